@@ -3,6 +3,17 @@ from import_manager import ImportSwRequirements
 from spdx_manager import SPDXManager
 from notifier import EmailNotifier
 from ai import AIPrompter
+from db.models.db_base import preload_used_work_items
+from db.models.traceability_graph import (
+    DEFAULT_DEPTH as TRACEABILITY_DEFAULT_DEPTH,
+    DIRECTIONS as TRACEABILITY_DIRECTIONS,
+    DOWNSTREAM as TRACEABILITY_DOWNSTREAM,
+    MAX_DEPTH as TRACEABILITY_MAX_DEPTH,
+    NODE_TYPES as TRACEABILITY_NODE_TYPES,
+    get_reachable_edges,
+)
+from db.models.traceability_matrix import MATRIX_COLUMNS, get_traceability_matrix
+from db.models.work_item_usage import get_work_item_usages
 from db.models.user import UserModel
 from db.models.test_specification_test_case import (
     TestSpecificationTestCaseHistoryModel,
@@ -27,16 +38,30 @@ from db.models.notification import NotificationModel
 from db.models.justification import JustificationHistoryModel, JustificationModel
 from db.models.document import DocumentHistoryModel, DocumentModel
 from db.models.document_document import DocumentDocumentModel, DocumentDocumentHistoryModel
-from db.models.comment import CommentModel
+from db.models.comment import CommentModel, preload_comment_counts
 from db.models.api_test_specification import ApiTestSpecificationHistoryModel, ApiTestSpecificationModel
 from db.models.api_test_case import ApiTestCaseHistoryModel, ApiTestCaseModel
 from db.models.api_sw_requirement import ApiSwRequirementHistoryModel, ApiSwRequirementModel
 from db.models.api_justification import ApiJustificationHistoryModel, ApiJustificationModel
 from db.models.api_document import ApiDocumentHistoryModel, ApiDocumentModel
 from db.models.api import ApiHistoryModel, ApiModel
+from db.models.api_user_permission import (
+    EDIT as EDIT_PERMISSION,
+    MANAGE as MANAGE_PERMISSION,
+    READ_DENIAL,
+    WRITE as WRITE_PERMISSION,
+    api_user_ids_with_permission,
+    get_users_permission_rows,
+    readable_apis_filter,
+    rebuild_api_user_permissions,
+    user_api_ids_with_permission,
+)
 from db import db_orm
 import base64
+import bisect
+import csv
 import datetime
+import io
 import json
 import logging
 import math
@@ -54,11 +79,11 @@ import yaml
 from uuid import uuid4
 
 import gitlab
-from flask import Flask, g, redirect, request, Response, send_file, send_from_directory
+from flask import Flask, g, redirect, request, Response, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_restful import Api, Resource, reqparse
 from pyaml_env import parse_config
-from sqlalchemy import String, and_, cast, or_, update
+from sqlalchemy import String, and_, cast, or_, tuple_, update
 from sqlalchemy.orm.exc import NoResultFound
 from api_response import (
     CREATED_STATUS,
@@ -82,6 +107,8 @@ from api_utils import (
     get_custom_actions,
     get_html_email_body_from_template,
     get_mapping_comments,
+    get_mappings_comments,
+    get_nested_mappings_keys,
     get_safe_str,
     get_user_config_folder_path,
     get_user_html_folder_path,
@@ -101,8 +128,20 @@ from api_utils import (
     test_run_to_html,
     tools_to_html,
 )
+from document_cache import document_cache
+from mapping_loader import (
+    API_DOC_TABLE,
+    API_SR_TABLE,
+    DocumentHierarchyLoader,
+    SwRequirementHierarchyLoader,
+    get_api_mapping_loader,
+)
+from mapping_view_cache import cached_mapping_view, mapping_view_cache
 from pdf_converter import ConvertRequest, convert_to_pdf
+import query_stats
+from section_anchors import reanchor_sections
 from testrun import TestRunner
+from user_cache import get_cached_active_user, user_cache
 import db.models.init_db as init_db
 
 logging.basicConfig(
@@ -178,6 +217,20 @@ API_PERMISSION_FIELDS = [
     "write_permissions",
 ]
 
+# Pagination
+COUNT_ESTIMATE = "estimate"
+COUNT_EXACT = "exact"
+MAX_PER_PAGE = 100
+
+# Work item types of /mapping/usage -> work item table of the usage index
+WORK_ITEM_USAGE_TABLES = {
+    "document": "documents",
+    "justification": "justifications",
+    "sw-requirement": "sw_requirements",
+    "test-case": "test_cases",
+    "test-specification": "test_specifications",
+}
+
 # Export configuration fields
 EXP_CONF_INCLUDE_JUSTIFICATIONS = "include_justifications"
 EXP_CONF_INCLUDE_DOCUMENTS = "include_documents"
@@ -432,18 +485,8 @@ def get_active_user_from_request(_request, _db_session):
     ):
         return None
 
-    query = (
-        _db_session.query(UserModel)
-        .filter(UserModel.id == _request["user-id"])
-        .filter(UserModel.token == _request["token"])
-        .filter(UserModel.enabled == 1)
-    )
-
-    try:
-        user = query.one()
-        return user
-    except NoResultFound:
-        return None
+    # Resolved once per request and cached by the process, see user_cache
+    return get_cached_active_user(_db_session, int(_request["user-id"]), str(_request["token"]))
 
 
 def get_usernames_from_ids(_ids, _dbi_session):
@@ -460,8 +503,9 @@ def get_usernames_from_ids(_ids, _dbi_session):
     return ret
 
 
-def get_api_user_permissions(_api, _user, _dbi_session):
-    """Extract user permissions from api
+def get_user_permissions_from_rows(_api, _user, _rows):
+    """Evaluate the permissions of a user on an api from the api_user_permissions
+    rows of the api related to the user and to its read denials
 
     - guest (without user entry) has id = 0
     - user with GUEST role doesn't have read permissions in case a read denial is defined
@@ -469,37 +513,50 @@ def get_api_user_permissions(_api, _user, _dbi_session):
     - for other roles, Write permission implies Read permission
     """
     permissions = ""
-
-    read_denials = get_safe_str(_api.read_denials)
-    write_permissions = get_safe_str(_api.write_permissions)
-    manage_permissions = get_safe_str(_api.manage_permissions)
-    edit_permissions = get_safe_str(_api.edit_permissions)
+    restricted = any(READ_DENIAL in x.perms for x in _rows)
 
     if isinstance(_user, UserModel):
         if _api.created_by_id == _user.id:
             return "rwem"
 
         if _user.role == 'GUEST':
-            if read_denials == '':
+            if not restricted:
                 permissions = "r"
             return permissions
-        else:
-            if f"[{_user.id}]" not in read_denials:
-                permissions += "r"
-                if f"[{_user.id}]" in write_permissions:
-                    permissions += "w"
 
-        if f"[{_user.id}]" in manage_permissions:
+        user_perms = "".join([x.perms for x in _rows if x.user_id == _user.id])
+        if READ_DENIAL not in user_perms:
+            permissions += "r"
+            if WRITE_PERMISSION in user_perms:
+                permissions += "w"
+        if MANAGE_PERMISSION in user_perms:
             permissions += "m"
-        if f"[{_user.id}]" in edit_permissions:
+        if EDIT_PERMISSION in user_perms:
             permissions += "e"
     else:
         # Guest _user is None
-        if read_denials == '':
+        if not restricted:
             permissions = "r"
     return permissions
 
 
+def get_apis_user_permissions(_apis, _user, _dbi_session):
+    """Return the permissions of a user on a list of apis as dict api id -> permissions,
+    with a single query on api_user_permissions"""
+    user_id = _user.id if isinstance(_user, UserModel) else None
+    rows = {}
+    for row in get_users_permission_rows(_dbi_session, [x.id for x in _apis], user_id):
+        rows.setdefault(row.api_id, []).append(row)
+    return {x.id: get_user_permissions_from_rows(x, _user, rows.get(x.id, [])) for x in _apis}
+
+
+def get_api_user_permissions(_api, _user, _dbi_session):
+    """Extract user permissions from api, see get_user_permissions_from_rows()"""
+    if isinstance(_user, UserModel) and _api.created_by_id == _user.id:
+        return "rwem"
+    return get_apis_user_permissions([_api], _user, _dbi_session)[_api.id]
+
+
 def get_api_user_requested_write_permissions(_api, _user, _dbi_session):
     """Return True if user requested write permission, else otherwise
 
@@ -514,6 +571,15 @@ def get_api_user_requested_write_permissions(_api, _user, _dbi_session):
     return False
 
 
+def get_readable_apis_filter(_user):
+    """SQL filter on the apis the user can read, see get_user_permissions_from_rows()"""
+    if not isinstance(_user, UserModel):
+        return readable_apis_filter(ApiModel.id)
+    if _user.role == "GUEST":
+        return or_(ApiModel.created_by_id == _user.id, readable_apis_filter(ApiModel.id))
+    return readable_apis_filter(ApiModel.id, _user.id, ApiModel.created_by_id)
+
+
 def get_combined_history_object(_obj, _map, _obj_fields, _map_fields):
     _obj_fields += ["version"]
     _map_fields += ["version"]
@@ -644,6 +710,7 @@ def get_model_editable_fields(_model, _is_history):
         "write_permissions",
         "write_permission_requests",
         "checksum",
+        "version",
     ]
 
     not_editable_model_history_fields = [
@@ -699,111 +766,47 @@ def filter_query(_query, _args, _model, _is_history):
     return _query
 
 
-def get_api_coverage(_sections):
-    total_len = sum([len(x["section"]) for x in _sections])
-    wa = 0
-    for i in range(len(_sections)):
-        wa += (len(_sections[i]["section"]) / total_len) * (_sections[i]["covered"] / 100.0)
-    return int(wa * 100)
+def get_query_count(_db_session, _query, _mode=COUNT_EXACT):
+    """Return the number of rows of a query
 
+    COUNT_ESTIMATE reads the number of rows estimated by the query planner,
+    that doesn't need to scan the rows but can be off for complex filters.
+    """
+    if _mode != COUNT_ESTIMATE:
+        return _query.order_by(None).count()
+    compiled = _query.order_by(None).statement.compile(dialect=_db_session.get_bind().dialect)
+    plan = _db_session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
 
-def split_section(_to_splits, _that_split, _work_item_type):
-    sections = []
-    _current_work_item = _that_split
 
-    if _work_item_type == _SR:
-        if "indirect_sw_requirement" in _that_split.keys():
-            _current_work_item["parent_mapping_type"] = "sw_requirement_mapping_sw_requirement"
-        else:
-            _current_work_item["parent_mapping_type"] = "sw_requirement_mapping_api"
-
-    for _to_split in _to_splits:
-        _to_split_range = range(_to_split["offset"], _to_split["offset"] + len(_to_split["section"]))
-        that_split_range = range(_that_split["offset"], _that_split["offset"] + len(_that_split["section"]))
-        overlap = len(list(set(_to_split_range) & set(that_split_range))) > 0
-        if not overlap:
-            tmp_section = {
-                "section": _to_split["section"],
-                "offset": _to_split["offset"],
-                "coverage": _to_split["coverage"],
-                "covered": _to_split["covered"],
-                "gap": _to_split["gap"],
-                "delete": 0,
-                _Js: [],
-                _TCs: [],
-                _TSs: [],
-                _SRs: [],
-                _Ds: [],
-            }
+def encode_page_cursor(_values):
+    """Opaque cursor of the keyset pagination, from the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(list(_values)).encode("utf-8")).decode("ascii")
 
-            for j in range(len(_to_split[_SRs])):
-                tmp_section[_SRs].append(_to_split[_SRs][j].copy())
-            for j in range(len(_to_split[_TCs])):
-                tmp_section[_TCs].append(_to_split[_TCs][j].copy())
-            for j in range(len(_to_split[_TSs])):
-                tmp_section[_TSs].append(_to_split[_TSs][j].copy())
-            for j in range(len(_to_split[_Js])):
-                tmp_section[_Js].append(_to_split[_Js][j].copy())
-            for j in range(len(_to_split[_Ds])):
-                tmp_section[_Ds].append(_to_split[_Ds][j].copy())
 
-            sections.append(tmp_section)
+def decode_page_cursor(_cursor, _types):
+    """Return the sort key of a cursor, None if the cursor is not valid
 
-        else:
-            idx = [
-                _to_split["offset"],
-                _to_split["offset"] + len(_to_split["section"]),
-                _that_split["offset"],
-                _that_split["offset"] + len(_that_split["section"]),
-            ]
-            idx_set = set(idx)
-            idx = sorted(list(idx_set))
-            for i in range(1, len(idx)):
-                # Compute boundaries relative to the section being split to avoid negative or zero-length slices
-                base_offset = _to_split["offset"]
-                section_start = base_offset
-                section_end = base_offset + len(_to_split["section"])
-                segment_start = max(idx[i - 1], section_start)
-                segment_end = min(idx[i], section_end)
-                if segment_end <= segment_start:
-                    continue
-                tmp_section = {
-                    "section": _to_split["section"][segment_start - base_offset: segment_end - base_offset],
-                    "offset": segment_start,
-                    "coverage": _to_split["coverage"],
-                    "covered": _to_split["covered"],
-                    "gap": _to_split["gap"],
-                    "delete": 0,
-                    _Js: [],
-                    _TCs: [],
-                    _TSs: [],
-                    _SRs: [],
-                    _Ds: [],
-                }
+    _types: type of each value of the sort key
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(_cursor).encode("ascii")))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(_types):
+        return None
+    # bool is an int for isinstance()
+    if any(isinstance(x, bool) or not isinstance(x, t) for x, t in zip(values, _types)):
+        return None
+    return values
 
-                for j in range(len(_to_split[_SRs])):
-                    tmp_section[_SRs].append(_to_split[_SRs][j].copy())
-                for j in range(len(_to_split[_TCs])):
-                    tmp_section[_TCs].append(_to_split[_TCs][j].copy())
-                for j in range(len(_to_split[_TSs])):
-                    tmp_section[_TSs].append(_to_split[_TSs][j].copy())
-                for j in range(len(_to_split[_Js])):
-                    tmp_section[_Js].append(_to_split[_Js][j].copy())
-                for j in range(len(_to_split[_Ds])):
-                    tmp_section[_Ds].append(_to_split[_Ds][j].copy())
-
-                sections.append(tmp_section)
-
-    for iSection in range(len(sections)):
-        section_range = range(
-            sections[iSection]["offset"], sections[iSection]["offset"] + len(sections[iSection]["section"])
-        )
-        that_split_range = range(_that_split["offset"], _that_split["offset"] + len(_that_split["section"]))
-        overlap = len(list(set(section_range) & set(that_split_range))) > 0
-        if overlap:
-            sections[iSection][f"{_work_item_type}s"].append(_current_work_item)
 
-    return sections
+def get_api_coverage(_sections):
+    total_len = sum([len(x["section"]) for x in _sections])
+    wa = 0
+    for i in range(len(_sections)):
+        wa += (len(_sections[i]["section"]) / total_len) * (_sections[i]["covered"] / 100.0)
+    return int(wa * 100)
 
 
 def get_split_sections(_specification, _mapping, _work_item_types):
@@ -813,87 +816,78 @@ def get_split_sections(_specification, _mapping, _work_item_types):
     _work_item_types: list of work items type for direct mapping that I
               what to display in the current view
     return: list of sections with related mapping
-    """
-    mapped_sections = [
-        {
-            "section": _specification,
-            "offset": 0,
-            "coverage": 0,
-            "covered": 0,
-            "gap": 100,
-            "delete": 0,
-            _TCs: [],
-            _TSs: [],
-            _SRs: [],
-            _Js: [],
-            _Ds: [],
-        }
-    ]
 
-    for iWIT in range(len(_work_item_types)):
-        _items_key = f"{_work_item_types[iWIT]}s"
-        for iMapping in range(len(_mapping[_items_key])):
-            if not _mapping[_items_key][iMapping]["match"]:
+    The specification is split at the start and at the end of every matching
+    mapping, then each mapping is assigned to the sections between its own
+    boundaries, looked up with a binary search on the sorted boundaries.
+    """
+    spec_len = len(_specification)
+    boundaries = {0, spec_len}
+    mappings = []
+    for work_item_type in _work_item_types:
+        for mapping in _mapping[f"{work_item_type}s"]:
+            if not mapping["match"]:
+                continue
+            start = mapping["offset"]
+            end = start + len(mapping["section"])
+            if end <= start:
                 continue
-            mapped_sections = sorted(mapped_sections, key=lambda k: k["offset"])
+            boundaries.update([start, end])
+            mappings.append((work_item_type, mapping, start, end))
 
-            # get overlapping sections
-            overlapping_section_indexes = []
-            for j in range(len(mapped_sections)):
-                section_range = range(
-                    mapped_sections[j]["offset"], mapped_sections[j]["offset"] + len(mapped_sections[j]["section"])
-                )
-                that_split_range = range(
-                    _mapping[_items_key][iMapping]["offset"],
-                    _mapping[_items_key][iMapping]["offset"] + len(_mapping[_items_key][iMapping]["section"]),
-                )
-                overlap = len(list(set(section_range) & set(that_split_range))) > 0
-                if overlap:
-                    overlapping_section_indexes.append(j)
-
-            if len(overlapping_section_indexes) > 0:
-                for k in overlapping_section_indexes:
-                    mapped_sections[k]["delete"] = 1
-
-                mapped_sections += split_section(
-                    [x for x in mapped_sections if x["delete"] == 1],
-                    _mapping[_items_key][iMapping],
-                    _work_item_types[iWIT],
-                )
-                mapped_sections = [x for x in mapped_sections if x["delete"] == 0]
-
-    for iS in range(len(mapped_sections)):
-        if mapped_sections[iS]["section"].strip() == "":
-            if (
-                sum(
-                    [
-                        len(mapped_sections[iS][_SRs]),
-                        len(mapped_sections[iS][_TSs]),
-                        len(mapped_sections[iS][_TCs]),
-                        len(mapped_sections[iS][_Js]),
-                        len(mapped_sections[iS][_Ds]),
-                    ]
-                )
-                == 0
-            ):
-                mapped_sections[iS]["delete"] = True
-
-        coverage_total = 0
-        for j in range(len(mapped_sections[iS][_SRs])):
-            coverage_total += mapped_sections[iS][_SRs][j]["covered"]
-        for j in range(len(mapped_sections[iS][_TCs])):
-            coverage_total += mapped_sections[iS][_TCs][j]["covered"]
-        for j in range(len(mapped_sections[iS][_TSs])):
-            coverage_total += mapped_sections[iS][_TSs][j]["covered"]
-        for j in range(len(mapped_sections[iS][_Js])):
-            coverage_total += mapped_sections[iS][_Js][j]["covered"]
-        for j in range(len(mapped_sections[iS][_Ds])):
-            coverage_total += mapped_sections[iS][_Ds][j]["covered"]
-        mapped_sections[iS]["covered"] = min(max(coverage_total, 0), 100)
-
-    # Remove Section with section: \n and no work items
-    mapped_sections = [x for x in mapped_sections if not x["delete"]]
-    return sorted(mapped_sections, key=lambda k: k["offset"])
+    boundaries = sorted(boundaries)
+    if not mappings:
+        mapped_sections = [
+            {
+                "section": _specification,
+                "offset": 0,
+                "coverage": 0,
+                "covered": 0,
+                "gap": 100,
+                "delete": 0,
+                _TCs: [],
+                _TSs: [],
+                _SRs: [],
+                _Js: [],
+                _Ds: [],
+            }
+        ]
+    else:
+        mapped_sections = [
+            {
+                "section": _specification[boundaries[i]: boundaries[i + 1]],
+                "offset": boundaries[i],
+                "coverage": 0,
+                "covered": 0,
+                "gap": 100,
+                "delete": 0,
+                _Js: [],
+                _TCs: [],
+                _TSs: [],
+                _SRs: [],
+                _Ds: [],
+            }
+            for i in range(len(boundaries) - 1)
+        ]
+
+    for work_item_type, mapping, start, end in mappings:
+        if work_item_type == _SR:
+            if "indirect_sw_requirement" in mapping.keys():
+                mapping["parent_mapping_type"] = "sw_requirement_mapping_sw_requirement"
+            else:
+                mapping["parent_mapping_type"] = "sw_requirement_mapping_api"
+        items_key = f"{work_item_type}s"
+        for i in range(bisect.bisect_left(boundaries, start), bisect.bisect_left(boundaries, end)):
+            mapped_sections[i][items_key].append(mapping)
+
+    for mapped_section in mapped_sections:
+        work_items = [x for key in [_SRs, _TCs, _TSs, _Js, _Ds] for x in mapped_section[key]]
+        # Remove Section with section: \n and no work items
+        if mapped_section["section"].strip() == "" and not work_items:
+            mapped_section["delete"] = True
+        mapped_section["covered"] = min(max(sum([x["covered"] for x in work_items]), 0), 100)
+
+    return [x for x in mapped_sections if not x["delete"]]
 
 
 def get_wrong_mandatory_fields(fields=[], request={}, allow_empty_string=True, int_fields=[]) -> bool:
@@ -930,10 +924,16 @@ def get_query_string_args(args):
 
     permitted_keys = [
         "api-id",
+        "api-ids",
         "artifact",
+        "count",
+        "cursor",
+        "depth",
+        "direction",
         "email",
         "filename",
         "filter",
+        "format",
         "id",
         "job",
         "library",
@@ -961,6 +961,7 @@ def get_query_string_args(args):
         "path",
         "recursive",
         "token",
+        "types",
         "url",
         "user-id",
         "work_item_type",
@@ -995,22 +996,34 @@ def get_query_string_args(args):
     return ret
 
 
-def get_sw_requirement_children(_dbi, _srm, config={}):
-    """Get hierichical mapping of Sw Requirements"""
+def get_sw_requirement_children(_dbi, _srm, config={}, loader=None):
+    """Get hierichical mapping of Sw Requirements
+
+    Nested work items are read from a SwRequirementHierarchyLoader, that fetches
+    the whole subtree in a fixed number of queries.
+    Callers that build more than one hierarchy in the same response should
+    create a single loader for all the roots and pass it here.
+    """
     undesired_keys = []
 
     include_test_specifications = bool_from_string(config.get(EXP_CONF_INCLUDE_TEST_SPECIFICATIONS, "true"))
     include_test_cases = bool_from_string(config.get(EXP_CONF_INCLUDE_TEST_CASES, "true"))
 
-    mapping_field_id = f"{_srm['__tablename__']}_id"
+    if loader is None:
+        root_ids = {
+            "api_relation_ids" if _srm["__tablename__"] == API_SR_TABLE else "sr_relation_ids": [_srm["relation_id"]]
+        }
+        loader = SwRequirementHierarchyLoader(
+            _dbi.session,
+            include_test_specifications=include_test_specifications,
+            include_test_cases=include_test_cases,
+            **root_ids,
+        )
 
     tmp = _srm
 
     # Indirect SwRequirement
-    ind_sr_query = _dbi.session.query(SwRequirementSwRequirementModel).filter(
-        getattr(SwRequirementSwRequirementModel, mapping_field_id) == _srm["relation_id"]
-    )
-    ind_sr = ind_sr_query.all()
+    ind_sr = loader.get_sw_requirements(_srm["__tablename__"], _srm["relation_id"])
 
     tmp[_SRs] = [get_dict_without_keys(x.as_dict(db_session=_dbi.session), undesired_keys + ["api"]) for x in ind_sr]
 
@@ -1022,11 +1035,7 @@ def get_sw_requirement_children(_dbi, _srm, config={}):
 
     # Indirect Test Specifications
     if include_test_specifications:
-        ind_ts = (
-            _dbi.session.query(SwRequirementTestSpecificationModel)
-            .filter(getattr(SwRequirementTestSpecificationModel, mapping_field_id) == _srm["relation_id"])
-            .all()
-        )
+        ind_ts = loader.get_test_specifications(_srm["__tablename__"], _srm["relation_id"])
         tmp[_TSs] = [
             get_dict_without_keys(
                 x.as_dict(db_session=_dbi.session),
@@ -1036,14 +1045,7 @@ def get_sw_requirement_children(_dbi, _srm, config={}):
         for iTS in range(len(tmp[_TSs])):
             # Indirect Test Cases
             if include_test_cases:
-                curr_srts_id = tmp[_TSs][iTS]["relation_id"]
-                ind_tc = (
-                    _dbi.session.query(TestSpecificationTestCaseModel)
-                    .filter(
-                        TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id == curr_srts_id
-                    )
-                    .all()
-                )
+                ind_tc = loader.get_test_specification_test_cases(tmp[_TSs][iTS]["relation_id"])
 
                 tmp[_TSs][iTS][_TS][_TCs] = [
                     get_dict_without_keys(x.as_dict(db_session=_dbi.session), undesired_keys + ["api"]) for x in ind_tc
@@ -1051,11 +1053,7 @@ def get_sw_requirement_children(_dbi, _srm, config={}):
 
     # Indirect Test Cases
     if include_test_cases:
-        ind_tc = (
-            _dbi.session.query(SwRequirementTestCaseModel)
-            .filter(getattr(SwRequirementTestCaseModel, mapping_field_id) == _srm["relation_id"])
-            .all()
-        )
+        ind_tc = loader.get_test_cases(_srm["__tablename__"], _srm["relation_id"])
         tmp[_TCs] = [
             get_dict_without_keys(
                 x.as_dict(db_session=_dbi.session), undesired_keys + ["api", "sw_requirement_mapping_api"]
@@ -1065,7 +1063,7 @@ def get_sw_requirement_children(_dbi, _srm, config={}):
 
     # Recursive updating of nested SwRequirements
     for iNSR in range(len(tmp[_SRs])):
-        tmp[_SRs][iNSR] = get_sw_requirement_children(_dbi, tmp[_SRs][iNSR], config)
+        tmp[_SRs][iNSR] = get_sw_requirement_children(_dbi, tmp[_SRs][iNSR], config, loader=loader)
 
     return tmp
 
@@ -1120,19 +1118,34 @@ def get_indirect_work_items_from_hierichical_mapping(dbi, mapping, work_items_ty
     return found_items
 
 
-def get_document_children(_dbi, _document_mapping):
-    """Get hierichical mapping of Documents"""
+def preload_mappings(_dbi, _rows):
+    """Resolve comment counters and usage of the rows about to be serialized with a few bulk queries"""
+    preload_comment_counts(_dbi.session, _rows)
+    preload_used_work_items(_dbi.session, _rows)
+
+
+def get_document_children(_dbi, _document_mapping, loader=None):
+    """Get hierichical mapping of Documents
+
+    Nested Documents are read from a DocumentHierarchyLoader, that fetches
+    the whole subtree with a single query.
+    Callers that build more than one hierarchy in the same response should
+    create a single loader for all the roots and pass it here.
+    """
     undesired_keys = []
 
-    mapping_field_id = f"{_document_mapping['__tablename__']}_id"
+    if loader is None:
+        root_ids = {
+            "api_relation_ids" if _document_mapping["__tablename__"] == API_DOC_TABLE else "doc_relation_ids": [
+                _document_mapping["relation_id"]
+            ]
+        }
+        loader = DocumentHierarchyLoader(_dbi.session, **root_ids)
 
     tmp = _document_mapping
 
     # Indirect Documents
-    ind_document_query = _dbi.session.query(DocumentDocumentModel).filter(
-        getattr(DocumentDocumentModel, mapping_field_id) == _document_mapping["relation_id"]
-    )
-    ind_docs = ind_document_query.all()
+    ind_docs = loader.get_documents(_document_mapping["__tablename__"], _document_mapping["relation_id"])
 
     tmp[_Ds] = [get_dict_without_keys(x.as_dict(db_session=_dbi.session), undesired_keys + ["api"]) for x in ind_docs]
 
@@ -1144,11 +1157,12 @@ def get_document_children(_dbi, _document_mapping):
 
     # Recursive updating of nested Documents
     for iND in range(len(tmp[_Ds])):
-        tmp[_Ds][iND] = get_document_children(_dbi, tmp[_Ds][iND])
+        tmp[_Ds][iND] = get_document_children(_dbi, tmp[_Ds][iND], loader=loader)
 
     return tmp
 
 
+@cached_mapping_view("sw_requirements")
 def get_api_sw_requirements_mapping_sections(dbi, api, config={}):
 
     include_justifications = bool_from_string(config.get(EXP_CONF_INCLUDE_JUSTIFICATIONS, "true"))
@@ -1162,43 +1176,14 @@ def get_api_sw_requirements_mapping_sections(dbi, api, config={}):
             "and that the file still exists in the expected location"
         )
 
-    sr = (
-        dbi.session.query(ApiSwRequirementModel)
-        .filter(ApiSwRequirementModel.api_id == api.id)
-        .order_by(ApiSwRequirementModel.offset.asc())
-        .all()
+    mapping_types = [_SRs] + ([_Js] if include_justifications else []) + ([_Ds] if include_documents else [])
+    loader = get_api_mapping_loader(dbi.session, api, api_specification).load(
+        *mapping_types, sw_requirement_hierarchy=True, document_hierarchy=include_documents
     )
-    sr_mapping = [x.as_dict(db_session=dbi.session) for x in sr]
 
-    documents_mapping = []
-    if include_documents:
-        documents = (
-            dbi.session.query(ApiDocumentModel)
-            .filter(ApiDocumentModel.api_id == api.id)
-            .order_by(ApiDocumentModel.offset.asc())
-            .all()
-        )
-        documents_mapping = [x.as_dict(db_session=dbi.session) for x in documents]
-
-    justifications_mapping = []
-    if include_justifications:
-        justifications = (
-            dbi.session.query(ApiJustificationModel)
-            .filter(ApiJustificationModel.api_id == api.id)
-            .order_by(ApiJustificationModel.offset.asc())
-            .all()
-        )
-        justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
-
-    mapping = {_A: api.as_dict(), _SRs: sr_mapping, _Js: justifications_mapping, _Ds: documents_mapping}
-
-    for iType in [_SRs, _Js, _Ds]:
-        for iMapping in range(len(mapping[iType])):
-            current_offset = mapping[iType][iMapping]["offset"]
-            current_section = mapping[iType][iMapping]["section"]
-            mapping[iType][iMapping]["match"] = (
-                api_specification[current_offset: current_offset + len(current_section)] == current_section
-            )
+    mapping = {_A: api.as_dict(), _SRs: [], _Js: [], _Ds: []}
+    for iType in mapping_types:
+        mapping[iType] = loader.mappings(iType)
 
     mapped_sections = get_split_sections(api_specification, mapping, [_SR, _J, _D])
     unmapped_sections = [x for x in mapping[_SRs] if not x["match"]]
@@ -1209,11 +1194,15 @@ def get_api_sw_requirements_mapping_sections(dbi, api, config={}):
 
     for iMS in range(len(mapped_sections)):
         for iD in range(len(mapped_sections[iMS][_Ds])):
-            document_children_data = get_document_children(dbi, mapped_sections[iMS][_Ds][iD])
+            document_children_data = get_document_children(
+                dbi, mapped_sections[iMS][_Ds][iD], loader=loader.document_loader
+            )
             mapped_sections[iMS][_Ds][iD] = document_children_data
 
         for iSR in range(len(mapped_sections[iMS][_SRs])):
-            sw_requirement_children_data = get_sw_requirement_children(dbi, mapped_sections[iMS][_SRs][iSR], config)
+            sw_requirement_children_data = get_sw_requirement_children(
+                dbi, mapped_sections[iMS][_SRs][iSR], config, loader=loader.sw_requirement_loader
+            )
             mapped_sections[iMS][_SRs][iSR] = sw_requirement_children_data
 
     ret = {"mapped": mapped_sections, "unmapped": unmapped_sections}
@@ -1221,6 +1210,7 @@ def get_api_sw_requirements_mapping_sections(dbi, api, config={}):
     return ret
 
 
+@cached_mapping_view("test_specifications")
 def get_api_test_specifications_mapping_sections(dbi, api):
     undesired_keys = ["section", "offset"]
 
@@ -1228,53 +1218,18 @@ def get_api_test_specifications_mapping_sections(dbi, api):
     if api_specification is None:
         return []
 
-    ts = (
-        dbi.session.query(ApiTestSpecificationModel)
-        .filter(ApiTestSpecificationModel.api_id == api.id)
-        .order_by(ApiTestSpecificationModel.offset.asc())
-        .all()
+    loader = get_api_mapping_loader(dbi.session, api, api_specification).load(
+        _TSs, _Js, _Ds, document_hierarchy=True, test_specification_test_cases=True
     )
-    ts_mapping = [x.as_dict(db_session=dbi.session) for x in ts]
 
-    documents = (
-        dbi.session.query(ApiDocumentModel)
-        .filter(ApiDocumentModel.api_id == api.id)
-        .order_by(ApiDocumentModel.offset.asc())
-        .all()
-    )
-    documents_mapping = [x.as_dict(db_session=dbi.session) for x in documents]
-
-    justifications = (
-        dbi.session.query(ApiJustificationModel)
-        .filter(ApiJustificationModel.api_id == api.id)
-        .order_by(ApiJustificationModel.offset.asc())
-        .all()
-    )
-    justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
-
-    mapping = {_A: api.as_dict(), _TSs: ts_mapping, _Js: justifications_mapping, _Ds: documents_mapping}
+    mapping = {_A: api.as_dict(), _TSs: loader.mappings(_TSs), _Js: loader.mappings(_Js), _Ds: loader.mappings(_Ds)}
 
     for iTS in range(len(mapping[_TSs])):
-        # Indirect Test Cases
-        curr_ats_id = mapping[_TSs][iTS]["relation_id"]
-
-        ind_tc = (
-            dbi.session.query(TestSpecificationTestCaseModel)
-            .filter(TestSpecificationTestCaseModel.test_specification_mapping_api_id == curr_ats_id)
-            .all()
-        )
         mapping[_TSs][iTS][_TS][_TCs] = [
-            get_dict_without_keys(x.as_dict(db_session=dbi.session), undesired_keys + ["api"]) for x in ind_tc
+            get_dict_without_keys(x.as_dict(db_session=dbi.session), undesired_keys + ["api"])
+            for x in loader.get_test_specification_test_cases(mapping[_TSs][iTS]["relation_id"])
         ]
 
-    for iType in [_TSs, _Js, _Ds]:
-        for iMapping in range(len(mapping[iType])):
-            current_offset = mapping[iType][iMapping]["offset"]
-            current_section = mapping[iType][iMapping]["section"]
-            mapping[iType][iMapping]["match"] = (
-                api_specification[current_offset: current_offset + len(current_section)] == current_section
-            )
-
     mapped_sections = get_split_sections(api_specification, mapping, [_TS, _J, _D])
     unmapped_sections = [x for x in mapping[_TSs] if not x["match"]]
     unmapped_sections += [x for x in mapping[_Js] if not x["match"]]
@@ -1284,7 +1239,9 @@ def get_api_test_specifications_mapping_sections(dbi, api):
 
     for iMS in range(len(mapped_sections)):
         for iD in range(len(mapped_sections[iMS][_Ds])):
-            document_children_data = get_document_children(dbi, mapped_sections[iMS][_Ds][iD])
+            document_children_data = get_document_children(
+                dbi, mapped_sections[iMS][_Ds][iD], loader=loader.document_loader
+            )
             mapped_sections[iMS][_Ds][iD] = document_children_data
 
     ret = {"mapped": mapped_sections, "unmapped": unmapped_sections}
@@ -1292,44 +1249,17 @@ def get_api_test_specifications_mapping_sections(dbi, api):
     return ret
 
 
+@cached_mapping_view("test_cases")
 def get_api_test_cases_mapping_sections(dbi, api):
     api_specification = get_api_specification(api.raw_specification_url)
     if api_specification is None:
         return []
 
-    tc = (
-        dbi.session.query(ApiTestCaseModel)
-        .filter(ApiTestCaseModel.api_id == api.id)
-        .order_by(ApiTestCaseModel.offset.asc())
-        .all()
+    loader = get_api_mapping_loader(dbi.session, api, api_specification).load(
+        _TCs, _Js, _Ds, document_hierarchy=True
     )
-    tc_mapping = [x.as_dict(db_session=dbi.session) for x in tc]
 
-    documents = (
-        dbi.session.query(ApiDocumentModel)
-        .filter(ApiDocumentModel.api_id == api.id)
-        .order_by(ApiDocumentModel.offset.asc())
-        .all()
-    )
-    documents_mapping = [x.as_dict(db_session=dbi.session) for x in documents]
-
-    justifications = (
-        dbi.session.query(ApiJustificationModel)
-        .filter(ApiJustificationModel.api_id == api.id)
-        .order_by(ApiJustificationModel.offset.asc())
-        .all()
-    )
-    justifications_mapping = [x.as_dict(db_session=dbi.session) for x in justifications]
-
-    mapping = {_A: api.as_dict(), _TCs: tc_mapping, _Js: justifications_mapping, _Ds: documents_mapping}
-
-    for iType in [_TCs, _Js, _Ds]:
-        for iMapping in range(len(mapping[iType])):
-            current_offset = mapping[iType][iMapping]["offset"]
-            current_section = mapping[iType][iMapping]["section"]
-            mapping[iType][iMapping]["match"] = (
-                api_specification[current_offset: current_offset + len(current_section)] == current_section
-            )
+    mapping = {_A: api.as_dict(), _TCs: loader.mappings(_TCs), _Js: loader.mappings(_Js), _Ds: loader.mappings(_Ds)}
 
     mapped_sections = get_split_sections(api_specification, mapping, [_TC, _J, _D])
     unmapped_sections = [x for x in mapping[_TCs] if not x["match"]]
@@ -1340,7 +1270,9 @@ def get_api_test_cases_mapping_sections(dbi, api):
 
     for iMS in range(len(mapped_sections)):
         for iD in range(len(mapped_sections[iMS][_Ds])):
-            document_children_data = get_document_children(dbi, mapped_sections[iMS][_Ds][iD])
+            document_children_data = get_document_children(
+                dbi, mapped_sections[iMS][_Ds][iD], loader=loader.document_loader
+            )
             mapped_sections[iMS][_Ds][iD] = document_children_data
 
     ret = {"mapped": mapped_sections, "unmapped": unmapped_sections}
@@ -1348,107 +1280,47 @@ def get_api_test_cases_mapping_sections(dbi, api):
     return ret
 
 
-def check_direct_work_items_against_another_spec_file(db_session, spec, api):
-    ret = {
-        "sw-requirements": {"ok": [], "ko": [], "warning": []},
-        "test-specifications": {"ok": [], "ko": [], "warning": []},
-        "test-cases": {"ok": [], "ko": [], "warning": []},
-        "justifications": {"ok": [], "ko": [], "warning": []},
-        "documents": {"ok": [], "ko": [], "warning": []},
-    }
+# Direct mappings checked against a new version of the Reference Document:
+# result key, mapping model, work item relationship, work item field used as title
+SPEC_CHECK_MAPPINGS = [
+    ("sw-requirements", ApiSwRequirementModel, "sw_requirement", "title"),
+    ("test-specifications", ApiTestSpecificationModel, "test_specification", "title"),
+    ("test-cases", ApiTestCaseModel, "test_case", "title"),
+    ("justifications", ApiJustificationModel, "justification", "description"),
+    ("documents", ApiDocumentModel, "document", "title"),
+]
+
+
+def reanchor_direct_mappings(db_session, spec, api, old_spec=None):
+    """Return (result key, mapping, new offset) for each direct mapping of the api,
+    new offset is None if the section is not part of spec"""
+    mappings = []
+    for key, model, _, _ in SPEC_CHECK_MAPPINGS:
+        rows = db_session.query(model).options(*model.as_dict_load_options()).filter(model.api_id == api.id).all()
+        mappings += [(key, x) for x in rows]
+
+    new_offsets = reanchor_sections([(i, x.section, x.offset) for i, (_, x) in enumerate(mappings)], spec, old_spec)
+    return [(key, mapping, new_offsets[i]) for i, (key, mapping) in enumerate(mappings)]
+
+
+def check_direct_work_items_against_another_spec_file(db_session, spec, api, old_spec=None):
+    ret = {key: {"ok": [], "ko": [], "warning": []} for key, _, _, _ in SPEC_CHECK_MAPPINGS}
 
     if not spec:
         return ret
 
-    # ApiSwRequirement
-    api_srs = db_session.query(ApiSwRequirementModel).filter(ApiSwRequirementModel.api_id == api.id).all()
-    for api_sr in api_srs:
-        if api_sr.section in spec:
-            if spec.index(api_sr.section) == api_sr.offset:
-                ret["sw-requirements"]["ok"].append({"id": api_sr.id, "title": api_sr.sw_requirement.title})
-            else:
-                ret["sw-requirements"]["warning"].append(
-                    {
-                        "id": api_sr.id,
-                        "old-offset": api_sr.offset,
-                        "new-offset": spec.index(api_sr.section),
-                        "title": api_sr.sw_requirement.title,
-                    }
-                )
-        else:
-            ret["sw-requirements"]["ko"].append({"id": api_sr.id, "title": api_sr.sw_requirement.title})
-
-    # ApiTestSpecification
-    api_tss = db_session.query(ApiTestSpecificationModel).filter(ApiTestSpecificationModel.api_id == api.id).all()
-    for api_ts in api_tss:
-        if api_ts.section in spec:
-            if spec.index(api_ts.section) == api_ts.offset:
-                ret["test-specifications"]["ok"].append({"id": api_ts.id, "title": api_ts.test_specification.title})
-            else:
-                ret["test-specifications"]["warning"].append(
-                    {
-                        "id": api_ts.id,
-                        "old-offset": api_ts.offset,
-                        "new-offset": spec.index(api_ts.section),
-                        "title": api_ts.test_specification.title,
-                    }
-                )
-        else:
-            ret["test-specifications"]["ko"].append({"id": api_ts.id, "title": api_ts.test_specification.title})
-
-    # ApiTestCase
-    api_tcs = db_session.query(ApiTestCaseModel).filter(ApiTestCaseModel.api_id == api.id).all()
-    for api_tc in api_tcs:
-        if api_tc.section in spec:
-            if spec.index(api_tc.section) == api_tc.offset:
-                ret["test-cases"]["ok"].append({"id": api_tc.id, "title": api_tc.test_case.title})
-            else:
-                ret["test-cases"]["warning"].append(
-                    {
-                        "id": api_tc.id,
-                        "old-offset": api_tc.offset,
-                        "new-offset": spec.index(api_tc.section),
-                        "title": api_tc.test_case.title,
-                    }
-                )
-        else:
-            ret["test-cases"]["ko"].append({"id": api_tc.id, "title": api_tc.test_case.title})
-
-    # ApiJustification
-    api_js = db_session.query(ApiJustificationModel).filter(ApiJustificationModel.api_id == api.id).all()
-    for api_j in api_js:
-        if api_j.section in spec:
-            if spec.index(api_j.section) == api_j.offset:
-                ret["justifications"]["ok"].append({"id": api_j.id, "title": api_j.justification.description})
-            else:
-                ret["justifications"]["warning"].append(
-                    {
-                        "id": api_j.id,
-                        "old-offset": api_j.offset,
-                        "new-offset": spec.index(api_j.section),
-                        "title": api_j.justification.description,
-                    }
-                )
+    titles = {key: (work_item, field) for key, _, work_item, field in SPEC_CHECK_MAPPINGS}
+    for key, mapping, new_offset in reanchor_direct_mappings(db_session, spec, api, old_spec):
+        work_item, field = titles[key]
+        title = getattr(getattr(mapping, work_item), field)
+        if new_offset is None:
+            ret[key]["ko"].append({"id": mapping.id, "title": title})
+        elif new_offset == mapping.offset:
+            ret[key]["ok"].append({"id": mapping.id, "title": title})
         else:
-            ret["justifications"]["ko"].append({"id": api_j.id, "title": api_j.justification.description})
-
-    # ApiDocument
-    api_docs = db_session.query(ApiDocumentModel).filter(ApiDocumentModel.api_id == api.id).all()
-    for api_doc in api_docs:
-        if api_doc.section in spec:
-            if spec.index(api_doc.section) == api_doc.offset:
-                ret["documents"]["ok"].append({"id": api_doc.id, "title": api_doc.document.title})
-            else:
-                ret["documents"]["warning"].append(
-                    {
-                        "id": api_doc.id,
-                        "old-offset": api_doc.offset,
-                        "new-offset": spec.index(api_doc.section),
-                        "title": api_doc.document.title,
-                    }
-                )
-        else:
-            ret["documents"]["ko"].append({"id": api_doc.id, "title": api_doc.document.title})
+            ret[key]["warning"].append(
+                {"id": mapping.id, "old-offset": mapping.offset, "new-offset": new_offset, "title": title}
+            )
 
     return ret
 
@@ -1937,6 +1809,8 @@ class SPDXApi(Resource):
 class HTMLApi(Resource):
     route = "/html/apis"
     fields = ["filename"]
+    # (tablename, relation_id) -> comments, loaded once per export
+    mapping_comments = None
     div_open_html = "<div style='border-left: 1px solid #DDD; padding-left: 10px;'>"
     div_close_html = "</div>"
 
@@ -1972,7 +1846,8 @@ class HTMLApi(Resource):
                 comments = get_mapping_comments(
                     dbi=dbi,
                     relation_id=sw_requirement.get("relation_id", None),
-                    tablename=sw_requirement.get("__tablename__", None)
+                    tablename=sw_requirement.get("__tablename__", None),
+                    preloaded=self.mapping_comments
                 )
 
             html += sw_requirement_to_html(
@@ -2038,7 +1913,8 @@ class HTMLApi(Resource):
                 comments = get_mapping_comments(
                     dbi=dbi,
                     relation_id=test_specification.get("relation_id", None),
-                    tablename=test_specification.get("__tablename__", None)
+                    tablename=test_specification.get("__tablename__", None),
+                    preloaded=self.mapping_comments
                 )
 
             html += test_specification_to_html(
@@ -2083,7 +1959,8 @@ class HTMLApi(Resource):
                 comments = get_mapping_comments(
                     dbi=dbi,
                     relation_id=test_case.get("relation_id", None),
-                    tablename=test_case.get("__tablename__", None)
+                    tablename=test_case.get("__tablename__", None),
+                    preloaded=self.mapping_comments
                 )
 
             html += test_case_to_html(
@@ -2153,7 +2030,8 @@ class HTMLApi(Resource):
                 comments = get_mapping_comments(
                     dbi=dbi,
                     relation_id=document.get("relation_id", None),
-                    tablename=document.get("__tablename__", None)
+                    tablename=document.get("__tablename__", None),
+                    preloaded=self.mapping_comments
                 )
 
             html += document_to_html(
@@ -2192,7 +2070,8 @@ class HTMLApi(Resource):
                 comments = get_mapping_comments(
                     dbi=dbi,
                     relation_id=justification.get("relation_id", None),
-                    tablename=justification.get("__tablename__", None)
+                    tablename=justification.get("__tablename__", None),
+                    preloaded=self.mapping_comments
                 )
 
             html += justification_to_html(
@@ -2296,6 +2175,9 @@ class HTMLApi(Resource):
             api_response.set_message("Invalid mapping view")
             return api_response.return_bad_request()
 
+        if include_comments:
+            self.mapping_comments = get_mappings_comments(dbi, get_nested_mappings_keys(mapped_sections))
+
         # Build Table of Contents
         toc_html = "<div id='toc'><h2>Table of Contents</h2><ul>"
         for i_ms, ms in enumerate(mapped_sections["mapped"]):
@@ -2590,6 +2472,7 @@ class Comment(Resource):
 
         query = (
             dbi.session.query(CommentModel)
+            .options(*CommentModel.as_dict_load_options())
             .filter(CommentModel.parent_table == request_data["parent_table"])
             .filter(CommentModel.parent_id == request_data["parent_id"])
         )
@@ -2833,12 +2716,14 @@ class CheckSpecification(Resource):
 
         api = apis[0]
 
+        old_spec = None
         if "url" in request_data.keys():
             spec = get_api_specification(request_data["url"])
+            old_spec = get_api_specification(api.raw_specification_url)
         else:
             spec = get_api_specification(api.raw_specification_url)
 
-        ret = check_direct_work_items_against_another_spec_file(dbi.session, spec, api)
+        ret = check_direct_work_items_against_another_spec_file(dbi.session, spec, api, old_spec)
         api_response.set_data(ret)
         return api_response.return_ok()
 
@@ -2993,62 +2878,12 @@ class FixNewSpecificationWarnings(Resource):
 
         spec = get_api_specification(api.raw_specification_url)
 
-        analysis = check_direct_work_items_against_another_spec_file(dbi.session, spec, api)
-
-        # ApiSwRequirements
-        for i in range(len(analysis["sw-requirements"]["warning"])):
-            sr_all = (
-                dbi.session.query(ApiSwRequirementModel)
-                .filter(ApiSwRequirementModel.id == analysis["sw-requirements"]["warning"][i]["id"])
-                .all()
-            )
-            if len(sr_all) == 1:
-                sr_all[0].offset = analysis["sw-requirements"]["warning"][i]["new-offset"]
-                dbi.session.commit()
-
-        # ApiTestSpecification
-        for i in range(len(analysis["test-specifications"]["warning"])):
-            ts_all = (
-                dbi.session.query(ApiTestSpecificationModel)
-                .filter(ApiTestSpecificationModel.id == analysis["test-specifications"]["warning"][i]["id"])
-                .all()
-            )
-            if len(ts_all) == 1:
-                ts_all[0].offset = analysis["test-specifications"]["warning"][i]["new-offset"]
-                dbi.session.commit()
-
-        # ApiTestCase
-        for i in range(len(analysis["test-cases"]["warning"])):
-            tc_all = (
-                dbi.session.query(ApiTestCaseModel)
-                .filter(ApiTestCaseModel.id == analysis["test-cases"]["warning"][i]["id"])
-                .all()
-            )
-            if len(tc_all) == 1:
-                tc_all[0].offset = analysis["test-cases"]["warning"][i]["new-offset"]
-                dbi.session.commit()
-
-        # ApiJustification
-        for i in range(len(analysis["justifications"]["warning"])):
-            j_all = (
-                dbi.session.query(ApiJustificationModel)
-                .filter(ApiJustificationModel.id == analysis["justifications"]["warning"][i]["id"])
-                .all()
-            )
-            if len(j_all) == 1:
-                j_all[0].offset = analysis["justifications"]["warning"][i]["new-offset"]
-                dbi.session.commit()
-
-        # ApiDocument
-        for i in range(len(analysis["documents"]["warning"])):
-            doc_all = (
-                dbi.session.query(ApiDocumentModel)
-                .filter(ApiDocumentModel.id == analysis["documents"]["warning"][i]["id"])
-                .all()
-            )
-            if len(doc_all) == 1:
-                doc_all[0].offset = analysis["documents"]["warning"][i]["new-offset"]
-                dbi.session.commit()
+        # All the offsets are fixed in a single transaction
+        if spec:
+            for _, mapping, new_offset in reanchor_direct_mappings(dbi.session, spec, api):
+                if new_offset is not None and new_offset != mapping.offset:
+                    mapping.offset = new_offset
+            dbi.session.commit()
 
         api_response.set_data(True)
         return api_response.return_ok()
@@ -3083,63 +2918,71 @@ class Api(Resource):
         else:
             user_api_notifications = []
 
+        # Read permission is evaluated by the database, so that pages and count only
+        # include the readable apis
         query = dbi.session.query(ApiModel)
         query = filter_query(query, args, ApiModel, False)
-        query = query.order_by(ApiModel.api, ApiModel.library_version)
+        query = query.filter(get_readable_apis_filter(user))
 
-        # Pagination
+        # Pagination: page number (offset) or cursor of the previous page (keyset)
         page = 1
         per_page = 10
-        if "page" in args.keys():
-            if str(request.args["page"]).isnumeric():
+        if "page" in args.keys() or "cursor" in args.keys():
+            if str(args.get("page", "")).isnumeric():
                 page = max(int(args["page"]), 1)
-                if "per_page" in args.keys():
-                    if per_page in [5, 10, 20, 40, "5", "10", "20", "40"]:
-                        per_page = int(args["per_page"])
+            if str(args.get("per_page", "")).isnumeric():
+                per_page = min(max(int(args["per_page"]), 1), MAX_PER_PAGE)
 
-        count = query.count()
-        apis = query.offset((page - 1) * per_page).limit(per_page).all()
+        count = get_query_count(dbi.session, query, args.get("count", COUNT_EXACT))
         page_count = math.ceil(count / per_page)
 
+        sort_key = [ApiModel.api, ApiModel.library_version, ApiModel.id]
+        query = query.order_by(*sort_key)
+        if "cursor" in args.keys():
+            cursor = decode_page_cursor(args["cursor"], [str, str, int])
+            if cursor is None:
+                api_response.set_message("Invalid cursor")
+                return api_response.return_bad_request()
+            query = query.filter(tuple_(*sort_key) > tuple_(*cursor))
+        else:
+            query = query.offset((page - 1) * per_page)
+        apis = query.limit(per_page + 1).all()
+        next_cursor = None
+        if len(apis) > per_page:
+            apis = apis[:per_page]
+            next_cursor = encode_page_cursor([apis[-1].api, apis[-1].library_version, apis[-1].id])
+
         apis_dict = []
-        if len(apis):
-            for iApi in range(len(apis)):
-                api_dict = apis[iApi].as_dict()
-                api_dict["covered"] = api_dict["last_coverage"]
-
-                # Permissions
-                permissions = get_api_user_permissions(apis[iApi], user, dbi.session)
-                api_dict["permissions"] = permissions
-
-                # Write permission request
-                write_permission_request = get_api_user_requested_write_permissions(apis[iApi], user, dbi.session)
-                api_dict["write_permission_request"] = 1 if write_permission_request else 0
-
-                # Write permission inbox notification
-                # For owners that have to assign write permission
-                curr_api_write_permission_requests = get_safe_str(apis[iApi].write_permission_requests)
-                api_dict["write_permission_inbox"] = (
-                    1 if curr_api_write_permission_requests != "" and "m" in permissions else 0
-                )
+        apis_permissions = get_apis_user_permissions(apis, user, dbi.session)
+        for api_model in apis:
+            api_dict = api_model.as_dict()
+            api_dict["covered"] = api_dict["last_coverage"]
+            permissions = apis_permissions[api_model.id]
+            api_dict["permissions"] = permissions
 
-                apis_dict.append(api_dict)
+            # Write permission request
+            write_permission_request = get_api_user_requested_write_permissions(api_model, user, dbi.session)
+            api_dict["write_permission_request"] = 1 if write_permission_request else 0
 
-            # Filter api based on read permission
-            apis_dict = [api_dict for api_dict in apis_dict if "r" in api_dict["permissions"]]
+            # Write permission inbox notification
+            # For owners that have to assign write permission
+            curr_api_write_permission_requests = get_safe_str(api_model.write_permission_requests)
+            api_dict["write_permission_inbox"] = (
+                1 if curr_api_write_permission_requests != "" and "m" in permissions else 0
+            )
 
-            # Populate user notifications settings
-            for i in range(len(apis_dict)):
-                if apis_dict[i]["id"] in user_api_notifications:
-                    apis_dict[i]["notifications"] = 1
-                else:
-                    apis_dict[i]["notifications"] = 0
+            # User notifications settings
+            api_dict["notifications"] = 1 if api_model.id in user_api_notifications else 0
+            apis_dict.append(api_dict)
 
         ret = {
-            "apis": sorted(apis_dict, key=lambda api: (api["api"], api["library_version"])),
-            "current_page": page,
+            "apis": apis_dict,
+            # Pages read with a cursor are not numbered
+            "current_page": None if "cursor" in args.keys() else page,
             "page_count": page_count,
             "per_page": per_page,
             "count": count,
+            "next_cursor": next_cursor,
         }
 
         api_response.set_data(ret)
@@ -3465,24 +3308,22 @@ class ApiWritePermissionRequest(Resource):
 
             # Email Notification for api owners
             try:
-                manage_permissions = get_safe_str(api.manage_permissions)
-                ownsers_ids = [int(n) for n in re.findall(r'\[(\d+)\]', manage_permissions)]
-                if ownsers_ids:
-                    owners = dbi.session.query(UserModel).filter(UserModel.id.in_(ownsers_ids))
-                    recipient_list = [owner.email for owner in owners]
-
-                    if recipient_list:
-                        email_subject = f"BASIL - {notification_title}"
-                        email_footer = EMAIL_DISCORD_FOOTER_MESSAGE
-                        email_body = notification_message
-
-                        async_email_notification(SETTINGS_FILEPATH,
-                                                 EMAIL_TEMPLATE_PATH,
-                                                 recipient_list,
-                                                 email_subject,
-                                                 email_body,
-                                                 email_footer,
-                                                 True)
+                owners = dbi.session.query(UserModel).filter(
+                    UserModel.id.in_(api_user_ids_with_permission(api.id, MANAGE_PERMISSION))).all()
+                recipient_list = [owner.email for owner in owners]
+
+                if recipient_list:
+                    email_subject = f"BASIL - {notification_title}"
+                    email_footer = EMAIL_DISCORD_FOOTER_MESSAGE
+                    email_body = notification_message
+
+                    async_email_notification(SETTINGS_FILEPATH,
+                                             EMAIL_TEMPLATE_PATH,
+                                             recipient_list,
+                                             email_subject,
+                                             email_body,
+                                             email_footer,
+                                             True)
             except Exception as e:
                 api_response.set_message("Unable to send email notification")
                 api_response.set_exception(e)
@@ -4423,7 +4264,8 @@ class MappingHistory(Resource):
             return api_response.return_ok()
 
         _model_fields = _model.__table__.columns.keys()
-        _model_map_fields = _model_map.__table__.columns.keys()
+        # covered is the materialized waterfall coverage, it is not part of the mapping history
+        _model_map_fields = [x for x in _model_map.__table__.columns.keys() if x != "covered"]
 
         relation_rows = dbi.session.query(_model_map).filter(_model_map.id == request_data["relation_id"]).all()
         if len(relation_rows) != 1:
@@ -4523,10 +4365,8 @@ class MappingUsage(Resource):
 
     @api_response_decorator
     def get(self, api_response: ApiResponse = None):
-        """Return list of api the selected work item is mapped directly against
-        Improvement: Take in consideration also indirect mapping and other
-          work items, like list of Test Specifications where a Test Case
-          is used
+        """Return list of api the selected work item is mapped against, directly or
+        nested under other work items, and the path of each mapping
         """
         request_data = get_query_string_args(request.args)
         api_response.set_logger(logger)
@@ -4542,82 +4382,176 @@ class MappingUsage(Resource):
         wi_type = request_data["work_item_type"]
         wi_id = int(request_data["id"])
 
-        api_ids = []
-
-        # Work items that can be nested under Sw Requirements
-        if wi_type in ["sw-requirement", "test-specification", "test-case"]:
-            api_srs = dbi.session.query(ApiSwRequirementModel).all()
-            for api_sr in api_srs:
-                sr_mapping = get_sw_requirement_children(dbi, api_sr.as_dict(db_session=dbi.session), config={})
-                for work_item in get_indirect_work_items_from_hierichical_mapping(dbi, sr_mapping, wi_type):
-                    if work_item.get("id", None) == wi_id:
-                        api_ids.append(api_sr.api_id)
-
-        # Work items that can be nested under Documents
-        if wi_type in ["document"]:
-            api_docs = dbi.session.query(ApiDocumentModel).all()
-            for api_doc in api_docs:
-                doc_mapping = get_document_children(dbi, api_doc.as_dict(db_session=dbi.session))
-                for work_item in get_indirect_work_items_from_hierichical_mapping(dbi, doc_mapping, wi_type):
-                    if work_item.get("id", None) == wi_id:
-                        api_ids.append(api_doc.api_id)
-
-        # Api
-        if wi_type == "justification":
-            model = ApiJustificationModel
-            api_data = dbi.session.query(model).filter(model.justification_id == wi_id).all()
-            api_ids += [x.api_id for x in api_data]
-        elif wi_type == "document":
-            model = ApiDocumentModel
-            api_data = dbi.session.query(model).filter(model.document_id == wi_id).all()
-            api_ids += [x.api_id for x in api_data]
-        elif wi_type == "sw-requirement":
-            model = ApiSwRequirementModel
-            api_data = dbi.session.query(model).filter(model.sw_requirement_id == wi_id).all()
-            api_ids += [x.api_id for x in api_data]
-        elif wi_type == "test-specification":
-            # Direct
-            model = ApiTestSpecificationModel
-            api_data = dbi.session.query(model).filter(model.test_specification_id == wi_id).all()
-            api_ids += [x.api_id for x in api_data]
-        elif wi_type == "test-case":
-            model = ApiTestCaseModel
-            api_data = dbi.session.query(model).filter(model.test_case_id == wi_id).all()
-            api_ids += [x.api_id for x in api_data]
-
-            # indirect test specification mapping api:
-            model = TestSpecificationTestCaseModel
-            parent_model = ApiTestSpecificationModel
-            ts_api_data = dbi.session.query(model).join(parent_model).filter(model.test_case_id == wi_id).all()
-            api_ids += [x.sw_requirement_mapping_api.api_id for x in ts_api_data]
-
-            # indirect test specification sw requirement:
-            model = TestSpecificationTestCaseModel
-            parent_model = SwRequirementTestSpecificationModel
-            sr_ts_data = dbi.session.query(model).join(parent_model).filter(model.test_case_id == wi_id).all()
-            sr_ts_ids = [x.test_specification_mapping_sw_requirement_id for x in sr_ts_data]
-            model = SwRequirementTestSpecificationModel
-            parent_model = ApiSwRequirementModel
-            sr_api_data = (
-                dbi.session.query(model)
-                .join(parent_model)
-                .filter(model.sw_requirement_mapping_api_id.in_(sr_ts_ids))
-                .all()
-            )
-            api_ids += [x.sw_requirement_mapping_api.api_id for x in sr_api_data]
+        usages = []
+        if wi_type in WORK_ITEM_USAGE_TABLES:
+            usages = get_work_item_usages(dbi.session, WORK_ITEM_USAGE_TABLES[wi_type], wi_id)
+        api_ids = list(dict.fromkeys(x["api_id"] for x in usages))
 
         apis = dbi.session.query(ApiModel).filter(ApiModel.id.in_(api_ids)).all()
 
         query_data = {
             "api": [
                 {"id": x.id, "api": x.api, "library": x.library, "library_version": x.library_version} for x in apis
-            ]
+            ],
+            "mappings": [
+                {
+                    "api_id": x["api_id"],
+                    "mapping_table": x["mapping_table"],
+                    "mapping_id": x["mapping_id"],
+                    "path": x["path"],
+                }
+                for x in usages
+            ],
         }
 
         api_response.set_data(query_data)
         return api_response.return_ok()
 
 
+class MappingImpact(Resource):
+    route = "/mapping/impact"
+    fields = ["work_item_type", "id"]
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """Return the edges of the traceability graph reachable from a work item,
+        a Software Component or a test run, across all the Software Components
+        the user can read
+
+        Optional arguments:
+         - direction: downstream (default) or upstream
+         - depth: number of mapping levels to walk
+         - types: comma separated node types of the edges to return
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        wrong_fields = get_wrong_mandatory_fields(self.fields, request_data)
+        if len(wrong_fields) > 0:
+            api_response.set_missing_fields(wrong_fields)
+            return api_response.return_bad_request_missing_fields()
+
+        node_types = list(TRACEABILITY_NODE_TYPES.values())
+        node_type = request_data["work_item_type"]
+        direction = request_data.get("direction", TRACEABILITY_DOWNSTREAM)
+        types = None
+        if request_data.get("types"):
+            types = [x.strip() for x in str(request_data["types"]).split(",") if x.strip()]
+        try:
+            node_id = int(request_data["id"])
+            depth = int(request_data.get("depth", TRACEABILITY_DEFAULT_DEPTH))
+        except ValueError:
+            api_response.set_message("id and depth should be integers")
+            return api_response.return_bad_request()
+
+        if node_type not in node_types or any(x not in node_types for x in types or []):
+            api_response.set_message(f"Node types should be in {', '.join(node_types)}")
+            return api_response.return_bad_request()
+        if direction not in TRACEABILITY_DIRECTIONS:
+            api_response.set_message(f"direction should be in {', '.join(TRACEABILITY_DIRECTIONS)}")
+            return api_response.return_bad_request()
+        if depth < 1 or depth > TRACEABILITY_MAX_DEPTH:
+            api_response.set_message(f"depth should be between 1 and {TRACEABILITY_MAX_DEPTH}")
+            return api_response.return_bad_request()
+
+        dbi = get_db()
+        user = get_active_user_from_request(request_data, dbi.session)
+        user_id = user.id if isinstance(user, UserModel) and user.role != "GUEST" else None
+
+        edges = get_reachable_edges(
+            dbi.session, node_type, node_id, direction=direction, max_depth=depth, types=types, user_id=user_id
+        )
+        api_response.set_data({
+            "node": f"{node_type}:{node_id}",
+            "direction": direction,
+            "edges": [
+                {"from": f"{x.parent_type}:{x.parent_id}", "to": f"{x.child_type}:{x.child_id}", "depth": x.depth}
+                for x in edges
+            ],
+        })
+        return api_response.return_ok()
+
+
+# Traceability matrix export formats -> mimetype
+MATRIX_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+# Separator of the Sw Requirements chain in the csv export
+MATRIX_CHAIN_SEPARATOR = " > "
+# Size of the chunks of the csv export
+MATRIX_CHUNK_SIZE = 65536
+
+
+def iter_matrix_csv(rows):
+    """Yield the csv export of the traceability matrix rows, in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MATRIX_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            MATRIX_CHAIN_SEPARATOR.join(str(y) for y in row[x]) if isinstance(row[x], list) else row[x]
+            for x in MATRIX_COLUMNS
+        ])
+        if buffer.tell() >= MATRIX_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_matrix_jsonl(rows):
+    """Yield the JSON Lines export of the traceability matrix rows, one line per row"""
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+class TraceabilityMatrix(Resource):
+    route = "/mapping/traceability-matrix"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """Stream the traceability matrix of a library or of a list of Software Components,
+        limited to the ones the user can read: one row per path of mappings from a section
+        down to the last work item, with the latest test run of the Test Cases
+
+        Arguments:
+         - library or api-ids: comma separated Software Component ids
+         - format: csv (default) or jsonl
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        if not request_data.get("library") and not request_data.get("api-ids"):
+            api_response.set_missing_fields(["library", "api-ids"])
+            return api_response.return_bad_request_missing_fields()
+
+        export_format = request_data.get("format", "csv")
+        if export_format not in MATRIX_FORMATS:
+            api_response.set_message(f"format should be in {', '.join(MATRIX_FORMATS)}")
+            return api_response.return_bad_request()
+
+        dbi = get_db()
+        user = get_active_user_from_request(request_data, dbi.session)
+        condition = get_readable_apis_filter(user)
+        if request_data.get("library"):
+            condition = and_(condition, ApiModel.library == request_data["library"])
+        if request_data.get("api-ids"):
+            try:
+                api_ids = [int(x) for x in str(request_data["api-ids"]).split(",") if x.strip()]
+            except ValueError:
+                api_response.set_message("api-ids should be a comma separated list of integers")
+                return api_response.return_bad_request()
+            condition = and_(condition, ApiModel.id.in_(api_ids))
+
+        rows = get_traceability_matrix(dbi.session, condition)
+        chunks = iter_matrix_csv(rows) if export_format == "csv" else iter_matrix_jsonl(rows)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=MATRIX_FORMATS[export_format],
+            headers={"Content-Disposition": f"attachment; filename=traceability_matrix.{export_format}"},
+        )
+
+
 class ApiSpecificationsMapping(Resource):
     route = "/mapping/api/specifications"
     fields = ["api-id", "justification", "section", "offset"]
@@ -4681,17 +4615,14 @@ class ApiDynamicViewMapping(Resource):
             api_response.set_message("Unable to find the Api Specification")
             return api_response.return_not_found()
 
-        def _group_mappings(mapping_rows, work_item_key, work_item_id_field):
-            """Group mapping rows by work item ID, collecting snippets."""
+        loader = get_api_mapping_loader(dbi.session, api, api_specification).load(
+            _SRs, _TSs, _TCs, _Js, _Ds, sw_requirement_hierarchy=True, document_hierarchy=True
+        )
+
+        def _group_mappings(work_item_type, work_item_key):
+            """Group mappings by work item ID, collecting snippets."""
             groups = {}
-            for row in mapping_rows:
-                row_dict = row.as_dict(db_session=dbi.session)
-                current_offset = row_dict["offset"]
-                current_section = row_dict["section"]
-                match = (
-                    api_specification[current_offset: current_offset + len(current_section)]
-                    == current_section
-                )
+            for row_dict in loader.mappings(work_item_type):
                 wi_id = row_dict[work_item_key]["id"]
                 snippet = {
                     "section": row_dict["section"],
@@ -4699,7 +4630,7 @@ class ApiDynamicViewMapping(Resource):
                     "relation_id": row_dict["relation_id"],
                     "coverage": row_dict["coverage"],
                     "covered": row_dict.get("covered", row_dict["coverage"]),
-                    "match": match,
+                    "match": row_dict["match"],
                     "__tablename__": row_dict["__tablename__"],
                 }
                 if wi_id not in groups:
@@ -4713,13 +4644,7 @@ class ApiDynamicViewMapping(Resource):
                 groups[wi_id]["snippets"].append(snippet)
             return list(groups.values())
 
-        sr_rows = (
-            dbi.session.query(ApiSwRequirementModel)
-            .filter(ApiSwRequirementModel.api_id == api.id)
-            .order_by(ApiSwRequirementModel.offset.asc())
-            .all()
-        )
-        grouped_srs = _group_mappings(sr_rows, _SR, "sw_requirement_id")
+        grouped_srs = _group_mappings(_SRs, _SR)
         for sr_group in grouped_srs:
             for snippet in sr_group["snippets"]:
                 if snippet["match"]:
@@ -4727,42 +4652,16 @@ class ApiDynamicViewMapping(Resource):
                         "relation_id": snippet["relation_id"],
                         "__tablename__": snippet["__tablename__"],
                     }
-                    children = get_sw_requirement_children(dbi, dummy_srm)
+                    children = get_sw_requirement_children(dbi, dummy_srm, loader=loader.sw_requirement_loader)
                     snippet[_SRs] = children.get(_SRs, [])
                     snippet[_TSs] = children.get(_TSs, [])
                     snippet[_TCs] = children.get(_TCs, [])
 
-        ts_rows = (
-            dbi.session.query(ApiTestSpecificationModel)
-            .filter(ApiTestSpecificationModel.api_id == api.id)
-            .order_by(ApiTestSpecificationModel.offset.asc())
-            .all()
-        )
-        grouped_tss = _group_mappings(ts_rows, _TS, "test_specification_id")
-
-        tc_rows = (
-            dbi.session.query(ApiTestCaseModel)
-            .filter(ApiTestCaseModel.api_id == api.id)
-            .order_by(ApiTestCaseModel.offset.asc())
-            .all()
-        )
-        grouped_tcs = _group_mappings(tc_rows, _TC, "test_case_id")
-
-        j_rows = (
-            dbi.session.query(ApiJustificationModel)
-            .filter(ApiJustificationModel.api_id == api.id)
-            .order_by(ApiJustificationModel.offset.asc())
-            .all()
-        )
-        grouped_js = _group_mappings(j_rows, _J, "justification_id")
+        grouped_tss = _group_mappings(_TSs, _TS)
+        grouped_tcs = _group_mappings(_TCs, _TC)
+        grouped_js = _group_mappings(_Js, _J)
 
-        doc_rows = (
-            dbi.session.query(ApiDocumentModel)
-            .filter(ApiDocumentModel.api_id == api.id)
-            .order_by(ApiDocumentModel.offset.asc())
-            .all()
-        )
-        grouped_docs = _group_mappings(doc_rows, _D, "document_id")
+        grouped_docs = _group_mappings(_Ds, _D)
         for doc_group in grouped_docs:
             for snippet in doc_group["snippets"]:
                 if snippet["match"]:
@@ -4770,7 +4669,7 @@ class ApiDynamicViewMapping(Resource):
                         "relation_id": snippet["relation_id"],
                         "__tablename__": snippet["__tablename__"],
                     }
-                    children = get_document_children(dbi, dummy_dm)
+                    children = get_document_children(dbi, dummy_dm, loader=loader.document_loader)
                     snippet[_Ds] = children.get(_Ds, [])
 
         ret = {
@@ -8821,6 +8720,7 @@ class UserSignin(Resource):
         set_api_permission_stmt = (update(ApiModel).where(ApiModel.read_denials != '')).values(
             read_denials=ApiModel.read_denials + f"[{user.id}]")
         dbi.session.execute(set_api_permission_stmt)
+        rebuild_api_user_permissions(dbi.session.connection(), ApiModel.read_denials != '')
 
         # Add Notifications
         notification = f"{user.username} joined us on BASIL!"
@@ -8902,7 +8802,7 @@ class UserApis(Resource):
 
         # apis
         query = dbi.session.query(ApiModel).filter(
-            or_(ApiModel.manage_permissions.like(f'%[{user.id}]%'),
+            or_(ApiModel.id.in_(user_api_ids_with_permission(user.id, MANAGE_PERMISSION)),
                 ApiModel.created_by_id == user.id)
         ).filter(ApiModel.id != api.id)
 
@@ -9699,7 +9599,7 @@ class UserNotifications(Resource):
         # List of api ids for the ones the current use is owner
         owner_api_list_query = (
             dbi.session.query(ApiModel.id)
-            .filter(ApiModel.manage_permissions.contains(f"[{user.id}]"))
+            .filter(ApiModel.id.in_(user_api_ids_with_permission(user.id, MANAGE_PERMISSION)))
         )
 
         NoneVar = None  # To avoid flake8 warning comparing None with `==` instead of `is`
@@ -9709,6 +9609,7 @@ class UserNotifications(Resource):
         # Query to extract notifications not related to api
         no_api_notifications = (
             dbi.session.query(NotificationModel)
+            .options(*NotificationModel.as_dict_load_options())
             .filter(NotificationModel.api_id == NoneVar)
             .filter(~NotificationModel.read_by.contains(f"[{user.id}]"))
             .all()
@@ -9718,6 +9619,7 @@ class UserNotifications(Resource):
         # Only api the user requested notifications for
         api_notifications_not_read_query = (
             dbi.session.query(NotificationModel)
+            .options(*NotificationModel.as_dict_load_options())
             .filter(~NotificationModel.read_by.contains(f"[{user.id}]"))
         )
 
@@ -10537,6 +10439,7 @@ class TestRun(Resource):
 
         runs_query = (
             dbi.session.query(TestRunModel)
+            .options(*TestRunModel.as_dict_load_options())
             .join(TestRunConfigModel)
             .filter(
                 TestRunModel.api_id == api.id,
@@ -11691,6 +11594,193 @@ class AdminSettings(Resource):
         return api_response.return_ok()
 
 
+def get_admin_user_from_request(request_data, api_response):
+    """Return the admin user of the request or the error response"""
+    mandatory_fields = ["token", "user-id"]
+    wrong_fields = get_wrong_mandatory_fields(mandatory_fields, request_data)
+    if len(wrong_fields) > 0:
+        api_response.set_missing_fields(wrong_fields)
+        return api_response.return_bad_request_missing_fields()
+
+    dbi = get_db()
+
+    user = get_active_user_from_request(request_data, dbi.session)
+    if not isinstance(user, UserModel):
+        return api_response.return_unauthorized()
+
+    if user.role not in USER_ROLES_MANAGE_USERS:
+        return api_response.return_unauthorized()
+    return user
+
+
+class AdminDbPoolStatus(Resource):
+    route = "/admin/db-pool-status"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """
+        get the database connection pool statistics of the worker serving the request
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        api_response.set_data(db_orm.DbInterface.pool_status())
+        return api_response.return_ok()
+
+
+class AdminSqlStats(Resource):
+    route = "/admin/sql-stats"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """
+        get the sql statistics of each route served by the worker serving the request
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        api_response.set_data(query_stats.route_stats.as_dict())
+        return api_response.return_ok()
+
+    @api_response_decorator
+    def delete(self, api_response: ApiResponse = None):
+        """
+        reset the sql statistics of the worker serving the request
+        """
+        request_data = request.get_json(force=True)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        query_stats.route_stats.reset()
+        api_response.set_data({})
+        return api_response.return_ok()
+
+
+class AdminDocumentCache(Resource):
+    route = "/admin/document-cache"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """
+        get the reference document cache counters of the worker serving the request
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        api_response.set_data(document_cache.stats())
+        return api_response.return_ok()
+
+    @api_response_decorator
+    def delete(self, api_response: ApiResponse = None):
+        """
+        drop the reference documents cached in memory by the worker serving the request
+        """
+        request_data = request.get_json(force=True)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        document_cache.clear()
+        api_response.set_data({})
+        return api_response.return_ok()
+
+
+class AdminMappingCache(Resource):
+    route = "/admin/mapping-cache"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """
+        get the mapping view cache counters of the worker serving the request
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        api_response.set_data(mapping_view_cache.stats())
+        return api_response.return_ok()
+
+    @api_response_decorator
+    def delete(self, api_response: ApiResponse = None):
+        """
+        drop the mapping views cached in memory by the worker serving the request
+        """
+        request_data = request.get_json(force=True)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        mapping_view_cache.clear()
+        api_response.set_data({})
+        return api_response.return_ok()
+
+
+class AdminUserCache(Resource):
+    route = "/admin/user-cache"
+
+    @api_response_decorator
+    def get(self, api_response: ApiResponse = None):
+        """
+        get the authenticated user cache counters of the worker serving the request
+        """
+        request_data = get_query_string_args(request.args)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        api_response.set_data(user_cache.stats())
+        return api_response.return_ok()
+
+    @api_response_decorator
+    def delete(self, api_response: ApiResponse = None):
+        """
+        drop the authenticated users cached by the worker serving the request
+        """
+        request_data = request.get_json(force=True)
+        api_response.set_logger(logger)
+        api_response.set_args(request_data)
+
+        user = get_admin_user_from_request(request_data, api_response)
+        if not isinstance(user, UserModel):
+            return user
+
+        user_cache.clear()
+        api_response.set_data({})
+        return api_response.return_ok()
+
+
 class TraceabilityScannerSettings(Resource):
     route = "/traceability-scanner/settings"
 
@@ -12140,6 +12230,11 @@ api.add_resource(TestRunArtifactContent, TestRunArtifactContent.route)
 api.add_resource(TestRunPluginPresets, TestRunPluginPresets.route)
 api.add_resource(AdminTestRunPluginsPresets, AdminTestRunPluginsPresets.route)
 api.add_resource(AdminSettings, AdminSettings.route)
+api.add_resource(AdminDbPoolStatus, AdminDbPoolStatus.route)
+api.add_resource(AdminSqlStats, AdminSqlStats.route)
+api.add_resource(AdminDocumentCache, AdminDocumentCache.route)
+api.add_resource(AdminMappingCache, AdminMappingCache.route)
+api.add_resource(AdminUserCache, AdminUserCache.route)
 api.add_resource(TraceabilityScannerSettings, TraceabilityScannerSettings.route)
 api.add_resource(TraceabilityScannerScan, TraceabilityScannerScan.route)
 api.add_resource(TraceabilityScannerLogs, TraceabilityScannerLogs.route)
@@ -12167,6 +12262,8 @@ api.add_resource(TestingSupportInitDb, TestingSupportInitDb.route)
 
 # Usage
 api.add_resource(MappingUsage, MappingUsage.route)
+api.add_resource(MappingImpact, MappingImpact.route)
+api.add_resource(TraceabilityMatrix, TraceabilityMatrix.route)
 # Comments
 api.add_resource(Comment, Comment.route)
 # Fork
@@ -1,6 +1,10 @@
 import json
 from functools import wraps
 
+from flask import Response
+
+import query_stats
+
 OK_STATUS = 200
 OK_RESPONSE_TYPE = "OK"
 
@@ -230,6 +234,32 @@ def api_response_decorator(func):
         api_response.set_verb(func.__name__)
         # inject api_response into the function
         kwargs["api_response"] = api_response
-        return func(*args, **kwargs)
+
+        stats = query_stats.start(route, func.__name__)
+        if stats is None:
+            return func(*args, **kwargs)
+        try:
+            ret = func(*args, **kwargs)
+        finally:
+            query_stats.stop(stats)
+        if query_stats.SERVER_TIMING:
+            ret = add_response_header(ret, "Server-Timing", stats.server_timing())
+        return ret
 
     return wrapper
+
+
+def add_response_header(ret, name, value):
+    """Add a header to the value returned by a Flask-RESTful Resource method"""
+    if isinstance(ret, Response):
+        ret.headers[name] = value
+        return ret
+    if isinstance(ret, tuple):
+        if len(ret) == 2:
+            return ret[0], ret[1], {name: value}
+        if len(ret) == 3:
+            headers = dict(ret[2] or {})
+            headers[name] = value
+            return ret[0], ret[1], headers
+        return ret
+    return ret, OK_STATUS, {name: value}
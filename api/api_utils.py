@@ -5,10 +5,9 @@ import logging
 import os
 import re
 import subprocess
-import urllib
 from pyaml_env import parse_config
+from sqlalchemy import and_, or_
 from string import Template
-from urllib.error import HTTPError, URLError
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
 logger = logging.getLogger(__name__)
@@ -17,6 +16,7 @@ from db.db_orm import DbInterface  # noqa: E402
 from db.models.comment import CommentModel  # noqa: E402
 from db.models.db_base import Base  # noqa: E402
 from db.models.user import UserModel  # noqa: E402
+from document_cache import document_cache  # noqa: E402
 
 LINK_BASIL_INSTANCE_HTML_MESSAGE = "Link to BASIL website"
 
@@ -268,42 +268,15 @@ def async_email_notification(setting_path, template_path, recipient_list, subjec
 
 
 def get_api_specification(_url_or_path):
+    """Return the content of the Reference Document, None if it is not available.
+    Documents are read through the process wide document cache"""
     if _url_or_path is None:
         return None
     else:
         _url_or_path = _url_or_path.strip()
         if len(_url_or_path) == 0:
             return None
-
-        if _url_or_path.startswith("http"):
-            try:
-                resource = urllib.request.urlopen(_url_or_path)
-                if resource.headers.get_content_charset():
-                    content = resource.read().decode(resource.headers.get_content_charset())
-                else:
-                    content = resource.read().decode("utf-8")
-                return content
-            except HTTPError as excp:
-                logger.error(f"HTTPError: {excp.reason} reading {_url_or_path}")
-                return None
-            except URLError as excp:
-                logger.error(f"URLError: {excp.reason} reading {_url_or_path}")
-                return None
-            except ValueError as excp:
-                logger.error(f"ValueError reading {_url_or_path}: {excp}")
-                return None
-        else:
-            if not os.path.exists(_url_or_path):
-                return None
-
-            try:
-                f = open(_url_or_path, "r")
-                fc = f.read()
-                f.close()
-                return fc
-            except OSError as excp:
-                logger.error(f"OSError for {_url_or_path}: {excp}")
-                return None
+        return document_cache.get(_url_or_path)
 
 
 def read_file(filepath):
@@ -813,32 +786,89 @@ def get_missing_mandatory_fields(mandatory_fields: list, request_data: dict) ->
     return missing_fields
 
 
-def get_mapping_comments(dbi: DbInterface, relation_id: int, tablename: str) -> list:
-    if not relation_id or not tablename or not dbi:
-        return []
-
-    comments = (
+def _mapping_comments_query(dbi: DbInterface):
+    return (
         dbi.session.query(
             CommentModel.id,
             CommentModel.comment,
             CommentModel.updated_at,
+            CommentModel.parent_table,
+            CommentModel.parent_id,
             UserModel.email,
             UserModel.username
         )
+        .join(UserModel, CommentModel.created_by_id == UserModel.id)
+        .order_by(CommentModel.created_at.asc(), CommentModel.id.asc())
+    )
+
+
+def _mapping_comment_to_dict(comment) -> dict:
+    return {
+        "id": comment.id,
+        "comment": comment.comment,
+        "updated_at": comment.updated_at.strftime(Base.dt_short_format_str),
+        "created_by_email": comment.email,
+        "created_by_username": comment.username
+    }
+
+
+def get_mapping_comments(dbi: DbInterface, relation_id: int, tablename: str, preloaded: dict = None) -> list:
+    """Return the comments of a mapping.
+    If `preloaded` (see get_mappings_comments) is provided the comments are read from it"""
+    if not relation_id or not tablename:
+        return []
+
+    if preloaded is not None:
+        return preloaded.get((tablename, relation_id), [])
+
+    if not dbi:
+        return []
+
+    comments = (
+        _mapping_comments_query(dbi)
         .filter(CommentModel.parent_table == tablename)
         .filter(CommentModel.parent_id == relation_id)
-        .join(UserModel, CommentModel.created_by_id == UserModel.id)
-        .order_by(CommentModel.created_at.asc())
         .all()
     )
+    return [_mapping_comment_to_dict(c) for c in comments]
+
+
+def get_nested_mappings_keys(data) -> set:
+    """Return the (__tablename__, relation_id) of all the mappings in a nested structure of lists and dicts"""
+    keys = set()
+    if isinstance(data, list):
+        for item in data:
+            keys |= get_nested_mappings_keys(item)
+    elif isinstance(data, dict):
+        if data.get("__tablename__") and data.get("relation_id"):
+            keys.add((data["__tablename__"], data["relation_id"]))
+        for value in data.values():
+            if isinstance(value, (list, dict)):
+                keys |= get_nested_mappings_keys(value)
+    return keys
+
+
+def get_mappings_comments(dbi: DbInterface, mappings_keys: set) -> dict:
+    """Return the comments of several mappings with a single query
+
+    :param dbi: database interface
+    :param mappings_keys: set of (tablename, relation_id)
+    :return: dict (tablename, relation_id) -> list of comments
+    """
+    ret = {key: [] for key in mappings_keys}
+    if not dbi or not mappings_keys:
+        return ret
+
+    ids = {}
+    for tablename, relation_id in mappings_keys:
+        ids.setdefault(tablename, []).append(relation_id)
 
-    return [
-        {
-            "id": c.id,
-            "comment": c.comment,
-            "updated_at": c.updated_at.strftime(Base.dt_short_format_str),
-            "created_by_email": c.email,
-            "created_by_username": c.username
-        }
-        for c in comments
-    ]
+    comments = (
+        _mapping_comments_query(dbi)
+        .filter(or_(*[and_(CommentModel.parent_table == tablename, CommentModel.parent_id.in_(relation_ids))
+                      for tablename, relation_ids in ids.items()]))
+        .all()
+    )
+    for c in comments:
+        ret[(c.parent_table, c.parent_id)].append(_mapping_comment_to_dict(c))
+    return ret
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import urllib.request
+from urllib.error import HTTPError, URLError
+
+from db.db_orm import int_from_env
+from sized_lru_cache import SizedLruCache
+
+logger = logging.getLogger(__name__)
+
+
+# Total size of the documents kept in memory by each process
+MAX_BYTES = int_from_env("BASIL_DOCUMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+# Remote documents younger than this are served without revalidation
+MAX_AGE = int_from_env("BASIL_DOCUMENT_CACHE_MAX_AGE", 300)
+# Timeout of the http requests
+TIMEOUT = int_from_env("BASIL_DOCUMENT_CACHE_TIMEOUT", 30)
+# Folder shared by the workers to store the remote documents, empty to disable
+CACHE_DIR = os.environ.get("BASIL_DOCUMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "basil-document-cache"))
+
+
+class DocumentCache(SizedLruCache):
+    """Process wide cache of the Reference Documents
+
+    Local files are revalidated on each access comparing modification time and size.
+    Remote documents are served from memory for MAX_AGE seconds, then revalidated
+    with a conditional request (ETag / Last-Modified).
+    Remote documents are also stored in CACHE_DIR, so that a worker can reuse
+    and revalidate the copies fetched by the other ones.
+    Memory entries are evicted in least recently used order to keep the total
+    size under MAX_BYTES.
+    """
+
+    COUNTERS = ["hits", "misses", "revalidations", "disk_hits", "errors", "evictions"]
+
+    def __init__(self, max_bytes=None, max_age=None, timeout=None, cache_dir=None):
+        super().__init__(MAX_BYTES if max_bytes is None else max_bytes)
+        self.max_age = MAX_AGE if max_age is None else max_age
+        self.timeout = TIMEOUT if timeout is None else timeout
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+
+    def get(self, url_or_path):
+        """Return the content of the document, None if it is not available"""
+        if url_or_path.startswith("http"):
+            return self._get_url(url_or_path)
+        return self._get_file(url_or_path)
+
+    def stats(self):
+        ret = super().stats()
+        ret["max_age"] = self.max_age
+        return ret
+
+    def _store(self, key, entry):
+        entry["bytes"] = len(entry["content"].encode("utf-8"))
+        super()._store(key, entry)
+
+    def _get_file(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._remove(path)
+            return None
+
+        validator = [stat.st_mtime_ns, stat.st_size]
+        entry = self._lookup(path)
+        if entry is not None and entry["validator"] == validator:
+            self._count("hits")
+            return entry["content"]
+
+        self._count("misses")
+        try:
+            with open(path, "r") as f:
+                content = f.read()
+        except OSError as excp:
+            self._count("errors")
+            logger.error(f"OSError for {path}: {excp}")
+            return None
+        self._store(path, {"content": content, "validator": validator})
+        return content
+
+    def _get_url(self, url):
+        entry = self._lookup(url)
+        if entry is not None and time.time() - entry["fetched_at"] < self.max_age:
+            self._count("hits")
+            return entry["content"]
+
+        # Copy fetched or revalidated by another worker
+        disk_entry = self._read_disk(url)
+        if disk_entry is not None and (entry is None or disk_entry["fetched_at"] > entry["fetched_at"]):
+            entry = disk_entry
+            if time.time() - entry["fetched_at"] < self.max_age:
+                self._count("disk_hits")
+                self._store(url, entry)
+                return entry["content"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            resource = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+            charset = resource.headers.get_content_charset() or "utf-8"
+            new_entry = {
+                "content": resource.read().decode(charset),
+                "etag": resource.headers.get("ETag"),
+                "last_modified": resource.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self._count("misses")
+        except HTTPError as excp:
+            if excp.code == 304 and entry is not None:
+                self._count("revalidations")
+                new_entry = dict(entry, fetched_at=time.time())
+            else:
+                return self._fetch_error(url, entry, f"HTTPError: {excp.reason} reading {url}")
+        except URLError as excp:
+            return self._fetch_error(url, entry, f"URLError: {excp.reason} reading {url}")
+        except (ValueError, OSError) as excp:
+            return self._fetch_error(url, entry, f"{type(excp).__name__} reading {url}: {excp}")
+
+        self._store(url, new_entry)
+        self._write_disk(url, new_entry)
+        return new_entry["content"]
+
+    def _fetch_error(self, url, entry, message):
+        """Serve the stale copy, if any, when the document cannot be fetched"""
+        self._count("errors")
+        logger.error(message)
+        if entry is None:
+            return None
+        logger.warning(f"Using the copy of {url} fetched at {time.ctime(entry['fetched_at'])}")
+        return entry["content"]
+
+    def _disk_path(self, url):
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+    def _read_disk(self, url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(url), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        return entry
+
+    def _write_disk(self, url, entry):
+        """Atomic write, workers can read the file while another one replaces it"""
+        if not self.cache_dir:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"url": url, "content": entry["content"], "etag": entry.get("etag"),
+                           "last_modified": entry.get("last_modified"), "fetched_at": entry["fetched_at"]}, f)
+            os.replace(tmp_path, self._disk_path(url))
+        except OSError as excp:
+            logger.warning(f"Unable to store {url} in {self.cache_dir}: {excp}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,373 @@
+import copy
+import logging
+import os
+import sys
+
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(1, os.path.dirname(currentdir))
+
+from db.models.api_document import ApiDocumentModel  # noqa E402
+from db.models.api_justification import ApiJustificationModel  # noqa E402
+from db.models.api_sw_requirement import ApiSwRequirementModel  # noqa E402
+from db.models.api_test_case import ApiTestCaseModel  # noqa E402
+from db.models.api_test_specification import ApiTestSpecificationModel  # noqa E402
+from db.models.comment import preload_comment_counts  # noqa E402
+from db.models.db_base import preload_used_work_items  # noqa E402
+from db.models.document_document import DocumentDocumentModel  # noqa E402
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel  # noqa E402
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel  # noqa E402
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel  # noqa E402
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel  # noqa E402
+
+logger = logging.getLogger(__name__)
+
+API_SR_TABLE = ApiSwRequirementModel.__tablename__
+SR_SR_TABLE = SwRequirementSwRequirementModel.__tablename__
+SR_TS_TABLE = SwRequirementTestSpecificationModel.__tablename__
+API_DOC_TABLE = ApiDocumentModel.__tablename__
+DOC_DOC_TABLE = DocumentDocumentModel.__tablename__
+
+# Direct mapping models of a Software Component, by work item type of the mapping views
+API_MAPPING_MODELS = {
+    "sw_requirements": ApiSwRequirementModel,
+    "test_specifications": ApiTestSpecificationModel,
+    "test_cases": ApiTestCaseModel,
+    "justifications": ApiJustificationModel,
+    "documents": ApiDocumentModel,
+}
+
+# Session info key of the ApiMappingLoader instances of the current transaction
+API_MAPPING_LOADERS = "api_mapping_loaders"
+
+
+class SwRequirementHierarchyLoader:
+    """Load the whole Sw Requirement hierarchy below a set of root mappings.
+
+    Roots are ApiSwRequirementModel ids (sw_requirement_mapping_api) and/or
+    SwRequirementSwRequirementModel ids (sw_requirement_mapping_sw_requirement).
+    Nested Sw Requirement mappings are collected with a recursive CTE, then a
+    single query per mapping table (SR-SR, SR-TS, SR-TC, TS-TC) fetches every
+    row of the subtree, so the number of round trips does not depend on
+    the size or the depth of the hierarchy.
+    Rows are indexed by parent mapping to be assembled in memory.
+
+    Root ids can be lists or sql selectables returning ids.
+    """
+
+    def __init__(self, db_session, api_relation_ids=None, sr_relation_ids=None,
+                 include_test_specifications=True, include_test_cases=True):
+        self.db_session = db_session
+        self.api_relation_ids = api_relation_ids if api_relation_ids is not None else []
+        self.sr_relation_ids = sr_relation_ids if sr_relation_ids is not None else []
+        self.include_test_specifications = include_test_specifications
+        self.include_test_cases = include_test_cases
+
+        # (parent tablename, parent id) -> list of mapping rows
+        self.sw_requirements = {}
+        self.test_specifications = {}
+        self.test_cases = {}
+        # SwRequirementTestSpecificationModel.id -> list of TestSpecificationTestCaseModel
+        self.test_specification_test_cases = {}
+
+        self._load()
+
+    @staticmethod
+    def _parent_key(row):
+        if row.sw_requirement_mapping_api_id:
+            return (API_SR_TABLE, row.sw_requirement_mapping_api_id)
+        return (SR_SR_TABLE, row.sw_requirement_mapping_sw_requirement_id)
+
+    @staticmethod
+    def _group(rows, key_func):
+        ret = {}
+        for row in rows:
+            ret.setdefault(key_func(row), []).append(row)
+        return ret
+
+    def _tree_cte(self):
+        """Recursive CTE with the ids of all the SR-SR mappings of the subtree.
+        UNION (not UNION ALL) stops the recursion on malformed cyclic data."""
+        srsr = SwRequirementSwRequirementModel
+        anchor = select(srsr.id).where(
+            or_(
+                srsr.sw_requirement_mapping_api_id.in_(self.api_relation_ids),
+                srsr.sw_requirement_mapping_sw_requirement_id.in_(self.sr_relation_ids),
+            )
+        )
+        tree = anchor.cte(name="sw_requirement_tree", recursive=True)
+        children = select(srsr.id).where(srsr.sw_requirement_mapping_sw_requirement_id == tree.c.id)
+        return tree.union(children)
+
+    def _parent_filter(self, model, tree):
+        return or_(
+            model.sw_requirement_mapping_api_id.in_(self.api_relation_ids),
+            model.sw_requirement_mapping_sw_requirement_id.in_(self.sr_relation_ids),
+            model.sw_requirement_mapping_sw_requirement_id.in_(select(tree.c.id)),
+        )
+
+    def _load(self):
+        tree = self._tree_cte()
+
+        srsr = SwRequirementSwRequirementModel
+        sr_rows = self.db_session.scalars(
+            select(srsr).options(*srsr.as_dict_load_options()).where(srsr.id.in_(select(tree.c.id))).order_by(srsr.id)
+        ).all()
+        self.sw_requirements = self._group(sr_rows, self._parent_key)
+
+        if self.include_test_specifications:
+            srts = SwRequirementTestSpecificationModel
+            srts_filter = self._parent_filter(srts, tree)
+            ts_rows = self.db_session.scalars(
+                select(srts).options(*srts.as_dict_load_options()).where(srts_filter).order_by(srts.id)
+            ).all()
+            self.test_specifications = self._group(ts_rows, self._parent_key)
+
+            if self.include_test_cases:
+                tstc = TestSpecificationTestCaseModel
+                tstc_rows = self.db_session.scalars(
+                    select(tstc)
+                    .options(*tstc.as_dict_load_options())
+                    .where(tstc.test_specification_mapping_sw_requirement_id.in_(select(srts.id).where(srts_filter)))
+                    .order_by(tstc.id)
+                ).all()
+                self.test_specification_test_cases = self._group(
+                    tstc_rows, lambda x: x.test_specification_mapping_sw_requirement_id
+                )
+
+        if self.include_test_cases:
+            srtc = SwRequirementTestCaseModel
+            tc_rows = self.db_session.scalars(
+                select(srtc)
+                .options(*srtc.as_dict_load_options())
+                .where(self._parent_filter(srtc, tree))
+                .order_by(srtc.id)
+            ).all()
+            self.test_cases = self._group(tc_rows, self._parent_key)
+
+    def get_sw_requirements(self, tablename, relation_id):
+        """SwRequirementSwRequirementModel rows nested under the selected mapping"""
+        return self.sw_requirements.get((tablename, relation_id), [])
+
+    def get_test_specifications(self, tablename, relation_id):
+        """SwRequirementTestSpecificationModel rows nested under the selected mapping"""
+        return self.test_specifications.get((tablename, relation_id), [])
+
+    def get_test_cases(self, tablename, relation_id):
+        """SwRequirementTestCaseModel rows nested under the selected mapping"""
+        return self.test_cases.get((tablename, relation_id), [])
+
+    def get_test_specification_test_cases(self, sr_ts_relation_id):
+        """TestSpecificationTestCaseModel rows nested under the selected SwRequirementTestSpecificationModel"""
+        return self.test_specification_test_cases.get(sr_ts_relation_id, [])
+
+    def rows(self):
+        """All the mapping rows loaded, of any type"""
+        ret = []
+        for group in [self.sw_requirements, self.test_specifications, self.test_cases,
+                      self.test_specification_test_cases]:
+            for group_rows in group.values():
+                ret += group_rows
+        return ret
+
+
+class DocumentHierarchyLoader:
+    """Load the whole Document hierarchy below a set of root mappings.
+
+    Roots are ApiDocumentModel ids (document_mapping_api) and/or
+    DocumentDocumentModel ids (document_mapping_document).
+    Nested Document mappings are collected with a recursive CTE and fetched
+    with a single query, rows are indexed by parent mapping.
+
+    Root ids can be lists or sql selectables returning ids.
+    """
+
+    def __init__(self, db_session, api_relation_ids=None, doc_relation_ids=None):
+        self.db_session = db_session
+        self.api_relation_ids = api_relation_ids if api_relation_ids is not None else []
+        self.doc_relation_ids = doc_relation_ids if doc_relation_ids is not None else []
+
+        # (parent tablename, parent id) -> list of DocumentDocumentModel rows
+        self.documents = {}
+
+        self._load()
+
+    @staticmethod
+    def _parent_key(row):
+        if row.document_mapping_api_id:
+            return (API_DOC_TABLE, row.document_mapping_api_id)
+        return (DOC_DOC_TABLE, row.document_mapping_document_id)
+
+    def _tree_cte(self):
+        """Recursive CTE with the ids of all the Document-Document mappings of the subtree"""
+        docdoc = DocumentDocumentModel
+        anchor = select(docdoc.id).where(
+            or_(
+                docdoc.document_mapping_api_id.in_(self.api_relation_ids),
+                docdoc.document_mapping_document_id.in_(self.doc_relation_ids),
+            )
+        )
+        tree = anchor.cte(name="document_tree", recursive=True)
+        children = select(docdoc.id).where(docdoc.document_mapping_document_id == tree.c.id)
+        return tree.union(children)
+
+    def _load(self):
+        tree = self._tree_cte()
+
+        docdoc = DocumentDocumentModel
+        rows = self.db_session.scalars(
+            select(docdoc)
+            .options(*docdoc.as_dict_load_options())
+            .where(docdoc.id.in_(select(tree.c.id)))
+            .order_by(docdoc.id)
+        ).all()
+        for row in rows:
+            self.documents.setdefault(self._parent_key(row), []).append(row)
+
+    def get_documents(self, tablename, relation_id):
+        """DocumentDocumentModel rows nested under the selected mapping"""
+        return self.documents.get((tablename, relation_id), [])
+
+    def rows(self):
+        """All the mapping rows loaded"""
+        ret = []
+        for group_rows in self.documents.values():
+            ret += group_rows
+        return ret
+
+
+class ApiMappingLoader:
+    """Direct mappings of a Software Component, shared by the mapping views.
+
+    Each mapping type is queried, preloaded (comment counters, used
+    work items) and serialized with as_dict() once, together with the "match"
+    flag computed against the Reference Document.
+    load() fetches the requested types and hierarchies not loaded yet with a
+    single preload, so a view pays the same queries as loading them by itself,
+    and a following view only pays for what it adds.
+    mappings() returns deep copies, that views can extend with their own data.
+
+    Use get_api_mapping_loader() to share the instance between the views
+    built in the same transaction.
+    """
+
+    def __init__(self, db_session, api, specification):
+        self.db_session = db_session
+        self.api = api
+        self.specification = specification
+
+        # work item type -> mapping rows / serialized mappings, in offset order
+        self._rows = {}
+        self._mappings = {}
+        self.sw_requirement_loader = None
+        self.document_loader = None
+        # ApiTestSpecificationModel.id -> list of TestSpecificationTestCaseModel
+        self.test_specification_test_cases = None
+
+    def load(self, *work_item_types, sw_requirement_hierarchy=False, document_hierarchy=False,
+             test_specification_test_cases=False):
+        """Load the selected mapping types and nested hierarchies, if not loaded yet"""
+        if sw_requirement_hierarchy:
+            work_item_types += ("sw_requirements",)
+        if document_hierarchy:
+            work_item_types += ("documents",)
+        if test_specification_test_cases:
+            work_item_types += ("test_specifications",)
+
+        new_rows = []
+        for work_item_type in dict.fromkeys(work_item_types):
+            if work_item_type in self._rows:
+                continue
+            model = API_MAPPING_MODELS[work_item_type]
+            self._rows[work_item_type] = (
+                self.db_session.query(model)
+                .options(*model.as_dict_load_options())
+                .filter(model.api_id == self.api.id)
+                .order_by(model.offset.asc())
+                .all()
+            )
+            new_rows += self._rows[work_item_type]
+
+        if sw_requirement_hierarchy and self.sw_requirement_loader is None:
+            self.sw_requirement_loader = SwRequirementHierarchyLoader(
+                self.db_session, api_relation_ids=[x.id for x in self._rows["sw_requirements"]]
+            )
+            new_rows += self.sw_requirement_loader.rows()
+
+        if document_hierarchy and self.document_loader is None:
+            self.document_loader = DocumentHierarchyLoader(
+                self.db_session, api_relation_ids=[x.id for x in self._rows["documents"]]
+            )
+            new_rows += self.document_loader.rows()
+
+        if test_specification_test_cases and self.test_specification_test_cases is None:
+            self.test_specification_test_cases = {}
+            api_ts_ids = [x.id for x in self._rows["test_specifications"]]
+            if api_ts_ids:
+                tstc = TestSpecificationTestCaseModel
+                tstc_rows = self.db_session.scalars(
+                    select(tstc)
+                    .options(*tstc.as_dict_load_options())
+                    .where(tstc.test_specification_mapping_api_id.in_(api_ts_ids))
+                    .order_by(tstc.id)
+                ).all()
+                for row in tstc_rows:
+                    key = row.test_specification_mapping_api_id
+                    self.test_specification_test_cases.setdefault(key, []).append(row)
+                new_rows += tstc_rows
+
+        if new_rows:
+            preload_comment_counts(self.db_session, new_rows)
+            preload_used_work_items(self.db_session, new_rows)
+
+        for work_item_type in work_item_types:
+            if work_item_type not in self._mappings:
+                self._mappings[work_item_type] = [self._serialize(x) for x in self._rows[work_item_type]]
+        return self
+
+    def _serialize(self, row):
+        ret = row.as_dict(db_session=self.db_session)
+        offset = ret["offset"]
+        section = ret["section"]
+        ret["match"] = self.specification[offset: offset + len(section)] == section
+        return ret
+
+    def rows(self, work_item_type):
+        """Mapping rows of the selected type, load() it first"""
+        return self._rows[work_item_type]
+
+    def mappings(self, work_item_type):
+        """Copy of the serialized mappings of the selected type, load() it first"""
+        return copy.deepcopy(self._mappings[work_item_type])
+
+    def get_test_specification_test_cases(self, api_ts_relation_id):
+        """TestSpecificationTestCaseModel rows nested under the selected ApiTestSpecificationModel"""
+        return self.test_specification_test_cases.get(api_ts_relation_id, [])
+
+
+def get_api_mapping_loader(db_session, api, specification):
+    """Return the ApiMappingLoader of the api shared in the current transaction.
+    Loaders are dropped at the first flush, commit or rollback of the session."""
+    loaders = db_session.info.setdefault(API_MAPPING_LOADERS, {})
+    loader = loaders.get(api.id)
+    if loader is None or loader.specification != specification:
+        loader = ApiMappingLoader(db_session, api, specification)
+        loaders[api.id] = loader
+    return loader
+
+
+@event.listens_for(Session, "after_flush")
+def _drop_loaders_after_flush(session, flush_context):
+    session.info.pop(API_MAPPING_LOADERS, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_loaders_after_commit(session):
+    session.info.pop(API_MAPPING_LOADERS, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_loaders_after_rollback(session):
+    session.info.pop(API_MAPPING_LOADERS, None)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from functools import wraps
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(1, os.path.dirname(currentdir))
+
+from api_utils import get_api_specification  # noqa E402
+from db.db_orm import int_from_env  # noqa E402
+from db.models.mapping_generation import get_mapping_generations, has_pending_mapping_changes  # noqa E402
+from sized_lru_cache import SizedLruCache  # noqa E402
+
+logger = logging.getLogger(__name__)
+
+
+ENABLED = os.environ.get("BASIL_MAPPING_CACHE", "true").lower() in ["1", "true", "yes"]
+# Total size of the mapping views kept in memory by each process
+MAX_BYTES = int_from_env("BASIL_MAPPING_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+# Folder shared by the workers to store the mapping views, empty to disable
+CACHE_DIR = os.environ.get("BASIL_MAPPING_CACHE_DIR", os.path.join(tempfile.gettempdir(), "basil-mapping-cache"))
+
+
+class MappingViewCache(SizedLruCache):
+    """Process wide cache of the mapping views of the Software Components
+
+    A view is identified by Software Component, view name and arguments.
+    It is valid while the Reference Document content and the mapping generations
+    (see db/models/mapping_generation.py) do not change, so a single copy
+    of each view is kept, both in memory and in CACHE_DIR, where it can be
+    reused by the other workers.
+    Views are stored as json, every caller gets its own copy.
+    """
+
+    COUNTERS = ["hits", "disk_hits", "misses", "evictions"]
+
+    def __init__(self, max_bytes=None, cache_dir=None):
+        super().__init__(MAX_BYTES if max_bytes is None else max_bytes)
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+
+    def get(self, dbi, api, view, builder, *args, **kwargs):
+        """Return the view, calling builder(dbi, api, *args, **kwargs) if there is no valid copy"""
+        if has_pending_mapping_changes(dbi.session):
+            # The view would show changes not committed yet
+            return builder(dbi, api, *args, **kwargs)
+
+        key = f"{api.id}:{view}:{json.dumps([args, kwargs], sort_keys=True)}"
+        validator = self._validator(dbi, api)
+
+        entry = self._lookup(key)
+        if entry is not None and entry["validator"] == validator:
+            self._count("hits")
+            return json.loads(entry["payload"])
+
+        entry = self._read_disk(key)
+        if entry is not None and entry["validator"] == validator:
+            self._count("disk_hits")
+            self._store(key, entry)
+            return json.loads(entry["payload"])
+
+        self._count("misses")
+        ret = builder(dbi, api, *args, **kwargs)
+        payload = json.dumps(ret)
+        entry = {"key": key, "validator": validator, "payload": payload, "bytes": len(payload)}
+        self._store(key, entry)
+        self._write_disk(key, entry)
+        return ret
+
+    @staticmethod
+    def _validator(dbi, api):
+        specification = get_api_specification(api.raw_specification_url)
+        checksum = None
+        if specification is not None:
+            checksum = hashlib.sha256(specification.encode("utf-8")).hexdigest()
+        return [checksum] + get_mapping_generations(dbi.session, api.id)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        """Atomic write, workers can read the file while another one replaces it"""
+        if not self.cache_dir:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"key": key, "validator": entry["validator"], "payload": entry["payload"],
+                           "bytes": entry["bytes"]}, f)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as excp:
+            logger.warning(f"Unable to store the mapping view {key} in {self.cache_dir}: {excp}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+mapping_view_cache = MappingViewCache()
+
+
+def cached_mapping_view(view):
+    """Serve the decorated mapping view function(dbi, api, ...) from mapping_view_cache"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(dbi, api, *args, **kwargs):
+            if not ENABLED:
+                return func(dbi, api, *args, **kwargs)
+            return mapping_view_cache.get(dbi, api, view, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
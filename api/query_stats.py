@@ -0,0 +1,161 @@
+import contextvars
+import heapq
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from db.db_orm import int_from_env
+
+logger = logging.getLogger(__name__)
+
+
+# Add the Server-Timing header to the responses
+SERVER_TIMING = os.environ.get("BASIL_SQL_SERVER_TIMING", "false").lower() in ["1", "true", "yes"]
+# Log the sql statistics of the requests slower than this threshold, 0 to disable
+SLOW_REQUEST_MS = int_from_env("BASIL_SQL_SLOW_REQUEST_MS", 1000)
+# Number of slowest statements kept per request and per route
+TOP_STATEMENTS = int_from_env("BASIL_SQL_TOP_STATEMENTS", 5)
+STATEMENT_MAX_LENGTH = 500
+
+_START_TIMES = "query_stats_start_times"
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+
+class QueryStats():
+    """Sql statements executed while serving a single request"""
+
+    def __init__(self, route=None, verb=None):
+        self.route = route
+        self.verb = verb
+        self.count = 0
+        self.db_time = 0.0
+        self.duration = 0.0
+        self._started_at = None
+        self._token = None
+        # min heap of (duration, statement)
+        self._slowest = []
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.db_time += duration
+        _push_top(self._slowest, (duration, statement[:STATEMENT_MAX_LENGTH]))
+
+    def slowest(self):
+        return [{"statement": statement, "duration_ms": round(duration * 1000, 3)}
+                for duration, statement in sorted(self._slowest, reverse=True)]
+
+    def server_timing(self):
+        return (f'db;dur={self.db_time * 1000:.3f};desc="{self.count} queries", '
+                f'app;dur={self.duration * 1000:.3f}')
+
+    def log(self):
+        log_message = (f"Slow request at {self.route} with {self.verb} method: {self.duration * 1000:.1f} ms, "
+                       f"{self.count} sql statements in {self.db_time * 1000:.1f} ms")
+        for item in self.slowest():
+            log_message += f"\n * {item['duration_ms']} ms: {item['statement']}"
+        logger.warning(log_message)
+
+
+class RouteQueryStats():
+    """Sql statistics of all the requests served by the current process, by route and method"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, stats):
+        key = f"{stats.verb.upper()} {stats.route}"
+        with self._lock:
+            route = self._routes.setdefault(key, {"requests": 0, "queries": 0, "max_queries": 0,
+                                                  "db_time": 0.0, "max_db_time": 0.0, "duration": 0.0,
+                                                  "slowest": []})
+            route["requests"] += 1
+            route["queries"] += stats.count
+            route["max_queries"] = max(route["max_queries"], stats.count)
+            route["db_time"] += stats.db_time
+            route["max_db_time"] = max(route["max_db_time"], stats.db_time)
+            route["duration"] += stats.duration
+            for item in stats._slowest:
+                _push_top(route["slowest"], item)
+
+    def as_dict(self):
+        ret = {}
+        with self._lock:
+            for key, route in self._routes.items():
+                ret[key] = {
+                    "pid": os.getpid(),
+                    "requests": route["requests"],
+                    "queries": route["queries"],
+                    "avg_queries": round(route["queries"] / route["requests"], 2),
+                    "max_queries": route["max_queries"],
+                    "db_time_ms": round(route["db_time"] * 1000, 3),
+                    "avg_db_time_ms": round(route["db_time"] * 1000 / route["requests"], 3),
+                    "max_db_time_ms": round(route["max_db_time"] * 1000, 3),
+                    "avg_duration_ms": round(route["duration"] * 1000 / route["requests"], 3),
+                    "slowest": [{"statement": statement, "duration_ms": round(duration * 1000, 3)}
+                                for duration, statement in sorted(route["slowest"], reverse=True)],
+                }
+        return ret
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+
+route_stats = RouteQueryStats()
+
+
+def _push_top(heap, item):
+    if len(heap) < TOP_STATEMENTS:
+        heapq.heappush(heap, item)
+    elif TOP_STATEMENTS > 0 and item[0] > heap[0][0]:
+        heapq.heapreplace(heap, item)
+
+
+def start(route=None, verb=None):
+    """Collect the sql statements of the current request.
+    Return None if a collection is already in progress, i.e. nested decorated calls"""
+    if _current.get() is not None:
+        return None
+    stats = QueryStats(route, verb)
+    stats._started_at = time.perf_counter()
+    stats._token = _current.set(stats)
+    return stats
+
+
+def stop(stats):
+    """Stop the collection started with start(), aggregate and log the statistics"""
+    _current.reset(stats._token)
+    stats.duration = time.perf_counter() - stats._started_at
+    if stats.route and stats.verb:
+        route_stats.add(stats)
+    if SLOW_REQUEST_MS and stats.duration * 1000 >= SLOW_REQUEST_MS:
+        stats.log()
+    return stats
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault(_START_TIMES, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    start_times = conn.info.get(_START_TIMES)
+    if stats is None or not start_times:
+        return
+    stats.add(statement, time.perf_counter() - start_times.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_TIMES):
+        connection.info[_START_TIMES].pop()
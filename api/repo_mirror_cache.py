@@ -0,0 +1,337 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from db.db_orm import int_from_env
+
+logger = logging.getLogger(__name__)
+
+
+# Folder of the repository mirrors shared by all the scans, empty to disable
+CACHE_DIR = os.environ.get("BASIL_REPO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "basil-repo-cache"))
+# Total size of the mirrors and of the trees checked out from them
+MAX_BYTES = int_from_env("BASIL_REPO_CACHE_MAX_BYTES", 4 * 1024 * 1024 * 1024)
+# Seconds a mirror is used without fetching the remote repository, 0 to fetch on every checkout
+FETCH_INTERVAL = int_from_env("BASIL_REPO_CACHE_FETCH_INTERVAL", 60)
+
+_MIRROR = "mirror.git"
+_TREES = "trees"
+_USAGE = "usage.json"
+
+
+@contextmanager
+def _flock(path, exclusive: bool = True, blocking: bool = True):
+    """Lock the file at path, yield False if the lock is held by someone else and blocking is False"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        yield acquired
+    finally:
+        os.close(fd)
+
+
+def _disk_usage(path: Path) -> int:
+    ret = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                ret += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return ret
+
+
+def _git(args: List[str], git_dir: Optional[Path] = None, env: Optional[dict] = None) -> str:
+    """Run git and return stdout, raise RuntimeError if it fails"""
+    cmd = ["git"] + ([f"--git-dir={git_dir}"] if git_dir else []) + args
+    try:
+        completed = subprocess.run(
+            cmd,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=dict(os.environ, GIT_TERMINAL_PROMPT="0", **(env or {})),
+        )
+        return (completed.stdout or "").strip()
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError(
+            f"Command failed with exit code {exc.returncode}: {' '.join(cmd)}\n"
+            f"stdout:\n{exc.stdout}\n"
+            f"stderr:\n{exc.stderr}"
+        ) from exc
+
+
+class RepoCheckout:
+    """Tree of a commit checked out from a mirror, it is not evicted until closed"""
+
+    def __init__(self, path: Path, commit: str, version: str, lock_fd: int):
+        self.path = path
+        self.commit = commit
+        self.version = version
+        self._lock_fd = lock_fd
+
+    def close(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+class RepoMirrorCache:
+    """Cache of the repositories read by the traceability scanner, shared by all the users and scans
+
+    Each repository url has a bare mirror, cloned once and updated with `git fetch` at most
+    every fetch_interval seconds. The trees of the commits requested are checked out from
+    the mirror once and shared read only by the scans, that hold a shared lock on them.
+    Operations on a repository are serialized by a lock file, so that concurrent scans of
+    the same repository clone or fetch it once.
+    Mirrors and trees are evicted in least recently used order to keep the total size
+    under max_bytes, skipping the ones in use.
+
+    Layout of cache_dir:
+        <repo>-<hash of the url>/repo.lock
+        <repo>-<hash of the url>/usage.json    url, last fetch, size and last use of each entry
+        <repo>-<hash of the url>/mirror.git
+        <repo>-<hash of the url>/trees/<commit>
+        <repo>-<hash of the url>/trees/<commit>.lock
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, fetch_interval=None):
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.fetch_interval = FETCH_INTERVAL if fetch_interval is None else fetch_interval
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache_dir)
+
+    def checkout(self, url: str, ref: str) -> RepoCheckout:
+        """Return the tree of ref (branch, tag or commit) of the repository at url.
+        The caller must close() it when the files are no longer needed."""
+        repo_dir = self._repo_dir(url)
+        (repo_dir / _TREES).mkdir(parents=True, exist_ok=True)
+
+        with _flock(repo_dir / "repo.lock"):
+            usage = self._read_usage(repo_dir)
+            mirror = repo_dir / _MIRROR
+            commit = self._update_and_resolve(repo_dir, usage, url, ref)
+            now = time.time()
+
+            tree_name = f"{_TREES}/{commit}"
+            tree = repo_dir / tree_name
+            if not tree.exists():
+                self._checkout_tree(mirror, commit, tree)
+                usage["entries"][tree_name] = {"bytes": _disk_usage(tree)}
+            version = self._describe(mirror, commit)
+
+            # Taken with the repository lock held, so that the tree can not be evicted in between
+            lock_fd = os.open(repo_dir / f"{tree_name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(lock_fd, fcntl.LOCK_SH)
+
+            for name in [_MIRROR, tree_name]:
+                usage["entries"].setdefault(name, {"bytes": 0})["used_at"] = now
+            self._write_usage(repo_dir, usage)
+
+        self.evict()
+        return RepoCheckout(path=tree, commit=commit, version=version, lock_fd=lock_fd)
+
+    def resolve(self, url: str, ref: str) -> str:
+        """Return the commit of ref (branch, tag or commit) of the repository at url, without checking it out"""
+        repo_dir = self._repo_dir(url)
+        (repo_dir / _TREES).mkdir(parents=True, exist_ok=True)
+        with _flock(repo_dir / "repo.lock"):
+            usage = self._read_usage(repo_dir)
+            commit = self._update_and_resolve(repo_dir, usage, url, ref)
+            usage["entries"].setdefault(_MIRROR, {"bytes": 0})["used_at"] = time.time()
+            self._write_usage(repo_dir, usage)
+        return commit
+
+    def changed_files(self, url: str, old_commit: str, new_commit: str) -> List[str]:
+        """
+        Return the paths added, modified or removed between two commits of the repository at url.
+        Renamed files are reported with both paths.
+        Raise RuntimeError if a commit is not in the mirror, e.g. after a force push.
+        """
+        repo_dir = self._repo_dir(url)
+        with _flock(repo_dir / "repo.lock"):
+            output = _git(
+                ["diff", "--name-only", "--no-renames", "-z", old_commit, new_commit], git_dir=repo_dir / _MIRROR
+            )
+        return [x for x in output.split("\0") if x]
+
+    def stats(self) -> dict:
+        ret = {"repositories": 0, "trees": 0, "bytes": 0, "max_bytes": self.max_bytes}
+        for repo_dir, usage in self._iter_usages():
+            ret["repositories"] += 1
+            ret["trees"] += len([x for x in usage["entries"] if x.startswith(f"{_TREES}/")])
+            ret["bytes"] += sum(x.get("bytes", 0) for x in usage["entries"].values())
+        return ret
+
+    def evict(self) -> None:
+        """Remove the least recently used mirrors and trees not in use until the cache fits max_bytes"""
+        with _flock(Path(self.cache_dir) / "cache.lock"):
+            entries = []
+            for repo_dir, usage in self._iter_usages():
+                entries += [(x.get("used_at", 0), x.get("bytes", 0), repo_dir, name)
+                            for name, x in usage["entries"].items()]
+            total = sum(x[1] for x in entries)
+            for used_at, n_bytes, repo_dir, name in sorted(entries, key=lambda x: x[0]):
+                if total <= self.max_bytes:
+                    break
+                if self._remove_entry(repo_dir, name):
+                    total -= n_bytes
+
+    # Internal helpers
+
+    def _repo_dir(self, url: str) -> Path:
+        tail = url.rstrip("/").split("/")[-1]
+        if tail.endswith(".git"):
+            tail = tail[:-4]
+        name = "".join(ch if ch.isalnum() or ch in "-._" else "-" for ch in tail).strip("-._") or "repo"
+        return Path(self.cache_dir) / f"{name}-{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}"
+
+    def _iter_usages(self):
+        cache_dir = Path(self.cache_dir)
+        if not cache_dir.is_dir():
+            return
+        for repo_dir in sorted(cache_dir.iterdir()):
+            if repo_dir.is_dir():
+                yield repo_dir, self._read_usage(repo_dir)
+
+    @staticmethod
+    def _read_usage(repo_dir: Path) -> dict:
+        try:
+            with open(repo_dir / _USAGE, "r") as f:
+                ret = json.load(f)
+        except (OSError, ValueError):
+            ret = {}
+        ret.setdefault("entries", {})
+        return ret
+
+    @staticmethod
+    def _write_usage(repo_dir: Path, usage: dict) -> None:
+        """Replace the usage file at once, it is read by evict() without the repository lock"""
+        tmp = repo_dir / f"{_USAGE}.{uuid.uuid4().hex}"
+        with open(tmp, "w") as f:
+            json.dump(usage, f)
+        os.replace(tmp, repo_dir / _USAGE)
+
+    def _remove_entry(self, repo_dir: Path, name: str) -> bool:
+        """Remove a mirror or a tree if nobody is using it"""
+        with _flock(repo_dir / "repo.lock", blocking=False) as repo_locked:
+            if not repo_locked:
+                return False
+            if name == _MIRROR:
+                shutil.rmtree(repo_dir / name, ignore_errors=True)
+            else:
+                with _flock(repo_dir / f"{name}.lock", blocking=False) as tree_locked:
+                    if not tree_locked:
+                        return False
+                    shutil.rmtree(repo_dir / name, ignore_errors=True)
+            usage = self._read_usage(repo_dir)
+            usage["entries"].pop(name, None)
+            if name == _MIRROR:
+                usage.pop("fetched_at", None)
+            self._write_usage(repo_dir, usage)
+        logger.info(f"Evicted {repo_dir.name}/{name} from the repository cache")
+        return True
+
+    def _update_and_resolve(self, repo_dir: Path, usage: dict, url: str, ref: str) -> str:
+        """Clone or fetch the mirror as needed and return the commit of ref, with the repository lock held"""
+        usage["url"] = url
+        mirror = repo_dir / _MIRROR
+        fetched = False
+        if not (mirror / "HEAD").exists():
+            self._clone(url, repo_dir)
+            fetched = True
+        elif time.time() - usage.get("fetched_at", 0) >= self.fetch_interval:
+            fetched = self._fetch(mirror, url)
+
+        commit = self._resolve(mirror, ref)
+        if commit is None and not fetched:
+            # Branch or tag created after the last fetch
+            fetched = self._fetch(mirror, url)
+            commit = self._resolve(mirror, ref)
+        if commit is None:
+            raise RuntimeError(f"Reference {ref} not found in {url}")
+        if fetched:
+            usage["fetched_at"] = time.time()
+            usage["entries"][_MIRROR] = {"bytes": _disk_usage(mirror)}
+        return commit
+
+    @staticmethod
+    def _clone(url: str, repo_dir: Path) -> None:
+        """Clone the mirror in a temporary folder first, leftovers of an interrupted clone are dropped"""
+        mirror = repo_dir / _MIRROR
+        shutil.rmtree(mirror, ignore_errors=True)
+        tmp = repo_dir / f"{_MIRROR}.{uuid.uuid4().hex}"
+        try:
+            _git(["clone", "--mirror", "--quiet", url, str(tmp)])
+            os.rename(tmp, mirror)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        logger.info(f"Cloned mirror of {url} to {mirror}")
+
+    @staticmethod
+    def _fetch(mirror: Path, url: str) -> bool:
+        """Update the mirror, keep using the previous state of the mirror if the remote is not reachable"""
+        try:
+            _git(["fetch", "--prune", "--quiet", "origin"], git_dir=mirror)
+        except RuntimeError as exc:
+            logger.warning(f"Unable to fetch {url}, using the cached mirror: {exc}")
+            return False
+        return True
+
+    @staticmethod
+    def _resolve(mirror: Path, ref: str) -> Optional[str]:
+        """Commit of ref, branches take precedence over tags as in `git clone --branch`"""
+        for candidate in [f"refs/heads/{ref}", f"refs/tags/{ref}", ref]:
+            try:
+                return _git(["rev-parse", "--verify", "--quiet", f"{candidate}^{{commit}}"], git_dir=mirror)
+            except RuntimeError:
+                continue
+        return None
+
+    @staticmethod
+    def _checkout_tree(mirror: Path, commit: str, tree: Path) -> None:
+        """Check out commit in a temporary folder with a temporary index, then move it to tree"""
+        tmp = tree.parent / f"{tree.name}.{uuid.uuid4().hex}"
+        index = tree.parent / f"{tree.name}.{uuid.uuid4().hex}.index"
+        env = {"GIT_INDEX_FILE": str(index)}
+        try:
+            tmp.mkdir()
+            _git([f"--work-tree={tmp}", "read-tree", commit], git_dir=mirror, env=env)
+            _git([f"--work-tree={tmp}", "checkout-index", "--all", "--force"], git_dir=mirror, env=env)
+            os.rename(tmp, tree)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if index.exists():
+                index.unlink()
+
+    @staticmethod
+    def _describe(mirror: Path, commit: str) -> str:
+        """
+        Version of the commit as described by a shallow clone of it:
+        the tag pointing to the commit if any, the abbreviated commit otherwise
+        """
+        try:
+            return _git(["describe", "--tags", "--exact-match", "--long", "--abbrev=7", commit], git_dir=mirror)
+        except RuntimeError:
+            return _git(["rev-parse", "--short=7", commit], git_dir=mirror)
+
+
+repo_mirror_cache = RepoMirrorCache()
@@ -1,29 +1,36 @@
 import argparse
+import bisect
+import concurrent.futures
+import copy
 import datetime
 import fnmatch
 import json
 import logging
+import multiprocessing
 import os
 import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import uuid
 from pathlib import Path
+from collections import OrderedDict
 from typing import Callable, List, Optional
 
 from pyaml_env import parse_config
+from sqlalchemy import column, select, table
 
 currentdir = Path(__file__).resolve().parent
 sys.path.insert(1, str(currentdir.parent))
 
 from api_utils import (  # noqa E402
     get_user_config_folder_path,
-    get_user_traceability_scanner_config
+    get_user_traceability_scanner_config,
 )
 
-from db.db_orm import DbInterface  # noqa E402
+from db.db_orm import DbInterface, int_from_env  # noqa E402
 from db.models.api import ApiModel  # noqa E402
 from db.models.api_document import ApiDocumentModel  # noqa E402
 from db.models.api_justification import ApiJustificationModel  # noqa E402
@@ -41,8 +48,19 @@ from db.models.test_case import TestCaseModel  # noqa E402
 from db.models.test_specification import TestSpecificationModel  # noqa E402
 from db.models.test_specification_test_case import TestSpecificationTestCaseModel  # noqa E402
 from db.models.user import UserModel  # noqa E402
+from db.models.waterfall_coverage import WATERFALL_CHILDREN  # noqa E402
 
 from api import USER_FILES_BASE_DIR  # noqa E402
+from repo_mirror_cache import repo_mirror_cache  # noqa E402
+from scan_rule_plan import LineIndex, RulePlan, compile_rule_plan, line_predicate, normalize_trim_value  # noqa E402
+from traceability_scan_state import (  # noqa E402
+    STATE_FILENAME,
+    TraceabilityScanState,
+    repository_key,
+    rule_key,
+    traceability_delta,
+    work_items_delta,
+)
 
 logger = logging.getLogger(__name__)
 # Ensure logger prints to the terminal by default (once)
@@ -55,13 +73,63 @@ logger.setLevel(logging.INFO)
 logger.propagate = False
 
 
+# Worker processes scanning the apis in parallel, 1 to scan them sequentially
+SCAN_WORKERS = int_from_env("BASIL_SCAN_WORKERS", 1)
+
+
 class TraceabilityGenerator:
     """
     Generate traceability from the scan results.
     """
 
-    def __init__(self, traceability: dict, user_id: int, logfile: str) -> None:
+    # Mapping model, name of the work item relationship, work item model and fields
+    # identifying the work item of each work item type
+    API_MAPPINGS = {
+        "justifications": (ApiJustificationModel, "justification", JustificationModel, ["description"]),
+        "documents": (
+            ApiDocumentModel,
+            "document",
+            DocumentModel,
+            ["title", "description", "document_type", "spdx_relation", "url"],
+        ),
+        "software_requirements": (
+            ApiSwRequirementModel,
+            "sw_requirement",
+            SwRequirementModel,
+            ["title", "description"],
+        ),
+        "test_specifications": (
+            ApiTestSpecificationModel,
+            "test_specification",
+            TestSpecificationModel,
+            ["title", "test_description", "expected_behavior", "preconditions"],
+        ),
+        "test_cases": (
+            ApiTestCaseModel,
+            "test_case",
+            TestCaseModel,
+            ["title", "description", "repository", "relative_path"],
+        ),
+    }
+
+    # Mapping model of the work items nested under the mappings of each work item type
+    NESTED_MAPPINGS = {
+        "documents": {"documents": DocumentDocumentModel},
+        "software_requirements": {
+            "software_requirements": SwRequirementSwRequirementModel,
+            "test_specifications": SwRequirementTestSpecificationModel,
+            "test_cases": SwRequirementTestCaseModel,
+        },
+    }
+
+    def __init__(self, traceability: dict, user_id: int, logfile: str, delta: Optional[List[dict]] = None) -> None:
+        """
+        traceability: work items found by ArtifactsScanner.scan(), all mapped to the apis
+        delta: if provided, only the work items added, changed or removed since the previous scan
+               are applied to the mappings, see traceability_scan_state.traceability_delta()
+        """
         self.traceability = traceability
+        self.delta = delta
         self.user_id = user_id
         self.dbi = DbInterface()
         self.logfile = logfile
@@ -225,37 +293,17 @@ class TraceabilityGenerator:
             self.dbi.session.add(new_api_software_requirement)
             self.dbi.session.commit()
 
-            # Map test specifications directly under this software requirement
-            test_specifications = software_requirement.get("test_specifications", []) or []
-            if test_specifications:
-                logger.info(f" - Generating {len(test_specifications)} test specifications")
-            for ts in test_specifications:
-                ts_model = self._get_or_create_test_specification(test_specification_dict=ts)
-                ts_link = SwRequirementTestSpecificationModel(
-                    sw_requirement_mapping_api=new_api_software_requirement,
-                    sw_requirement_mapping_sw_requirement=None,
-                    test_specification=ts_model,
-                    coverage=ts.get("coverage", 0),
-                    created_by=self.user,
-                )
-                self.dbi.session.add(ts_link)
-                self.dbi.session.commit()
-
-            # Map test cases directly under this software requirement
-            test_cases = software_requirement.get("test_cases", []) or []
-            if test_cases:
-                logger.info(f" - Generating {len(test_cases)} test cases")
-            for tc in test_cases:
-                tc_model = self._get_or_create_test_case(test_case_dict=tc)
-                tc_link = SwRequirementTestCaseModel(
-                    sw_requirement_mapping_api=new_api_software_requirement,
-                    sw_requirement_mapping_sw_requirement=None,
-                    test_case=tc_model,
-                    coverage=tc.get("coverage", 0),
-                    created_by=self.user,
-                )
-                self.dbi.session.add(tc_link)
-                self.dbi.session.commit()
+            # Map test specifications and test cases directly under this software requirement
+            self._generate_sw_requirement_test_specifications(
+                parent_mapping_api=new_api_software_requirement,
+                parent_mapping_sw_requirement=None,
+                test_specifications=software_requirement.get("test_specifications", []) or [],
+            )
+            self._generate_sw_requirement_test_cases(
+                parent_mapping_api=new_api_software_requirement,
+                parent_mapping_sw_requirement=None,
+                test_cases=software_requirement.get("test_cases", []) or [],
+            )
 
             # Recursively create SwRequirementSwRequirementModel links for nested software requirements
             children = software_requirement.get("software_requirements", []) or []
@@ -312,33 +360,17 @@ class TraceabilityGenerator:
             self.dbi.session.commit()
             created_links.append(link)
 
-            # Map test specifications under this nested software requirement link
-            test_specifications = child.get("test_specifications", []) or []
-            for ts in test_specifications:
-                ts_model = self._get_or_create_test_specification(test_specification_dict=ts)
-                ts_link = SwRequirementTestSpecificationModel(
-                    sw_requirement_mapping_api=None,
-                    sw_requirement_mapping_sw_requirement=link,
-                    test_specification=ts_model,
-                    coverage=ts.get("coverage", 0),
-                    created_by=self.user,
-                )
-                self.dbi.session.add(ts_link)
-                self.dbi.session.commit()
-
-            # Map test cases under this nested software requirement link
-            test_cases = child.get("test_cases", []) or []
-            for tc in test_cases:
-                tc_model = self._get_or_create_test_case(test_case_dict=tc)
-                tc_link = SwRequirementTestCaseModel(
-                    sw_requirement_mapping_api=None,
-                    sw_requirement_mapping_sw_requirement=link,
-                    test_case=tc_model,
-                    coverage=tc.get("coverage", 0),
-                    created_by=self.user,
-                )
-                self.dbi.session.add(tc_link)
-                self.dbi.session.commit()
+            # Map test specifications and test cases under this nested software requirement link
+            self._generate_sw_requirement_test_specifications(
+                parent_mapping_api=None,
+                parent_mapping_sw_requirement=link,
+                test_specifications=child.get("test_specifications", []) or [],
+            )
+            self._generate_sw_requirement_test_cases(
+                parent_mapping_api=None,
+                parent_mapping_sw_requirement=link,
+                test_cases=child.get("test_cases", []) or [],
+            )
             # Recurse into grandchildren
             grand_children = child.get("software_requirements", []) or []
             if grand_children:
@@ -349,6 +381,54 @@ class TraceabilityGenerator:
                 )
         return created_links
 
+    def _generate_sw_requirement_test_specifications(
+        self,
+        parent_mapping_api: Optional[ApiSwRequirementModel],
+        parent_mapping_sw_requirement: Optional[SwRequirementSwRequirementModel],
+        test_specifications: List[dict],
+    ) -> List[SwRequirementTestSpecificationModel]:
+        """Create the SwRequirementTestSpecificationModel mappings of a software requirement mapping"""
+        if test_specifications:
+            logger.info(f" - Generating {len(test_specifications)} test specifications")
+        created_links: List[SwRequirementTestSpecificationModel] = []
+        for ts in test_specifications:
+            ts_model = self._get_or_create_test_specification(test_specification_dict=ts)
+            ts_link = SwRequirementTestSpecificationModel(
+                sw_requirement_mapping_api=parent_mapping_api,
+                sw_requirement_mapping_sw_requirement=parent_mapping_sw_requirement,
+                test_specification=ts_model,
+                coverage=ts.get("coverage", 0),
+                created_by=self.user,
+            )
+            self.dbi.session.add(ts_link)
+            self.dbi.session.commit()
+            created_links.append(ts_link)
+        return created_links
+
+    def _generate_sw_requirement_test_cases(
+        self,
+        parent_mapping_api: Optional[ApiSwRequirementModel],
+        parent_mapping_sw_requirement: Optional[SwRequirementSwRequirementModel],
+        test_cases: List[dict],
+    ) -> List[SwRequirementTestCaseModel]:
+        """Create the SwRequirementTestCaseModel mappings of a software requirement mapping"""
+        if test_cases:
+            logger.info(f" - Generating {len(test_cases)} test cases")
+        created_links: List[SwRequirementTestCaseModel] = []
+        for tc in test_cases:
+            tc_model = self._get_or_create_test_case(test_case_dict=tc)
+            tc_link = SwRequirementTestCaseModel(
+                sw_requirement_mapping_api=parent_mapping_api,
+                sw_requirement_mapping_sw_requirement=parent_mapping_sw_requirement,
+                test_case=tc_model,
+                coverage=tc.get("coverage", 0),
+                created_by=self.user,
+            )
+            self.dbi.session.add(tc_link)
+            self.dbi.session.commit()
+            created_links.append(tc_link)
+        return created_links
+
     def generate_api_test_specifications(self, api_model, snippet: dict, test_specifications: List[dict]):
         # ApiTestSpecifications
         api_test_specifications = []
@@ -430,6 +510,168 @@ class TraceabilityGenerator:
         self.dbi.session.commit()
         return new_test_case
 
+    def _get_or_create_work_item(self, work_item_type: str, item: dict):
+        get_or_create = {
+            "justifications": self._get_or_create_justification,
+            "documents": self._get_or_create_document,
+            "software_requirements": self._get_or_create_software_requirement,
+            "test_specifications": self._get_or_create_test_specification,
+            "test_cases": self._get_or_create_test_case,
+        }
+        return get_or_create[work_item_type](item)
+
+    def _mapping_query(self, mapping_model, work_item_type: str, item: dict):
+        """Query the mappings of the work item created by the scan user"""
+        _, work_item_name, work_item_model, fields = self.API_MAPPINGS[work_item_type]
+        query = (
+            self.dbi.session.query(mapping_model)
+            .join(work_item_model, getattr(mapping_model, f"{work_item_name}_id") == work_item_model.id)
+            .filter(mapping_model.created_by_id == self.user.id)
+        )
+        for field in fields:
+            query = query.filter(getattr(work_item_model, field) == item.get(field, ""))
+        return query
+
+    def _find_api_mapping(self, api_model, entry: dict):
+        """Return the mapping of a work item to a snippet of the api created by a previous scan"""
+        mapping_model = self.API_MAPPINGS[entry["work_item_type"]][0]
+        query = (
+            self._mapping_query(mapping_model, entry["work_item_type"], entry["item"])
+            .filter(mapping_model.api_id == api_model.id)
+            .filter(mapping_model.section == entry["section"])
+            .filter(mapping_model.offset == entry["offset"])
+        )
+        return query.order_by(mapping_model.id.desc()).first()
+
+    def _find_nested_mapping(self, parent_mapping, work_item_type: str, nested_type: str, item: dict):
+        """Return the mapping of a work item nested under parent_mapping created by a previous scan"""
+        mapping_model = self.NESTED_MAPPINGS[work_item_type][nested_type]
+        parent_fk = next(
+            fk for child_table, fk, _ in WATERFALL_CHILDREN[parent_mapping.__tablename__]
+            if child_table == mapping_model.__tablename__
+        )
+        query = (
+            self._mapping_query(mapping_model, nested_type, item)
+            .filter(getattr(mapping_model, parent_fk) == parent_mapping.id)
+        )
+        return query.order_by(mapping_model.id.desc()).first()
+
+    def _generate_api_mapping(self, api_model, entry: dict):
+        work_item_type = entry["work_item_type"]
+        snippet = {"section": entry["section"], "offset": entry["offset"], work_item_type: [entry["item"]]}
+        generate = getattr(self, f"generate_api_{work_item_type}")
+        return generate(api_model=api_model, snippet=snippet, **{work_item_type: [entry["item"]]})
+
+    def _generate_nested_mapping(self, parent_mapping, nested_type: str, item: dict, entry: dict) -> None:
+        parent_is_api = isinstance(parent_mapping, (ApiDocumentModel, ApiSwRequirementModel))
+        parent_mapping_api = parent_mapping if parent_is_api else None
+        parent_mapping_nested = None if parent_is_api else parent_mapping
+        if nested_type == "documents":
+            self._generate_nested_documents(
+                parent_mapping_api=parent_mapping_api,
+                parent_mapping_document=parent_mapping_nested,
+                children_documents=[item],
+                snippet={"section": entry["section"], "offset": entry["offset"]},
+            )
+        elif nested_type == "software_requirements":
+            self._generate_nested_sw_requirements(
+                parent_mapping_api=parent_mapping_api,
+                parent_mapping_sw_requirement=parent_mapping_nested,
+                children_sw_requirements=[item],
+            )
+        elif nested_type == "test_specifications":
+            self._generate_sw_requirement_test_specifications(
+                parent_mapping_api=parent_mapping_api,
+                parent_mapping_sw_requirement=parent_mapping_nested,
+                test_specifications=[item],
+            )
+        else:
+            self._generate_sw_requirement_test_cases(
+                parent_mapping_api=parent_mapping_api,
+                parent_mapping_sw_requirement=parent_mapping_nested,
+                test_cases=[item],
+            )
+
+    def _has_mappings_of_other_users(self, mapping) -> bool:
+        """True if a mapping nested under the mapping, at any depth, was not created by the scan user"""
+        pending = [(mapping.__tablename__, [mapping.id])]
+        while pending:
+            tablename, ids = pending.pop()
+            for child_table, fk, _ in WATERFALL_CHILDREN.get(tablename, []):
+                child = table(child_table, column("id"), column(fk), column("created_by_id"))
+                rows = self.dbi.session.execute(
+                    select(child.c.id, child.c.created_by_id).where(child.c[fk].in_(ids))
+                ).all()
+                if any(x.created_by_id != self.user.id for x in rows):
+                    return True
+                if rows:
+                    pending.append((child_table, [x.id for x in rows]))
+        return False
+
+    def _delete_mapping(self, mapping) -> None:
+        """Delete a mapping created by the scan, unless other users mapped work items under it"""
+        if self._has_mappings_of_other_users(mapping):
+            logger.info(f" - {mapping.__tablename__} {mapping.id} kept, other users mapped work items under it")
+            return
+        self.dbi.session.delete(mapping)
+        self.dbi.session.commit()
+
+    def _update_mapping(self, mapping, work_item_type: str, previous_item: dict, item: dict, entry: dict) -> None:
+        """Update the coverage and the work item of a mapping in place, then the mappings nested under it.
+        Work items can be shared by other mappings, a changed work item is replaced, not edited."""
+        _, work_item_name, _, fields = self.API_MAPPINGS[work_item_type]
+        edited = False
+        if any(previous_item.get(x, "") != item.get(x, "") for x in fields):
+            setattr(mapping, work_item_name, self._get_or_create_work_item(work_item_type, item))
+            edited = True
+        if mapping.coverage != item.get("coverage", 0):
+            mapping.coverage = item.get("coverage", 0)
+            edited = True
+        if edited:
+            mapping.edited_by = self.user
+            mapping.edited_by_id = self.user.id
+            self.dbi.session.commit()
+
+        for nested_type in self.NESTED_MAPPINGS.get(work_item_type, {}):
+            added, removed, changed = work_items_delta(
+                nested_type, previous_item.get(nested_type, None), item.get(nested_type, None)
+            )
+            for previous_child in removed:
+                child_mapping = self._find_nested_mapping(mapping, work_item_type, nested_type, previous_child)
+                if child_mapping is not None:
+                    self._delete_mapping(child_mapping)
+            for previous_child, child in changed:
+                child_mapping = self._find_nested_mapping(mapping, work_item_type, nested_type, previous_child)
+                if child_mapping is None:
+                    self._generate_nested_mapping(mapping, nested_type, child, entry)
+                else:
+                    self._update_mapping(child_mapping, nested_type, previous_child, child, entry)
+            for child in added:
+                self._generate_nested_mapping(mapping, nested_type, child, entry)
+
+    def apply_api_delta(self, api_model, api_delta: dict) -> None:
+        """Update the mappings of the api with the work items added, changed or removed since the previous scan.
+        Only the mappings created by the scan user are changed or deleted."""
+        for entry in api_delta["removed"]:
+            mapping = self._find_api_mapping(api_model=api_model, entry=entry)
+            if mapping is None:
+                logger.info(f" - {entry['work_item_type']} mapping already removed: {entry['item']}")
+            else:
+                self._delete_mapping(mapping)
+        logger.info(f" - removed: {len(api_delta['removed'])}")
+
+        for previous_entry, entry in api_delta["changed"]:
+            mapping = self._find_api_mapping(api_model=api_model, entry=previous_entry)
+            if mapping is None:
+                self._generate_api_mapping(api_model=api_model, entry=entry)
+            else:
+                self._update_mapping(mapping, entry["work_item_type"], previous_entry["item"], entry["item"], entry)
+        logger.info(f" - changed: {len(api_delta['changed'])}")
+
+        for entry in api_delta["added"]:
+            self._generate_api_mapping(api_model=api_model, entry=entry)
+        logger.info(f" - added: {len(api_delta['added'])}")
+
     def generate(self) -> dict:
         """Traverse the traceability and
         - if the work item already exists in the db extract it from the db
@@ -439,7 +681,7 @@ class TraceabilityGenerator:
         if not os.path.exists(user_files_path):
             os.makedirs(user_files_path, exist_ok=True)
 
-        for api in self.traceability:
+        for api in self.traceability if self.delta is None else self.delta:
             logger.info(f"Api {api['api']} {api['library']} {api['library_version']}")
 
             # Check if the api already exists
@@ -482,6 +724,14 @@ class TraceabilityGenerator:
             with open(reference_document_filepath, "w") as f:
                 f.write(api["api_reference_document"])
 
+            if self.delta is not None:
+                self.apply_api_delta(api_model=api_model, api_delta=api)
+                self.dbi.session.commit()
+                logger.info(
+                    f" - Traceability scan completed for api {api['api']} {api['library']} {api['library_version']}"
+                )
+                continue
+
             for index, snippet in enumerate(api["snippets"]):
                 logger.info(f"* Snippet {index}")
 
@@ -538,6 +788,9 @@ class RepoScanner:
 
     files = []
     user_id = None
+    checkout = None
+    commit = None
+    target_dir = None
 
     def __init__(self, user_id: str, _config: dict = {}) -> None:
         """
@@ -572,11 +825,20 @@ class RepoScanner:
 
         Returns the absolute path to the cloned working directory.
         """
+        url = self.config.get("url", "")
+        branch = self.config.get("branch", "")
+        if repo_mirror_cache.enabled:
+            # Files of the branch shared with the other scans, the mirror is cloned only once
+            self.checkout = repo_mirror_cache.checkout(url=url, ref=branch)
+            self.git_version = self.checkout.version
+            self.commit = self.checkout.commit
+            logger.info(f"Checked out repository {url} at {self.checkout.commit} to {self.checkout.path}")
+            self.target_dir = str(self.checkout.path)
+            return self.target_dir
+
         user_root = self._get_user_root()
         user_root.mkdir(parents=True, exist_ok=True)
 
-        url = self.config.get("url", "")
-        branch = self.config.get("branch", "")
         target_dir = user_root / self._generate_repo_dir_name(url, branch)
         if target_dir.exists():
             # Avoid accidental reuse; create a unique directory instead
@@ -594,6 +856,18 @@ class RepoScanner:
         self.target_dir = str(target_dir)
         return str(target_dir)
 
+    def close(self) -> None:
+        """
+        Release the files of the repository: the checkout of the mirror cache
+        can be evicted, the clone in the user's temporary folder is removed.
+        """
+        if self.checkout is not None:
+            self.checkout.close()
+            self.checkout = None
+        elif self.target_dir and Path(self.target_dir).parent == self._get_user_root():
+            shutil.rmtree(self.target_dir, ignore_errors=True)
+        self.target_dir = None
+
     def clear_user_temp(self) -> None:
         """Remove the entire temporary folder for the given user."""
         user_root = self._get_user_root()
@@ -627,6 +901,13 @@ class RepoScanner:
             files = self.list_all_files(include_hidden=include_hidden)
         else:
             files = self.files
+        return self.filter_files(files=files, filename_pattern=filename_pattern, folder_pattern=folder_pattern)
+
+    @staticmethod
+    def filter_files(files: List[str], filename_pattern: str = "", folder_pattern: str = "") -> List[str]:
+        """
+        Return the files matching the filename and folder patterns.
+        """
         if filename_pattern:
             files = [f for f in files if fnmatch.fnmatch(os.path.basename(f), filename_pattern)]
         if folder_pattern:
@@ -741,10 +1022,143 @@ class RepoScanner:
             ) from exc
 
 
+class TextElement(dict):
+    """
+    Element of the TextScanner: the lines [start, end) of a list of lines shared by all
+    the elements extracted from the same text.
+    It behaves as the {"index": ..., "text": ...} dictionary used by the scanner, the text
+    is only joined when it is read, so that chains of start__/end__/closest__ steps
+    move offsets instead of copying the tail of the text for every match.
+    Assigning "text" detaches the element from the shared lines.
+    """
+
+    __slots__ = ("lines", "start", "end")
+
+    def __init__(self, lines: List[str], start: int, end: int, index: Optional[int] = None):
+        dict.__init__(self, index=start if index is None else index)
+        self.lines = lines
+        # Bounds of lines[start:end]
+        if not 0 <= start <= end <= len(lines):
+            start = min(max(start, 0), len(lines))
+            end = min(max(end, start), len(lines))
+        self.start = start
+        self.end = end
+
+    def _materialize(self) -> "TextElement":
+        if self.lines is not None and not dict.__contains__(self, "text"):
+            dict.__setitem__(self, "text", "\n".join(self.lines[self.start:self.end]))
+        return self
+
+    def __getitem__(self, key):
+        if key == "text":
+            self._materialize()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key == "text":
+            self._materialize()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key) -> bool:
+        return (key == "text" and self.lines is not None) or dict.__contains__(self, key)
+
+    def __setitem__(self, key, value) -> None:
+        if key == "text":
+            self.lines = None
+        dict.__setitem__(self, key, value)
+
+    def __iter__(self):
+        return dict.__iter__(self._materialize())
+
+    def __len__(self) -> int:
+        return dict.__len__(self._materialize())
+
+    def __eq__(self, other) -> bool:
+        return dict.__eq__(self._materialize(), other)
+
+    def __ne__(self, other) -> bool:
+        return dict.__ne__(self._materialize(), other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return dict.__repr__(self._materialize())
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+    def keys(self):
+        return dict.keys(self._materialize())
+
+    def values(self):
+        return dict.values(self._materialize())
+
+    def items(self):
+        return dict.items(self._materialize())
+
+    def copy(self) -> dict:
+        return dict(dict.items(self._materialize()))
+
+    def pop(self, *args):
+        return dict.pop(self._materialize(), *args)
+
+    def setdefault(self, key, default=None):
+        return dict.setdefault(self._materialize(), key, default)
+
+
 class TextScanner:
 
     def __init__(self, text: str):
         self.text = text
+        # Lines of the last text scanned, shared by the elements extracted from it,
+        # with the lines matching the predicates already evaluated
+        self._line_index: Optional[LineIndex] = None
+
+    def line_index(self, text: Optional[str] = None) -> LineIndex:
+        """Return the LineIndex of text (default self.text), splitting the same text only once"""
+        text = self.text if text is None else text
+        if self._line_index is None or (self._line_index.text is not text and self._line_index.text != text):
+            self._line_index = LineIndex(text)
+        return self._line_index
+
+    def _lines_of(self, text: str) -> List[str]:
+        """Return text.splitlines(), splitting the same text only once"""
+        return self.line_index(text).lines
+
+    @staticmethod
+    def _element_span(element: dict):
+        """
+        Return (lines, start, end) of the lines of element text, without copying the text
+        of the elements that are still spans of a shared list of lines
+        """
+        if isinstance(element, TextElement) and element.lines is not None:
+            lines, start, end = element.lines, element.start, element.end
+            # The trailing empty line is lost by text.splitlines() of the joined text
+            if end > start and lines[end - 1] == "":
+                end -= 1
+            return lines, start, end
+        lines = element.get("text", "").splitlines()
+        return lines, 0, len(lines)
+
+    def _is_text_span(self, element: dict) -> bool:
+        """True if element is a span of the lines of the last text split"""
+        return (
+            isinstance(element, TextElement)
+            and self._line_index is not None
+            and element.lines is self._line_index.lines
+        )
+
+    @staticmethod
+    def _span_key(element: TextElement):
+        """
+        Key of the text of a span of the lines of the last text split.
+        The index of these spans is their start line, so two of them with
+        the same index have the same text only if it is empty.
+        """
+        start, end = element.start, element.end
+        if end - start > 1 or (end - start == 1 and element.lines[start] != ""):
+            return element.get("index", 0), start, end
+        return element.get("index", 0)
 
     def _skip_items(self, elements: List[dict], skip_top_items: int = 0, skip_bottom_items: int = 0) -> List[dict]:
         """
@@ -762,11 +1176,12 @@ class TextScanner:
         if skip_bottom_items > 0:
             elements = elements[:-skip_bottom_items]
 
-        # remove duplicates keeping the order
+        # remove duplicates keeping the order, without joining the text of the spans if possible
+        spans_only = all(self._is_text_span(d) for d in elements)
         seen = set()
         unique_elements = []
         for d in elements:
-            t = tuple(sorted(d.items()))
+            t = self._span_key(d) if spans_only else tuple(sorted(d.items()))
             if t not in seen:
                 seen.add(t)
                 unique_elements.append(d)
@@ -775,112 +1190,43 @@ class TextScanner:
 
     # ---------- Generic text scanning utilities (to reduce duplication) ----------
 
-    @staticmethod
-    def _make_line_checker(
-        match_type: str,
-        match_string: str,
-        strip: bool,
-        case_sensitive: bool,
-        lstrip: bool = False,
-        rstrip: bool = False,
-    ) -> Callable[[str], bool]:
-        """
-        Build a predicate that checks a single line against the given condition.
-        match_type: one of ["startswith", "endswith", "contains", "not_contains", "equal", "regex"]
-        """
-        if not case_sensitive:
-            match_string_cmp = match_string.lower()
-        else:
-            match_string_cmp = match_string
-
-        def apply_trim(s: str) -> str:
-            # strip takes precedence (can be True or a string of characters)
-            if isinstance(strip, str):
-                return s.strip(strip)
-            if strip:
-                return s.strip()
-            out = s
-            # lstrip may be bool or a string of characters
-            if lstrip:
-                if isinstance(lstrip, str):
-                    out = out.lstrip(lstrip)
-                else:
-                    out = out.lstrip()
-            # rstrip may be bool or a string of characters
-            if rstrip:
-                if isinstance(rstrip, str):
-                    out = out.rstrip(rstrip)
-                else:
-                    out = out.rstrip()
-            return out
-
-        def normalize(line: str) -> str:
-            value = apply_trim(line)
-            return value if case_sensitive else value.lower()
-
-        if match_type == "startswith":
-            return lambda line: normalize(line).startswith(match_string_cmp)
-        if match_type == "not_startswith":
-            return lambda line: not normalize(line).startswith(match_string_cmp)
-        if match_type == "endswith":
-            return lambda line: normalize(line).endswith(match_string_cmp)
-        if match_type == "not_endswith":
-            return lambda line: not normalize(line).endswith(match_string_cmp)
-        if match_type == "contains":
-            return lambda line: match_string_cmp in normalize(line)
-        if match_type == "not_contains":
-            return lambda line: match_string_cmp not in normalize(line)
-        if match_type == "equal":
-            return lambda line: normalize(line) == match_string_cmp
-        if match_type == "not_equal":
-            return lambda line: normalize(line) != match_string_cmp
-        if match_type == "regex":
-            flags = 0 if case_sensitive else re.IGNORECASE
-            try:
-                pattern = re.compile(match_string, flags)
-            except re.error as exc:
-                raise ValueError(f"Invalid regular expression: {match_string}") from exc
-            return lambda line: pattern.search(apply_trim(line)) is not None
-        raise ValueError(f"Unsupported match_type: {match_type}")
-
     @staticmethod
     def _collect_matches_for_lines(
         lines: List[str],
         initial_index: int,
         check_line: Callable[[str], bool],
         output_mode: str,
-        first_only: bool
+        first_only: bool,
+        start: int = 0,
+        end: Optional[int] = None,
+        matches: Optional[List[int]] = None,
     ) -> List[dict]:
         """
-        Scan provided lines with check_line and build elements.
+        Scan lines[start:end] with check_line and build elements.
         output_mode:
           - "from": element text starts from the matching index
           - "to":   element text is from top up to the matching index (excluded)
+        matches: sorted positions of all the lines matching check_line, if already known
         """
-        results: List[dict] = []
-        for idx, line in enumerate(lines):
-            if check_line(line):
-                if output_mode == "from":
-                    results.append(
-                        {
-                            "index": initial_index + idx,
-                            "text": "\n".join(lines[idx:]),
-                        }
-                    )
-                    if first_only:
-                        return results
-                elif output_mode == "to":
-                    results.append(
-                        {
-                            "index": initial_index,
-                            "text": "\n".join(lines[:idx]),
-                        }
-                    )
+        if output_mode not in ["from", "to"]:
+            raise ValueError(f"Unsupported output_mode: {output_mode}")
+        end = len(lines) if end is None else end
+
+        if matches is None:
+            positions = []
+            for idx in range(start, end):
+                if check_line(lines[idx]):
+                    positions.append(idx)
                     if first_only:
-                        return results
-                else:
-                    raise ValueError(f"Unsupported output_mode: {output_mode}")
-        return results
+                        break
+        else:
+            low = bisect.bisect_left(matches, start)
+            high = bisect.bisect_left(matches, end)
+            positions = matches[low:min(high, low + 1) if first_only else high]
+
+        if output_mode == "from":
+            return [TextElement(lines, idx, end, index=initial_index + idx - start) for idx in positions]
+        return [TextElement(lines, start, idx, index=initial_index) for idx in positions]
 
     def _scan_text_by_elements(
         self,
@@ -906,8 +1252,7 @@ class TextScanner:
         if not text:
             return ret
 
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        predicate = line_predicate(
             match_type=match_type,
             match_string=match_string,
             strip=strip,
@@ -915,35 +1260,112 @@ class TextScanner:
             lstrip=lstrip,
             rstrip=rstrip,
         )
+        check_line = predicate.checker()
+        line_index = self.line_index(text)
 
         # If elements are not provided, scan the whole text
         if not elements:
             ret = self._collect_matches_for_lines(
-                lines=lines,
+                lines=line_index.lines,
                 initial_index=0,
                 check_line=check_line,
                 output_mode=output_mode,
                 first_only=first_only,
+                matches=line_index.positions(predicate),
             )
             return ret
 
-        # If elements are provided, scan each element["text"] with initial index element["index"]
+        # If elements are provided, scan each element text with initial index element["index"].
+        # The lines shared by several elements are checked once.
+        matches_by_lines = {}
         aggregated: List[dict] = []
         for el in elements:
-            el_lines = el.get("text", "").splitlines()
-            initial_index = el.get("index", 0)
+            lines, start, end = self._element_span(el)
+            matches = None
+            if lines is line_index.lines:
+                matches = line_index.positions(predicate)
+            elif isinstance(el, TextElement) and el.lines is not None:
+                if id(lines) not in matches_by_lines:
+                    matches_by_lines[id(lines)] = [idx for idx, line in enumerate(lines) if check_line(line)]
+                matches = matches_by_lines[id(lines)]
             aggregated.extend(
                 self._collect_matches_for_lines(
-                    lines=el_lines,
-                    initial_index=initial_index,
+                    lines=lines,
+                    initial_index=el.get("index", 0),
                     check_line=check_line,
                     output_mode=output_mode,
                     first_only=first_only,
+                    start=start,
+                    end=end,
+                    matches=matches,
                 )
             )
         ret = self._skip_items(elements=aggregated, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
         return ret
 
+    def _closest_elements(
+        self,
+        text: str,
+        elements: List[dict],
+        match_type: str,
+        match_string: str,
+        strip: bool,
+        case_sensitive: bool,
+        lstrip: bool,
+        rstrip: bool,
+        direction: str,
+        skip_top_items: int,
+        skip_bottom_items: int,
+        first_only: bool,
+    ) -> List[dict]:
+        """
+        Generic helper of the closest__ methods.
+        For each element pick the line of text matching the condition with the closest index,
+        above the element for direction "up", below it for direction "down", the upper one
+        on ties, and return the elements starting from the picked lines.
+        """
+        if not text or not elements:
+            return []
+        predicate = line_predicate(
+            match_type=match_type,
+            match_string=match_string,
+            strip=strip,
+            case_sensitive=case_sensitive,
+            lstrip=lstrip,
+            rstrip=rstrip,
+        )
+        line_index = self.line_index(text)
+        candidates = self._collect_matches_for_lines(
+            lines=line_index.lines,
+            initial_index=0,
+            check_line=predicate.checker(),
+            output_mode="from",
+            first_only=first_only,
+            matches=line_index.positions(predicate),
+        )
+        candidate_indexes = [c.start for c in candidates]
+
+        ret = []
+        for el in elements:
+            el_index = el.get("index", 0)
+            pos = bisect.bisect_right(candidate_indexes, el_index)
+            above = candidates[pos - 1] if pos > 0 else None
+            pos = bisect.bisect_left(candidate_indexes, el_index)
+            below = candidates[pos] if pos < len(candidates) else None
+            if direction == "up":
+                best = above
+            elif direction == "down":
+                best = below
+            elif above is None or below is None:
+                best = above or below
+            else:
+                best = above if el_index - above.start <= below.start - el_index else below
+            if best is not None:
+                ret.append(TextElement(best.lines, best.start, best.end))
+
+        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
+        return ret
+
     def start__lines_starting_with(
         self,
         text: str,
@@ -966,7 +1388,7 @@ class TextScanner:
             + index of starting line
             + text: portion of text starting from the identified line
         """
-        logger.info(f"start__lines_starting_with: {json.dumps(elements, indent=4)}")
+        logger.info(f"start__lines_starting_with: {len(elements)} elements")
         return self._scan_text_by_elements(
             text=text,
             elements=elements,
@@ -1004,7 +1426,7 @@ class TextScanner:
             + index of starting line
             + text: portion of text starting from the identified line
         """
-        logger.info(f"start__lines_starting_with: {json.dumps(elements, indent=4)}")
+        logger.info(f"start__lines_starting_with: {len(elements)} elements")
         return self._scan_text_by_elements(
             text=text,
             elements=elements,
@@ -1041,11 +1463,16 @@ class TextScanner:
             + text: portion of text ending at the identified line
         """
         logger.info(f"end__at_line: {end_at_line}")
+        text_lines = self._lines_of(text)
+        ret = []
         for el in elements:
-            if el.get("index", 0) <= end_at_line < el.get("index", 0) + len(el.get("text", "").splitlines()):
-                el["text"] = "\n".join(text.splitlines()[el["index"]: end_at_line + 1])
-        logger.info(f"elements: {elements}")
-        return elements
+            index = el.get("index", 0)
+            _, start, end = self._element_span(el)
+            if index <= end_at_line < index + end - start:
+                el = TextElement(text_lines, index, end_at_line + 1)
+            ret.append(el)
+        logger.info(f"elements: {len(ret)}")
+        return ret
 
     def end__lines_starting_with(
         self,
@@ -1269,69 +1696,21 @@ class TextScanner:
             + index of starting line
             + text: portion of text starting from top to the identified line
         """
-
-        def text_to_elements(
-            lines: List[str],
-            match_string: str = "",
-            strip: bool = False,
-            case_sensitive: bool = False,
-            lstrip: bool = False,
-            rstrip: bool = False,
-        ) -> List[dict]:
-            check_line = self._make_line_checker(
-                match_type="startswith",
-                match_string=match_string,
-                strip=strip,
-                case_sensitive=case_sensitive,
-                lstrip=lstrip,
-                rstrip=rstrip,
-            )
-            return self._collect_matches_for_lines(
-                lines=lines,
-                initial_index=0,
-                check_line=check_line,
-                output_mode="from",
-                first_only=first_only,
-            )
-
-        ret = []
-
-        lines = text.splitlines()
-
-        # No elements provided: use every non-empty line as a starting point
-        closest_elements = text_to_elements(
-            lines=lines,
+        return self._closest_elements(
+            text=text,
+            elements=elements,
+            match_type="startswith",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
+            first_only=first_only,
         )
 
-        # Elements provided: for each element pick candidate by closest index
-        for el in elements:
-            el_index = el.get("index", 0)
-            new_element_closest_index = None
-            new_element_closest_text = None
-            for idx, closest_el in enumerate(closest_elements):
-                closest_el_index = closest_el.get("index", 0)
-                closest_el_text = closest_el.get("text", "")
-                if direction == "up" and closest_el_index > el_index:
-                    continue
-                if direction == "down" and closest_el_index < el_index:
-                    continue
-                if new_element_closest_index is None or (
-                    abs(closest_el_index - el_index) < abs(new_element_closest_index - el_index)
-                ):
-                    new_element_closest_index = closest_el_index
-                    new_element_closest_text = closest_el_text
-
-            if new_element_closest_index is not None:
-                ret.append({"index": new_element_closest_index, "text": new_element_closest_text})
-
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
-
     def closest__lines_not_starting_with(
         self,
         text: str,
@@ -1349,40 +1728,20 @@ class TextScanner:
         """
         Find closest lines not starting with match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="not_startswith",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def closest__lines_ending_with(
         self,
@@ -1401,40 +1760,20 @@ class TextScanner:
         """
         Find closest lines ending with match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="endswith",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def closest__lines_not_ending_with(
         self,
@@ -1453,40 +1792,20 @@ class TextScanner:
         """
         Find closest lines not ending with match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="not_endswith",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
-            first_only=first_only,
-        )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
+            first_only=first_only,
+        )
 
     def closest__lines_contains(
         self,
@@ -1505,40 +1824,20 @@ class TextScanner:
         """
         Find closest lines containing match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="contains",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def closest__lines_not_contains(
         self,
@@ -1557,40 +1856,20 @@ class TextScanner:
         """
         Find closest lines not containing match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="not_contains",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def closest__lines_equal(
         self,
@@ -1609,40 +1888,20 @@ class TextScanner:
         """
         Find closest lines equal to match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="equal",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def closest__lines_not_equal(
         self,
@@ -1661,40 +1920,20 @@ class TextScanner:
         """
         Find closest lines not equal to match_string for each element.
         """
-        if not text or not elements:
-            return []
-        lines = text.splitlines()
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="not_equal",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        candidates = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction=direction,
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
-        ret = []
-        for el in elements:
-            el_index = el.get("index", 0)
-            best = None
-            for c in candidates:
-                ci = c.get("index", 0)
-                if direction == "up" and ci > el_index:
-                    continue
-                if direction == "down" and ci < el_index:
-                    continue
-                if best is None or abs(ci - el_index) < abs(best.get("index", 0) - el_index):
-                    best = c
-            if best is not None:
-                ret.append({"index": best.get("index", 0), "text": best.get("text", "")})
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
 
     def start__lines_ending_with(
         self,
@@ -1992,50 +2231,21 @@ class TextScanner:
         to provide a new text starting from the closest matching line index.
         Returns structure with 'text' and list of elements {index, text}.
         """
-        ret = []
-
-        if not text or not elements:
-            return ret
-
-        lines = text.splitlines()
-
-        # Build candidate matches from entire text using regex
-        check_line = self._make_line_checker(
+        return self._closest_elements(
+            text=text,
+            elements=elements,
             match_type="regex",
             match_string=match_string,
             strip=strip,
             case_sensitive=case_sensitive,
             lstrip=lstrip,
             rstrip=rstrip,
-        )
-        closest_elements = self._collect_matches_for_lines(
-            lines=lines,
-            initial_index=0,
-            check_line=check_line,
-            output_mode="from",
+            direction="",
+            skip_top_items=skip_top_items,
+            skip_bottom_items=skip_bottom_items,
             first_only=first_only,
         )
 
-        # For each provided element, pick the candidate with closest index
-        for el in elements:
-            el_index = el.get("index", 0)
-            new_element_closest_index = None
-            new_element_closest_text = None
-            for closest_el in closest_elements:
-                closest_el_index = closest_el.get("index", 0)
-                closest_el_text = closest_el.get("text", "")
-                if new_element_closest_index is None or (
-                    abs(closest_el_index - el_index) < abs(new_element_closest_index - el_index)
-                ):
-                    new_element_closest_index = closest_el_index
-                    new_element_closest_text = closest_el_text
-
-            if new_element_closest_index is not None:
-                ret.append({"index": new_element_closest_index, "text": new_element_closest_text})
-
-        ret = self._skip_items(elements=ret, skip_top_items=skip_top_items, skip_bottom_items=skip_bottom_items)
-        return ret
-
     def _extend_content_of_elements(self, direction: str, count: int, text: str, elements: List[dict]) -> List[dict]:
         """
         Extend elements in the list of elements.
@@ -2048,15 +2258,15 @@ class TextScanner:
         """
         results = []
 
-        text_lines = text.splitlines()
+        text_lines = self._lines_of(text)
 
         if direction not in ["up", "down"]:
             raise ValueError(f"Invalid direction: {direction}")
 
         for el in elements:
             index = el.get("index", 0)
-            element_lines = el.get("text", "").splitlines()
-            element_lines_count = len(element_lines)
+            _, element_start, element_end = self._element_span(el)
+            element_lines_count = element_end - element_start
 
             if direction == "up":
                 start_index = min(max(0, index - count), len(text_lines))
@@ -2065,9 +2275,7 @@ class TextScanner:
                 start_index = index
                 end_index = min(max(0, index + count), len(text_lines))
 
-            el["index"] = start_index
-            el["text"] = "\n".join(text_lines[start_index:end_index])
-            results.append(el)
+            results.append(TextElement(text_lines, start_index, end_index))
         return results
 
     def _extract_split_from_elements(self, text: str, elements: List[dict], delimiter: str, index: int) -> List[dict]:
@@ -2102,7 +2310,7 @@ class TextScanner:
                     # Calculate the index of the split in the original text
                     # consider the len of the text to the line number index from the input element
                     # add to it the len of the text before the split occurrence
-                    tmp["index"] = len("\n".join(text.splitlines()[:element_index]))
+                    tmp["index"] = len("\n".join(self._lines_of(text)[:element_index]))
                     if index > 0:
                         tmp["index"] += len(delimiter.join(split_elements[:index]))
                     ret.append(tmp)
@@ -2260,11 +2468,38 @@ class ArtifactsScanner:
         {"name": "coverage", "type": "int"},
     ]
 
-    def __init__(self, user_id: str, api: Optional[dict] = {}, testing: bool = False) -> None:
+    # Rules with nested work items
+    NESTED_RULES_KEYS = ["justifications", "documents", "software_requirements", "test_specifications", "test_cases"]
+
+    # Number of file contents kept with their lines and the predicates evaluated on them
+    TEXT_SCANNERS_CACHE_SIZE = 32
+
+    def __init__(
+        self,
+        user_id: str,
+        api: Optional[dict] = {},
+        testing: bool = False,
+        scan_state: Optional[TraceabilityScanState] = None,
+        workers: Optional[int] = None,
+    ) -> None:
         self.api = api
+        self.workers = SCAN_WORKERS if workers is None else workers
+        # Duration of the scan of each api, in configuration order
+        self.api_timings = []
         self.user_id = user_id
         self.dbi = DbInterface()
         self.testing = testing
+        # Work items of the previous scan, reused by the rules not affected by the changes of the repositories
+        self.scan_state = scan_state
+        # Repositories read by the rules being evaluated, innermost last
+        self._rule_records = []
+        # repository key -> current commit, (repository key, commit) -> files changed since then
+        self._repository_commits = {}
+        self._changed_files = {}
+        # id of the rule config -> (rule config, RulePlan), the rule config keeps the id valid
+        self._rule_plans = {}
+        # file content -> TextScanner, least recently used first
+        self._text_scanners = OrderedDict()
 
         # search user
         if self.testing:
@@ -2316,6 +2551,129 @@ class ArtifactsScanner:
                 return True
         return False
 
+    def _get_rule_plan(self, rule_config: dict) -> RulePlan:
+        """Compile the line predicates of a rule once per scan"""
+        if id(rule_config) not in self._rule_plans:
+            self._rule_plans[id(rule_config)] = (rule_config, compile_rule_plan(rule_config))
+        return self._rule_plans[id(rule_config)][1]
+
+    def _get_text_scanner(self, rule_config: dict, text: str) -> TextScanner:
+        """
+        Return the TextScanner of text shared by all the fields of the rules scanning it,
+        with the predicates of rule_config evaluated in a single pass over the lines.
+        """
+        text_scanner = self._text_scanners.pop(text, None)
+        if text_scanner is None:
+            text_scanner = TextScanner(text=text)
+        self._text_scanners[text] = text_scanner
+        while len(self._text_scanners) > self.TEXT_SCANNERS_CACHE_SIZE:
+            self._text_scanners.popitem(last=False)
+        text_scanner.line_index().evaluate(self._get_rule_plan(rule_config).line_passes)
+        return text_scanner
+
+    def _iter_rule_configs(self):
+        """Yield the snippet rules of the configuration and the rules nested in them"""
+
+        def walk(rules):
+            for rule_config in rules or []:
+                if not isinstance(rule_config, dict):
+                    continue
+                yield rule_config
+                for key in self.NESTED_RULES_KEYS:
+                    if isinstance(rule_config.get(key, None), dict):
+                        yield from walk(rule_config.get(key).get("rules", []))
+
+        for api_config in self.scan_config.get("api", None) or []:
+            if isinstance(api_config, dict) and isinstance(api_config.get("snippets", None), dict):
+                yield from walk(api_config.get("snippets").get("rules", []))
+
+    def dump_rule_plans(self) -> List[dict]:
+        """Return the compiled plan of each rule of the configuration, for debugging"""
+        return [self._get_rule_plan(rule_config).describe() for rule_config in self._iter_rule_configs()]
+
+    def _scan_rule(self, kind: str, rule_config: dict, _magic_variables: dict, scan_rule: Callable) -> List[dict]:
+        """
+        Return the work items extracted by scan_rule(rule_config).
+        The ones of the previous scan are reused if none of the files changed since then
+        matches the patterns of the rule or of its nested rules.
+        """
+        if self.scan_state is None or not repo_mirror_cache.enabled:
+            return scan_rule(rule_config)
+
+        key = rule_key(kind=kind, rule_config=rule_config, magic_variables=_magic_variables)
+        record = self.scan_state.get_rule(key)
+        if record is not None and self._is_rule_record_valid(record):
+            logger.info(f"  - Rule {rule_config.get('name', '')}: no changes since the last scan, reused")
+            self._merge_rule_repositories(record["repositories"])
+            self.scan_state.set_rule(key, record)
+            return copy.deepcopy(record["work_items"])
+
+        self._rule_records.append({})
+        try:
+            work_items = scan_rule(rule_config)
+        finally:
+            repositories = self._rule_records.pop()
+        self._merge_rule_repositories(repositories)
+        if all(x["commit"] for x in repositories.values()):
+            self.scan_state.set_rule(key, {"repositories": repositories, "work_items": work_items})
+        return work_items
+
+    def _merge_rule_repositories(self, repositories: dict) -> None:
+        """Add the repositories read by a rule to the ones of the rule evaluating it"""
+        if not self._rule_records:
+            return
+        parent = self._rule_records[-1]
+        for key, repository in repositories.items():
+            merged = parent.setdefault(key, dict(repository, patterns=[]))
+            if merged["commit"] != repository["commit"]:
+                # Read at different commits, e.g. fetched during the scan
+                merged["commit"] = None
+            merged["patterns"] += [x for x in repository["patterns"] if x not in merged["patterns"]]
+
+    def _is_rule_record_valid(self, record: dict) -> bool:
+        """Return True if no file matching the patterns of the rule changed in its repositories"""
+        for repository in record["repositories"].values():
+            changed_files = self._get_changed_files(repository)
+            if changed_files is None:
+                return False
+            for pattern in repository["patterns"]:
+                files = changed_files
+                if not pattern["hidden"]:
+                    files = [x for x in files if not any(part.startswith(".") for part in x.split("/"))]
+                if RepoScanner.filter_files(
+                    files=files, filename_pattern=pattern["filename_pattern"], folder_pattern=pattern["folder_pattern"]
+                ):
+                    return False
+        return True
+
+    def _get_changed_files(self, repository: dict) -> Optional[List[str]]:
+        """Return the files changed since the commit of the repository, None if unknown"""
+        key = repository_key(url=repository["url"], branch=repository["branch"])
+        if key not in self._repository_commits:
+            try:
+                self._repository_commits[key] = repo_mirror_cache.resolve(
+                    url=repository["url"], ref=repository["branch"]
+                )
+            except RuntimeError as exc:
+                logger.warning(f"Unable to resolve {repository['branch']} of {repository['url']}: {exc}")
+                self._repository_commits[key] = None
+        commit = self._repository_commits[key]
+        if commit is None or not repository["commit"]:
+            return None
+        if commit == repository["commit"]:
+            return []
+        if (key, repository["commit"]) not in self._changed_files:
+            try:
+                changed_files = repo_mirror_cache.changed_files(
+                    url=repository["url"], old_commit=repository["commit"], new_commit=commit
+                )
+                logger.info(f"{len(changed_files)} files changed in {key} since {repository['commit']}")
+            except RuntimeError as exc:
+                logger.warning(f"Unable to compare {key} with {repository['commit']}: {exc}")
+                changed_files = None
+            self._changed_files[(key, repository["commit"])] = changed_files
+        return self._changed_files[(key, repository["commit"])]
+
     def scan(self) -> dict:
 
         api = []
@@ -2323,220 +2681,293 @@ class ArtifactsScanner:
             return ValueError("Scan configuration do not have `api` key")
 
         apis_config = self.scan_config.get("api", [])
+        self.api_timings = []
 
-        for curr_api_config in apis_config:
+        if self.workers > 1:
+            api = self._scan_parallel(apis_config=apis_config)
+        else:
+            for curr_api_config in apis_config:
+                api += self.scan_api_config(curr_api_config=curr_api_config)
 
-            # Create a ReposScanner
-            if not self._is_valid_repo_config(curr_api_config):
-                continue
+        logger.info("Api scan timings:")
+        for timing in self.api_timings:
+            logger.info(f" - {timing['api']}: {timing['seconds']:.3f} s")
+        logger.info(f"Total: {sum(x['seconds'] for x in self.api_timings):.3f} s")
 
-            api_repository_config = curr_api_config.get("repository", {})
-            api_repo_scanner = RepoScanner(user_id=self.user_id, _config=api_repository_config)
-            api_repo_scanner.clone_to_user_temp()
+        logger.info(f"Api: {json.dumps(api, indent=4)}")
+        return api
+
+    def _scan_parallel(self, apis_config: List[dict]) -> List[dict]:
+        """
+        Scan each api name of the configuration in a worker process, each worker with its own
+        ArtifactsScanner and repository checkouts. The results are merged in configuration order.
+        """
+        tasks = [
+            (index, name)
+            for index, curr_api_config in enumerate(apis_config)
+            if isinstance(curr_api_config, dict)
+            for name in curr_api_config.get("name", None) or []
+        ]
+        if len(tasks) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+            api = []
+            for curr_api_config in apis_config:
+                api += self.scan_api_config(curr_api_config=curr_api_config)
+            return api
+
+        workers = min(self.workers, len(tasks))
+        logger.info(f"Scan of {len(tasks)} apis with {workers} workers")
+        # Forked workers inherit the configuration, the rule plans and the log handlers of the scan
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_scan_worker,
+            initargs=(self,),
+        ) as executor:
+            futures = [executor.submit(_scan_api_worker, index, name) for index, name in tasks]
+            results = [x.result() for x in futures]
 
-            for idx, curr_api in enumerate(curr_api_config.get("name", [])):
-                logger.info(f"Scan for api: {curr_api}")
+        api = []
+        for task_api, api_timings, rules in results:
+            api += task_api
+            self.api_timings += api_timings
+            if self.scan_state is not None:
+                self.scan_state.new_rules.update(rules)
+        return api
 
-                curr_api_config["api"] = curr_api
-                api_reference_documents = self.search__get_files(
-                    repo_scanner=api_repo_scanner,
-                    _config=api_repository_config,
-                    _magic_variables={"__api__": curr_api},
-                )
-                if api_reference_documents:
-                    api_repository_url = api_repository_config.get("url", "")
-                    api_repository_branch = api_repository_config.get("branch", "")
-                    api_library = curr_api_config.get("library", "")
-                    api_library_version = (
-                        curr_api_config.get("library_version", "")
-                        .replace("__ref__", api_repository_branch)
-                        .replace("__branch__", api_repository_branch)
-                        .replace("__version__", api_repo_scanner.git_version)
-                    )
+    def _scan_api_task(self, index: int, name: str):
+        """Scan one api name in a worker process, return the apis, their timings and the rules evaluated"""
+        self.api_timings = []
+        if self.scan_state is not None:
+            self.scan_state.new_rules = {}
+        api = self.scan_api_config(curr_api_config=self.scan_config["api"][index], names=[name])
+        return api, self.api_timings, self.scan_state.new_rules if self.scan_state is not None else {}
 
-                    api_reference_document = api_reference_documents[0]
-
-                    # Copy the api reference document to the user's files folder
-                    api_reference_document_extension = api_reference_document.split(".")[-1]
-                    user_file_name = f"{curr_api}_{api_repository_branch}.{api_reference_document_extension}"
-                    api_user_files_path = os.path.join(USER_FILES_BASE_DIR, f"{self.user_id}", user_file_name)
-                    shutil.copy(os.path.join(api_repo_scanner.target_dir, api_reference_document), api_user_files_path)
-
-                    tmp_api = {
-                        "api": curr_api,
-                        "snippets": [],
-                        "repository_url": api_repository_url,
-                        "repository_branch": api_repository_branch,
-                        "library": api_library,
-                        "library_version": api_library_version,
-                        "original_api_reference_document": api_reference_document,
-                        "api_reference_document": api_user_files_path,
-                    }
-                    reference_document_content = FilesScanner.get_file_content(
-                        filepath=os.path.join(api_user_files_path)
-                    )
-                    tmp_api["reference_document_content"] = reference_document_content
-                    magic_variables = {
-                        "__api__": tmp_api["api"],
-                        "__library__": tmp_api["library"],
-                        "__library_version__": tmp_api["library_version"],
-                        "__api_reference_document__": tmp_api["api_reference_document"],
-                        "__reference_document_content__": tmp_api["reference_document_content"],
-                    }
+    def scan_api_config(self, curr_api_config: dict, names: Optional[List[str]] = None) -> List[dict]:
+        """Scan the apis of an entry of the configuration, only the ones in names if provided"""
+        api = []
 
-                    logger.info(f"Copied api reference document to user's folder: {api_user_files_path}")
-                    logger.info(f"Api reference document filename in user's folder: {user_file_name}")
-                    logger.info(f"Api library: {api_library}")
-                    logger.info(f"Api library version: {api_library_version}")
-                    logger.info(f"Api original reference document file: {api_reference_document}")
-                    logger.info(f"Api repository url: {api_repository_url}")
-                    logger.info(f"Api repository branch: {api_repository_branch}")
-                    logger.info(f"Api reference document extension: {api_reference_document_extension}")
+        # Create a ReposScanner
+        if not self._is_valid_repo_config(curr_api_config):
+            return api
 
-                else:
-                    logger.info(f"No api reference document found for api: {curr_api}")
-                    continue
+        api_repository_config = curr_api_config.get("repository", {})
+        api_repo_scanner = RepoScanner(user_id=self.user_id, _config=api_repository_config)
+        try:
+            api_repo_scanner.clone_to_user_temp()
 
-                # ------------------------------------------------------------
-                # Get api reference document Snippets
-                # ------------------------------------------------------------
-                logger.info("Get api reference document Snippets")
+            for curr_api in curr_api_config.get("name", []) if names is None else names:
+                start = time.perf_counter()
+                tmp_api = self.scan_api(
+                    curr_api_config=curr_api_config, api_repo_scanner=api_repo_scanner, curr_api=curr_api
+                )
+                duration = time.perf_counter() - start
+                self.api_timings.append({"api": curr_api, "seconds": duration})
+                logger.info(f"Scan for api {curr_api} completed in {duration:.3f} s")
+                if tmp_api is not None:
+                    api.append(tmp_api)
+        finally:
+            logger.info("Clear api repository scanner")
+            api_repo_scanner.close()
+            del api_repo_scanner
+        return api
 
-                snippets_config = curr_api_config.get("snippets", {})
-                if not snippets_config:
-                    logger.info(f"No snippets configuration found for api: {curr_api}")
-                    continue
+    def scan_api(self, curr_api_config: dict, api_repo_scanner: RepoScanner, curr_api: str) -> Optional[dict]:
+        """Scan the reference document of an api and the work items of its snippets"""
+        api_repository_config = curr_api_config.get("repository", {})
+        logger.info(f"Scan for api: {curr_api}")
 
-                snippet_rules_config = snippets_config.get("rules", [])
-                if not snippet_rules_config:
-                    logger.info(f"No snippet rules configuration found for api: {curr_api}")
-                    continue
+        curr_api_config["api"] = curr_api
+        api_reference_documents = self.search__get_files(
+            repo_scanner=api_repo_scanner,
+            _config=api_repository_config,
+            _magic_variables={"__api__": curr_api},
+        )
+        if api_reference_documents:
+            api_repository_url = api_repository_config.get("url", "")
+            api_repository_branch = api_repository_config.get("branch", "")
+            api_library = curr_api_config.get("library", "")
+            api_library_version = (
+                curr_api_config.get("library_version", "")
+                .replace("__ref__", api_repository_branch)
+                .replace("__branch__", api_repository_branch)
+                .replace("__version__", api_repo_scanner.git_version)
+            )
 
-                for snippet_rule_config in snippet_rules_config:
-                    snippets = []
+            api_reference_document = api_reference_documents[0]
+
+            # Copy the api reference document to the user's files folder
+            api_reference_document_extension = api_reference_document.split(".")[-1]
+            user_file_name = f"{curr_api}_{api_repository_branch}.{api_reference_document_extension}"
+            api_user_files_path = os.path.join(USER_FILES_BASE_DIR, f"{self.user_id}", user_file_name)
+            shutil.copy(os.path.join(api_repo_scanner.target_dir, api_reference_document), api_user_files_path)
+
+            tmp_api = {
+                "api": curr_api,
+                "snippets": [],
+                "repository_url": api_repository_url,
+                "repository_branch": api_repository_branch,
+                "library": api_library,
+                "library_version": api_library_version,
+                "original_api_reference_document": api_reference_document,
+                "api_reference_document": api_user_files_path,
+            }
+            reference_document_content = FilesScanner.get_file_content(
+                filepath=os.path.join(api_user_files_path)
+            )
+            tmp_api["reference_document_content"] = reference_document_content
+            magic_variables = {
+                "__api__": tmp_api["api"],
+                "__library__": tmp_api["library"],
+                "__library_version__": tmp_api["library_version"],
+                "__api_reference_document__": tmp_api["api_reference_document"],
+                "__reference_document_content__": tmp_api["reference_document_content"],
+            }
+
+            logger.info(f"Copied api reference document to user's folder: {api_user_files_path}")
+            logger.info(f"Api reference document filename in user's folder: {user_file_name}")
+            logger.info(f"Api library: {api_library}")
+            logger.info(f"Api library version: {api_library_version}")
+            logger.info(f"Api original reference document file: {api_reference_document}")
+            logger.info(f"Api repository url: {api_repository_url}")
+            logger.info(f"Api repository branch: {api_repository_branch}")
+            logger.info(f"Api reference document extension: {api_reference_document_extension}")
 
-                    logger.info(f"Scan for snippet: {snippet_rule_config.get('name', '')}")
+        else:
+            logger.info(f"No api reference document found for api: {curr_api}")
+            return None
 
-                    for snippet_field in self.SNIPPET_FIELDS:
-                        valid_fields_config = True
-                        if not self._is_valid_work_item_config(snippet_rule_config, snippet_field["name"]):
-                            valid_fields_config = False
-                            break
+        # ------------------------------------------------------------
+        # Get api reference document Snippets
+        # ------------------------------------------------------------
+        logger.info("Get api reference document Snippets")
 
-                    if not valid_fields_config:
-                        continue
+        snippets_config = curr_api_config.get("snippets", {})
+        if not snippets_config:
+            logger.info(f"No snippets configuration found for api: {curr_api}")
+            return None
 
-                    reference_document_snippets = self.search__snippets(
-                        _config=snippet_rule_config,
-                        _reference_document_content=reference_document_content,
-                        _magic_variables=magic_variables,
-                    )
-                    if reference_document_snippets:
-                        # reference_document_snippet = reference_document_snippets[0]
-                        snippets += reference_document_snippets
-
-                    # add nested work items keys to each snippet
-                    for snippet in snippets:
-                        snippet["justifications"] = []
-                        snippet["documents"] = []
-                        snippet["software_requirements"] = []
-                        snippet["test_specifications"] = []
-                        snippet["test_cases"] = []
-
-                    # ------------------------------------------------------------
-                    # Justifications
-                    # ------------------------------------------------------------
-                    logger.info("  - Justifications")
-
-                    justifications_config = snippet_rule_config.get("justifications", {})
-                    justifications = self.search__justifications(
-                        _config=justifications_config,
-                        _magic_variables=magic_variables,
-                    )
+        snippet_rules_config = snippets_config.get("rules", [])
+        if not snippet_rules_config:
+            logger.info(f"No snippet rules configuration found for api: {curr_api}")
+            return None
 
-                    if justifications:
-                        for snippet in snippets:
-                            snippet["justifications"] += justifications
+        for snippet_rule_config in snippet_rules_config:
+            snippets = []
 
-                    logger.info(f"    -> Found: {len(snippet['justifications'])} justifications")
+            logger.info(f"Scan for snippet: {snippet_rule_config.get('name', '')}")
 
-                    # ------------------------------------------------------------
-                    # Documents
-                    # ------------------------------------------------------------
-                    logger.info("  - Documents")
+            for snippet_field in self.SNIPPET_FIELDS:
+                valid_fields_config = True
+                if not self._is_valid_work_item_config(snippet_rule_config, snippet_field["name"]):
+                    valid_fields_config = False
+                    break
 
-                    documents_config = snippet_rule_config.get("documents", {})
-                    documents = self.search__documents(
-                        _config=documents_config,
-                        _magic_variables=magic_variables,
-                    )
+            if not valid_fields_config:
+                continue
 
-                    if documents:
-                        for snippet in snippets:
-                            snippet["documents"] += documents
+            reference_document_snippets = self.search__snippets(
+                _config=snippet_rule_config,
+                _reference_document_content=reference_document_content,
+                _magic_variables=magic_variables,
+            )
+            if reference_document_snippets:
+                # reference_document_snippet = reference_document_snippets[0]
+                snippets += reference_document_snippets
+
+            # add nested work items keys to each snippet
+            for snippet in snippets:
+                snippet["justifications"] = []
+                snippet["documents"] = []
+                snippet["software_requirements"] = []
+                snippet["test_specifications"] = []
+                snippet["test_cases"] = []
+
+            # ------------------------------------------------------------
+            # Justifications
+            # ------------------------------------------------------------
+            logger.info("  - Justifications")
+
+            justifications_config = snippet_rule_config.get("justifications", {})
+            justifications = self.search__justifications(
+                _config=justifications_config,
+                _magic_variables=magic_variables,
+            )
 
-                    logger.info(f"    -> Found: {len(snippet['documents'])} documents")
+            if justifications:
+                for snippet in snippets:
+                    snippet["justifications"] += justifications
 
-                    # ------------------------------------------------------------
-                    # Software Requirements
-                    # ------------------------------------------------------------
-                    logger.info("  - Software Requirements")
+            logger.info(f"    -> Found: {len(snippet['justifications'])} justifications")
 
-                    software_requirements_config = snippet_rule_config.get("software_requirements", {})
-                    software_requirements = self.search__software_requirements(
-                        _config=software_requirements_config,
-                        _magic_variables=magic_variables,
-                    )
-                    if software_requirements:
-                        for snippet in snippets:
-                            snippet["software_requirements"] += software_requirements
+            # ------------------------------------------------------------
+            # Documents
+            # ------------------------------------------------------------
+            logger.info("  - Documents")
 
-                    logger.info(f"    -> Found: {len(snippet['software_requirements'])} software requirements")
+            documents_config = snippet_rule_config.get("documents", {})
+            documents = self.search__documents(
+                _config=documents_config,
+                _magic_variables=magic_variables,
+            )
 
-                    # ------------------------------------------------------------
-                    # Test Specifications
-                    # ------------------------------------------------------------
-                    logger.info("  - Test Specifications")
+            if documents:
+                for snippet in snippets:
+                    snippet["documents"] += documents
 
-                    test_specifications_config = snippet_rule_config.get("test_specifications", {})
-                    test_specifications = self.search__test_specifications(
-                        _config=test_specifications_config,
-                        _magic_variables=magic_variables,
-                    )
-                    if test_specifications:
-                        for snippet in snippets:
-                            snippet["test_specifications"] += test_specifications
+            logger.info(f"    -> Found: {len(snippet['documents'])} documents")
 
-                    logger.info(f"    -> Found: {len(snippet['test_specifications'])} test specifications")
+            # ------------------------------------------------------------
+            # Software Requirements
+            # ------------------------------------------------------------
+            logger.info("  - Software Requirements")
 
-                    # ------------------------------------------------------------
-                    # Test Cases
-                    # ------------------------------------------------------------
-                    logger.info("  - Test Cases")
+            software_requirements_config = snippet_rule_config.get("software_requirements", {})
+            software_requirements = self.search__software_requirements(
+                _config=software_requirements_config,
+                _magic_variables=magic_variables,
+            )
+            if software_requirements:
+                for snippet in snippets:
+                    snippet["software_requirements"] += software_requirements
 
-                    test_cases_config = snippet_rule_config.get("test_cases", {})
-                    test_cases = self.search__test_cases(
-                        _config=test_cases_config,
-                        _magic_variables=magic_variables,
-                    )
-                    if test_cases:
-                        for snippet in snippets:
-                            snippet["test_cases"] += test_cases
+            logger.info(f"    -> Found: {len(snippet['software_requirements'])} software requirements")
 
-                    logger.info(f"    -> Found: {len(snippet['test_cases'])} test cases")
+            # ------------------------------------------------------------
+            # Test Specifications
+            # ------------------------------------------------------------
+            logger.info("  - Test Specifications")
 
-                    if snippets:
-                        tmp_api["snippets"] += snippets
+            test_specifications_config = snippet_rule_config.get("test_specifications", {})
+            test_specifications = self.search__test_specifications(
+                _config=test_specifications_config,
+                _magic_variables=magic_variables,
+            )
+            if test_specifications:
+                for snippet in snippets:
+                    snippet["test_specifications"] += test_specifications
 
-                # ------------------------------------------------------------
-                api.append(tmp_api)
+            logger.info(f"    -> Found: {len(snippet['test_specifications'])} test specifications")
 
-            logger.info("Clear api repository scanner")
-            # api_repo_scanner.clear_user_temp()
-            del api_repo_scanner
+            # ------------------------------------------------------------
+            # Test Cases
+            # ------------------------------------------------------------
+            logger.info("  - Test Cases")
 
-        logger.info(f"Api: {json.dumps(api, indent=4)}")
-        return api
+            test_cases_config = snippet_rule_config.get("test_cases", {})
+            test_cases = self.search__test_cases(
+                _config=test_cases_config,
+                _magic_variables=magic_variables,
+            )
+            if test_cases:
+                for snippet in snippets:
+                    snippet["test_cases"] += test_cases
+
+            logger.info(f"    -> Found: {len(snippet['test_cases'])} test cases")
+
+            if snippets:
+                tmp_api["snippets"] += snippets
+
+        return tmp_api
 
     def search__get_files(self, repo_scanner: RepoScanner, _config: dict, _magic_variables: dict) -> List[str]:
         # Get api reference document
@@ -2553,6 +2984,23 @@ class ArtifactsScanner:
             filename_pattern=filename_pattern,
             folder_pattern=folder_pattern,
         )
+        url = repo_scanner.config.get("url", "")
+        branch = repo_scanner.config.get("branch", "")
+        pattern = {
+            "filename_pattern": filename_pattern,
+            "folder_pattern": folder_pattern,
+            "hidden": bool(_config.get("hidden", False)),
+        }
+        self._merge_rule_repositories(
+            {
+                repository_key(url=url, branch=branch): {
+                    "url": url,
+                    "branch": branch,
+                    "commit": repo_scanner.commit,
+                    "patterns": [pattern],
+                }
+            }
+        )
 
         file_scanner = FilesScanner(files=files, tmp_repo_path=repo_scanner.target_dir)
         logger.info(f"Number of identified files: {len(files)}")
@@ -2567,58 +3015,43 @@ class ArtifactsScanner:
             logger.info(f"Number of files passing the content filter: {len(filtered_files)}")
         return filtered_files
 
-    def search__extract_sections(self, _config: dict, text: str, elements: List[dict]) -> List[dict]:
+    def search__extract_sections(
+        self, _config: dict, text: str, elements: List[dict], text_scanner: Optional[TextScanner] = None
+    ) -> List[dict]:
         """
         Extract sections text
+        text_scanner: scanner of text shared with the other fields of the rule, if any
         """
-
-        def _normalize_trim_value(v):
-            """
-            Normalize lstrip/rstrip/strip config values:
-            - True -> True (default whitespace)
-            - ""   -> True (explicit default whitespace)
-            - str  -> the provided character set
-            - list/tuple of strings -> concatenated character set
-            - falsy/None -> False (disabled)
-            """
-            if v is True:
-                return True
-            if isinstance(v, str):
-                return True if v == "" else v
-            if isinstance(v, (list, tuple)):
-                chars = "".join([c for c in v if isinstance(c, str) and c])
-                return chars if chars else False
-            return bool(v)
-
         mandatory_configs = ["start", "end"]
         for mandatory_config in mandatory_configs:
             if not _config.get(mandatory_config, None):
                 logger.info(f"Scan configuration error: `{mandatory_config}` is not valid into {_config}")
                 return []
 
-        text_scanner = TextScanner(text=text)
+        if text_scanner is None:
+            text_scanner = TextScanner(text=text)
 
         # Extract sections using start definition
         start_cfg = _config.get("start") or {}
 
-        strip = _normalize_trim_value(_config.get("start").get("strip", False))
-        lstrip_flag = _normalize_trim_value(_config.get("start").get("lstrip", False))
-        rstrip_flag = _normalize_trim_value(_config.get("start").get("rstrip", False))
+        strip = normalize_trim_value(_config.get("start").get("strip", False))
+        lstrip_flag = normalize_trim_value(_config.get("start").get("lstrip", False))
+        rstrip_flag = normalize_trim_value(_config.get("start").get("rstrip", False))
         case_sensitive = _config.get("start").get("case_sensitive", False)
         start_skip_top_items = _config.get("start").get("skip_top_items", 0)
         start_skip_bottom_items = _config.get("start").get("skip_bottom_items", 0)
-        start_first_only = _normalize_trim_value(start_cfg.get("first_only", False))
+        start_first_only = normalize_trim_value(start_cfg.get("first_only", False))
 
         # Defaults for end are inherited from start unless explicitly overridden
         end_cfg = _config.get("end") or {}
-        strip_end = _normalize_trim_value(end_cfg.get("strip", strip))
-        lstrip_end = _normalize_trim_value(end_cfg.get("lstrip", lstrip_flag))
-        rstrip_end = _normalize_trim_value(end_cfg.get("rstrip", rstrip_flag))
+        strip_end = normalize_trim_value(end_cfg.get("strip", strip))
+        lstrip_end = normalize_trim_value(end_cfg.get("lstrip", lstrip_flag))
+        rstrip_end = normalize_trim_value(end_cfg.get("rstrip", rstrip_flag))
         end_skip_top_items = end_cfg.get("skip_top_items", start_skip_top_items)
         end_skip_bottom_items = end_cfg.get("skip_bottom_items", start_skip_bottom_items)
 
         # By default we keep single output from end
-        end_first_only = _normalize_trim_value(end_cfg.get("first_only", True))
+        end_first_only = normalize_trim_value(end_cfg.get("first_only", True))
 
         if _config.get("start").get("at", None) is not None:
             start_at = _config.get("start").get("at")
@@ -3041,9 +3474,9 @@ class ArtifactsScanner:
                 or split_cfg.get("value")
                 or split_cfg.get("separator")
             )
-            split_strip = _normalize_trim_value(split_cfg.get("strip", False)) if "strip" in split_cfg else False
-            split_lstrip = _normalize_trim_value(split_cfg.get("lstrip", False)) if "lstrip" in split_cfg else False
-            split_rstrip = _normalize_trim_value(split_cfg.get("rstrip", False)) if "rstrip" in split_cfg else False
+            split_strip = normalize_trim_value(split_cfg.get("strip", False)) if "strip" in split_cfg else False
+            split_lstrip = normalize_trim_value(split_cfg.get("lstrip", False)) if "lstrip" in split_cfg else False
+            split_rstrip = normalize_trim_value(split_cfg.get("rstrip", False)) if "rstrip" in split_cfg else False
             split_keep_empty = split_cfg.get("keep_empty", False)
             if delimiter:
                 # If elements accidentally wrapped in a dict of shape {"text":..., "elements":[...]},
@@ -3071,9 +3504,9 @@ class ArtifactsScanner:
 
         # Field-level final trimming on resulting element texts, e.g. rstrip: ";"
         if elements:
-            field_strip = _normalize_trim_value(_config.get("strip", False)) if "strip" in _config else False
-            field_lstrip = _normalize_trim_value(_config.get("lstrip", False)) if "lstrip" in _config else False
-            field_rstrip = _normalize_trim_value(_config.get("rstrip", False)) if "rstrip" in _config else False
+            field_strip = normalize_trim_value(_config.get("strip", False)) if "strip" in _config else False
+            field_lstrip = normalize_trim_value(_config.get("lstrip", False)) if "lstrip" in _config else False
+            field_rstrip = normalize_trim_value(_config.get("rstrip", False)) if "rstrip" in _config else False
             if field_strip or field_lstrip or field_rstrip:
                 for el in elements:
                     curr = el.get("text", "")
@@ -3095,7 +3528,8 @@ class ArtifactsScanner:
                                 curr = curr.rstrip()
                     el["text"] = curr
 
-        return elements
+        # Only the final elements are joined in plain dictionaries
+        return [dict(el) for el in elements]
 
     def _get_field_value(self, _config: dict, field_name: str, field_type: str, text: str, _magic_variables: dict):
         """
@@ -3141,7 +3575,12 @@ class ArtifactsScanner:
             # Only treat as extraction config if both 'start' and 'end' are provided
             # To avoid conflict with test_case repository field
             if field_config.get("start", None) is not None and field_config.get("end", None) is not None:
-                ret = self.search__extract_sections(_config=field_config, text=text, elements=[])
+                ret = self.search__extract_sections(
+                    _config=field_config,
+                    text=text,
+                    elements=[],
+                    text_scanner=self._get_text_scanner(rule_config=_config, text=text),
+                )
 
                 # NOTE: Do not apply magic variables to the extracted text
 
@@ -3505,8 +3944,8 @@ class ArtifactsScanner:
             return justifications
 
         # ------------------------------------------------------------
-        ret = []
-        for rule_config in _config.get("rules", []):
+        def scan_rule(rule_config: dict) -> List[dict]:
+            ret = []
             logger.info(f"  - Justification Rule: {rule_config.get('name', '')}")
             repository_config = rule_config.get("repository", None)
 
@@ -3524,7 +3963,7 @@ class ArtifactsScanner:
                 )
                 if justifications:
                     ret += justifications
-                continue
+                return ret
 
             repo_scanner = RepoScanner(user_id=self.user_id, _config=repository_config)
             repo_scanner.clone_to_user_temp()
@@ -3553,6 +3992,17 @@ class ArtifactsScanner:
 
                     if justifications:
                         ret += justifications
+            repo_scanner.close()
+            return ret
+
+        ret = []
+        for rule_config in _config.get("rules", []):
+            ret += self._scan_rule(
+                kind="justifications",
+                rule_config=rule_config,
+                _magic_variables=_magic_variables,
+                scan_rule=scan_rule,
+            )
         return ret
 
     def search__documents(self, _config: dict, _magic_variables: dict) -> List[dict]:
@@ -3636,8 +4086,8 @@ class ArtifactsScanner:
             return documents
 
         # ------------------------------------------------------------
-        ret = []
-        for rule_config in _config.get("rules", []):
+        def scan_rule(rule_config: dict) -> List[dict]:
+            ret = []
             logger.info(f"  - Document Rule: {rule_config.get('name', '')}")
             repository_config = rule_config.get("repository", None)
 
@@ -3667,7 +4117,7 @@ class ArtifactsScanner:
                         d["documents"] += nested_documents
                 if documents:
                     ret += documents
-                continue
+                return ret
 
             repo_scanner = RepoScanner(user_id=self.user_id, _config=repository_config)
             repo_scanner.clone_to_user_temp()
@@ -3699,6 +4149,17 @@ class ArtifactsScanner:
 
                     if documents:
                         ret += documents
+            repo_scanner.close()
+            return ret
+
+        ret = []
+        for rule_config in _config.get("rules", []):
+            ret += self._scan_rule(
+                kind="documents",
+                rule_config=rule_config,
+                _magic_variables=_magic_variables,
+                scan_rule=scan_rule,
+            )
         return ret
 
     def search__software_requirements(self, _config: dict, _magic_variables: dict) -> List[dict]:
@@ -3783,8 +4244,8 @@ class ArtifactsScanner:
             return software_requirements
 
         # ------------------------------------------------------------
-        ret = []
-        for rule_config in _config.get("rules", []):
+        def scan_rule(rule_config: dict) -> List[dict]:
+            ret = []
             logger.info(f"  - Software Requirement Rule: {rule_config.get('name', '')}")
             repository_config = rule_config.get("repository", None)
 
@@ -3843,7 +4304,7 @@ class ArtifactsScanner:
                 if software_requirements:
                     ret += software_requirements
                 logger.info(" ---> here")
-                continue
+                return ret
 
             repo_scanner = RepoScanner(user_id=self.user_id, _config=repository_config)
             repo_scanner.clone_to_user_temp()
@@ -3916,6 +4377,17 @@ class ArtifactsScanner:
                         ret += software_requirements
             else:
                 logger.info("No software requirements files found")
+            repo_scanner.close()
+            return ret
+
+        ret = []
+        for rule_config in _config.get("rules", []):
+            ret += self._scan_rule(
+                kind="software_requirements",
+                rule_config=rule_config,
+                _magic_variables=_magic_variables,
+                scan_rule=scan_rule,
+            )
         return ret
 
     def search__test_specifications(self, _config: dict, _magic_variables: dict) -> List[dict]:
@@ -4002,8 +4474,8 @@ class ArtifactsScanner:
             return test_specifications
 
         # ------------------------------------------------------------
-        ret = []
-        for rule_config in _config.get("rules", []):
+        def scan_rule(rule_config: dict) -> List[dict]:
+            ret = []
             logger.info(f"  - Test Specification Rule: {rule_config.get('name', '')}")
             repository_config = rule_config.get("repository", None)
 
@@ -4021,7 +4493,7 @@ class ArtifactsScanner:
                 )
                 if test_specifications:
                     ret += test_specifications
-                continue
+                return ret
 
             repo_scanner = RepoScanner(user_id=self.user_id, _config=repository_config)
             repo_scanner.clone_to_user_temp()
@@ -4050,6 +4522,17 @@ class ArtifactsScanner:
 
                     if test_specifications:
                         ret += test_specifications
+            repo_scanner.close()
+            return ret
+
+        ret = []
+        for rule_config in _config.get("rules", []):
+            ret += self._scan_rule(
+                kind="test_specifications",
+                rule_config=rule_config,
+                _magic_variables=_magic_variables,
+                scan_rule=scan_rule,
+            )
         return ret
 
     def search__test_cases(self, _config: dict, _magic_variables: dict) -> List[dict]:
@@ -4129,15 +4612,15 @@ class ArtifactsScanner:
             return test_cases
 
         # ------------------------------------------------------------
-        ret = []
-        for rule_config in _config.get("rules", []):
+        def scan_rule(rule_config: dict) -> List[dict]:
+            ret = []
             logger.info(f"  - Test Case Rule: {rule_config.get('name', '')}")
             repository_config = rule_config.get("repository", None)
 
             if not repository_config:
                 # Mandatory for Test Cases
                 logger.info(f"  - Test Case Rule: {rule_config} do not have `repository` key")
-                continue
+                return ret
 
             repo_scanner = RepoScanner(user_id=self.user_id, _config=repository_config)
             repo_scanner.clone_to_user_temp()
@@ -4179,15 +4662,48 @@ class ArtifactsScanner:
                             f"  - Test Case Rule '{rule_config.get('name', '')}': no test cases extracted "
                             f"from {test_cases_file} (description/title/coverage extraction may have returned empty)"
                         )
+            repo_scanner.close()
+            return ret
+
+        ret = []
+        for rule_config in _config.get("rules", []):
+            ret += self._scan_rule(
+                kind="test_cases",
+                rule_config=rule_config,
+                _magic_variables=_magic_variables,
+                scan_rule=scan_rule,
+            )
         return ret
 
 
+# ArtifactsScanner of a worker process of a parallel scan
+_worker_scanner = None
+
+
+def _init_scan_worker(scanner: ArtifactsScanner) -> None:
+    global _worker_scanner
+    _worker_scanner = scanner
+
+
+def _scan_api_worker(index: int, name: str):
+    return _worker_scanner._scan_api_task(index=index, name=name)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Artifacts Repo Scanner")
     parser.add_argument("--userid", type=int, required=True, help="User ID (e.g., --userid 323)")
     parser.add_argument(
         "--logfile", type=str, required=False, help="Log file name (e.g., --logfile 20251115_120000.log)"
     )
+    parser.add_argument(
+        "--dump-plan", action="store_true", help="Log the compiled rules of the configuration and exit"
+    )
+    parser.add_argument(
+        "--full-scan", action="store_true", help="Evaluate all the rules, even if their files did not change"
+    )
+    parser.add_argument(
+        "--workers", type=int, required=False, help="Processes scanning the apis in parallel"
+    )
     args = parser.parse_args()
 
     dbi = DbInterface()
@@ -4212,7 +4728,20 @@ if __name__ == "__main__":
     logger.addHandler(logging.FileHandler(logfile))
     logger.setLevel(logging.INFO)
 
-    scanner = ArtifactsScanner(user_id=args.userid, api="test")
+    # Work items of the previous scan, to evaluate only the rules affected by the changes of the repositories
+    # and to update only the mappings of the work items added, changed or removed since then
+    scan_state = TraceabilityScanState(
+        path=os.path.join(user_config_path, STATE_FILENAME), config=get_user_traceability_scanner_config(user)
+    )
+    if args.full_scan:
+        scan_state.rules = {}
+
+    scanner = ArtifactsScanner(user_id=args.userid, api="test", scan_state=scan_state, workers=args.workers)
+    if args.dump_plan:
+        logger.info(f"Rule plans: {json.dumps(scanner.dump_rule_plans(), indent=4)}")
+        sys.exit(0)
     traceability = scanner.scan()
-    generator = TraceabilityGenerator(traceability=traceability, user_id=args.userid, logfile=logfile)
+    delta = traceability_delta(previous=scan_state.traceability, current=traceability)
+    generator = TraceabilityGenerator(traceability=traceability, user_id=args.userid, logfile=logfile, delta=delta)
     generator.generate()
+    scan_state.save(traceability=traceability)
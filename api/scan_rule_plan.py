@@ -0,0 +1,390 @@
+import operator
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Union
+
+# Compiled rules of the traceability scanner.
+# The fields of a rule extracted with start/end blocks are compiled once in a RulePlan,
+# listing the line predicates used by their matchers. A LineIndex evaluates all the
+# predicates of a plan over the lines of a file in a single pass for each trim/case
+# combination: lines are normalized once and the plain matchers (starting with,
+# ending with, contains, equal) are searched with a single regular expression.
+
+# Match types of the TextScanner -> (positive match type, negated)
+MATCH_TYPES = {
+    "startswith": ("startswith", False),
+    "not_startswith": ("startswith", True),
+    "endswith": ("endswith", False),
+    "not_endswith": ("endswith", True),
+    "contains": ("contains", False),
+    "not_contains": ("contains", True),
+    "equal": ("equal", False),
+    "not_equal": ("equal", True),
+    "regex": ("regex", False),
+}
+
+# Matchers of the start/end/closest blocks of the scanner configuration, in evaluation order
+CONFIG_MATCH_TYPES = {
+    "line_starting_with": "startswith",
+    "line_not_starting_with": "not_startswith",
+    "line_ending_with": "endswith",
+    "line_not_ending_with": "not_endswith",
+    "line_contains": "contains",
+    "line_not_contains": "not_contains",
+    "line_equal": "equal",
+    "line_not_equal": "not_equal",
+    "line_regex": "regex",
+}
+
+# Plain matchers as alternatives of a MULTILINE search over the normalized lines joined by "\n"
+_SCAN_PATTERNS = {
+    "startswith": "^{}",
+    "endswith": "{}$",
+    "contains": "{}",
+    "equal": "^{}$",
+}
+
+# Plain matchers as lookaheads of a match on a single normalized line
+_LINE_PATTERNS = {
+    "startswith": "{}",
+    "endswith": ".*{}\\Z",
+    "contains": ".*?{}",
+    "equal": "{}\\Z",
+}
+
+TrimValue = Union[bool, str]
+
+
+def normalize_trim_value(v) -> TrimValue:
+    """
+    Normalize lstrip/rstrip/strip config values:
+    - True -> True (default whitespace)
+    - ""   -> True (explicit default whitespace)
+    - str  -> the provided character set
+    - list/tuple of strings -> concatenated character set
+    - falsy/None -> False (disabled)
+    """
+    if v is True:
+        return True
+    if isinstance(v, str):
+        return True if v == "" else v
+    if isinstance(v, (list, tuple)):
+        chars = "".join([c for c in v if isinstance(c, str) and c])
+        return chars if chars else False
+    return bool(v)
+
+
+class Normalization(NamedTuple):
+    """Trim and case folding applied to a line before checking it"""
+
+    strip: TrimValue
+    lstrip: TrimValue
+    rstrip: TrimValue
+    lower: bool
+
+    def apply(self, line: str) -> str:
+        # strip takes precedence (can be True or a string of characters)
+        if isinstance(self.strip, str):
+            out = line.strip(self.strip)
+        elif self.strip:
+            out = line.strip()
+        else:
+            out = line
+            # lstrip/rstrip may be bool or a string of characters
+            if self.lstrip:
+                out = out.lstrip(self.lstrip) if isinstance(self.lstrip, str) else out.lstrip()
+            if self.rstrip:
+                out = out.rstrip(self.rstrip) if isinstance(self.rstrip, str) else out.rstrip()
+        return out.lower() if self.lower else out
+
+    def apply_all(self, lines: List[str]) -> List[str]:
+        """Return apply() of each line"""
+        if isinstance(self.strip, str) or self.strip:
+            steps = [operator.methodcaller("strip", *([self.strip] if isinstance(self.strip, str) else []))]
+        else:
+            steps = [operator.methodcaller(name, *([value] if isinstance(value, str) else []))
+                     for name, value in [("lstrip", self.lstrip), ("rstrip", self.rstrip)] if value]
+        if self.lower:
+            steps.append(str.lower)
+        for step in steps:
+            lines = list(map(step, lines))
+        return lines
+
+    def describe(self) -> dict:
+        return self._asdict()
+
+
+class LinePredicate(NamedTuple):
+    """Condition on a single line, match_string is already folded for case insensitive matchers"""
+
+    match_type: str
+    match_string: str
+    normalization: Normalization
+    negated: bool = False
+    case_sensitive: bool = False
+
+    def test_normalized(self) -> Callable[[str], bool]:
+        """Return the check of a line already normalized, ignoring negated"""
+        s = self.match_string
+        if self.match_type == "regex":
+            pattern = compile_line_regex(s, self.case_sensitive)
+            return lambda line: pattern.search(line) is not None
+        if self.match_type == "startswith":
+            return lambda line: line.startswith(s)
+        if self.match_type == "endswith":
+            return lambda line: line.endswith(s)
+        if self.match_type == "contains":
+            return lambda line: s in line
+        return lambda line: line == s
+
+    def checker(self) -> Callable[[str], bool]:
+        """Return the check of a raw line"""
+        normalize = self.normalization.apply
+        test = self.test_normalized()
+        if self.negated:
+            return lambda line: not test(normalize(line))
+        return lambda line: test(normalize(line))
+
+    def positive(self) -> "LinePredicate":
+        return self._replace(negated=False)
+
+    def describe(self) -> str:
+        return f"{'not ' if self.negated else ''}{self.match_type} {self.match_string!r}"
+
+
+def compile_line_regex(match_string: str, case_sensitive: bool) -> re.Pattern:
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        return re.compile(match_string, flags)
+    except re.error as exc:
+        raise ValueError(f"Invalid regular expression: {match_string}") from exc
+
+
+def line_predicate(
+    match_type: str,
+    match_string: str,
+    strip: TrimValue,
+    case_sensitive: bool,
+    lstrip: TrimValue = False,
+    rstrip: TrimValue = False,
+) -> LinePredicate:
+    """
+    Build the predicate checking a single line against the given condition.
+    match_type: one of the MATCH_TYPES
+    """
+    if match_type not in MATCH_TYPES:
+        raise ValueError(f"Unsupported match_type: {match_type}")
+    base_type, negated = MATCH_TYPES[match_type]
+    if isinstance(strip, str) or strip:
+        lstrip = rstrip = False
+    if base_type == "regex":
+        compile_line_regex(match_string, case_sensitive)
+        return LinePredicate(base_type, match_string, Normalization(strip, lstrip, rstrip, False), negated,
+                             bool(case_sensitive))
+    if not case_sensitive:
+        match_string = match_string.lower()
+    return LinePredicate(base_type, match_string, Normalization(strip, lstrip, rstrip, not case_sensitive), negated,
+                         bool(case_sensitive))
+
+
+class LinePass:
+    """
+    Positive predicates sharing a normalization, evaluated together over the lines of a text.
+    The lines matching any plain predicate are found with one search over the joined lines,
+    each of them is then checked against all the plain predicates with a single match.
+    """
+
+    def __init__(self, normalization: Normalization, predicates: Iterable[LinePredicate]):
+        self.normalization = normalization
+        self.predicates = list(dict.fromkeys(predicates))
+        # Match strings with a line break never match a single line, they are checked line by line
+        self.plain = [
+            x for x in self.predicates
+            if x.match_type in _SCAN_PATTERNS and isinstance(x.match_string, str) and "\n" not in x.match_string
+        ]
+        self.others = [x for x in self.predicates if x not in self.plain]
+        self.scan = self.resolve = None
+        if self.plain:
+            self.scan = re.compile(
+                "|".join(_SCAN_PATTERNS[x.match_type].format(re.escape(x.match_string)) for x in self.plain),
+                re.MULTILINE,
+            )
+            self.resolve = re.compile(
+                "".join(f"(?:(?={_LINE_PATTERNS[x.match_type].format(re.escape(x.match_string))})())?"
+                        for x in self.plain),
+                re.DOTALL,
+            )
+
+    def run(self, lines: List[str], text: str) -> Dict[LinePredicate, List[int]]:
+        """
+        Return the sorted positions of the normalized lines matching each predicate.
+        text: the normalized lines joined by "\n"
+        """
+        ret = {x: [] for x in self.predicates}
+        if self.plain and lines:
+            idx = 0
+            pos = 0
+            while True:
+                m = self.scan.search(text, pos)
+                if m is None:
+                    break
+                # Line of the match, then skip to the next line
+                idx += text.count("\n", pos, m.start())
+                for predicate, group in zip(self.plain, self.resolve.match(lines[idx]).groups()):
+                    if group is not None:
+                        ret[predicate].append(idx)
+                pos = text.find("\n", m.start()) + 1
+                if pos == 0:
+                    break
+                idx += 1
+        for predicate in self.others:
+            if predicate.match_type == "regex":
+                search = compile_line_regex(predicate.match_string, predicate.case_sensitive).search
+                ret[predicate] = [idx for idx, line in enumerate(lines) if search(line) is not None]
+            else:
+                test = predicate.test_normalized()
+                ret[predicate] = [idx for idx, line in enumerate(lines) if test(line)]
+        return ret
+
+    def describe(self) -> dict:
+        return {
+            "normalization": self.normalization.describe(),
+            "scan": self.scan.pattern if self.scan else None,
+            "predicates": [x.describe() for x in self.predicates],
+        }
+
+
+def group_line_passes(predicates: Iterable[LinePredicate]) -> List[LinePass]:
+    """One LinePass for each normalization of the positive form of predicates"""
+    by_normalization: Dict[Normalization, Dict[LinePredicate, None]] = {}
+    for predicate in predicates:
+        by_normalization.setdefault(predicate.normalization, {})[predicate.positive()] = None
+    return [LinePass(normalization, x) for normalization, x in by_normalization.items()]
+
+
+class LineIndex:
+    """Lines of a text with the normalized lines and the lines matching each predicate, evaluated once"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.splitlines()
+        # normalization -> (normalized lines, normalized lines joined by "\n")
+        self._normalized: Dict[Normalization, tuple] = {}
+        self._positions: Dict[LinePredicate, List[int]] = {}
+
+    def normalized(self, normalization: Normalization) -> tuple:
+        """Return the normalized lines and the normalized lines joined by "\n" """
+        if normalization not in self._normalized:
+            lines = normalization.apply_all(self.lines)
+            self._normalized[normalization] = (lines, "\n".join(lines))
+        return self._normalized[normalization]
+
+    def evaluate(self, line_passes: Iterable[LinePass]) -> None:
+        """Run the passes with predicates not evaluated yet"""
+        for line_pass in line_passes:
+            if any(x not in self._positions for x in line_pass.predicates):
+                self._positions.update(line_pass.run(*self.normalized(line_pass.normalization)))
+
+    def positions(self, predicate: LinePredicate) -> List[int]:
+        """Return the sorted positions of the lines matching predicate"""
+        if predicate not in self._positions:
+            positive = predicate.positive()
+            if positive not in self._positions:
+                self.evaluate([LinePass(predicate.normalization, [positive])])
+            if predicate.negated:
+                matching = set(self._positions[positive])
+                self._positions[predicate] = [idx for idx in range(len(self.lines)) if idx not in matching]
+        return self._positions[predicate]
+
+
+def _start_at_anchor(start_cfg: dict) -> bool:
+    """True if the start block selects a fixed position, so that its matchers are not used"""
+    for key, anchor in [("at", "__start__"), ("line", "__start__")]:
+        value = start_cfg.get(key, None)
+        if value == anchor or (isinstance(value, int) and not isinstance(value, bool)):
+            return True
+    return False
+
+
+class RulePlan:
+    """Line predicates of the fields of a scanner rule extracted with start/end blocks"""
+
+    def __init__(self, name: str, fields: Dict[str, List[tuple]]):
+        self.name = name
+        # field name -> [(block, config key, predicate)]
+        self.fields = fields
+        self.line_passes = group_line_passes(x[2] for steps in fields.values() for x in steps)
+
+    def describe(self) -> dict:
+        return {
+            "rule": self.name,
+            "fields": {
+                field: [f"{block}.{key}: {predicate.describe()}" for block, key, predicate in steps]
+                for field, steps in self.fields.items()
+            },
+            "passes": [x.describe() for x in self.line_passes],
+        }
+
+
+def compile_rule_plan(rule_config: dict) -> RulePlan:
+    """
+    Compile the line predicates of the fields of rule_config extracted with start/end blocks,
+    following the defaults of ArtifactsScanner.search__extract_sections().
+    A matcher that can not be compiled is left out of the plan, the scan reports it when reached.
+    """
+    fields = {}
+    for field_name, field_config in rule_config.items():
+        if not isinstance(field_config, dict) or field_config.get("value", None) is not None:
+            continue
+        start_cfg = field_config.get("start", None)
+        end_cfg = field_config.get("end", None)
+        if not isinstance(start_cfg, dict) or not isinstance(end_cfg, dict) or not start_cfg or not end_cfg:
+            continue
+
+        strip = normalize_trim_value(start_cfg.get("strip", False))
+        lstrip = normalize_trim_value(start_cfg.get("lstrip", False))
+        rstrip = normalize_trim_value(start_cfg.get("rstrip", False))
+        case_sensitive = start_cfg.get("case_sensitive", False)
+        end_trims = (
+            normalize_trim_value(end_cfg.get("strip", strip)),
+            normalize_trim_value(end_cfg.get("lstrip", lstrip)),
+            normalize_trim_value(end_cfg.get("rstrip", rstrip)),
+        )
+
+        candidates = []
+        if not _start_at_anchor(start_cfg):
+            candidates += [("start", key, start_cfg.get(key), (strip, lstrip, rstrip))
+                           for key in CONFIG_MATCH_TYPES if start_cfg.get(key, None)]
+            closest_cfg = start_cfg.get("closest", None)
+            if isinstance(closest_cfg, dict):
+                for key in CONFIG_MATCH_TYPES:
+                    if closest_cfg.get(key, None) is None:
+                        continue
+                    value = closest_cfg.get(key)
+                    if key == "line_not_equal":
+                        value = closest_cfg.get("line_equal", "")
+                    if key in ["line_ending_with", "line_not_ending_with"] and isinstance(value, str):
+                        value = value.rstrip("\n")
+                    candidates.append(("closest", key, value, (strip, lstrip, rstrip)))
+        if end_cfg.get("at", None) is None and not end_cfg.get("line", None):
+            # Only the first end matcher is used
+            candidates += [("end", key, end_cfg.get(key), end_trims)
+                           for key in CONFIG_MATCH_TYPES if end_cfg.get(key, None)][:1]
+
+        steps = []
+        for block, key, match_string, (step_strip, step_lstrip, step_rstrip) in candidates:
+            try:
+                predicate = line_predicate(
+                    match_type=CONFIG_MATCH_TYPES[key],
+                    match_string=match_string,
+                    strip=step_strip,
+                    case_sensitive=case_sensitive,
+                    lstrip=step_lstrip,
+                    rstrip=step_rstrip,
+                )
+                hash(predicate)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            steps.append((block, key, predicate))
+        if steps:
+            fields[field_name] = steps
+    return RulePlan(name=str(rule_config.get("name", "")), fields=fields)
@@ -0,0 +1,84 @@
+import bisect
+import difflib
+
+# Initial half width of the window searched around the expected offset of a section
+MIN_SEARCH_WINDOW = 4096
+
+
+class OffsetMap():
+    """Map the offsets of a Reference Document to the offsets of its new version
+
+    The two versions are compared line by line, offsets inside unchanged lines
+    are moved by the size of the changes before them, offsets inside changed
+    lines are moved to the same distance from the start of the replacement.
+    """
+
+    def __init__(self, old_text, new_text):
+        old_lines = old_text.splitlines(keepends=True)
+        new_lines = new_text.splitlines(keepends=True)
+        old_starts = _line_starts(old_lines)
+        new_starts = _line_starts(new_lines)
+
+        # Blocks of the diff: old start, new start, new end, unchanged
+        self._old_starts = []
+        self._blocks = []
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            self._old_starts.append(old_starts[i1])
+            self._blocks.append((old_starts[i1], new_starts[j1], new_starts[j2], tag == "equal"))
+
+    def map(self, offset):
+        i = bisect.bisect_right(self._old_starts, offset) - 1
+        if i < 0:
+            return offset
+        old_start, new_start, new_end, equal = self._blocks[i]
+        if equal:
+            return new_start + offset - old_start
+        return min(new_start + offset - old_start, new_end)
+
+
+def _line_starts(lines):
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+def find_nearest(text, section, expected):
+    """Return the offset of the occurrence of section nearest to expected, None if not found.
+    The search window grows around expected, so the cost depends on the distance
+    of the occurrence and not on the size of the text."""
+    expected = max(0, min(expected, len(text)))
+    window = max(len(section), MIN_SEARCH_WINDOW)
+    while True:
+        start = max(0, expected - window)
+        end = min(len(text), expected + window + len(section))
+        after = text.find(section, expected, end)
+        before = text.rfind(section, start, min(len(text), expected + len(section) - 1)) if expected else -1
+        candidates = [x for x in [after, before] if x >= 0]
+        if candidates:
+            return min(candidates, key=lambda x: (abs(x - expected), x))
+        if start == 0 and end == len(text):
+            return None
+        window *= 4
+
+
+def reanchor_sections(sections, new_text, old_text=None):
+    """Find the new offset of each section in new_text.
+
+    sections is a list of (key, section, offset), the return value maps each key
+    to the new offset, None if the section is not part of new_text anymore.
+    Duplicated sections are anchored to the occurrence nearest to the expected offset:
+    the offset mapped with an OffsetMap if old_text is known, otherwise the offset
+    moved as much as the previous section.
+    """
+    offset_map = OffsetMap(old_text, new_text) if old_text is not None else None
+    shift = 0
+    ret = {}
+    for key, section, offset in sorted(sections, key=lambda x: x[2]):
+        expected = offset_map.map(offset) if offset_map else offset + shift
+        new_offset = find_nearest(new_text, section, expected)
+        if new_offset is not None:
+            shift = new_offset - offset
+        ret[key] = new_offset
+    return ret
@@ -0,0 +1,67 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class SizedLruCache():
+    """Thread safe in memory cache bounded by the total size of its entries
+
+    Entries are dicts with a "bytes" field, evicted in least recently used order.
+    Subclasses list their own counters in COUNTERS.
+    """
+
+    COUNTERS = ["hits", "misses", "evictions"]
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> entry, least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def stats(self):
+        with self._lock:
+            ret = dict(self._counters)
+            ret.update({"pid": os.getpid(), "entries": len(self._entries), "bytes": self._bytes,
+                        "max_bytes": self.max_bytes})
+        return ret
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._discard(key)
+            if entry["bytes"] > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry["bytes"]
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["bytes"]
+                self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        """Remove an entry, the lock must be held by the caller"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["bytes"]
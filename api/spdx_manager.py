@@ -32,6 +32,7 @@ from db.models.test_run import TestRunModel  # noqa E402
 from db.models.test_specification import TestSpecificationModel  # noqa E402
 from db.models.test_specification_test_case import TestSpecificationTestCaseModel  # noqa E402
 from db.models.user import UserModel  # noqa E402
+from mapping_loader import SwRequirementHierarchyLoader  # noqa E402
 
 logger = logging.getLogger(__name__)
 
@@ -1105,6 +1106,7 @@ class SPDXManager:
         xsr: Optional[Union[ApiSwRequirementModel, SwRequirementSwRequirementModel]] = None,
         spdx_sr: SPDXFile = None,  # SPDX object of SwRequirement from xsr.sw_requriement
         dbsession=None,
+        loader: SwRequirementHierarchyLoader = None,
     ):
         """In BASIL user can create a complex hierarchy of Software Requirements.
         Moreover we can assign other work items to each Software Requirement in the chain.
@@ -1114,6 +1116,7 @@ class SPDXManager:
         :param xsr: Sw Requirement mapping model instance
         :param spdx_sr: SwRequirementSPDX instance
         :param dbi: Database interface instance
+        :param loader: preloaded Sw Requirement hierarchy, if missing the hierarchy is queried node by node
         :return:
         """
         if isinstance(xsr, ApiSwRequirementModel):
@@ -1126,11 +1129,14 @@ class SPDXManager:
             return
 
         # SwRequirementSwRequirementModel
-        sr_srs = (
-            dbsession.query(SwRequirementSwRequirementModel)
-            .filter(getattr(SwRequirementSwRequirementModel, mapping_field_id) == xsr.id)
-            .all()
-        )
+        if loader:
+            sr_srs = loader.get_sw_requirements(mapping_field, xsr.id)
+        else:
+            sr_srs = (
+                dbsession.query(SwRequirementSwRequirementModel)
+                .filter(getattr(SwRequirementSwRequirementModel, mapping_field_id) == xsr.id)
+                .all()
+            )
         for sr_sr in sr_srs:
             spdx_sr_sr = self.addSwRequirement(software_requirement=sr_sr.sw_requirement, dbsession=dbsession)
             self.addRelationship(
@@ -1142,15 +1148,17 @@ class SPDXManager:
 
             # SwRequirementTestSpecification
             self.addSwRequirementTestSpecifications(
-                spdx_sr=spdx_sr_sr, mapping_to=mapping_field, mapping_id=xsr.id, dbsession=dbsession
+                spdx_sr=spdx_sr_sr, mapping_to=mapping_field, mapping_id=xsr.id, dbsession=dbsession, loader=loader
             )
 
             # SwRequirementTestCases
             self.addSwRequirementTestCases(
-                spdx_sr=spdx_sr_sr, mapping_to=mapping_field, mapping_id=xsr.id, dbsession=dbsession
+                spdx_sr=spdx_sr_sr, mapping_to=mapping_field, mapping_id=xsr.id, dbsession=dbsession, loader=loader
             )
 
-            self.addSoftwareRequirementNestedElements(api=api, xsr=sr_sr, spdx_sr=spdx_sr_sr, dbsession=dbsession)
+            self.addSoftwareRequirementNestedElements(
+                api=api, xsr=sr_sr, spdx_sr=spdx_sr_sr, dbsession=dbsession, loader=loader
+            )
 
     def addApiSwRequirements(self, spdx_api=None, spdx_api_ref_doc=None, api: ApiModel = None, dbsession=None):
         """Collect all the work items of a BASIL Software Component and their relationships
@@ -1160,6 +1168,8 @@ class SPDXManager:
         api_sw_requirements = (
             dbsession.query(ApiSwRequirementModel).filter(ApiSwRequirementModel.api_id == api.id).all()
         )
+        # Load the nested hierarchy of all the api Sw Requirements at once
+        loader = SwRequirementHierarchyLoader(dbsession, api_relation_ids=[x.id for x in api_sw_requirements])
         for asr in api_sw_requirements:
             # ApiSwRequirement
             spdx_asr_snippet = self.addSnippet(
@@ -1173,7 +1183,9 @@ class SPDXManager:
                 completeness_percentage=asr.coverage,
             )
 
-            self.addSoftwareRequirementNestedElements(api=api, xsr=asr, spdx_sr=spdx_sr, dbsession=dbsession)
+            self.addSoftwareRequirementNestedElements(
+                api=api, xsr=asr, spdx_sr=spdx_sr, dbsession=dbsession, loader=loader
+            )
 
     def addApiTestSpecifications(self, spdx_api=None, spdx_api_ref_doc=None, api: ApiModel = None, dbsession=None):
         """..."""
@@ -1202,7 +1214,8 @@ class SPDXManager:
             )
 
     def addSwRequirementTestSpecifications(
-        self, spdx_sr=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None
+        self, spdx_sr=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None,
+        loader: SwRequirementHierarchyLoader = None
     ):
 
         if mapping_to not in [ApiSwRequirementModel.__tablename__, SwRequirementSwRequirementModel.__tablename__]:
@@ -1211,11 +1224,14 @@ class SPDXManager:
         mapping_field_id = f"{mapping_to}_id"
 
         # SwRequirementTestSpecificationModel
-        sr_tss = (
-            dbsession.query(SwRequirementTestSpecificationModel)
-            .filter(getattr(SwRequirementTestSpecificationModel, mapping_field_id) == mapping_id)
-            .all()
-        )
+        if loader:
+            sr_tss = loader.get_test_specifications(mapping_to, mapping_id)
+        else:
+            sr_tss = (
+                dbsession.query(SwRequirementTestSpecificationModel)
+                .filter(getattr(SwRequirementTestSpecificationModel, mapping_field_id) == mapping_id)
+                .all()
+            )
         for sr_ts in sr_tss:
             spdx_ts = self.addTestSpecification(test_specification=sr_ts.test_specification, dbsession=dbsession)
             self.addRelationship(
@@ -1227,19 +1243,26 @@ class SPDXManager:
 
             # TestSpecificationTestCaseModel
             self.addTestSpecificationTestCases(
-                spdx_ts=spdx_ts, mapping_to=sr_ts.__tablename__, mapping_id=sr_ts.id, dbsession=dbsession
+                spdx_ts=spdx_ts, mapping_to=sr_ts.__tablename__, mapping_id=sr_ts.id, dbsession=dbsession,
+                loader=loader
             )
 
-    def addSwRequirementTestCases(self, spdx_sr=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None):
+    def addSwRequirementTestCases(
+        self, spdx_sr=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None,
+        loader: SwRequirementHierarchyLoader = None
+    ):
         if mapping_to not in [ApiSwRequirementModel.__tablename__, SwRequirementSwRequirementModel.__tablename__]:
             return
 
         mapping_field_id = f"{mapping_to}_id"
-        sw_requirement_test_cases = (
-            dbsession.query(SwRequirementTestCaseModel)
-            .filter(getattr(SwRequirementTestCaseModel, mapping_field_id) == mapping_id)
-            .all()
-        )
+        if loader:
+            sw_requirement_test_cases = loader.get_test_cases(mapping_to, mapping_id)
+        else:
+            sw_requirement_test_cases = (
+                dbsession.query(SwRequirementTestCaseModel)
+                .filter(getattr(SwRequirementTestCaseModel, mapping_field_id) == mapping_id)
+                .all()
+            )
 
         for sr_tc in sw_requirement_test_cases:
             spdx_tc = self.addTestCase(test_case=sr_tc.test_case, dbsession=dbsession)
@@ -1255,13 +1278,18 @@ class SPDXManager:
                 dbsession=dbsession,
             )
 
-    def addTestSpecificationTestCases(self, spdx_ts=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None):
+    def addTestSpecificationTestCases(
+        self, spdx_ts=None, mapping_to: str = "", mapping_id: int = 0, dbsession=None,
+        loader: SwRequirementHierarchyLoader = None
+    ):
         if mapping_to == ApiTestSpecificationModel.__tablename__:
             test_specification_test_cases = (
                 dbsession.query(TestSpecificationTestCaseModel)
                 .filter(TestSpecificationTestCaseModel.test_specification_mapping_api_id == mapping_id)
                 .all()
             )
+        elif mapping_to == SwRequirementTestSpecificationModel.__tablename__ and loader:
+            test_specification_test_cases = loader.get_test_specification_test_cases(mapping_id)
         elif mapping_to == SwRequirementTestSpecificationModel.__tablename__:
             test_specification_test_cases = (
                 dbsession.query(TestSpecificationTestCaseModel)
@@ -2,9 +2,11 @@ import logging
 import os
 os.environ['BASIL_TESTING'] = "True"
 
+import contextlib
 import pytest
 import string
 import random
+from sqlalchemy import event
 from api import api
 from db import db_orm
 from db.models.db_base import Base
@@ -31,6 +33,26 @@ class Utilities:
     def generate_random_hex_string8():
         return ''.join(random.choices(string.hexdigits, k=8))
 
+    @staticmethod
+    @contextlib.contextmanager
+    def assert_max_queries(engine, max_queries=None):
+        """
+        Yield the statements executed on the engine inside the block,
+        fail if they are more than max_queries when provided
+        """
+        statements = []
+
+        def count_queries(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_queries)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", count_queries)
+        assert max_queries is None or len(statements) <= max_queries, \
+            f"{len(statements)} queries, expected at most {max_queries}:\n" + "\n".join(statements)
+
 
 @pytest.fixture
 def utilities(scope="session", autouse=True):
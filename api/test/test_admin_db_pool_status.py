@@ -0,0 +1,91 @@
+"""Tests for the shared DbInterface engine and GET /admin/db-pool-status."""
+
+from http import HTTPStatus
+
+import pytest
+
+from conftest import DB_NAME
+from db import db_orm
+from db.models.user import UserModel
+
+_POOL_STATUS_URL = "/admin/db-pool-status"
+
+UT_ADMIN_USER_NAME = "pool_admin_username"
+UT_ADMIN_USER_EMAIL = "pool_admin_email"
+UT_ADMIN_USER_PASSWORD = "pool_admin_password"
+UT_ADMIN_USER_ROLE = "ADMIN"
+
+
+@pytest.fixture(scope="module")
+def ut_admin_user_db(client_db):
+    dbi = client_db
+    ut_admin_user = UserModel(
+        UT_ADMIN_USER_NAME, UT_ADMIN_USER_EMAIL,
+        UT_ADMIN_USER_PASSWORD, UT_ADMIN_USER_ROLE,
+    )
+    dbi.session.add(ut_admin_user)
+    dbi.session.commit()
+    yield ut_admin_user
+
+
+@pytest.fixture(scope="module")
+def admin_authentication(client, ut_admin_user_db):
+    return client.post(
+        "/user/login",
+        json={"email": UT_ADMIN_USER_EMAIL, "password": UT_ADMIN_USER_PASSWORD},
+    )
+
+
+def _auth_qs(auth_response):
+    return {
+        "user-id": auth_response.json["id"],
+        "token": auth_response.json["token"],
+    }
+
+
+def test_engine_is_shared_across_instances(client_db):
+    dbi_a = db_orm.DbInterface(DB_NAME)
+    dbi_b = db_orm.DbInterface(DB_NAME)
+    try:
+        assert dbi_a.engine is dbi_b.engine
+        assert dbi_a.engine is client_db.engine
+        assert dbi_a.session is not dbi_b.session
+    finally:
+        dbi_a.close()
+        dbi_b.close()
+
+
+def test_close_keeps_engine_usable(client_db):
+    dbi = db_orm.DbInterface(DB_NAME)
+    engine = dbi.engine
+    dbi.session.query(UserModel).count()
+    dbi.close()
+
+    dbi = db_orm.DbInterface(DB_NAME)
+    assert dbi.engine is engine
+    assert dbi.session.query(UserModel).count() > 0
+    dbi.close()
+
+
+def test_pool_status(client_db):
+    status = db_orm.DbInterface.pool_status()
+    assert DB_NAME in status
+    for field in ["pool_size", "max_overflow", "pool_recycle", "checked_in", "checked_out", "overflow"]:
+        assert field in status[DB_NAME]
+
+
+def test_get_pool_status(client, admin_authentication):
+    response = client.get(_POOL_STATUS_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    assert DB_NAME in response.json
+    assert response.json[DB_NAME]["pool_size"] == db_orm.DbInterface.DB_POOL_SIZE
+
+
+def test_get_pool_status_missing_fields(client):
+    response = client.get(_POOL_STATUS_URL)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_pool_status_non_admin_user(client, user_authentication):
+    response = client.get(_POOL_STATUS_URL, query_string=_auth_qs(user_authentication))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
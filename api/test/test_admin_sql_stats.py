@@ -0,0 +1,117 @@
+"""Tests for the per request sql statistics and GET/DELETE /admin/sql-stats."""
+
+import logging
+from http import HTTPStatus
+
+import pytest
+
+import query_stats
+from db.models.user import UserModel
+
+_SQL_STATS_URL = "/admin/sql-stats"
+_USER_URL = "/user"
+
+UT_ADMIN_USER_NAME = "sql_stats_admin_username"
+UT_ADMIN_USER_EMAIL = "sql_stats_admin_email"
+UT_ADMIN_USER_PASSWORD = "sql_stats_admin_password"
+UT_ADMIN_USER_ROLE = "ADMIN"
+
+
+@pytest.fixture(scope="module")
+def ut_admin_user_db(client_db):
+    dbi = client_db
+    ut_admin_user = UserModel(
+        UT_ADMIN_USER_NAME, UT_ADMIN_USER_EMAIL,
+        UT_ADMIN_USER_PASSWORD, UT_ADMIN_USER_ROLE,
+    )
+    dbi.session.add(ut_admin_user)
+    dbi.session.commit()
+    yield ut_admin_user
+
+
+@pytest.fixture(scope="module")
+def admin_authentication(client, ut_admin_user_db):
+    return client.post(
+        "/user/login",
+        json={"email": UT_ADMIN_USER_EMAIL, "password": UT_ADMIN_USER_PASSWORD},
+    )
+
+
+def _auth_qs(auth_response):
+    return {
+        "user-id": auth_response.json["id"],
+        "token": auth_response.json["token"],
+    }
+
+
+def test_query_stats(client_db):
+    stats = query_stats.start("/ut", "get")
+    assert query_stats.start("/ut", "get") is None
+    try:
+        for i in range(3):
+            client_db.session.query(UserModel).count()
+    finally:
+        query_stats.stop(stats)
+    assert stats.count == 3
+    assert stats.db_time > 0
+    assert stats.duration >= stats.db_time
+    assert len(stats.slowest()) == 3
+    assert stats.server_timing().startswith('db;dur=')
+
+    # Statements executed outside of a request are not collected
+    client_db.session.query(UserModel).count()
+    assert stats.count == 3
+
+
+def test_server_timing_header(client, admin_authentication, monkeypatch):
+    response = client.get(_USER_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    assert "Server-Timing" not in response.headers
+
+    monkeypatch.setattr(query_stats, "SERVER_TIMING", True)
+    response = client.get(_USER_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert "queries" in response.headers["Server-Timing"]
+
+
+def test_slow_request_log(client, admin_authentication, monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "SLOW_REQUEST_MS", 0.000001)
+    with caplog.at_level(logging.WARNING, logger=query_stats.logger.name):
+        response = client.get(_USER_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    assert f"Slow request at {_USER_URL} with get method" in caplog.text
+
+
+def test_get_sql_stats(client, admin_authentication):
+    response = client.delete(_SQL_STATS_URL, json=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+
+    for i in range(2):
+        response = client.get(_USER_URL, query_string=_auth_qs(admin_authentication))
+        assert response.status_code == HTTPStatus.OK
+
+    response = client.get(_SQL_STATS_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    route = response.json[f"GET {_USER_URL}"]
+    assert route["requests"] == 2
+    assert route["queries"] > 0
+    assert route["max_queries"] >= route["avg_queries"]
+    assert len(route["slowest"]) <= query_stats.TOP_STATEMENTS
+
+    response = client.delete(_SQL_STATS_URL, json=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(_SQL_STATS_URL, query_string=_auth_qs(admin_authentication))
+    assert f"GET {_USER_URL}" not in response.json
+
+
+def test_get_sql_stats_missing_fields(client):
+    response = client.get(_SQL_STATS_URL)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_sql_stats_non_admin_user(client, user_authentication):
+    response = client.get(_SQL_STATS_URL, query_string=_auth_qs(user_authentication))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    response = client.delete(_SQL_STATS_URL, json=_auth_qs(user_authentication))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,103 @@
+import base64
+import json
+from http import HTTPStatus
+
+import pytest
+
+from conftest import UT_USER_EMAIL
+from db.models.api import ApiModel
+from db.models.user import UserModel
+
+_APIS_URL = "/apis"
+_UT_APIS = 7
+
+
+def _auth(authentication):
+    return {"user-id": authentication.json["id"], "token": authentication.json["token"]}
+
+
+@pytest.fixture
+def apis_db(client_db, utilities, ut_user_db, ut_reader_user_db):
+    """_UT_APIS apis in a dedicated library, the ones with odd index denied to the reader user"""
+    user = client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+    library = f"ut_pagination_{utilities.generate_random_hex_string8()}"
+    apis = []
+    for i in range(_UT_APIS):
+        # Same name for the first apis, sorted by version and id
+        ut_api = ApiModel(f"api_{i // 3}", library, f"v{i % 3}", __file__, "ut_category", "", "", 0, 1, "", user)
+        if i % 2:
+            ut_api.read_denials = f"[{ut_reader_user_db.id}]"
+        apis.append(ut_api)
+    client_db.session.add_all(apis)
+    client_db.session.commit()
+
+    yield library, apis
+
+    for ut_api in apis:
+        client_db.session.delete(ut_api)
+    client_db.session.commit()
+
+
+def _get_apis(client, library, authentication=None, **kwargs):
+    query_string = {"field1": "library", "filter1": library, **kwargs}
+    if authentication is not None:
+        query_string.update(_auth(authentication))
+    return client.get(_APIS_URL, query_string=query_string)
+
+
+def test_apis_pages_readable_only(client, reader_authentication, apis_db):
+    library, apis = apis_db
+    readable = [x.id for i, x in enumerate(apis) if i % 2 == 0]
+
+    response = _get_apis(client, library, reader_authentication, page=1, per_page=2)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["count"] == len(readable)
+    assert response.json["page_count"] == 2
+    assert [x["id"] for x in response.json["apis"]] == readable[:2]
+
+    response = _get_apis(client, library, reader_authentication, page=2, per_page=2)
+    assert [x["id"] for x in response.json["apis"]] == readable[2:]
+    assert response.json["next_cursor"] is None
+
+
+def test_apis_owner_reads_all(client, user_authentication, apis_db):
+    library, apis = apis_db
+    response = _get_apis(client, library, user_authentication, page=1, per_page=20)
+    assert [x["id"] for x in response.json["apis"]] == [x.id for x in apis]
+    assert all(x["permissions"] == "rwem" for x in response.json["apis"])
+
+
+def test_apis_keyset_pagination(client, user_authentication, apis_db):
+    library, apis = apis_db
+    ids = []
+    response = _get_apis(client, library, user_authentication, page=1, per_page=3)
+    while True:
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json["apis"]) <= 3
+        ids += [x["id"] for x in response.json["apis"]]
+        if response.json["next_cursor"] is None:
+            break
+        response = _get_apis(client, library, user_authentication, per_page=3, cursor=response.json["next_cursor"])
+        assert response.json["current_page"] is None
+    assert ids == [x.id for x in apis]
+
+
+def test_apis_count_estimate(client, apis_db):
+    library, _ = apis_db
+    response = _get_apis(client, library, page=1, count="estimate")
+    assert response.status_code == HTTPStatus.OK
+    assert isinstance(response.json["count"], int)
+
+
+def test_apis_invalid_cursor(client, apis_db):
+    library, _ = apis_db
+    response = _get_apis(client, library, cursor="not a cursor")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize("values", [[1, 2, 3], ["api", "v1"], ["api", "v1", "1"], ["api", "v1", True]])
+def test_apis_cursor_wrong_types(client, apis_db, values):
+    library, _ = apis_db
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+    response = _get_apis(client, library, cursor=cursor)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,108 @@
+import pytest
+
+from db.models.api import ApiModel
+from db.models.api_user_permission import (
+    ApiUserPermissionModel,
+    MANAGE,
+    get_permission_rows,
+    readable_apis_filter,
+    rebuild_api_user_permissions,
+    user_api_ids_with_permission,
+)
+from db.models.user import UserModel
+from api import get_api_user_permissions, get_apis_user_permissions  # noqa E402
+from conftest import UT_USER_EMAIL
+
+
+@pytest.fixture()
+def users(client_db, ut_user_db, utilities):
+    owner = client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+    ret = [owner]
+    for role in ["USER", "USER", "GUEST"]:
+        name = f"ut_perm_{utilities.generate_random_hex_string8()}"
+        ret.append(UserModel(name, f"{name}@basil.test", "password", role))
+    client_db.session.add_all(ret[1:])
+    client_db.session.commit()
+    return ret
+
+
+@pytest.fixture()
+def apis_db(client_db, users, utilities):
+    owner = users[0]
+    ret = []
+    for i in range(3):
+        ret.append(ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_perm_library", "v1.0.0",
+                            "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                            0, 42, "ut_tags", owner))
+    client_db.session.add_all(ret)
+    client_db.session.commit()
+    return ret
+
+
+def _rows(client_db, api):
+    return {x.user_id: x.perms for x in client_db.session.query(ApiUserPermissionModel).filter(
+        ApiUserPermissionModel.api_id == api.id).all()}
+
+
+def test_permission_rows():
+    fields = {"read_denials": "[3][0]", "write_permissions": "[1][2]", "edit_permissions": "[1]",
+              "manage_permissions": None}
+    rows = {x["user_id"]: x["perms"] for x in get_permission_rows(7, fields)}
+    assert rows == {0: "d", 1: "we", 2: "w", 3: "d"}
+
+
+def test_rows_follow_permission_fields(client_db, users, apis_db):
+    owner, user, other_user, _ = users
+    api = apis_db[0]
+    assert _rows(client_db, api) == {owner.id: "wem"}
+
+    api.write_permissions += f"[{user.id}]"
+    api.manage_permissions += f"[{user.id}]"
+    api.read_denials = f"[{other_user.id}][0]"
+    client_db.session.commit()
+    assert _rows(client_db, api) == {owner.id: "wem", user.id: "wm", other_user.id: "d", 0: "d"}
+
+    api.read_denials = ""
+    client_db.session.commit()
+    assert _rows(client_db, api) == {owner.id: "wem", user.id: "wm"}
+
+    # Rows of bulk updates are rebuilt explicitly
+    client_db.session.query(ApiModel).filter(ApiModel.id == api.id).update(
+        {ApiModel.edit_permissions: f"[{owner.id}][{user.id}]"})
+    rebuild_api_user_permissions(client_db.session.connection(), ApiModel.id == api.id)
+    client_db.session.commit()
+    assert _rows(client_db, api) == {owner.id: "wem", user.id: "wem"}
+
+
+def test_user_permissions(client_db, users, apis_db):
+    owner, user, other_user, guest = users
+    public_api, restricted_api, managed_api = apis_db
+
+    restricted_api.read_denials = f"[{other_user.id}][0]"
+    restricted_api.write_permissions += f"[{user.id}]"
+    managed_api.manage_permissions += f"[{user.id}]"
+    managed_api.edit_permissions += f"[{other_user.id}]"
+    client_db.session.commit()
+
+    expected = {
+        owner.id: {public_api.id: "rwem", restricted_api.id: "rwem", managed_api.id: "rwem"},
+        user.id: {public_api.id: "r", restricted_api.id: "rw", managed_api.id: "rm"},
+        other_user.id: {public_api.id: "r", restricted_api.id: "", managed_api.id: "re"},
+        guest.id: {public_api.id: "r", restricted_api.id: "", managed_api.id: "r"},
+    }
+    for iUser in [owner, user, other_user, guest]:
+        assert get_apis_user_permissions(apis_db, iUser, client_db.session) == expected[iUser.id]
+        for api in apis_db:
+            assert get_api_user_permissions(api, iUser, client_db.session) == expected[iUser.id][api.id]
+    assert get_apis_user_permissions(apis_db, None, client_db.session) == expected[guest.id]
+
+    owned = client_db.session.query(ApiModel.id).filter(
+        ApiModel.id.in_(user_api_ids_with_permission(user.id, MANAGE))).all()
+    assert [x.id for x in owned] == [managed_api.id]
+
+    readable = client_db.session.query(ApiModel.id).filter(ApiModel.id.in_([x.id for x in apis_db])).filter(
+        readable_apis_filter(ApiModel.id, other_user.id, ApiModel.created_by_id)).order_by(ApiModel.id).all()
+    assert [x.id for x in readable] == [public_api.id, managed_api.id]
+    readable = client_db.session.query(ApiModel.id).filter(ApiModel.id.in_([x.id for x in apis_db])).filter(
+        readable_apis_filter(ApiModel.id)).order_by(ApiModel.id).all()
+    assert [x.id for x in readable] == [public_api.id, managed_api.id]
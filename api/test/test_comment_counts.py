@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import event
+
+from db.models import comment as comment_module
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.comment import (
+    COMMENT_COUNTS_CACHE,
+    CommentCountModel,
+    CommentModel,
+    preload_comment_counts,
+    rebuild_comment_counts,
+)
+from db.models.sw_requirement import SwRequirementModel
+from db.models.user import UserModel
+from api_utils import get_mapping_comments, get_mappings_comments, get_nested_mappings_keys
+from conftest import UT_USER_EMAIL
+
+
+@pytest.fixture()
+def ut_user(client_db, ut_user_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+@pytest.fixture()
+def mappings_db(client_db, ut_user, utilities):
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                      0, 42, "ut_tags", ut_user)
+    mappings = []
+    for i in range(3):
+        sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+        mappings.append(ApiSwRequirementModel(ut_api, sr, "section", i, 100, ut_user))
+        client_db.session.add(sr)
+    client_db.session.add(ut_api)
+    client_db.session.add_all(mappings)
+    client_db.session.commit()
+
+    table = ApiSwRequirementModel.__tablename__
+    done_todo = CommentModel(table, mappings[0].id, ut_user, "done todo", todo=True)
+    done_todo.done = True
+    client_db.session.add_all([
+        CommentModel(table, mappings[0].id, ut_user, "comment"),
+        CommentModel(table, mappings[0].id, ut_user, "todo", todo=True),
+        done_todo,
+        CommentModel(table, mappings[1].id, ut_user, "todo", todo=True),
+    ])
+    client_db.session.commit()
+    return mappings
+
+
+@pytest.fixture()
+def counter_cache(client_db, monkeypatch):
+    monkeypatch.setattr(comment_module, "COMMENT_COUNTER_CACHE", True)
+    rebuild_comment_counts(client_db.session.connection())
+    client_db.session.commit()
+
+
+def _expected_counts():
+    return [{"comment_count": 3, "todo_count": 1},
+            {"comment_count": 1, "todo_count": 1},
+            {"comment_count": 0, "todo_count": 0}]
+
+
+def test_preloaded_comment_counts(client_db, mappings_db):
+    session = client_db.session
+    assert [x.comment_counts(session) for x in mappings_db] == _expected_counts()
+
+    preload_comment_counts(session, mappings_db)
+    assert len(session.info[COMMENT_COUNTS_CACHE]) == 3
+
+    queries = []
+
+    def count_queries(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count_queries)
+    try:
+        assert [x.comment_counts(session) for x in mappings_db] == _expected_counts()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_queries)
+    assert queries == []
+
+    # A new comment drops the preloaded counters
+    session.add(CommentModel(mappings_db[2].__tablename__, mappings_db[2].id, mappings_db[2].created_by, "new"))
+    session.commit()
+    assert COMMENT_COUNTS_CACHE not in session.info
+    assert mappings_db[2].comment_counts(session) == {"comment_count": 1, "todo_count": 0}
+
+
+def test_comment_counter_cache(client_db, mappings_db, counter_cache):
+    session = client_db.session
+    table = mappings_db[0].__tablename__
+    assert [x.comment_counts(session) for x in mappings_db] == _expected_counts()
+
+    session.expire_all()
+    preload_comment_counts(session, mappings_db)
+    assert [x.comment_counts(session) for x in mappings_db] == _expected_counts()
+
+    # Insert
+    new_comment = CommentModel(table, mappings_db[2].id, mappings_db[2].created_by, "todo", todo=True)
+    session.add(new_comment)
+    session.commit()
+    assert mappings_db[2].comment_counts(session) == {"comment_count": 1, "todo_count": 1}
+
+    # Update
+    new_comment.done = True
+    session.commit()
+    assert mappings_db[2].comment_counts(session) == {"comment_count": 1, "todo_count": 0}
+
+    # Delete
+    session.delete(new_comment)
+    session.commit()
+    assert mappings_db[2].comment_counts(session) == {"comment_count": 0, "todo_count": 0}
+    assert session.query(CommentCountModel).filter(
+        CommentCountModel.parent_table == table,
+        CommentCountModel.parent_id == mappings_db[2].id).count() == 0
+
+
+def test_mappings_comments(client_db, mappings_db):
+    table = mappings_db[0].__tablename__
+    nested = {"mapped": [{"__tablename__": table, "relation_id": x.id, "children": [{}]} for x in mappings_db]}
+    keys = get_nested_mappings_keys(nested)
+    assert keys == {(table, x.id) for x in mappings_db}
+
+    preloaded = get_mappings_comments(client_db, keys)
+    for mapping in mappings_db:
+        assert preloaded[(table, mapping.id)] == get_mapping_comments(client_db, mapping.id, table)
+        assert get_mapping_comments(None, mapping.id, table, preloaded=preloaded) == preloaded[(table, mapping.id)]
+    assert [x["comment"] for x in preloaded[(table, mappings_db[0].id)]] == ["done todo", "comment", "todo"]
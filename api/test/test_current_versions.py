@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import update
+
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.user import UserModel
+from conftest import UT_USER_EMAIL
+
+
+@pytest.fixture()
+def mapping_db(client_db, ut_user_db, utilities):
+    ut_user = client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                      0, 42, "ut_tags", ut_user)
+    sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+    nested_sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+    api_sr = ApiSwRequirementModel(ut_api, sr, "section", 0, 80, ut_user)
+    sr_sr = SwRequirementSwRequirementModel(api_sr, None, nested_sr, 50, ut_user)
+    client_db.session.add_all([ut_api, sr, nested_sr, api_sr, sr_sr])
+    client_db.session.commit()
+
+    # Bump the version of a work item and of a mapping
+    sr.description = "description v2"
+    client_db.session.commit()
+    sr_sr.coverage = 60
+    client_db.session.commit()
+    return [ut_api, sr, nested_sr, api_sr, sr_sr]
+
+
+def test_current_versions_from_rows(client_db, mapping_db, utilities):
+    session = client_db.session
+    for x in mapping_db:
+        session.refresh(x)
+    for x in mapping_db[3:]:
+        session.refresh(x.sw_requirement)
+
+    # The history tables are not read
+    with utilities.assert_max_queries(client_db.engine, 0):
+        versions = [x.current_version(session) for x in mapping_db]
+    assert versions == ["1", "2", "1", "2.1", "1.2"]
+
+    ut_api, sr, nested_sr, api_sr, sr_sr = mapping_db
+    sr.description = "description v3"
+    session.commit()
+    assert sr.current_version(session) == "3"
+    assert api_sr.current_version(session) == "3.1"
+
+
+def test_current_versions_from_history(client_db, mapping_db):
+    session = client_db.session
+    ut_api, sr, nested_sr, api_sr, sr_sr = mapping_db
+
+    # Rows created before the introduction of the version column
+    for x in [sr, sr_sr]:
+        session.execute(update(type(x).__table__).where(type(x).__table__.c.id == x.id).values(version=None))
+    session.commit()
+    assert sr.version is None
+    assert sr.current_version(session) == "2"
+    assert sr_sr.current_version(session) == "1.2"
@@ -0,0 +1,17 @@
+from sqlalchemy import text
+
+from db.models.init_db import get_missing_indexes
+
+
+def test_missing_indexes(client_db):
+    connection = client_db.session.connection()
+    assert get_missing_indexes(connection) == []
+
+    try:
+        connection.execute(text("DROP INDEX ix_comments_parent_table_parent_id"))
+        connection.execute(text("DROP INDEX ix_sw_requirements_history_id_version"))
+        assert sorted(get_missing_indexes(connection)) == ["ix_comments_parent_table_parent_id",
+                                                           "ix_sw_requirements_history_id_version"]
+    finally:
+        client_db.session.rollback()
+    assert get_missing_indexes(client_db.session.connection()) == []
@@ -0,0 +1,181 @@
+"""Tests for the reference document cache and GET/DELETE /admin/document-cache."""
+
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from document_cache import DocumentCache
+from db.models.user import UserModel
+
+_DOCUMENT_CACHE_URL = "/admin/document-cache"
+
+UT_ADMIN_USER_NAME = "document_cache_admin_username"
+UT_ADMIN_USER_EMAIL = "document_cache_admin_email"
+UT_ADMIN_USER_PASSWORD = "document_cache_admin_password"
+UT_ADMIN_USER_ROLE = "ADMIN"
+
+
+class _DocumentHandler(BaseHTTPRequestHandler):
+    content = "Reference document v1"
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        _DocumentHandler.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.content.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def document_server():
+    _DocumentHandler.content = "Reference document v1"
+    _DocumentHandler.etag = '"v1"'
+    _DocumentHandler.requests = []
+    server = HTTPServer(("127.0.0.1", 0), _DocumentHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}/spec.md"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def ut_admin_user_db(client_db):
+    dbi = client_db
+    ut_admin_user = UserModel(
+        UT_ADMIN_USER_NAME, UT_ADMIN_USER_EMAIL,
+        UT_ADMIN_USER_PASSWORD, UT_ADMIN_USER_ROLE,
+    )
+    dbi.session.add(ut_admin_user)
+    dbi.session.commit()
+    yield ut_admin_user
+
+
+@pytest.fixture(scope="module")
+def admin_authentication(client, ut_admin_user_db):
+    return client.post(
+        "/user/login",
+        json={"email": UT_ADMIN_USER_EMAIL, "password": UT_ADMIN_USER_PASSWORD},
+    )
+
+
+def _auth_qs(auth_response):
+    return {
+        "user-id": auth_response.json["id"],
+        "token": auth_response.json["token"],
+    }
+
+
+def test_file(tmp_path):
+    cache = DocumentCache(cache_dir=str(tmp_path / "cache"))
+    path = tmp_path / "spec.md"
+    path.write_text("Reference document")
+
+    assert cache.get(str(path)) == "Reference document"
+    assert cache.get(str(path)) == "Reference document"
+    assert (cache.stats()["misses"], cache.stats()["hits"]) == (1, 1)
+
+    path.write_text("Reference document, edited")
+    assert cache.get(str(path)) == "Reference document, edited"
+    assert cache.stats()["misses"] == 2
+
+    os.remove(path)
+    assert cache.get(str(path)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_url_revalidation(tmp_path, document_server):
+    server, url = document_server
+    cache = DocumentCache(max_age=3600, cache_dir=str(tmp_path))
+
+    assert cache.get(url) == "Reference document v1"
+    assert cache.get(url) == "Reference document v1"
+    assert _DocumentHandler.requests == [None]
+
+    # Expired copies are revalidated with a conditional request
+    cache.max_age = 0
+    assert cache.get(url) == "Reference document v1"
+    assert _DocumentHandler.requests == [None, '"v1"']
+    assert cache.stats()["revalidations"] == 1
+
+    _DocumentHandler.content = "Reference document v2"
+    _DocumentHandler.etag = '"v2"'
+    assert cache.get(url) == "Reference document v2"
+    assert cache.stats()["misses"] == 2
+
+    # Stale copy served when the document cannot be fetched
+    server.shutdown()
+    server.server_close()
+    assert cache.get(url) == "Reference document v2"
+    assert cache.stats()["errors"] == 1
+
+
+def test_url_shared_on_disk(tmp_path, document_server):
+    _, url = document_server
+    worker_a = DocumentCache(max_age=3600, cache_dir=str(tmp_path))
+    worker_b = DocumentCache(max_age=3600, cache_dir=str(tmp_path))
+
+    assert worker_a.get(url) == "Reference document v1"
+    assert worker_b.get(url) == "Reference document v1"
+    assert _DocumentHandler.requests == [None]
+    assert worker_b.stats()["disk_hits"] == 1
+
+    # Expired disk copies are revalidated
+    worker_c = DocumentCache(max_age=0, cache_dir=str(tmp_path))
+    assert worker_c.get(url) == "Reference document v1"
+    assert _DocumentHandler.requests == [None, '"v1"']
+
+
+def test_lru_eviction(tmp_path):
+    cache = DocumentCache(max_bytes=25, cache_dir=str(tmp_path / "cache"))
+    paths = []
+    for name in ["a", "b", "c"]:
+        path = tmp_path / f"{name}.md"
+        path.write_text(name * 10)
+        paths.append(str(path))
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 20, 1)
+
+    # The least recently used document has been evicted
+    cache.get(paths[0])
+    cache.get(paths[1])
+    assert cache.stats()["misses"] == 4
+
+
+def test_get_document_cache(client, admin_authentication):
+    response = client.get(_DOCUMENT_CACHE_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    for field in DocumentCache.COUNTERS + ["entries", "bytes", "max_bytes", "max_age"]:
+        assert field in response.json
+
+    response = client.delete(_DOCUMENT_CACHE_URL, json=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(_DOCUMENT_CACHE_URL, query_string=_auth_qs(admin_authentication))
+    assert response.json["entries"] == 0
+
+
+def test_get_document_cache_non_admin_user(client, user_authentication):
+    response = client.get(_DOCUMENT_CACHE_URL)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get(_DOCUMENT_CACHE_URL, query_string=_auth_qs(user_authentication))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
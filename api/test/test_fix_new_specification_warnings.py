@@ -19,6 +19,7 @@ from db.models.test_specification import TestSpecificationModel
 from db.models.user import UserModel
 
 _FIX_WARNINGS_URL = '/apis/fix-specification-warnings'
+_CHECK_SPEC_URL = '/apis/check-specification'
 
 _UT_API_NAME = 'ut_fix_warnings_api'
 _UT_API_LIBRARY = 'ut_fix_warnings_library'
@@ -229,3 +230,47 @@ def test_fix_warnings_is_idempotent(client, client_db, user_authentication, api_
     assert fixture['tc_map'].offset == _expected_new_offset(_SECTION_C)
     assert fixture['j_map'].offset == _expected_new_offset(_SECTION_D)
     assert fixture['doc_map'].offset == _expected_new_offset(_SECTION_E)
+
+
+# --- Duplicated sections: anchored to the nearest occurrence ------------------------
+
+def test_fix_warnings_duplicated_section(client, client_db, user_authentication, api_with_all_mappings):
+    fixture = api_with_all_mappings
+    user = client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+    # The second occurrence of the section is mapped
+    spec = f'{_ORIGINAL_SPEC} {_SECTION_A}'
+    with open(fixture['spec_path'], 'w') as f:
+        f.write(spec)
+    sr = SwRequirementModel('SR duplicated section', 'desc', user)
+    client_db.session.add(sr)
+    client_db.session.commit()
+    sr_map = ApiSwRequirementModel(fixture['api'], sr, _SECTION_A, spec.rindex(_SECTION_A), 0, user)
+    client_db.session.add(sr_map)
+    client_db.session.commit()
+
+    response = client.get(_CHECK_SPEC_URL, query_string={'id': fixture['api'].id})
+    assert {'id': sr_map.id, 'title': sr.title} in response.get_json()['sw-requirements']['ok']
+
+    shifted_spec = f'{_SHIFTED_SPEC} {_SECTION_A}'
+    with open(fixture['spec_path'], 'w') as f:
+        f.write(shifted_spec)
+    client.get(_FIX_WARNINGS_URL, query_string={'id': fixture['api'].id})
+
+    client_db.session.expire_all()
+    assert fixture['sr_map'].offset == shifted_spec.index(_SECTION_A)
+    assert sr_map.offset == shifted_spec.rindex(_SECTION_A)
+
+
+def test_check_specification_with_new_url(client, user_authentication, api_with_all_mappings):
+    fixture = api_with_all_mappings
+    new_spec_path = _write_spec_file(_SHIFTED_SPEC.replace(_SECTION_E, 'removed'))
+
+    response = client.get(_CHECK_SPEC_URL, query_string={'id': fixture['api'].id, 'url': new_spec_path})
+    os.remove(new_spec_path)
+
+    assert response.status_code == HTTPStatus.OK
+    ret = response.get_json()
+    assert ret['sw-requirements']['warning'][0]['old-offset'] == _expected_old_offset(_SECTION_A)
+    assert ret['sw-requirements']['warning'][0]['new-offset'] == _expected_new_offset(_SECTION_A)
+    assert ret['documents']['ko'] == [{'id': fixture['doc_map'].id, 'title': fixture['doc_map'].document.title}]
@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import event
+
+from db.models.api import ApiModel, ApiHistoryModel
+from db.models.sw_requirement import SwRequirementModel, SwRequirementHistoryModel
+from db.models.user import UserModel
+from db.models.versions import HISTORY_BUFFER
+from conftest import UT_USER_EMAIL
+
+
+@pytest.fixture()
+def ut_user(client_db, ut_user_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+@pytest.fixture()
+def sw_requirements_db(client_db, ut_user, utilities):
+    ret = [SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+           for i in range(5)]
+    client_db.session.add_all(ret)
+    client_db.session.commit()
+    return ret
+
+
+def _history_versions(client_db, history_model, id):
+    return [x.version for x in client_db.session.query(history_model.version).filter(
+        history_model.id == id).order_by(history_model.version).all()]
+
+
+def _count_history_inserts(table):
+    statements = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(f"INSERT INTO {table} "):
+            statements.append(executemany)
+
+    return statements, count_inserts
+
+
+def test_versions_on_live_rows(client_db, sw_requirements_db):
+    sr = sw_requirements_db[0]
+    assert sr.version == 1
+    assert _history_versions(client_db, SwRequirementHistoryModel, sr.id) == [1]
+
+    sr.description = "description v2"
+    client_db.session.commit()
+    sr.description = "description v3"
+    client_db.session.commit()
+    assert sr.version == 3
+    assert _history_versions(client_db, SwRequirementHistoryModel, sr.id) == [1, 2, 3]
+    assert sr.current_version(client_db.session) == "3"
+
+    # Rows created before the introduction of the column fall back to the history table
+    client_db.session.query(SwRequirementModel).filter(SwRequirementModel.id == sr.id).update(
+        {SwRequirementModel.version: None})
+    client_db.session.commit()
+    sr.description = "description v4"
+    client_db.session.commit()
+    assert sr.version == 4
+    assert _history_versions(client_db, SwRequirementHistoryModel, sr.id) == [1, 2, 3, 4]
+
+
+def test_bulk_history_insert(client_db, sw_requirements_db):
+    session = client_db.session
+    statements, count_inserts = _count_history_inserts(SwRequirementHistoryModel.__tablename__)
+
+    for sr in sw_requirements_db:
+        sr.status = "APPROVED"
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count_inserts)
+    try:
+        session.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_inserts)
+
+    assert statements == [True]
+    for sr in sw_requirements_db:
+        assert sr.version == 2
+        assert _history_versions(client_db, SwRequirementHistoryModel, sr.id) == [1, 2]
+
+
+def test_last_coverage_does_not_create_a_version(client_db, ut_user, utilities):
+    api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                   "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                   0, 42, "ut_tags", ut_user)
+    client_db.session.add(api)
+    client_db.session.commit()
+
+    api.last_coverage = "42.0"
+    client_db.session.commit()
+    assert api.version == 1
+    assert _history_versions(client_db, ApiHistoryModel, api.id) == [1]
+
+    api.tags = "ut_tags_v2"
+    client_db.session.commit()
+    assert api.version == 2
+    assert _history_versions(client_db, ApiHistoryModel, api.id) == [1, 2]
+
+
+def test_rollback_drops_pending_history(client_db, sw_requirements_db):
+    session = client_db.session
+    sr = sw_requirements_db[0]
+
+    sr.title = None
+    with pytest.raises(Exception):
+        session.commit()
+    session.rollback()
+    assert HISTORY_BUFFER not in session.info
+
+    sr.description = "description v2"
+    session.commit()
+    assert sr.version == 2
+    assert _history_versions(client_db, SwRequirementHistoryModel, sr.id) == [1, 2]
@@ -0,0 +1,144 @@
+import os
+import tempfile
+from http import HTTPStatus
+
+import pytest
+
+from conftest import UT_USER_EMAIL
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.api_test_case import ApiTestCaseModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.test_case import TestCaseModel
+from db.models.test_run import TestRunModel
+from db.models.test_run_config import TestRunConfigModel
+from db.models.user import UserModel
+
+_MAPPING_IMPACT_URL = "/mapping/impact"
+
+_UT_SPEC_SECTION = "BASIL UT impact analysis section."
+_UT_RAW_SPEC = f"BASIL UT: {_UT_SPEC_SECTION}"
+
+
+def _ut_user(client_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+def _create_api(client_db, utilities, user, raw_spec):
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      raw_spec, "ut_category", utilities.generate_random_hex_string8(),
+                      raw_spec + "impl", 0, 42, "ut_tags", user)
+    client_db.session.add(ut_api)
+    return ut_api
+
+
+@pytest.fixture
+def impact_db(client_db, utilities, ut_user_db, ut_reader_user_db):
+    """api1 -> SR1 -> SR2 -> TC -> test run, api2 -> TC with a read denial for the reader user"""
+    user = _ut_user(client_db)
+    raw_spec = tempfile.NamedTemporaryFile(mode="w", delete=False)
+    raw_spec.write(_UT_RAW_SPEC)
+    raw_spec.close()
+    api1 = _create_api(client_db, utilities, user, raw_spec.name)
+    api2 = _create_api(client_db, utilities, user, raw_spec.name)
+    api2.read_denials = f"[{ut_reader_user_db.id}]"
+    sr1 = SwRequirementModel(f"SR #{utilities.generate_random_hex_string8()}", "parent", user)
+    sr2 = SwRequirementModel(f"SR #{utilities.generate_random_hex_string8()}", "child", user)
+    tc = TestCaseModel("https://github.com/example/repo", f"tests/test_{utilities.generate_random_hex_string8()}.py",
+                       f"TC #{utilities.generate_random_hex_string8()}", "impact", user)
+    client_db.session.add_all([sr1, sr2, tc])
+    client_db.session.commit()
+
+    offset = _UT_RAW_SPEC.find(_UT_SPEC_SECTION)
+    api_sr = ApiSwRequirementModel(api1, sr1, _UT_SPEC_SECTION, offset, 0, user)
+    api_tc = ApiTestCaseModel(api2, tc, _UT_SPEC_SECTION, offset, 0, user)
+    client_db.session.add_all([api_sr, api_tc])
+    client_db.session.commit()
+    sr_sr = SwRequirementSwRequirementModel(api_sr, None, sr2, 100, user)
+    client_db.session.add(sr_sr)
+    client_db.session.commit()
+    sr_tc = SwRequirementTestCaseModel(None, sr_sr, tc, 100, user)
+    client_db.session.add(sr_tc)
+    client_db.session.commit()
+    test_run_config = TestRunConfigModel("tmt", "", "", "config", "main", "", "", "container", "", "", None, user)
+    test_run = TestRunModel(api1, "run", "notes", test_run_config, sr_tc.__tablename__, sr_tc.id, user)
+    client_db.session.add(test_run)
+    client_db.session.commit()
+
+    yield {"api1": api1, "api2": api2, "sr1": sr1, "sr2": sr2, "tc": tc, "test_run": test_run}
+
+    client_db.session.rollback()
+    for ut_api in [api1, api2]:
+        client_db.session.delete(client_db.session.get(ApiModel, ut_api.id))
+    client_db.session.commit()
+    os.remove(raw_spec.name)
+
+
+def _node(node_type, obj):
+    return f"{node_type}:{obj.id}"
+
+
+def _auth(authentication):
+    return {"user-id": authentication.json["id"], "token": authentication.json["token"]}
+
+
+def _get_impact(client, authentication, node_type, obj, **kwargs):
+    query_string = {"work_item_type": node_type, "id": obj.id, **_auth(authentication), **kwargs}
+    response = client.get(_MAPPING_IMPACT_URL, query_string=query_string)
+    assert response.status_code == HTTPStatus.OK
+    return [(x["from"], x["to"], x["depth"]) for x in response.json["edges"]]
+
+
+def test_mapping_impact_downstream(client, user_authentication, impact_db):
+    assert _get_impact(client, user_authentication, "sw-requirement", impact_db["sr1"]) == [
+        (_node("sw-requirement", impact_db["sr1"]), _node("sw-requirement", impact_db["sr2"]), 1),
+        (_node("sw-requirement", impact_db["sr2"]), _node("test-case", impact_db["tc"]), 2),
+        (_node("test-case", impact_db["tc"]), _node("test-run", impact_db["test_run"]), 3),
+    ]
+
+
+def test_mapping_impact_upstream(client, user_authentication, impact_db):
+    edges = _get_impact(client, user_authentication, "test-case", impact_db["tc"], direction="upstream")
+    assert sorted(edges) == sorted([
+        (_node("api", impact_db["api2"]), _node("test-case", impact_db["tc"]), 1),
+        (_node("sw-requirement", impact_db["sr2"]), _node("test-case", impact_db["tc"]), 1),
+        (_node("sw-requirement", impact_db["sr1"]), _node("sw-requirement", impact_db["sr2"]), 2),
+        (_node("api", impact_db["api1"]), _node("sw-requirement", impact_db["sr1"]), 3),
+    ])
+
+
+def test_mapping_impact_depth_and_types(client, user_authentication, impact_db):
+    edges = _get_impact(client, user_authentication, "test-case", impact_db["tc"], direction="upstream", types="api")
+    assert sorted(x[0] for x in edges) == sorted([_node("api", impact_db["api1"]), _node("api", impact_db["api2"])])
+
+    edges = _get_impact(client, user_authentication, "test-case", impact_db["tc"], direction="upstream", types="api",
+                        depth=2)
+    assert [x[0] for x in edges] == [_node("api", impact_db["api2"])]
+
+    edges = _get_impact(client, user_authentication, "api", impact_db["api1"], types="test-run,test-case")
+    assert [x[1] for x in edges] == [_node("test-case", impact_db["tc"]), _node("test-run", impact_db["test_run"])]
+
+
+def test_mapping_impact_read_denial(client, reader_authentication, impact_db):
+    edges = _get_impact(client, reader_authentication, "test-case", impact_db["tc"], direction="upstream", types="api")
+    assert [x[0] for x in edges] == [_node("api", impact_db["api1"])]
+
+    # Guests can't read Software Components with read denials
+    response = client.get(_MAPPING_IMPACT_URL, query_string={"work_item_type": "test-case", "id": impact_db["tc"].id,
+                                                             "direction": "upstream", "types": "api"})
+    assert [x["from"] for x in response.json["edges"]] == [_node("api", impact_db["api1"])]
+
+
+@pytest.mark.parametrize("query_string", [
+    {"work_item_type": "test-case"},
+    {"work_item_type": "unknown", "id": 1},
+    {"work_item_type": "test-case", "id": "x"},
+    {"work_item_type": "test-case", "id": 1, "direction": "sideways"},
+    {"work_item_type": "test-case", "id": 1, "depth": 0},
+    {"work_item_type": "test-case", "id": 1, "types": "api,unknown"},
+])
+def test_mapping_impact_bad_request(client, query_string):
+    response = client.get(_MAPPING_IMPACT_URL, query_string=query_string)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,187 @@
+import os
+import sys
+
+import pytest
+
+from db.models.api import ApiModel
+from db.models.api_document import ApiDocumentModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.document import DocumentModel
+from db.models.document_document import DocumentDocumentModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from db.models.test_case import TestCaseModel
+from db.models.test_specification import TestSpecificationModel
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+from db.models.user import UserModel
+from conftest import UT_USER_EMAIL
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(1, os.path.dirname(currentdir))
+
+from api import get_sw_requirement_children  # noqa E402
+from mapping_loader import (  # noqa E402
+    API_DOC_TABLE,
+    API_SR_TABLE,
+    DOC_DOC_TABLE,
+    SR_SR_TABLE,
+    DocumentHierarchyLoader,
+    SwRequirementHierarchyLoader,
+    get_api_mapping_loader,
+)
+
+_UT_API_SPEC = "BASIL UT: mapping loader section."
+_UT_API_SECTION = "mapping loader section"
+_UT_DEPTH = 4
+
+
+@pytest.fixture()
+def sr_hierarchy_db(client_db, ut_user_db, utilities):
+    """Api -> Sw Requirement -> chain of nested Sw Requirements.
+    Each nested Sw Requirement has a Test Specification (with a Test Case) and a Test Case"""
+    dbi = client_db
+    user = dbi.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                      0, 42, "ut_tags", user)
+    sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", user)
+    api_sr = ApiSwRequirementModel(ut_api, sr, _UT_API_SECTION, _UT_API_SPEC.find(_UT_API_SECTION), 0, user)
+    dbi.session.add_all([ut_api, sr, api_sr])
+    dbi.session.commit()
+
+    sr_srs = []
+    parent_api_sr, parent_sr_sr = api_sr, None
+    for i in range(_UT_DEPTH):
+        nested_sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", user)
+        sr_sr = SwRequirementSwRequirementModel(parent_api_sr, parent_sr_sr, nested_sr, 50, user)
+        ts = TestSpecificationModel(f"TS #{i}", "preconditions", "description", "expected", user)
+        sr_ts = SwRequirementTestSpecificationModel(None, sr_sr, ts, 50, user)
+        ts_tc = TestSpecificationTestCaseModel(None, sr_ts, TestCaseModel("repo", f"tc_ts_{i}", f"TC TS #{i}",
+                                                                          "description", user), 50, user)
+        sr_tc = SwRequirementTestCaseModel(None, sr_sr, TestCaseModel("repo", f"tc_sr_{i}", f"TC SR #{i}",
+                                                                      "description", user), 50, user)
+        dbi.session.add_all([nested_sr, sr_sr, ts, sr_ts, ts_tc, sr_tc])
+        dbi.session.commit()
+        sr_srs.append(sr_sr)
+        parent_api_sr, parent_sr_sr = None, sr_sr
+
+    yield api_sr, sr_srs
+
+
+def test_loader_loads_whole_hierarchy(client_db, sr_hierarchy_db, utilities):
+    api_sr, sr_srs = sr_hierarchy_db
+    api_sr_id = api_sr.id
+
+    with utilities.assert_max_queries(client_db.engine) as statements:
+        loader = SwRequirementHierarchyLoader(client_db.session, api_relation_ids=[api_sr_id])
+    # SR-SR, SR-TS, TS-TC, SR-TC: independent from the depth of the hierarchy.
+    # Relationships serialized by as_dict are eager loaded by primary keys.
+    assert len([x for x in statements if "primary_keys" not in x]) == 4
+
+    assert [x.id for x in loader.get_sw_requirements(API_SR_TABLE, api_sr.id)] == [sr_srs[0].id]
+    for parent, child in zip(sr_srs, sr_srs[1:]):
+        assert [x.id for x in loader.get_sw_requirements(SR_SR_TABLE, parent.id)] == [child.id]
+    assert loader.get_sw_requirements(SR_SR_TABLE, sr_srs[-1].id) == []
+
+    for sr_sr in sr_srs:
+        sr_tss = loader.get_test_specifications(SR_SR_TABLE, sr_sr.id)
+        assert len(sr_tss) == 1
+        assert len(loader.get_test_specification_test_cases(sr_tss[0].id)) == 1
+        assert len(loader.get_test_cases(SR_SR_TABLE, sr_sr.id)) == 1
+
+
+def test_loader_sw_requirement_root(client_db, sr_hierarchy_db):
+    _, sr_srs = sr_hierarchy_db
+
+    loader = SwRequirementHierarchyLoader(client_db.session, sr_relation_ids=[sr_srs[1].id],
+                                          include_test_specifications=False, include_test_cases=False)
+    assert loader.get_sw_requirements(API_SR_TABLE, sr_srs[0].sw_requirement_mapping_api_id) == []
+    assert [x.id for x in loader.get_sw_requirements(SR_SR_TABLE, sr_srs[1].id)] == [sr_srs[2].id]
+    assert loader.get_test_specifications(SR_SR_TABLE, sr_srs[2].id) == []
+    assert loader.get_test_cases(SR_SR_TABLE, sr_srs[2].id) == []
+
+
+def test_get_sw_requirement_children(client_db, sr_hierarchy_db):
+    api_sr, sr_srs = sr_hierarchy_db
+
+    mapping = get_sw_requirement_children(client_db, api_sr.as_dict(db_session=client_db.session))
+
+    node = mapping
+    for sr_sr in sr_srs:
+        assert len(node["sw_requirements"]) == 1
+        node = node["sw_requirements"][0]
+        assert node["relation_id"] == sr_sr.id
+        assert len(node["test_specifications"]) == 1
+        assert len(node["test_specifications"][0]["test_specification"]["test_cases"]) == 1
+        assert len(node["test_cases"]) == 1
+    assert node["sw_requirements"] == []
+
+
+def test_document_loader(client_db, ut_user_db, utilities):
+    dbi = client_db
+    user = dbi.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                      0, 42, "ut_tags", user)
+    docs = [DocumentModel(f"Doc #{utilities.generate_random_hex_string8()}", "description", "file", "", "url", "",
+                          0, 1, user) for i in range(_UT_DEPTH + 1)]
+    api_doc = ApiDocumentModel(ut_api, docs[0], _UT_API_SECTION, _UT_API_SPEC.find(_UT_API_SECTION), 0, user)
+    dbi.session.add_all([ut_api, api_doc] + docs)
+    dbi.session.commit()
+
+    doc_docs = []
+    parent_api_doc, parent_doc_doc = api_doc, None
+    for doc in docs[1:]:
+        doc_doc = DocumentDocumentModel(parent_doc_doc, parent_api_doc, doc, "", 0, 50, user)
+        dbi.session.add(doc_doc)
+        dbi.session.commit()
+        doc_docs.append(doc_doc)
+        parent_api_doc, parent_doc_doc = None, doc_doc
+    api_doc_id = api_doc.id
+
+    with utilities.assert_max_queries(client_db.engine) as statements:
+        loader = DocumentHierarchyLoader(client_db.session, api_relation_ids=[api_doc_id])
+    assert len([x for x in statements if "primary_keys" not in x]) == 1
+    assert [x.id for x in loader.get_documents(API_DOC_TABLE, api_doc.id)] == [doc_docs[0].id]
+    for parent, child in zip(doc_docs, doc_docs[1:]):
+        assert [x.id for x in loader.get_documents(DOC_DOC_TABLE, parent.id)] == [child.id]
+    assert loader.get_documents(DOC_DOC_TABLE, doc_docs[-1].id) == []
+
+    loader = DocumentHierarchyLoader(client_db.session, doc_relation_ids=[doc_docs[1].id])
+    assert loader.get_documents(API_DOC_TABLE, api_doc.id) == []
+    assert [x.id for x in loader.rows()] == [x.id for x in doc_docs[2:]]
+
+
+def test_api_mapping_loader(client_db, sr_hierarchy_db, utilities):
+    api_sr, sr_srs = sr_hierarchy_db
+    api = api_sr.api
+    session = client_db.session
+
+    loader = get_api_mapping_loader(session, api, _UT_API_SPEC)
+    loader.load("sw_requirements", sw_requirement_hierarchy=True)
+    assert [x.id for x in loader.sw_requirement_loader.get_sw_requirements(API_SR_TABLE, api_sr.id)] == [sr_srs[0].id]
+
+    # Views built in the same transaction share the loader, loaded types are not queried again
+    assert get_api_mapping_loader(session, api, _UT_API_SPEC) is loader
+    with utilities.assert_max_queries(client_db.engine, 0):
+        loader.load("sw_requirements")
+    with utilities.assert_max_queries(client_db.engine, 1):
+        loader.load("sw_requirements", "justifications")
+
+    # Views get their own copy of the mappings
+    mappings = loader.mappings("sw_requirements")
+    assert [(x["relation_id"], x["match"]) for x in mappings] == [(api_sr.id, True)]
+    mappings[0]["sw_requirements"] = []
+    assert "sw_requirements" not in loader.mappings("sw_requirements")[0]
+    assert loader.mappings("justifications") == []
+
+    other_loader = get_api_mapping_loader(session, api, "Another reference document")
+    assert other_loader is not loader
+    assert not other_loader.load("sw_requirements").mappings("sw_requirements")[0]["match"]
+
+    session.commit()
+    assert get_api_mapping_loader(session, api, "Another reference document") is not other_loader
@@ -264,7 +264,7 @@ def test_mapping_usage_missing_id(client):
 def test_mapping_usage_unknown_id_returns_empty_api_list(client, work_item_type):
     response = _get_mapping_usage(client, work_item_type=work_item_type, wi_id=_UNMATCHING_ID)
     assert response.status_code == HTTPStatus.OK
-    assert response.get_json() == {"api": []}
+    assert response.get_json() == {"api": [], "mappings": []}
 
 
 def test_mapping_usage_sw_requirement_finds_api(client, api_sw_requirement_db):
@@ -307,6 +307,15 @@ def test_mapping_usage_no_match_when_only_api_exists(client, api_only_db):
     ut_api, _ = api_only_db
     response = _get_mapping_usage(client, work_item_type="sw-requirement", wi_id=_UNMATCHING_ID)
     assert response.status_code == HTTPStatus.OK
-    assert response.get_json() == {"api": []}
+    assert response.get_json() == {"api": [], "mappings": []}
     # ensure the created API is not spuriously listed
     assert ut_api.id not in {x["id"] for x in response.get_json().get("api", [])}
+
+
+def test_mapping_usage_returns_mapping_paths(client, api_sr_tc_indirect_db):
+    ut_api, ut_tc, _ = api_sr_tc_indirect_db
+    response = _get_mapping_usage(client, work_item_type="test-case", wi_id=ut_tc.id)
+    mappings = response.get_json()["mappings"]
+    assert [(x["api_id"], x["mapping_table"]) for x in mappings] == [(ut_api.id, "test_case_mapping_sw_requirement")]
+    assert mappings[0]["path"].startswith("sw_requirement_mapping_api:")
+    assert mappings[0]["path"].endswith(f"/test_case_mapping_sw_requirement:{mappings[0]['mapping_id']}")
@@ -0,0 +1,257 @@
+"""Tests for the mapping view cache and GET/DELETE /admin/mapping-cache."""
+
+import os
+import tempfile
+from http import HTTPStatus
+
+import pytest
+
+from mapping_view_cache import MappingViewCache, mapping_view_cache
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.comment import CommentModel
+from db.models.mapping_generation import GLOBAL_GENERATION, get_mapping_generations, has_pending_mapping_changes
+from db.models.sw_requirement import SwRequirementModel
+from db.models.user import UserModel
+from conftest import UT_USER_EMAIL
+
+_MAPPING_CACHE_URL = "/admin/mapping-cache"
+_SW_REQUIREMENTS_URL = "/mapping/api/sw-requirements"
+
+UT_ADMIN_USER_NAME = "mapping_cache_admin_username"
+UT_ADMIN_USER_EMAIL = "mapping_cache_admin_email"
+UT_ADMIN_USER_PASSWORD = "mapping_cache_admin_password"
+UT_ADMIN_USER_ROLE = "ADMIN"
+
+UT_SPECIFICATION = "Mapping view cache. First section. Second section."
+
+
+@pytest.fixture(scope="module")
+def ut_admin_user_db(client_db):
+    dbi = client_db
+    ut_admin_user = UserModel(
+        UT_ADMIN_USER_NAME, UT_ADMIN_USER_EMAIL,
+        UT_ADMIN_USER_PASSWORD, UT_ADMIN_USER_ROLE,
+    )
+    dbi.session.add(ut_admin_user)
+    dbi.session.commit()
+    yield ut_admin_user
+
+
+@pytest.fixture(scope="module")
+def admin_authentication(client, ut_admin_user_db):
+    return client.post(
+        "/user/login",
+        json={"email": UT_ADMIN_USER_EMAIL, "password": UT_ADMIN_USER_PASSWORD},
+    )
+
+
+@pytest.fixture()
+def ut_api(client_db, ut_user_db, utilities):
+    session = client_db.session
+    ut_user = session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+    raw_spec = tempfile.NamedTemporaryFile(mode="w", delete=False)
+    raw_spec.write(UT_SPECIFICATION)
+    raw_spec.close()
+
+    api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                   raw_spec.name, "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                   0, 42, "ut_tags", ut_user)
+    sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+    session.add_all([api, sr])
+    session.commit()
+
+    section = "First section."
+    api_sr = ApiSwRequirementModel(api, sr, section, UT_SPECIFICATION.find(section), 100, ut_user)
+    session.add(api_sr)
+    session.commit()
+
+    yield api, api_sr, ut_user
+
+    if os.path.isfile(raw_spec.name):
+        os.remove(raw_spec.name)
+
+
+class _Builder():
+    """Mapping view stub that counts its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, dbi, api, *args, **kwargs):
+        self.calls += 1
+        return {"calls": self.calls, "args": list(args), "kwargs": kwargs}
+
+
+def _auth_qs(auth_response):
+    return {
+        "user-id": auth_response.json["id"],
+        "token": auth_response.json["token"],
+    }
+
+
+def test_hit_and_arguments(tmp_path, client_db, ut_api):
+    api, _, _ = ut_api
+    cache = MappingViewCache(cache_dir=str(tmp_path))
+    builder = _Builder()
+
+    assert cache.get(client_db, api, "view", builder) == {"calls": 1, "args": [], "kwargs": {}}
+    assert cache.get(client_db, api, "view", builder)["calls"] == 1
+    assert cache.get(client_db, api, "view", builder, {"flag": "false"})["calls"] == 2
+    assert cache.get(client_db, api, "other_view", builder)["calls"] == 3
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 3)
+
+    # Callers get their own copy
+    cache.get(client_db, api, "view", builder)["calls"] = 42
+    assert cache.get(client_db, api, "view", builder)["calls"] == 1
+
+
+def test_generations(client_db, ut_api):
+    api, api_sr, ut_user = ut_api
+    session = client_db.session
+
+    _, _, api_gen, global_gen = get_mapping_generations(session, api.id)
+
+    # Direct mappings only affect their Software Component
+    api_sr.coverage = 50
+    session.commit()
+    assert get_mapping_generations(session, api.id)[2:] == [api_gen + 1, global_gen]
+
+    # Work items and comments can be shown by any Software Component
+    api_sr.sw_requirement.title = f"{api_sr.sw_requirement.title} edited"
+    session.commit()
+    session.add(CommentModel(api_sr.__tablename__, api_sr.id, ut_user, "comment"))
+    session.commit()
+    assert get_mapping_generations(session, api.id)[2:] == [api_gen + 1, global_gen + 2]
+
+    # Bulk deletes are not related to a Software Component
+    session.query(CommentModel).filter(CommentModel.parent_id == api_sr.id,
+                                       CommentModel.parent_table == api_sr.__tablename__).delete()
+    session.commit()
+    assert get_mapping_generations(session, GLOBAL_GENERATION)[3] == global_gen + 3
+
+
+def test_generations_user_name(client_db, utilities):
+    session = client_db.session
+    user = UserModel(f"ut_user_{utilities.generate_random_hex_string8()}",
+                     f"ut_email_{utilities.generate_random_hex_string8()}", "password", "USER")
+    session.add(user)
+    session.commit()
+    global_gen = get_mapping_generations(session, GLOBAL_GENERATION)[3]
+
+    # Only the user name is shown by the mapping views
+    user.email = f"ut_email_{utilities.generate_random_hex_string8()}"
+    session.commit()
+    assert get_mapping_generations(session, GLOBAL_GENERATION)[3] == global_gen
+    user.username = f"ut_user_{utilities.generate_random_hex_string8()}"
+    session.commit()
+    assert get_mapping_generations(session, GLOBAL_GENERATION)[3] == global_gen + 1
+
+    session.delete(user)
+    session.commit()
+
+
+def test_generations_increased_on_commit(client_db, ut_api, utilities):
+    api, api_sr, _ = ut_api
+    session = client_db.session
+    api_gen = get_mapping_generations(session, api.id)[2]
+
+    # The counters are locked by the writer transaction only when it is committed
+    api_sr.coverage = 60
+    with utilities.assert_max_queries(client_db.engine) as statements:
+        session.flush()
+    assert not any("mapping_generations" in x for x in statements)
+    assert has_pending_mapping_changes(session)
+
+    with utilities.assert_max_queries(client_db.engine) as statements:
+        session.commit()
+    assert [x for x in statements if "mapping_generations" in x]
+    assert not has_pending_mapping_changes(session)
+    assert get_mapping_generations(session, api.id)[2] == api_gen + 1
+
+
+def test_invalidation(tmp_path, client_db, ut_api):
+    api, api_sr, ut_user = ut_api
+    session = client_db.session
+    cache = MappingViewCache(cache_dir=str(tmp_path))
+    builder = _Builder()
+
+    cache.get(client_db, api, "view", builder)
+    api_sr.sw_requirement.description = "description edited"
+    session.commit()
+    assert cache.get(client_db, api, "view", builder)["calls"] == 2
+
+    session.delete(api_sr)
+    session.commit()
+    assert cache.get(client_db, api, "view", builder)["calls"] == 3
+
+    with open(api.raw_specification_url, "a") as f:
+        f.write(" Third section.")
+    assert cache.get(client_db, api, "view", builder)["calls"] == 4
+    assert cache.get(client_db, api, "view", builder)["calls"] == 4
+
+
+def test_pending_changes_are_not_cached(tmp_path, client_db, ut_api):
+    api, _, ut_user = ut_api
+    session = client_db.session
+    cache = MappingViewCache(cache_dir=str(tmp_path))
+    builder = _Builder()
+
+    session.add(SwRequirementModel("SW req not committed", "description", ut_user))
+    session.flush()
+    assert has_pending_mapping_changes(session)
+    cache.get(client_db, api, "view", builder)
+    assert cache.stats()["entries"] == 0
+
+    session.rollback()
+    assert not has_pending_mapping_changes(session)
+    cache.get(client_db, api, "view", builder)
+    assert cache.get(client_db, api, "view", builder)["calls"] == 2
+
+
+def test_shared_on_disk(tmp_path, client_db, ut_api):
+    api, _, _ = ut_api
+    worker_a = MappingViewCache(cache_dir=str(tmp_path))
+    worker_b = MappingViewCache(cache_dir=str(tmp_path))
+    builder = _Builder()
+
+    worker_a.get(client_db, api, "view", builder)
+    assert worker_b.get(client_db, api, "view", builder)["calls"] == 1
+    assert worker_b.stats()["disk_hits"] == 1
+
+
+def test_mapping_view(client, client_db, ut_api, user_authentication):
+    api, api_sr, _ = ut_api
+    mapping_view_cache.clear()
+
+    response = client.get(_SW_REQUIREMENTS_URL, query_string={"api-id": api.id})
+    assert response.status_code == HTTPStatus.OK
+    assert client.get(_SW_REQUIREMENTS_URL, query_string={"api-id": api.id}).json == response.json
+    assert mapping_view_cache.stats()["hits"] == 1
+
+    api_sr.sw_requirement.title = "SW req edited"
+    client_db.session.commit()
+    response = client.get(_SW_REQUIREMENTS_URL, query_string={"api-id": api.id})
+    titles = [sr["sw_requirement"]["title"]
+              for section in response.json["mapped"] for sr in section["sw_requirements"]]
+    assert titles == ["SW req edited"]
+
+
+def test_get_mapping_cache(client, admin_authentication):
+    response = client.get(_MAPPING_CACHE_URL, query_string=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    for field in MappingViewCache.COUNTERS + ["entries", "bytes", "max_bytes"]:
+        assert field in response.json
+
+    response = client.delete(_MAPPING_CACHE_URL, json=_auth_qs(admin_authentication))
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(_MAPPING_CACHE_URL, query_string=_auth_qs(admin_authentication))
+    assert response.json["entries"] == 0
+
+
+def test_get_mapping_cache_non_admin_user(client, user_authentication):
+    response = client.get(_MAPPING_CACHE_URL)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get(_MAPPING_CACHE_URL, query_string=_auth_qs(user_authentication))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
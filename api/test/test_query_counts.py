@@ -0,0 +1,157 @@
+import os
+import pytest
+import tempfile
+from http import HTTPStatus
+
+from db.models.api import ApiModel
+from db.models.api_document import ApiDocumentModel
+from db.models.api_justification import ApiJustificationModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.api_test_case import ApiTestCaseModel
+from db.models.api_test_specification import ApiTestSpecificationModel
+from db.models.comment import CommentModel
+from db.models.document import DocumentModel
+from db.models.document_document import DocumentDocumentModel
+from db.models.justification import JustificationModel
+from db.models.notification import NotificationModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from db.models.test_case import TestCaseModel
+from db.models.test_run import TestRunModel
+from db.models.test_run_config import TestRunConfigModel
+from db.models.test_specification import TestSpecificationModel
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+from db.models.user import UserModel
+from conftest import UT_USER_EMAIL
+from user_cache import user_cache
+
+# Number of queries of each endpoint, that must not depend on the number of rows
+MAX_QUERIES = {
+    "/mapping/api/sw-requirements": 62,
+    "/mapping/api/test-specifications": 37,
+    "/mapping/api/test-cases": 29,
+    "/mapping/api/dynamic-view": 77,
+    "/mapping/api/test-runs": 6,
+    "/comments": 4,
+    "/user/notifications": 5,
+}
+
+
+@pytest.fixture()
+def ut_user(client_db, ut_user_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+@pytest.fixture()
+def create_api(client_db, ut_user, utilities):
+    """Create a Software Component with `n` sections, each one mapped to every type of work item"""
+    raw_specs = []
+
+    def _create_api(n):
+        session = client_db.session
+        sections = [f"Section {utilities.generate_random_hex_string8()}." for i in range(n)]
+        spec = " ".join(sections)
+        raw_spec = tempfile.NamedTemporaryFile(mode="w", delete=False)
+        raw_spec.write(spec)
+        raw_spec.close()
+        raw_specs.append(raw_spec.name)
+
+        api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                       raw_spec.name, "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                       0, 42, "ut_tags", ut_user)
+        session.add(api)
+        session.commit()
+
+        mappings = []
+        for section in sections:
+            offset = spec.find(section)
+
+            srs = [SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description",
+                                      ut_user) for i in range(2)]
+            tss = [TestSpecificationModel(f"TS #{utilities.generate_random_hex_string8()}", "pre", "test",
+                                          "expected", ut_user) for i in range(2)]
+            tcs = [TestCaseModel("repository", f"tc_{utilities.generate_random_hex_string8()}.sh", "TC",
+                                 "description", ut_user) for i in range(4)]
+            docs = [DocumentModel(f"Doc #{utilities.generate_random_hex_string8()}", "description", "file", "",
+                                  "url", "", 0, 1, ut_user) for i in range(2)]
+            justification = JustificationModel("justification", ut_user)
+            session.add_all(srs + tss + tcs + docs + [justification])
+            session.commit()
+
+            api_sr = ApiSwRequirementModel(api, srs[0], section, offset, 100, ut_user)
+            api_ts = ApiTestSpecificationModel(api, tss[0], section, offset, 100, ut_user)
+            api_tc = ApiTestCaseModel(api, tcs[0], section, offset, 100, ut_user)
+            api_doc = ApiDocumentModel(api, docs[0], section, offset, 100, ut_user)
+            api_j = ApiJustificationModel(api, justification, section, offset, 100, ut_user)
+            session.add_all([api_sr, api_ts, api_tc, api_doc, api_j])
+            session.commit()
+
+            sr_sr = SwRequirementSwRequirementModel(api_sr, None, srs[1], 100, ut_user)
+            sr_ts = SwRequirementTestSpecificationModel(api_sr, None, tss[1], 100, ut_user)
+            ts_tc = TestSpecificationTestCaseModel(api_ts, None, tcs[1], 100, ut_user)
+            doc_doc = DocumentDocumentModel(None, api_doc, docs[1], section, offset, 100, ut_user)
+            session.add_all([sr_sr, sr_ts, ts_tc, doc_doc])
+            session.commit()
+
+            sr_ts_tc = TestSpecificationTestCaseModel(None, sr_ts, tcs[2], 100, ut_user)
+            sr_tc = SwRequirementTestCaseModel(None, sr_sr, tcs[3], 100, ut_user)
+            session.add_all([sr_ts_tc, sr_tc])
+            session.commit()
+            mappings.append((api_sr, api_tc))
+
+        # Comments and test runs of the first mappings
+        api_sr, api_tc = mappings[0]
+        session.add_all([
+            CommentModel(api_sr.__tablename__, api_sr.id, ut_user, "comment"),
+            TestRunModel(api, "run", "notes",
+                         TestRunConfigModel("tmt", "", "", "config", "main", "", "", "container", "", "",
+                                            None, ut_user),
+                         api_tc.__tablename__, api_tc.id, ut_user),
+        ])
+        notification = NotificationModel(api, "info", "title", "description", "", "")
+        notification.for_owners = 1
+        session.add(notification)
+        session.commit()
+        return api, mappings[0][0], mappings[0][1]
+
+    yield _create_api
+
+    for raw_spec in raw_specs:
+        if os.path.isfile(raw_spec):
+            os.remove(raw_spec)
+
+
+def _get(client, url, query_string):
+    response = client.get(url, query_string=query_string)
+    assert response.status_code == HTTPStatus.OK
+    return response.json
+
+
+def _requests(api, api_sr, api_tc, auth):
+    return {
+        "/mapping/api/sw-requirements": {"api-id": api.id},
+        "/mapping/api/test-specifications": {"api-id": api.id},
+        "/mapping/api/test-cases": {"api-id": api.id},
+        "/mapping/api/dynamic-view": {"api-id": api.id},
+        "/mapping/api/test-runs": {"api-id": api.id, "mapped_to_type": api_tc.__tablename__,
+                                   "mapped_to_id": api_tc.id},
+        "/comments": {"api-id": api.id, "parent_table": api_sr.__tablename__, "parent_id": api_sr.id},
+        "/user/notifications": {"user-id": auth["id"], "token": auth["token"]},
+    }
+
+
+def test_query_counts(client, client_db, user_authentication, create_api, utilities):
+    counts = {}
+    for n in [1, 5]:
+        api, api_sr, api_tc = create_api(n)
+        for url, query_string in _requests(api, api_sr, api_tc, user_authentication.json).items():
+            # Count the query of the authenticated user too
+            user_cache.clear()
+            with utilities.assert_max_queries(client_db.engine, MAX_QUERIES[url]) as statements:
+                _get(client, url, query_string)
+            counts.setdefault(url, []).append(len(statements))
+
+    for url, url_counts in counts.items():
+        assert url_counts[0] == url_counts[1], f"{url}: the number of queries grows with the number of sections"
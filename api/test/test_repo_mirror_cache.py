@@ -0,0 +1,162 @@
+"""Tests for the mirror cache of the repositories read by the traceability scanner."""
+
+import os
+import subprocess
+
+import pytest
+
+import repos_scanner
+from repo_mirror_cache import RepoMirrorCache
+from repos_scanner import RepoScanner
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def _commit(repo, filename, content, message):
+    (repo / filename).write_text(content)
+    _git(repo, "add", filename)
+    _git(repo, "-c", "user.name=ut", "-c", "user.email=ut@basil", "commit", "-q", "-m", message)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture()
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "main")
+    _commit(repo, "requirements.txt", "REQ-1\n", "first")
+    _git(repo, "tag", "v1.0")
+    _commit(repo, "requirements.txt", "REQ-1\nREQ-2\n", "second")
+    return repo
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return RepoMirrorCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024 * 1024, fetch_interval=3600)
+
+
+def test_checkout_reuses_mirror_and_tree(origin, cache):
+    url = str(origin)
+    first = cache.checkout(url, "main")
+    assert (first.path / "requirements.txt").read_text() == "REQ-1\nREQ-2\n"
+    assert not (first.path / ".git").exists()
+    assert first.commit == _git(origin, "rev-parse", "HEAD")
+    assert first.version == _git(origin, "rev-parse", "--short=7", "HEAD")
+
+    second = cache.checkout(url, "main")
+    assert second.path == first.path
+    first.close()
+    second.close()
+
+    stats = cache.stats()
+    assert stats["repositories"] == 1
+    assert stats["trees"] == 1
+    assert stats["bytes"] > 0
+
+
+def test_checkout_tag_and_commit(origin, cache):
+    url = str(origin)
+    tag = cache.checkout(url, "v1.0")
+    assert (tag.path / "requirements.txt").read_text() == "REQ-1\n"
+    assert tag.version == f"v1.0-0-g{tag.commit[:7]}"
+
+    commit = cache.checkout(url, tag.commit)
+    assert commit.path == tag.path
+    tag.close()
+    commit.close()
+
+
+def test_fetch_interval(origin, cache):
+    url = str(origin)
+    cache.checkout(url, "main").close()
+    head = _commit(origin, "requirements.txt", "REQ-3\n", "third")
+
+    # The mirror is not fetched again before the interval
+    checkout = cache.checkout(url, "main")
+    assert checkout.commit != head
+    checkout.close()
+
+    cache.fetch_interval = 0
+    checkout = cache.checkout(url, "main")
+    assert checkout.commit == head
+    assert (checkout.path / "requirements.txt").read_text() == "REQ-3\n"
+    checkout.close()
+
+
+def test_new_branch_is_fetched(origin, cache):
+    url = str(origin)
+    cache.checkout(url, "main").close()
+    _git(origin, "checkout", "-q", "-b", "feature")
+    head = _commit(origin, "feature.txt", "feature\n", "feature")
+
+    checkout = cache.checkout(url, "feature")
+    assert checkout.commit == head
+    checkout.close()
+
+
+def test_unknown_ref(origin, cache):
+    with pytest.raises(RuntimeError):
+        cache.checkout(str(origin), "missing")
+
+
+def test_unreachable_remote_uses_mirror(origin, cache, tmp_path):
+    url = str(origin)
+    cache.checkout(url, "main").close()
+    os.rename(origin, tmp_path / "moved")
+
+    cache.fetch_interval = 0
+    checkout = cache.checkout(url, "main")
+    assert (checkout.path / "requirements.txt").read_text() == "REQ-1\nREQ-2\n"
+    checkout.close()
+
+
+def test_evict_keeps_trees_in_use(origin, cache):
+    url = str(origin)
+    old = cache.checkout(url, "v1.0")
+    old.close()
+    current = cache.checkout(url, "main")
+
+    cache.max_bytes = 0
+    cache.evict()
+
+    # The tree in use is kept, the rest is evicted
+    assert (current.path / "requirements.txt").exists()
+    assert not old.path.exists()
+    assert cache.stats()["trees"] == 1
+    current.close()
+
+    cache.evict()
+    assert not current.path.exists()
+    assert cache.stats() == {"repositories": 1, "trees": 0, "bytes": 0, "max_bytes": 0}
+
+    # Evicted mirrors are cloned again
+    cache.max_bytes = 1024 * 1024 * 1024
+    checkout = cache.checkout(url, "main")
+    assert (checkout.path / "requirements.txt").exists()
+    checkout.close()
+
+
+def test_repo_scanner_uses_cache(origin, cache, monkeypatch):
+    monkeypatch.setattr(repos_scanner, "repo_mirror_cache", cache)
+    scanner = RepoScanner(user_id="ut", _config={"url": str(origin), "branch": "main"})
+    target_dir = scanner.clone_to_user_temp()
+
+    assert target_dir.startswith(cache.cache_dir)
+    assert scanner.list_files(filename_pattern="*.txt") == ["requirements.txt"]
+    assert scanner.git_version == _git(origin, "rev-parse", "--short=7", "HEAD")
+    scanner.close()
+    assert scanner.target_dir is None
+    assert os.path.exists(target_dir)
+
+
+def test_repo_scanner_without_cache(origin, monkeypatch):
+    monkeypatch.setattr(repos_scanner, "repo_mirror_cache", RepoMirrorCache(cache_dir=""))
+    scanner = RepoScanner(user_id="ut", _config={"url": f"file://{origin}", "branch": "v1.0"})
+    target_dir = scanner.clone_to_user_temp()
+
+    assert scanner.list_files(filename_pattern="*.txt") == ["requirements.txt"]
+    assert scanner.git_version.startswith("v1.0-0-g")
+    scanner.close()
+    assert not os.path.exists(target_dir)
@@ -647,3 +647,26 @@ def test_closest_integration():
     assert isinstance(ret, list)
     assert len(ret) == 1
     assert "TARGET LINE 2" in ret[0].get("text", "")
+
+
+def test_start_end_chain_large_text():
+    """Elements of a chain are spans of the shared text lines, their text is joined only when read"""
+    lines = []
+    for i in range(2000):
+        lines += [f"// REQ {i}"] + [f"   body {i}.{j}" for j in range(8)] + ["// END"]
+    text = "\n".join(lines)
+    scanner = TextScanner(text="")
+
+    starts = scanner.start__lines_starting_with(text=text, elements=[], match_string="// REQ")
+    assert len(starts) == 2000
+    assert all(x.lines is starts[0].lines for x in starts)
+
+    sections = scanner.end__lines_equal(text=text, elements=starts, match_string="// END")
+    assert len(sections) == 2000
+    assert sections[1] == {"index": 10, "text": "\n".join(lines[10:19])}
+    assert sections[-1]["text"].startswith("// REQ 1999\n   body 1999.0")
+
+    closest = scanner.closest__lines_starting_with(
+        text=text, elements=[{"index": 15, "text": lines[15]}], match_string="// REQ", direction="up"
+    )
+    assert closest == [{"index": 10, "text": "\n".join(lines[10:])}]
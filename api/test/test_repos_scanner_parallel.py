@@ -0,0 +1,108 @@
+"""Tests for the parallel scan of the apis of a traceability configuration."""
+
+import subprocess
+
+import pytest
+
+import repos_scanner
+from repo_mirror_cache import RepoMirrorCache
+from repos_scanner import ArtifactsScanner
+from traceability_scan_state import TraceabilityScanState
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+@pytest.fixture()
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    (repo / "docs").mkdir(parents=True)
+    (repo / "reqs").mkdir()
+    for name in ["open", "read", "write", "close"]:
+        (repo / "docs" / f"{name}.md").write_text(f"{name}\n\nReference document of {name}\n")
+        (repo / "reqs" / f"{name}.req").write_text(f"// REQ {name} 1\n// END\n// REQ {name} 2\n// END\n")
+    _git(repo, "init", "-q", "-b", "main")
+    _git(repo, "add", ".")
+    _git(repo, "-c", "user.name=ut", "-c", "user.email=ut@basil", "commit", "-q", "-m", "apis")
+    return repo
+
+
+@pytest.fixture()
+def scan_config(origin):
+    snippet_rule = {
+        "name": "Whole document",
+        "section": {"value": "__reference_document_content__"},
+        "offset": {"value": 0},
+        "software_requirements": {
+            "rules": [
+                {
+                    "name": "Requirements",
+                    "repository": {"url": str(origin), "branch": "main", "filename_pattern": "__api__.req"},
+                    "title": {"start": {"line_starting_with": "// REQ"}, "end": {"line_equal": "// END"}},
+                    "description": {"value": "__api__"},
+                    "coverage": {"value": 100},
+                }
+            ]
+        },
+    }
+    return {
+        "api": [
+            {
+                "name": names,
+                "library": "lib",
+                "library_version": "__version__",
+                "repository": {"url": str(origin), "branch": "main", "filename_pattern": "__api__.md"},
+                "snippets": {"rules": [snippet_rule]},
+            }
+            for names in [["open", "read", "missing"], ["write", "close"]]
+        ]
+    }
+
+
+@pytest.fixture()
+def scanner_env(tmp_path, monkeypatch):
+    (tmp_path / "user-files" / "u").mkdir(parents=True)
+    monkeypatch.setattr(repos_scanner, "USER_FILES_BASE_DIR", str(tmp_path / "user-files"))
+    monkeypatch.setattr(
+        repos_scanner,
+        "repo_mirror_cache",
+        RepoMirrorCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024 * 1024, fetch_interval=3600),
+    )
+
+
+def _scan(scan_config, workers):
+    scanner = ArtifactsScanner(user_id="u", testing=True, workers=workers)
+    scanner.scan_config = scan_config
+    return scanner.scan(), scanner.api_timings
+
+
+def test_parallel_scan_same_result_as_sequential(scan_config, scanner_env):
+    sequential, sequential_timings = _scan(scan_config, workers=1)
+    parallel, parallel_timings = _scan(scan_config, workers=3)
+
+    assert [x["api"] for x in sequential] == ["open", "read", "write", "close"]
+    assert [x["title"] for x in sequential[3]["snippets"][0]["software_requirements"]] == [
+        "// REQ close 1",
+        "// REQ close 2",
+    ]
+    assert parallel == sequential
+    assert [x["api"] for x in parallel_timings] == [x["api"] for x in sequential_timings]
+    assert [x["api"] for x in parallel_timings] == ["open", "read", "missing", "write", "close"]
+    assert all(x["seconds"] >= 0 for x in parallel_timings)
+
+
+def test_parallel_scan_worker_error(scan_config, scanner_env):
+    scan_config["api"][1]["repository"]["branch"] = "missing"
+    with pytest.raises(RuntimeError):
+        _scan(scan_config, workers=2)
+
+
+def test_parallel_scan_keeps_rules_evaluated_by_workers(scan_config, scanner_env, tmp_path):
+    scan_state = TraceabilityScanState(path=str(tmp_path / "state.json"), config="config")
+    scanner = ArtifactsScanner(user_id="u", testing=True, workers=2, scan_state=scan_state)
+    scanner.scan_config = scan_config
+    scanner.scan()
+
+    # One record of the requirements rule for each api with a reference document
+    assert len(scan_state.new_rules) == 4
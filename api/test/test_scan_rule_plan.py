@@ -0,0 +1,93 @@
+import pytest
+
+from repos_scanner import ArtifactsScanner
+from scan_rule_plan import LineIndex, LinePass, compile_rule_plan, line_predicate
+
+TEST_TEXT = "\n".join([
+    "// REQ-1 Title",
+    "  body of req-1",
+    "// END",
+    "",
+    "// req-2 title",
+    "body; // END",
+    "// END",
+])
+
+RULE_CONFIG = {
+    "name": "Requirements",
+    "title": {
+        "start": {"line_starting_with": "// REQ", "strip": True},
+        "end": {"line_equal": "// END"},
+    },
+    "description": {
+        "start": {"line_contains": "req", "strip": True, "closest": {"direction": "up", "line_starting_with": "//"}},
+        "end": {"line_ending_with": "END", "line_regex": "^x"},
+    },
+    "coverage": {"value": 100},
+}
+
+
+@pytest.mark.parametrize("match_type", ["startswith", "not_startswith", "endswith", "not_endswith", "contains",
+                                        "not_contains", "equal", "not_equal", "regex"])
+@pytest.mark.parametrize("match_string", ["// ", "END", "", "req", "a\nb", "body; // END"])
+@pytest.mark.parametrize("strip, case_sensitive", [(False, False), (True, False), (True, True), ("/ ", False)])
+def test_line_index_positions(match_type, match_string, strip, case_sensitive):
+    predicate = line_predicate(match_type, match_string, strip=strip, case_sensitive=case_sensitive)
+    check_line = predicate.checker()
+    lines = TEST_TEXT.splitlines()
+
+    assert LineIndex(TEST_TEXT).positions(predicate) == [i for i, x in enumerate(lines) if check_line(x)]
+
+
+def test_line_pass_overlapping_predicates():
+    """Lines matching several predicates of the same pass are reported for all of them"""
+    predicates = [line_predicate(x, y, strip=True, case_sensitive=False)
+                  for x, y in [("startswith", "//"), ("startswith", "// req"), ("contains", "end"),
+                               ("endswith", "end"), ("equal", "// end"), ("regex", "^//.*title$")]]
+    line_pass = LinePass(predicates[0].normalization, predicates)
+    index = LineIndex(TEST_TEXT)
+    index.evaluate([line_pass])
+
+    assert index.positions(predicates[0]) == [0, 2, 4, 6]
+    assert index.positions(predicates[1]) == [0, 4]
+    assert index.positions(predicates[2]) == [2, 5, 6]
+    assert index.positions(predicates[3]) == [2, 5, 6]
+    assert index.positions(predicates[4]) == [2, 6]
+    assert index.positions(predicates[5]) == [0, 4]
+    assert len(line_pass.plain) == 5
+
+
+def test_compile_rule_plan():
+    plan = compile_rule_plan(RULE_CONFIG)
+    description = plan.describe()
+
+    assert description["rule"] == "Requirements"
+    assert description["fields"] == {
+        "title": ["start.line_starting_with: startswith '// req'", "end.line_equal: equal '// end'"],
+        "description": ["start.line_contains: contains 'req'", "closest.line_starting_with: startswith '//'",
+                        "end.line_ending_with: endswith 'end'"],
+    }
+    # end inherits the strip of start, all the predicates share a single pass
+    assert len(plan.line_passes) == 1
+    assert len(plan.line_passes[0].predicates) == 5
+
+
+def test_artifacts_scanner_rule_plans():
+    scanner = ArtifactsScanner(user_id="u", testing=True)
+    rule_config = dict(RULE_CONFIG, test_cases={"rules": [dict(RULE_CONFIG, name="Nested")]})
+    snippet_rule = {"name": "Snippets", "software_requirements": {"rules": [rule_config]}}
+    scanner.scan_config = {"api": [{"name": ["api"], "snippets": {"rules": [snippet_rule]}}]}
+    assert [x["rule"] for x in scanner.dump_rule_plans()] == ["Snippets", "Requirements", "Nested"]
+
+    # The fields of a rule share the lines of the text and the predicates evaluated on them
+    text = TEST_TEXT
+    title = scanner._get_field_value(_config=RULE_CONFIG, field_name="title", field_type="str", text=text,
+                                     _magic_variables={})
+    text_scanner = scanner._text_scanners[text]
+    line_index = text_scanner.line_index()
+    description = scanner._get_field_value(_config=RULE_CONFIG, field_name="description", field_type="str",
+                                           text=text, _magic_variables={})
+
+    assert text_scanner.line_index() is line_index
+    assert [x["text"] for x in title] == ["// REQ-1 Title\n  body of req-1", "// req-2 title\nbody; // END"]
+    assert [x["index"] for x in description] == [0, 4]
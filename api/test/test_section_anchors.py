@@ -0,0 +1,61 @@
+from section_anchors import OffsetMap, find_nearest, reanchor_sections
+
+_OLD_TEXT = "Title\nFirst paragraph.\nRepeated line.\nSecond paragraph.\nRepeated line.\nEnd\n"
+_NEW_TEXT = "Title\nIntroduction.\nFirst paragraph.\nRepeated line.\nSecond paragraph, edited.\nRepeated line.\nEnd\n"
+
+
+def _sections(text, *sections):
+    """(key, section, offset) of the n-th occurrence of each section, key is the section index"""
+    ret = []
+    for i, (section, occurrence) in enumerate(sections):
+        offset = -1
+        for _ in range(occurrence + 1):
+            offset = text.index(section, offset + 1)
+        ret.append((i, section, offset))
+    return ret
+
+
+def test_offset_map():
+    offset_map = OffsetMap(_OLD_TEXT, _NEW_TEXT)
+    shift = len("Introduction.\n")
+    assert offset_map.map(0) == 0
+    assert offset_map.map(_OLD_TEXT.index("First")) == _NEW_TEXT.index("First")
+    assert offset_map.map(_OLD_TEXT.index("End")) == _NEW_TEXT.index("End")
+    # Changed lines keep the distance from the start of the replacement
+    assert offset_map.map(_OLD_TEXT.index("paragraph.\nRep", 30)) == _OLD_TEXT.index("paragraph.\nRep", 30) + shift
+
+
+def test_find_nearest():
+    text = "abc " * 10000
+    assert find_nearest(text, "abc", 0) == 0
+    assert find_nearest(text, "abc", 5) == 4
+    assert find_nearest(text, "abc", 7) == 8
+    # Ties are resolved to the first occurrence
+    assert find_nearest(text, "abc", 6) == 4
+    assert find_nearest(text, "abc", len(text) + 10) == len(text) - 4
+    assert find_nearest("x" * 100000 + "needle", "needle", 0) == 100000
+    assert find_nearest(text, "missing", 20000) is None
+
+
+def test_reanchor_without_old_text():
+    sections = _sections(_OLD_TEXT, ("First paragraph.", 0), ("Repeated line.", 0),
+                         ("Repeated line.", 1), ("Second paragraph.", 0))
+    ret = reanchor_sections(sections, _NEW_TEXT)
+    assert ret[0] == _NEW_TEXT.index("First paragraph.")
+    # Duplicated sections keep their order instead of moving to the first occurrence
+    assert ret[1] == _NEW_TEXT.index("Repeated line.")
+    assert ret[2] == _NEW_TEXT.rindex("Repeated line.")
+    # Edited section
+    assert ret[3] is None
+
+
+def test_reanchor_with_old_text():
+    sections = _sections(_OLD_TEXT, ("Repeated line.", 1), ("Repeated line.", 0), ("Title", 0))
+    ret = reanchor_sections(sections, _NEW_TEXT, _OLD_TEXT)
+    assert ret == {0: _NEW_TEXT.rindex("Repeated line."), 1: _NEW_TEXT.index("Repeated line."), 2: 0}
+
+
+def test_reanchor_removed_section():
+    sections = _sections(_OLD_TEXT, ("First paragraph.", 0))
+    assert reanchor_sections(sections, _NEW_TEXT.replace("First", "1st")) == {0: None}
+    assert reanchor_sections(sections, "") == {0: None}
@@ -0,0 +1,60 @@
+import os
+import sys
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(1, os.path.dirname(currentdir))
+
+from api import get_split_sections  # noqa E402
+
+_SPEC = "First line.\nSecond line.\n\nThird line."
+
+
+def _item(section, covered=50, match=True, offset=None):
+    return {"section": section, "offset": _SPEC.find(section) if offset is None else offset,
+            "covered": covered, "match": match}
+
+
+def _mapping(sw_requirements=[], justifications=[], documents=[]):
+    return {"sw_requirements": sw_requirements, "justifications": justifications, "documents": documents}
+
+
+def _sections(mapped_sections):
+    return [(x["offset"], x["section"]) for x in mapped_sections]
+
+
+def test_no_mapping():
+    sections = get_split_sections(_SPEC, _mapping(), ["sw_requirement", "justification", "document"])
+    assert _sections(sections) == [(0, _SPEC)]
+    assert sections[0]["covered"] == 0
+
+    assert get_split_sections("", _mapping(), ["sw_requirement"]) == []
+
+
+def test_overlapping_mappings():
+    sr = _item("Second line.\n\nThird", covered=40)
+    sr_nested = _item("line.\n\nThird", covered=30, offset=_SPEC.find("line.\n\nThird"))
+    justification = _item("First line.\nSecond", covered=100)
+    not_matching = _item("First", match=False)
+    sections = get_split_sections(
+        _SPEC, _mapping(sw_requirements=[sr, sr_nested, not_matching], justifications=[justification]),
+        ["sw_requirement", "justification"],
+    )
+    assert _sections(sections) == [
+        (0, "First line.\n"),
+        (12, "Second"),
+        (18, " "),
+        (19, "line.\n\nThird"),
+        (31, " line."),
+    ]
+    assert [len(x["sw_requirements"]) for x in sections] == [0, 1, 1, 2, 0]
+    assert [len(x["justifications"]) for x in sections] == [1, 1, 0, 0, 0]
+    assert sections[3]["sw_requirements"] == [sr, sr_nested]
+    assert [x["covered"] for x in sections] == [100, 100, 40, 70, 0]
+    assert sr["parent_mapping_type"] == "sw_requirement_mapping_api"
+    assert "parent_mapping_type" not in not_matching
+
+
+def test_blank_sections_without_work_items_are_removed():
+    sections = get_split_sections(_SPEC, _mapping(documents=[_item("Second line."), _item("Third line.")]),
+                                  ["document"])
+    assert _sections(sections) == [(0, "First line.\n"), (12, "Second line."), (26, "Third line.")]
@@ -0,0 +1,170 @@
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+from http import HTTPStatus
+
+import pytest
+
+from conftest import UT_USER_EMAIL
+from db.models.api import ApiModel
+from db.models.api_justification import ApiJustificationModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.api_test_case import ApiTestCaseModel
+from db.models.justification import JustificationModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from db.models.test_case import TestCaseModel
+from db.models.test_run import TestRunModel
+from db.models.test_run_config import TestRunConfigModel
+from db.models.test_specification import TestSpecificationModel
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+from db.models.traceability_matrix import MATRIX_COLUMNS
+from db.models.user import UserModel
+
+_MATRIX_URL = "/mapping/traceability-matrix"
+
+_UT_SPEC_SECTION = "BASIL UT traceability matrix section."
+_UT_RAW_SPEC = f"BASIL UT: {_UT_SPEC_SECTION}"
+
+
+def _auth(authentication):
+    return {"user-id": authentication.json["id"], "token": authentication.json["token"]}
+
+
+@pytest.fixture
+def matrix_db(client_db, utilities, ut_user_db, ut_reader_user_db):
+    """In a dedicated library:
+    api1 -> SR1 -> SR2 -> TC1 with two test runs
+    api1 -> SR1 -> TS -> TC2
+    api1 -> Justification
+    api2 -> TC1, with a read denial for the reader user
+    """
+    session = client_db.session
+    user = session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+    library = f"ut_matrix_{utilities.generate_random_hex_string8()}"
+    raw_spec = tempfile.NamedTemporaryFile(mode="w", delete=False)
+    raw_spec.write(_UT_RAW_SPEC)
+    raw_spec.close()
+
+    api1 = ApiModel("api1", library, "v1", raw_spec.name, "ut_category", "", "", 0, 1, "", user)
+    api2 = ApiModel("api2", library, "v1", raw_spec.name, "ut_category", "", "", 0, 1, "", user)
+    api2.read_denials = f"[{ut_reader_user_db.id}]"
+    sr1 = SwRequirementModel("SR1", "parent", user)
+    sr2 = SwRequirementModel("SR2", "child", user)
+    ts = TestSpecificationModel("TS", "pre", "test", "expected", user)
+    tc1 = TestCaseModel("repository", "tc1.sh", "TC1", "description", user)
+    tc2 = TestCaseModel("repository", "tc2.sh", "TC2", "description", user)
+    justification = JustificationModel("Not testable", user)
+    session.add_all([api1, api2, sr1, sr2, ts, tc1, tc2, justification])
+    session.commit()
+
+    offset = _UT_RAW_SPEC.find(_UT_SPEC_SECTION)
+    api_sr = ApiSwRequirementModel(api1, sr1, _UT_SPEC_SECTION, offset, 100, user)
+    api_j = ApiJustificationModel(api1, justification, _UT_SPEC_SECTION, offset, 100, user)
+    api_tc = ApiTestCaseModel(api2, tc1, _UT_SPEC_SECTION, offset, 100, user)
+    session.add_all([api_sr, api_j, api_tc])
+    session.commit()
+    sr_sr = SwRequirementSwRequirementModel(api_sr, None, sr2, 100, user)
+    sr_ts = SwRequirementTestSpecificationModel(api_sr, None, ts, 100, user)
+    session.add_all([sr_sr, sr_ts])
+    session.commit()
+    sr_tc = SwRequirementTestCaseModel(None, sr_sr, tc1, 100, user)
+    ts_tc = TestSpecificationTestCaseModel(None, sr_ts, tc2, 100, user)
+    session.add_all([sr_tc, ts_tc])
+    session.commit()
+
+    config = TestRunConfigModel("tmt", "", "", "config", "main", "", "", "container", "", "", None, user)
+    old_run = TestRunModel(api1, "old run", "notes", config, sr_tc.__tablename__, sr_tc.id, user)
+    old_run.created_at = datetime.datetime.now() - datetime.timedelta(days=1)
+    old_run.result = "fail"
+    new_run = TestRunModel(api1, "new run", "notes", config, sr_tc.__tablename__, sr_tc.id, user)
+    new_run.status = "completed"
+    new_run.result = "pass"
+    session.add_all([old_run, new_run])
+    session.commit()
+
+    yield {"library": library, "api1": api1, "api2": api2, "sr1": sr1, "sr2": sr2, "ts": ts, "tc1": tc1,
+           "tc2": tc2, "justification": justification, "new_run": new_run}
+
+    session.rollback()
+    for ut_api in [api1, api2]:
+        session.delete(session.get(ApiModel, ut_api.id))
+    session.commit()
+    os.remove(raw_spec.name)
+
+
+def _get_matrix(client, authentication=None, **kwargs):
+    query_string = dict(kwargs)
+    if authentication is not None:
+        query_string.update(_auth(authentication))
+    return client.get(_MATRIX_URL, query_string=query_string)
+
+
+def _jsonl(response):
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(x) for x in response.get_data(as_text=True).splitlines()]
+
+
+def test_traceability_matrix_jsonl(client, user_authentication, matrix_db):
+    rows = _jsonl(_get_matrix(client, user_authentication, library=matrix_db["library"], format="jsonl"))
+    assert all(list(x.keys()) == MATRIX_COLUMNS for x in rows)
+    assert [x["api"] for x in rows] == ["api1", "api1", "api1", "api2"]
+
+    api1_rows = {x["mapping_table"]: x for x in rows[:3]}
+    sr_tc = api1_rows["test_case_mapping_sw_requirement"]
+    assert sr_tc["sw_requirements"] == ["SR1", "SR2"]
+    assert sr_tc["sw_requirement_ids"] == [matrix_db["sr1"].id, matrix_db["sr2"].id]
+    assert sr_tc["test_specification_id"] is None
+    assert sr_tc["test_case"] == "TC1"
+    assert sr_tc["section"] == _UT_SPEC_SECTION
+    assert sr_tc["test_run_id"] == matrix_db["new_run"].id
+    assert sr_tc["test_run_result"] == "pass"
+
+    ts_tc = api1_rows["test_case_mapping_test_specification"]
+    assert ts_tc["sw_requirements"] == ["SR1"]
+    assert (ts_tc["test_specification"], ts_tc["test_case"]) == ("TS", "TC2")
+    assert ts_tc["test_run_id"] is None
+
+    justified = api1_rows["justification_mapping_api"]
+    assert justified["sw_requirements"] == []
+    assert (justified["justification_id"], justified["justification"]) == (matrix_db["justification"].id,
+                                                                           "Not testable")
+
+    assert (rows[3]["mapping_table"], rows[3]["test_case_id"]) == ("test_case_mapping_api", matrix_db["tc1"].id)
+
+
+def test_traceability_matrix_csv(client, user_authentication, matrix_db):
+    response = _get_matrix(client, user_authentication, **{"api-ids": str(matrix_db["api1"].id)})
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "text/csv"
+    assert "traceability_matrix.csv" in response.headers["Content-Disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 3
+    assert list(rows[0].keys()) == MATRIX_COLUMNS
+    assert sorted(x["sw_requirements"] for x in rows) == ["", "SR1", "SR1 > SR2"]
+
+
+def test_traceability_matrix_read_denial(client, reader_authentication, matrix_db):
+    rows = _jsonl(_get_matrix(client, reader_authentication, library=matrix_db["library"], format="jsonl"))
+    assert {x["api"] for x in rows} == {"api1"}
+
+    api_ids = f"{matrix_db['api1'].id},{matrix_db['api2'].id}"
+    rows = _jsonl(_get_matrix(client, **{"api-ids": api_ids, "format": "jsonl"}))
+    assert {x["api"] for x in rows} == {"api1"}
+
+
+@pytest.mark.parametrize("query_string", [
+    {},
+    {"library": "ut_library", "format": "xlsx"},
+    {"api-ids": "1,x"},
+])
+def test_traceability_matrix_bad_request(client, query_string):
+    response = client.get(_MATRIX_URL, query_string=query_string)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,285 @@
+"""Tests for the incremental traceability scans: rules reused across commits and delta of the mappings."""
+
+import subprocess
+
+import pytest
+
+import repos_scanner
+from db import db_orm
+from db.models.api import ApiModel
+from db.models.api_justification import ApiJustificationModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.api_test_case import ApiTestCaseModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.test_case import TestCaseModel
+from db.models.user import UserModel
+from repo_mirror_cache import RepoMirrorCache
+from repos_scanner import ArtifactsScanner, FilesScanner, TraceabilityGenerator
+from traceability_scan_state import TraceabilityScanState, traceability_delta
+
+RULE_CONFIG = {
+    "name": "Requirements",
+    "repository": {"filename_pattern": "*.req", "folder_pattern": "reqs"},
+    "title": {
+        "start": {"line_starting_with": "// REQ", "strip": True},
+        "end": {"line_equal": "// END"},
+    },
+    "description": {"value": "from the repository"},
+    "coverage": {"value": 100},
+}
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def _commit(repo, filename, content):
+    (repo / filename).parent.mkdir(parents=True, exist_ok=True)
+    (repo / filename).write_text(content)
+    _git(repo, "add", filename)
+    _git(repo, "-c", "user.name=ut", "-c", "user.email=ut@basil", "commit", "-q", "-m", f"update {filename}")
+
+
+def _api(snippets, library_version="1.0"):
+    return {"api": "api", "library": "lib", "library_version": library_version, "snippets": snippets}
+
+
+def _snippet(section="section", offset=0, **work_items):
+    ret = {"section": section, "offset": offset}
+    for work_item_type in ["justifications", "documents", "software_requirements", "test_specifications",
+                           "test_cases"]:
+        ret[work_item_type] = work_items.get(work_item_type, [])
+    return ret
+
+
+def _sw_requirement(title, description="", coverage=100):
+    return {"title": title, "description": description, "coverage": coverage, "software_requirements": [],
+            "test_specifications": [], "test_cases": []}
+
+
+@pytest.fixture()
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "main")
+    _commit(repo, "reqs/a.req", "// REQ-1\n// END\n")
+    _commit(repo, "README.md", "readme\n")
+    return repo
+
+
+@pytest.fixture()
+def mirror_cache(tmp_path, monkeypatch):
+    cache = RepoMirrorCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024 * 1024, fetch_interval=0)
+    monkeypatch.setattr(repos_scanner, "repo_mirror_cache", cache)
+    return cache
+
+
+@pytest.fixture()
+def file_reads(monkeypatch):
+    reads = []
+    get_file_content = FilesScanner.get_file_content
+
+    def counting_get_file_content(filepath, encoding="utf-8"):
+        reads.append(filepath)
+        return get_file_content(filepath, encoding=encoding)
+
+    monkeypatch.setattr(FilesScanner, "get_file_content", staticmethod(counting_get_file_content))
+    return reads
+
+
+def _scan(state_path, origin):
+    """Evaluate the rule with the state of the previous scan and store the new state"""
+    scan_state = TraceabilityScanState(path=str(state_path), config="config")
+    scanner = ArtifactsScanner(user_id="u", testing=True, scan_state=scan_state)
+    rule_config = dict(RULE_CONFIG, repository=dict(RULE_CONFIG["repository"], url=str(origin), branch="main"))
+    ret = scanner.search__software_requirements(_config={"rules": [rule_config]}, _magic_variables={"__api__": "a"})
+    scan_state.save(traceability=[])
+    return [x["title"] for x in ret]
+
+
+def test_rules_reused_until_their_files_change(origin, mirror_cache, file_reads, tmp_path):
+    state_path = tmp_path / "state.json"
+    # Each file is read by the content filter and by the rule
+    assert _scan(state_path, origin) == ["// REQ-1"]
+    assert len(file_reads) == 2
+
+    # Same commit
+    assert _scan(state_path, origin) == ["// REQ-1"]
+    assert len(file_reads) == 2
+
+    # Files not matching the patterns of the rule
+    _commit(origin, "README.md", "changed\n")
+    _commit(origin, "other/b.req", "// REQ-3\n// END\n")
+    assert _scan(state_path, origin) == ["// REQ-1"]
+    assert len(file_reads) == 2
+
+    _commit(origin, "reqs/b.req", "// REQ-2\n// END\n")
+    assert _scan(state_path, origin) == ["// REQ-1", "// REQ-2"]
+    assert len(file_reads) == 6
+
+    # A different configuration evaluates the rules again
+    TraceabilityScanState(path=str(state_path), config="new config").save(traceability=[])
+    assert _scan(state_path, origin) == ["// REQ-1", "// REQ-2"]
+    assert len(file_reads) == 10
+
+
+def test_rules_not_reused_without_mirror_cache(origin, file_reads, tmp_path, monkeypatch):
+    monkeypatch.setattr(repos_scanner, "repo_mirror_cache", RepoMirrorCache(cache_dir=""))
+    state_path = tmp_path / "state.json"
+    assert _scan(state_path, origin) == ["// REQ-1"]
+    assert _scan(state_path, origin) == ["// REQ-1"]
+    assert len(file_reads) == 4
+
+
+def test_scan_state_keeps_apis_not_scanned(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    scan_state = TraceabilityScanState(path=state_path, config="config")
+    assert scan_state.traceability is None
+    scan_state.save(traceability=[dict(_api([]), reference_document_content="content")])
+
+    scan_state = TraceabilityScanState(path=state_path, config="config")
+    assert scan_state.traceability == [_api([])]
+    scan_state.save(traceability=[_api([], library_version="2.0")])
+
+    scan_state = TraceabilityScanState(path=state_path, config="other config")
+    assert scan_state.traceability == [_api([]), _api([], library_version="2.0")]
+
+
+def test_traceability_delta():
+    previous = [_api([_snippet(software_requirements=[_sw_requirement("SR-1"), _sw_requirement("SR-2"),
+                                                      _sw_requirement("SR-3")])])]
+    current = [
+        _api([_snippet(software_requirements=[_sw_requirement("SR-1"), _sw_requirement("SR-2", coverage=50),
+                                              _sw_requirement("SR-4"), _sw_requirement("SR-4")])]),
+        _api([_snippet(justifications=[{"description": "J", "coverage": 100}])], library_version="2.0"),
+    ]
+
+    delta = traceability_delta(previous=previous, current=current)
+
+    assert [x["library_version"] for x in delta] == ["1.0", "2.0"]
+    assert delta[0]["full"] is False
+    assert [x["item"]["title"] for x in delta[0]["added"]] == ["SR-4", "SR-4"]
+    assert [x["item"]["title"] for x in delta[0]["removed"]] == ["SR-3"]
+    assert [[x["item"]["coverage"] for x in y] for y in delta[0]["changed"]] == [[100, 50]]
+    assert delta[1]["full"] is True
+    assert delta[1]["added"] == [
+        {"work_item_type": "justifications", "section": "section", "offset": 0,
+         "item": {"description": "J", "coverage": 100}}
+    ]
+    assert traceability_delta(previous=current, current=current)[0]["added"] == []
+
+
+def test_generate_delta(ut_user_db, ut_user_files_dir, monkeypatch):
+    monkeypatch.setattr(repos_scanner, "DbInterface", lambda: db_orm.DbInterface("test"))
+    api_name = f"api_{ut_user_db.id}_delta"
+    previous = [dict(_api([_snippet(justifications=[{"description": f"{api_name} J", "coverage": 100}],
+                                    software_requirements=[_sw_requirement(f"{api_name} SR-1"),
+                                                           _sw_requirement(f"{api_name} SR-2")])]),
+                     api=api_name, api_reference_document="")]
+    current = [dict(_api([_snippet(software_requirements=[_sw_requirement(f"{api_name} SR-1", coverage=40),
+                                                          _sw_requirement(f"{api_name} SR-2", description="new")],
+                                   test_cases=[{"title": f"{api_name} TC", "description": "", "repository": "r",
+                                                "relative_path": "p", "coverage": 100}])]),
+                    api=api_name, api_reference_document="")]
+
+    TraceabilityGenerator(traceability=previous, user_id=ut_user_db.id, logfile="",
+                          delta=traceability_delta(previous=None, current=previous)).generate()
+    dbi = db_orm.DbInterface("test")
+    sw_requirement_ids = [
+        x.id for x in dbi.session.query(ApiSwRequirementModel)
+        .join(ApiModel, ApiSwRequirementModel.api_id == ApiModel.id)
+        .filter(ApiModel.api == api_name)
+        .order_by(ApiSwRequirementModel.id)
+    ]
+    dbi.close()
+    TraceabilityGenerator(traceability=current, user_id=ut_user_db.id, logfile="",
+                          delta=traceability_delta(previous=previous, current=current)).generate()
+
+    dbi = db_orm.DbInterface("test")
+    api_model = dbi.session.query(ApiModel).filter(ApiModel.api == api_name).one()
+    assert dbi.session.query(ApiJustificationModel).filter(ApiJustificationModel.api_id == api_model.id).count() == 0
+    sw_requirements = (
+        dbi.session.query(ApiSwRequirementModel)
+        .filter(ApiSwRequirementModel.api_id == api_model.id)
+        .order_by(ApiSwRequirementModel.id)
+        .all()
+    )
+    assert [(x.sw_requirement.title, x.sw_requirement.description, x.coverage) for x in sw_requirements] == [
+        (f"{api_name} SR-1", "", 40),
+        (f"{api_name} SR-2", "new", 100),
+    ]
+    # Changed mappings are updated in place
+    assert sw_requirements[1].id == sw_requirement_ids[1]
+    assert dbi.session.query(ApiTestCaseModel).filter(ApiTestCaseModel.api_id == api_model.id).count() == 1
+    dbi.close()
+
+
+def _test_case(title, coverage=100):
+    return {"title": title, "description": "", "repository": "r", "relative_path": "p", "coverage": coverage}
+
+
+def test_generate_delta_nested(ut_user_db, ut_user_files_dir, utilities, monkeypatch):
+    monkeypatch.setattr(repos_scanner, "DbInterface", lambda: db_orm.DbInterface("test"))
+    api_name = f"api_{ut_user_db.id}_nested_delta"
+
+    def _traceability(software_requirements):
+        return [dict(_api([_snippet(software_requirements=software_requirements)]), api=api_name,
+                     api_reference_document="")]
+
+    def _generate(previous, current):
+        TraceabilityGenerator(traceability=current, user_id=ut_user_db.id, logfile="",
+                              delta=traceability_delta(previous=previous, current=current)).generate()
+
+    previous_sr = dict(_sw_requirement(f"{api_name} SR", description="old"),
+                       software_requirements=[_sw_requirement(f"{api_name} SR-1")],
+                       test_cases=[_test_case(f"{api_name} TC-1"), _test_case(f"{api_name} TC-2")])
+    previous = _traceability([previous_sr])
+    _generate(None, previous)
+
+    # Test Case mapped by another user under the scanned Software Requirement
+    dbi = db_orm.DbInterface("test")
+    api_model = dbi.session.query(ApiModel).filter(ApiModel.api == api_name).one()
+    api_sr = dbi.session.query(ApiSwRequirementModel).filter(ApiSwRequirementModel.api_id == api_model.id).one()
+    sr_sr = (
+        dbi.session.query(SwRequirementSwRequirementModel)
+        .filter(SwRequirementSwRequirementModel.sw_requirement_mapping_api_id == api_sr.id)
+        .one()
+    )
+    other_user = UserModel(f"ut_user_{utilities.generate_random_hex_string8()}",
+                           f"ut_email_{utilities.generate_random_hex_string8()}", "password", "USER")
+    other_tc = TestCaseModel("r", "p", f"{api_name} TC-other", "", other_user)
+    dbi.session.add_all([other_user, other_tc])
+    dbi.session.commit()
+    dbi.session.add(SwRequirementTestCaseModel(api_sr, None, other_tc, 100, other_user))
+    dbi.session.commit()
+    api_sr_id, sr_sr_id = api_sr.id, sr_sr.id
+    dbi.close()
+
+    current_sr = dict(_sw_requirement(f"{api_name} SR", description="new"),
+                      software_requirements=[_sw_requirement(f"{api_name} SR-1", coverage=20)],
+                      test_cases=[_test_case(f"{api_name} TC-1", coverage=50), _test_case(f"{api_name} TC-3")])
+    current = _traceability([current_sr])
+    _generate(previous, current)
+
+    dbi = db_orm.DbInterface("test")
+    api_sr = dbi.session.get(ApiSwRequirementModel, api_sr_id)
+    assert api_sr.sw_requirement.description == "new"
+    assert dbi.session.get(SwRequirementSwRequirementModel, sr_sr_id).coverage == 20
+    test_cases = (
+        dbi.session.query(SwRequirementTestCaseModel)
+        .filter(SwRequirementTestCaseModel.sw_requirement_mapping_api_id == api_sr_id)
+        .all()
+    )
+    assert sorted((x.test_case.title, x.coverage) for x in test_cases) == [
+        (f"{api_name} TC-1", 50),
+        (f"{api_name} TC-3", 100),
+        (f"{api_name} TC-other", 100),
+    ]
+    dbi.close()
+
+    # The mapping is kept while other users mapped work items under it
+    _generate(current, _traceability([]))
+    dbi = db_orm.DbInterface("test")
+    assert dbi.session.get(ApiSwRequirementModel, api_sr_id) is not None
+    dbi.close()
@@ -0,0 +1,113 @@
+"""Tests for the authenticated user cache and GET/DELETE /admin/user-cache."""
+
+from http import HTTPStatus
+
+import pytest
+
+from user_cache import UserCache, get_cached_active_user, user_cache
+from db.models.user import UserModel
+
+_USER_CACHE_URL = "/admin/user-cache"
+_NOTIFICATIONS_URL = "/user/notifications"
+
+UT_ADMIN_USER_NAME = "user_cache_admin_username"
+UT_ADMIN_USER_EMAIL = "user_cache_admin_email"
+UT_ADMIN_USER_PASSWORD = "user_cache_admin_password"
+UT_ADMIN_USER_ROLE = "ADMIN"
+
+
+@pytest.fixture(scope="module")
+def ut_admin_user_db(client_db):
+    ut_admin_user = UserModel(UT_ADMIN_USER_NAME, UT_ADMIN_USER_EMAIL, UT_ADMIN_USER_PASSWORD, UT_ADMIN_USER_ROLE)
+    client_db.session.add(ut_admin_user)
+    client_db.session.commit()
+    yield ut_admin_user
+
+
+@pytest.fixture(scope="module")
+def admin_authentication(client, ut_admin_user_db):
+    return client.post("/user/login", json={"email": UT_ADMIN_USER_EMAIL, "password": UT_ADMIN_USER_PASSWORD})
+
+
+@pytest.fixture()
+def ut_cached_user(client, client_db, utilities):
+    """A dedicated user, logged in, so that the tests can disable it"""
+    suffix = utilities.generate_random_hex_string8()
+    user = UserModel(f"user_cache_{suffix}", f"user_cache_{suffix}@example.com", "password", "USER")
+    client_db.session.add(user)
+    client_db.session.commit()
+    login = client.post("/user/login", json={"email": user.email, "password": "password"})
+    assert login.status_code == HTTPStatus.OK
+    user_cache.clear()
+    yield login.json
+
+
+def _auth(authentication):
+    return {"user-id": authentication["id"], "token": authentication["token"]}
+
+
+def _get_notifications(client, authentication):
+    return client.get(_NOTIFICATIONS_URL, query_string=_auth(authentication))
+
+
+def test_user_cache_avoids_query(client, client_db, utilities, ut_cached_user):
+    with utilities.assert_max_queries(client_db.engine, 100) as cold:
+        assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.OK
+    with utilities.assert_max_queries(client_db.engine, 100) as warm:
+        assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.OK
+    assert len(warm) == len(cold) - 1
+    assert user_cache.stats()["hits"] == 1
+
+
+def test_user_cache_per_session(client_db, utilities, ut_cached_user):
+    user_id, token = ut_cached_user["id"], ut_cached_user["token"]
+    client_db.session.info.pop("request_users", None)
+    with utilities.assert_max_queries(client_db.engine, 1):
+        first = get_cached_active_user(client_db.session, user_id, token)
+        assert get_cached_active_user(client_db.session, user_id, token) is first
+    assert first.id == user_id
+    assert get_cached_active_user(client_db.session, user_id, "wrong token") is None
+
+
+def test_user_cache_disabled_user(client, admin_authentication, ut_cached_user):
+    assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.OK
+
+    response = client.put("/user/enable", json={**_auth(admin_authentication.json),
+                                                "target-user": {"id": ut_cached_user["id"], "enabled": 0}})
+    assert response.status_code == HTTPStatus.OK
+    assert user_cache.stats()["invalidations"] == 1
+    assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_user_cache_new_token(client, client_db, ut_cached_user):
+    assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.OK
+
+    user = client_db.session.get(UserModel, ut_cached_user["id"])
+    login = client.post("/user/login", json={"email": user.email, "password": "password"})
+    assert login.status_code == HTTPStatus.OK
+    assert _get_notifications(client, ut_cached_user).status_code == HTTPStatus.UNAUTHORIZED
+    assert _get_notifications(client, login.json).status_code == HTTPStatus.OK
+
+
+def test_user_cache_ttl(client_db, ut_cached_user):
+    cache = UserCache(ttl=0)
+    user = client_db.session.get(UserModel, ut_cached_user["id"])
+    cache.store(user)
+    assert cache.get(client_db.session, user.id, user.token) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_user_cache_admin(client, admin_authentication, reader_authentication, ut_cached_user):
+    _get_notifications(client, ut_cached_user)
+
+    response = client.get(_USER_CACHE_URL, query_string=_auth(admin_authentication.json))
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["entries"] >= 1
+    assert "ttl" in response.json
+
+    response = client.get(_USER_CACHE_URL, query_string=_auth(reader_authentication.json))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    response = client.delete(_USER_CACHE_URL, json=_auth(admin_authentication.json))
+    assert response.status_code == HTTPStatus.OK
+    assert user_cache.stats()["entries"] == 0
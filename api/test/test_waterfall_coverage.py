@@ -0,0 +1,109 @@
+import pytest
+
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from db.models.test_case import TestCaseModel
+from db.models.test_specification import TestSpecificationModel
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+from db.models.user import UserModel
+from db.models.waterfall_coverage import backfill_waterfall_coverage, waterfall_coverage
+from conftest import UT_USER_EMAIL
+
+
+@pytest.fixture()
+def ut_user(client_db, ut_user_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+@pytest.fixture()
+def api_sr_db(client_db, ut_user, utilities):
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      "stub.md", "ut_category", utilities.generate_random_hex_string8(), "stub.impl",
+                      0, 42, "ut_tags", ut_user)
+    sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+    api_sr = ApiSwRequirementModel(ut_api, sr, "section", 0, 80, ut_user)
+    client_db.session.add_all([ut_api, sr, api_sr])
+    client_db.session.commit()
+    return api_sr
+
+
+def _new_sr_sr(client_db, ut_user, utilities, api_sr=None, sr_sr=None, coverage=100):
+    sr = SwRequirementModel(f"SW req #{utilities.generate_random_hex_string8()}", "description", ut_user)
+    ret = SwRequirementSwRequirementModel(api_sr, sr_sr, sr, coverage, ut_user)
+    client_db.session.add_all([sr, ret])
+    client_db.session.commit()
+    return ret
+
+
+def _new_test_case(ut_user, utilities):
+    tc_id = utilities.generate_random_hex_string8()
+    return TestCaseModel("repo", f"tc_{tc_id}", f"TC #{tc_id}", "description", ut_user)
+
+
+def test_waterfall_coverage_formula():
+    assert waterfall_coverage(80) == 80
+    assert waterfall_coverage(80, 50) == 40
+    assert waterfall_coverage(80, 150) == 80
+    assert waterfall_coverage(80, -10) == 0
+
+
+def test_leaf_mapping_covered(client_db, api_sr_db):
+    assert api_sr_db.covered == 80
+    assert api_sr_db.as_dict(db_session=client_db.session)["covered"] == 80
+
+
+def test_covered_propagates_to_ancestors(client_db, ut_user, api_sr_db, utilities):
+    sr_sr = _new_sr_sr(client_db, ut_user, utilities, api_sr=api_sr_db, coverage=50)
+    nested_sr_sr = _new_sr_sr(client_db, ut_user, utilities, sr_sr=sr_sr, coverage=100)
+
+    ts = TestSpecificationModel("TS", "preconditions", "description", "expected", ut_user)
+    sr_ts = SwRequirementTestSpecificationModel(None, nested_sr_sr, ts, 100, ut_user)
+    ts_tc = TestSpecificationTestCaseModel(None, sr_ts, _new_test_case(ut_user, utilities), 40, ut_user)
+    client_db.session.add_all([ts, sr_ts, ts_tc])
+    client_db.session.commit()
+
+    # 40% of the test specification is covered by the test case
+    assert sr_ts.covered == 40
+    assert nested_sr_sr.covered == 40
+    assert sr_ts.as_dict(db_session=client_db.session)["covered"] == 40
+    assert sr_sr.covered == 50 * 40 / 100
+    assert api_sr_db.covered == 80 * (50 * 40 / 100) / 100
+
+    # Update a leaf
+    ts_tc.coverage = 100
+    client_db.session.commit()
+    assert sr_ts.covered == 100
+    assert sr_sr.covered == 50
+    assert api_sr_db.covered == 40
+
+    # Direct test case on the api mapping
+    sr_tc = SwRequirementTestCaseModel(api_sr_db, None, _new_test_case(ut_user, utilities), 50, ut_user)
+    client_db.session.add(sr_tc)
+    client_db.session.commit()
+    assert api_sr_db.covered == 80
+
+    # Delete a subtree
+    client_db.session.delete(sr_sr)
+    client_db.session.commit()
+    assert api_sr_db.covered == 40
+    assert api_sr_db.as_dict(db_session=client_db.session)["covered"] == 40
+
+
+def test_backfill(client_db, ut_user, api_sr_db, utilities):
+    sr_sr = _new_sr_sr(client_db, ut_user, utilities, api_sr=api_sr_db, coverage=50)
+    nested_sr_sr = _new_sr_sr(client_db, ut_user, utilities, sr_sr=sr_sr, coverage=20)
+
+    for mapping in [api_sr_db, sr_sr, nested_sr_sr]:
+        mapping.covered = None
+    client_db.session.commit()
+
+    backfill_waterfall_coverage(client_db.session.connection())
+    client_db.session.commit()
+
+    assert nested_sr_sr.covered == 20
+    assert sr_sr.covered == 10
+    assert api_sr_db.covered == 8
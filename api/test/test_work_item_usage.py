@@ -0,0 +1,157 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import delete
+
+from conftest import UT_USER_EMAIL
+from db.models.api import ApiModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.sw_requirement import SwRequirementModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.test_case import TestCaseModel
+from db.models.user import UserModel
+from db.models.work_item_usage import (
+    WorkItemUsageModel,
+    get_work_item_usage_rows,
+    get_work_item_usages,
+    rebuild_work_item_usages,
+)
+
+_UT_SPEC_SECTION = "BASIL UT work item usage section."
+_UT_RAW_SPEC = f"BASIL UT: {_UT_SPEC_SECTION}"
+
+
+def _ut_user(client_db):
+    return client_db.session.query(UserModel).filter(UserModel.email == UT_USER_EMAIL).one()
+
+
+def _usages(client_db, table, obj):
+    return [dict(x) for x in get_work_item_usages(client_db.session, table, obj.id)]
+
+
+@pytest.fixture
+def nested_mappings_db(client_db, utilities, ut_user_db):
+    """Software Component -> Sw Requirement -> Sw Requirement -> Test Case"""
+    user = _ut_user(client_db)
+    raw_spec = tempfile.NamedTemporaryFile(mode="w", delete=False)
+    raw_spec.write(_UT_RAW_SPEC)
+    raw_spec.close()
+    ut_api = ApiModel(f"ut_api#{utilities.generate_random_hex_string8()}", "ut_library", "v1.0.0",
+                      raw_spec.name, "ut_category", utilities.generate_random_hex_string8(),
+                      raw_spec.name + "impl", 0, 42, "ut_tags", user)
+    sr = SwRequirementModel(f"SR #{utilities.generate_random_hex_string8()}", "parent", user)
+    child_sr = SwRequirementModel(f"SR #{utilities.generate_random_hex_string8()}", "child", user)
+    tc = TestCaseModel("https://github.com/example/repo", f"tests/test_{utilities.generate_random_hex_string8()}.py",
+                       f"TC #{utilities.generate_random_hex_string8()}", "nested", user)
+    client_db.session.add_all([ut_api, sr, child_sr, tc])
+    client_db.session.commit()
+
+    api_sr = ApiSwRequirementModel(ut_api, sr, _UT_SPEC_SECTION, _UT_RAW_SPEC.find(_UT_SPEC_SECTION), 0, user)
+    client_db.session.add(api_sr)
+    client_db.session.commit()
+    sr_sr = SwRequirementSwRequirementModel(api_sr, None, child_sr, 100, user)
+    client_db.session.add(sr_sr)
+    client_db.session.commit()
+    sr_tc = SwRequirementTestCaseModel(None, sr_sr, tc, 100, user)
+    client_db.session.add(sr_tc)
+    client_db.session.commit()
+
+    yield ut_api, (sr, child_sr, tc), (api_sr, sr_sr, sr_tc)
+
+    client_db.session.rollback()
+    client_db.session.delete(client_db.session.get(ApiModel, ut_api.id))
+    client_db.session.commit()
+    os.remove(raw_spec.name)
+
+
+def test_work_item_usage_nested_paths(client_db, nested_mappings_db):
+    ut_api, (sr, child_sr, tc), (api_sr, sr_sr, sr_tc) = nested_mappings_db
+
+    assert _usages(client_db, "sw_requirements", sr) == [{
+        "mapping_table": "sw_requirement_mapping_api",
+        "mapping_id": api_sr.id,
+        "api_id": ut_api.id,
+        "work_item_table": "sw_requirements",
+        "work_item_id": sr.id,
+        "path": f"sw_requirement_mapping_api:{api_sr.id}",
+    }]
+    tc_usages = _usages(client_db, "test_cases", tc)
+    assert [(x["api_id"], x["path"]) for x in tc_usages] == [
+        (ut_api.id, f"sw_requirement_mapping_api:{api_sr.id}"
+                    f"/sw_requirement_mapping_sw_requirement:{sr_sr.id}"
+                    f"/test_case_mapping_sw_requirement:{sr_tc.id}")
+    ]
+
+
+def test_work_item_usage_matches_rebuild(client_db, nested_mappings_db):
+    ut_api = nested_mappings_db[0]
+    indexed = client_db.session.query(WorkItemUsageModel).filter(WorkItemUsageModel.api_id == ut_api.id).all()
+    rebuilt = [x for x in get_work_item_usage_rows(client_db.session.connection()) if x["api_id"] == ut_api.id]
+    key = lambda x: (x["mapping_table"], x["mapping_id"])  # noqa: E731
+    assert sorted([{k: getattr(x, k) for k in rebuilt[0].keys()} for x in indexed], key=key) == \
+        sorted(rebuilt, key=key)
+    # Reading only the mappings of the api
+    assert sorted(get_work_item_usage_rows(client_db.session.connection(), [ut_api.id]), key=key) == \
+        sorted(rebuilt, key=key)
+
+    # Rebuild from scratch
+    client_db.session.execute(delete(WorkItemUsageModel).where(WorkItemUsageModel.api_id == ut_api.id))
+    rebuild_work_item_usages(client_db.session.connection(), [ut_api.id])
+    client_db.session.commit()
+    assert client_db.session.query(WorkItemUsageModel).filter(WorkItemUsageModel.api_id == ut_api.id).count() == 3
+
+
+def test_work_item_usage_delete_cascades_to_nested(client_db, nested_mappings_db):
+    _, (sr, child_sr, tc), (api_sr, sr_sr, sr_tc) = nested_mappings_db
+
+    # Nested mappings are deleted by the database, without events
+    client_db.session.delete(sr_sr)
+    client_db.session.commit()
+    assert len(_usages(client_db, "sw_requirements", sr)) == 1
+    assert _usages(client_db, "sw_requirements", child_sr) == []
+    assert _usages(client_db, "test_cases", tc) == []
+
+
+def test_work_item_usage_bulk_delete(client_db, nested_mappings_db):
+    ut_api, (sr, child_sr, tc), _ = nested_mappings_db
+
+    client_db.session.query(ApiSwRequirementModel).filter(ApiSwRequirementModel.api_id == ut_api.id).delete()
+    client_db.session.commit()
+    for table, obj in [("sw_requirements", sr), ("sw_requirements", child_sr), ("test_cases", tc)]:
+        assert _usages(client_db, table, obj) == []
+
+
+def test_work_item_usage_moved_mapping(client_db, nested_mappings_db):
+    ut_api, (sr, child_sr, tc), (api_sr, sr_sr, sr_tc) = nested_mappings_db
+
+    # Test Case moved from the nested Sw Requirement to the direct one
+    sr_tc.sw_requirement_mapping_sw_requirement = None
+    sr_tc.sw_requirement_mapping_api = api_sr
+    client_db.session.commit()
+    assert [x["path"] for x in _usages(client_db, "test_cases", tc)] == [
+        f"sw_requirement_mapping_api:{api_sr.id}/test_case_mapping_sw_requirement:{sr_tc.id}"
+    ]
+
+
+def test_work_item_usage_forked_work_item(client_db, nested_mappings_db, utilities):
+    ut_api, (sr, child_sr, tc), (api_sr, sr_sr, sr_tc) = nested_mappings_db
+    fork = SwRequirementModel(f"SR #{utilities.generate_random_hex_string8()}", "fork", _ut_user(client_db))
+    client_db.session.add(fork)
+    client_db.session.commit()
+
+    # Only the row of the mapping is updated, the mapping tables are not read
+    sr_sr.sw_requirement_id = fork.id
+    with utilities.assert_max_queries(client_db.engine) as statements:
+        client_db.session.commit()
+    usage_statements = [x for x in statements if "work_item_usages" in x]
+    assert len(usage_statements) == 1
+    assert usage_statements[0].startswith("UPDATE work_item_usages")
+    assert not any("FROM sw_requirement_mapping_api" in x for x in statements)
+
+    assert _usages(client_db, "sw_requirements", child_sr) == []
+    assert [x["path"] for x in _usages(client_db, "sw_requirements", fork)] == [
+        f"sw_requirement_mapping_api:{api_sr.id}/sw_requirement_mapping_sw_requirement:{sr_sr.id}"
+    ]
+    assert len(_usages(client_db, "test_cases", tc)) == 1
@@ -0,0 +1,208 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = "traceability_scan_state.json"
+
+WORK_ITEM_TYPES = ["justifications", "documents", "software_requirements", "test_specifications", "test_cases"]
+
+# Fields identifying a work item mapped to a snippet, a different value of the other fields is a change
+IDENTITY_FIELDS = {
+    "justifications": ["description"],
+    "documents": ["title", "url"],
+    "software_requirements": ["title"],
+    "test_specifications": ["title"],
+    "test_cases": ["title", "repository", "relative_path"],
+}
+
+# Magic variables set for each file or work item by the rules, always overwritten before being read
+_VOLATILE_MAGIC_VARIABLES = ["__file__", "__file_relative_path__", "__file_content__"]
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def rule_key(kind: str, rule_config: dict, magic_variables: dict) -> str:
+    """Key of the work items extracted by a rule, given the magic variables it is evaluated with"""
+    variables = {
+        k: v for k, v in magic_variables.items() if k not in _VOLATILE_MAGIC_VARIABLES and not k.endswith("_index__")
+    }
+    return _digest([kind, rule_config, variables])
+
+
+def repository_key(url: str, branch: str) -> str:
+    return f"{url}#{branch}"
+
+
+def _api_key(api: dict) -> str:
+    return json.dumps([api.get("api"), api.get("library"), api.get("library_version")])
+
+
+class TraceabilityScanState:
+    """
+    Results of the last traceability scan of a user, stored in a json file.
+
+    - commits: last commit scanned of each repository, per configuration
+    - rules: work items extracted by each rule, with the commit and the file patterns of each
+      repository read by the rule and by its nested rules. A rule is evaluated again only if
+      one of the files changed since that commit matches its patterns.
+    - traceability: work items mapped by the scan to each api, to generate only the differences
+
+    The rules are dropped when the scan configuration changes, the traceability is kept since
+    it describes the mappings created by the previous scans.
+    """
+
+    def __init__(self, path: str, config: str) -> None:
+        self.path = path
+        self.config_hash = _digest(config)
+        self.commits = {}
+        self.rules = {}
+        self.traceability = None
+        # Rules evaluated or reused by the current scan, the other ones are dropped on save
+        self.new_rules = {}
+
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Unable to read the traceability scan state {self.path}: {exc}")
+            return
+
+        self.traceability = state.get("traceability", None)
+        if state.get("config_hash", None) == self.config_hash:
+            self.commits = state.get("commits", {})
+            self.rules = state.get("rules", {})
+        else:
+            logger.info("Scan configuration changed, all the rules will be evaluated")
+
+    def get_rule(self, key: str) -> Optional[dict]:
+        """Return the rule record stored by the current or by the previous scan"""
+        return self.new_rules.get(key, None) or self.rules.get(key, None)
+
+    def set_rule(self, key: str, record: dict) -> None:
+        self.new_rules[key] = copy.deepcopy(record)
+
+    def save(self, traceability: List[dict]) -> None:
+        """Store the rules used by the current scan and the traceability generated from it"""
+        commits = {}
+        for record in self.new_rules.values():
+            commits.update({k: v["commit"] for k, v in record["repositories"].items()})
+
+        # Keep the apis not scanned this time, their mappings are still in the db
+        scanned = set(_api_key(x) for x in traceability)
+        apis = [x for x in self.traceability or [] if _api_key(x) not in scanned]
+        apis += [{k: v for k, v in x.items() if k != "reference_document_content"} for x in traceability]
+
+        state = {"config_hash": self.config_hash, "commits": commits, "rules": self.new_rules, "traceability": apis}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex}"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+
+def _mapping_entries(api: dict) -> List[dict]:
+    ret = []
+    for snippet in api.get("snippets", []) or []:
+        for work_item_type in WORK_ITEM_TYPES:
+            for item in snippet.get(work_item_type, []) or []:
+                ret.append(
+                    {
+                        "work_item_type": work_item_type,
+                        "section": snippet.get("section", ""),
+                        "offset": snippet.get("offset", 0),
+                        "item": item,
+                    }
+                )
+    return ret
+
+
+def _identity(entry: dict) -> str:
+    return json.dumps(
+        [entry["work_item_type"], entry["section"], entry["offset"]]
+        + [entry["item"].get(x, "") for x in IDENTITY_FIELDS[entry["work_item_type"]]]
+    )
+
+
+def _multiset_delta(previous: List[dict], current: List[dict], identity) -> tuple:
+    """
+    Return the items added, removed and changed ([previous, current] pairs with the same identity).
+    Items are compared as multisets, the same work item can be mapped twice.
+    """
+    current_counter = Counter(_digest(x) for x in current)
+    previous_counter = Counter(_digest(x) for x in previous)
+    added = []
+    for item in current:
+        if previous_counter[_digest(item)] > 0:
+            previous_counter[_digest(item)] -= 1
+        else:
+            added.append(item)
+    removed = []
+    for item in previous:
+        if current_counter[_digest(item)] > 0:
+            current_counter[_digest(item)] -= 1
+        else:
+            removed.append(item)
+
+    changed = []
+    removed_by_identity = {}
+    for item in removed:
+        removed_by_identity.setdefault(identity(item), []).append(item)
+    for item in list(added):
+        candidates = removed_by_identity.get(identity(item), [])
+        if candidates:
+            previous_item = candidates.pop(0)
+            removed.remove(previous_item)
+            added.remove(item)
+            changed.append([previous_item, item])
+    return added, removed, changed
+
+
+def work_items_delta(work_item_type: str, previous: Optional[List[dict]], current: Optional[List[dict]]) -> tuple:
+    """Same as traceability_delta() for the work items nested under a mapping, e.g. the Test Cases
+    of a Software Requirement: return the items added, removed and changed"""
+    return _multiset_delta(
+        previous or [],
+        current or [],
+        lambda x: json.dumps([x.get(field, "") for field in IDENTITY_FIELDS[work_item_type]]),
+    )
+
+
+def traceability_delta(previous: Optional[List[dict]], current: List[dict]) -> List[dict]:
+    """
+    Compare the traceability of each api with the one of the previous scan.
+
+    Return, for each api of the current traceability, its fields (snippets excluded) and:
+    - full: True if the api was not in the previous scan
+    - added, removed: work items mapped to a snippet, {work_item_type, section, offset, item}
+    - changed: [previous, current] pairs of mappings of the same work item with different
+      fields, coverage or nested work items
+
+    The apis of the previous scan missing in the current one are not reported,
+    e.g. the ones of a previous library version.
+    """
+    previous_apis = {_api_key(x): x for x in previous or []}
+    ret = []
+    for api in current:
+        api_delta = {k: v for k, v in api.items() if k != "snippets"}
+        entries = _mapping_entries(api)
+        previous_api = previous_apis.get(_api_key(api), None)
+        if previous_api is None:
+            api_delta.update({"full": True, "added": entries, "removed": [], "changed": []})
+            ret.append(api_delta)
+            continue
+
+        added, removed, changed = _multiset_delta(_mapping_entries(previous_api), entries, _identity)
+        api_delta.update({"full": False, "added": added, "removed": removed, "changed": changed})
+        ret.append(api_delta)
+    return ret
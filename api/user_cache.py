@@ -0,0 +1,113 @@
+import logging
+import time
+
+from db.db_orm import int_from_env
+from db.models.user import UserModel
+from sized_lru_cache import SizedLruCache
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds an authenticated user is reused by a process without reading the users table, 0 to disable
+TTL = int_from_env("BASIL_USER_CACHE_TTL", 30)
+# Number of users kept by each process
+MAX_ENTRIES = int_from_env("BASIL_USER_CACHE_MAX_ENTRIES", 10000)
+
+# session.info key of the users resolved by the current request: (id, token) -> UserModel or None
+REQUEST_USERS = "request_users"
+
+
+def _snapshot(user):
+    """Detached copy of the loaded columns of a user, that can be merged in other sessions"""
+    mapper = inspect(user).mapper
+    ret = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        set_committed_value(ret, attr.key, getattr(user, attr.key))
+    make_transient_to_detached(ret)
+    return ret
+
+
+class UserCache(SizedLruCache):
+    """Process wide cache of the authenticated users
+
+    Each enabled user is stored with its current token for TTL seconds, a request
+    with the same id and token gets the user merged in its session without a query.
+    The entry of a user is dropped when the user is changed or deleted by this
+    process (logout, role change, disable, ...), changes made by other processes
+    are seen after at most TTL seconds.
+    The size of each entry is 1, so max_bytes is the maximum number of users.
+    """
+
+    COUNTERS = ["hits", "misses", "evictions", "invalidations"]
+
+    def __init__(self, ttl=None, max_entries=None):
+        super().__init__(MAX_ENTRIES if max_entries is None else max_entries)
+        self.ttl = TTL if ttl is None else ttl
+
+    def get(self, db_session, user_id, token):
+        """Return the user attached to db_session, None if it is not cached"""
+        if self.ttl <= 0:
+            return None
+        entry = self._lookup(user_id)
+        if entry is None or entry["token"] != token or entry["expires"] < time.monotonic():
+            self._count("misses")
+            return None
+        self._count("hits")
+        return db_session.merge(entry["user"], load=False)
+
+    def store(self, user):
+        if self.ttl <= 0:
+            return
+        self._store(user.id, {"token": user.token, "expires": time.monotonic() + self.ttl,
+                              "user": _snapshot(user), "bytes": 1})
+
+    def invalidate(self, user_id):
+        if self._lookup(user_id) is not None:
+            self._remove(user_id)
+            self._count("invalidations")
+
+    def stats(self):
+        ret = super().stats()
+        ret["ttl"] = self.ttl
+        return ret
+
+
+user_cache = UserCache()
+
+
+def get_cached_active_user(db_session, user_id, token):
+    """Return the enabled user with the given id and token, None if it doesn't exist.
+
+    The user is resolved once per request (session) and reused across requests
+    through user_cache.
+    """
+    request_users = db_session.info.setdefault(REQUEST_USERS, {})
+    key = (user_id, token)
+    if key in request_users:
+        return request_users[key]
+
+    user = user_cache.get(db_session, user_id, token)
+    if user is None:
+        user = (
+            db_session.query(UserModel)
+            .filter(UserModel.id == user_id)
+            .filter(UserModel.token == token)
+            .filter(UserModel.enabled == 1)
+            .one_or_none()
+        )
+        if user is not None:
+            user_cache.store(user)
+    request_users[key] = user
+    return user
+
+
+@event.listens_for(UserModel, "after_update")
+@event.listens_for(UserModel, "after_delete")
+def receive_after_user_change(mapper, connection, target):
+    user_cache.invalidate(target.id)
+    session = inspect(target).session
+    if session is not None:
+        session.info.pop(REQUEST_USERS, None)
@@ -1,9 +1,11 @@
 from datetime import datetime
+from db.models.api_user_permission import PERMISSION_FLAGS, sync_api_user_permissions
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, inspect, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event, func, inspect
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -12,8 +14,12 @@ from typing import Optional
 
 class ApiModel(Base):
     __tablename__ = "apis"
+    __table_args__ = (
+        Index("ix_apis_api_library_version_id", "api", "library_version", "id"),
+    )
     _description = "Software Component"
     extend_existing = True
+    as_dict_relationships = ["created_by", "edited_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api: Mapped[str] = mapped_column(String(100))
     library: Mapped[str] = mapped_column(String(100))
@@ -41,6 +47,7 @@ class ApiModel(Base):
     write_permission_requests: Mapped[Optional[str]] = mapped_column(String(), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, library, library_version, raw_specification_url,
                  category, checksum, implementation_file,
@@ -92,11 +99,7 @@ class ApiModel(Base):
                f"tags={self.tags!r})"
 
     def current_version(self, db_session):
-        last_item = db_session.query(ApiHistoryModel).filter(
-            ApiHistoryModel.id == self.id).order_by(
-            ApiHistoryModel.version.desc()).limit(1).all()[0]
-
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, ApiHistoryModel, self.id, self.version)}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {"id": self.id,
@@ -121,24 +124,22 @@ class ApiModel(Base):
             from db.models.api_test_case import ApiTestCaseModel
 
             _dict['version'] = self.current_version(db_session)
-            # Calc coverage
-            srs_query = db_session.query(ApiSwRequirementModel).filter(
-                ApiSwRequirementModel.api_id == self.id
-            )
-            srs = srs_query.all()
-            srs_cov = sum([x.get_waterfall_coverage(db_session) for x in srs])
+            # Calc coverage, reading the materialized waterfall coverage of the mappings
+            srs_cov = db_session.query(
+                func.coalesce(
+                    func.sum(func.coalesce(ApiSwRequirementModel.covered, ApiSwRequirementModel.coverage)), 0
+                )
+            ).filter(ApiSwRequirementModel.api_id == self.id).scalar()
 
-            tss_query = db_session.query(ApiTestSpecificationModel).filter(
-                ApiTestSpecificationModel.api_id == self.id
-            )
-            tss = tss_query.all()
-            tss_cov = sum([x.get_waterfall_coverage(db_session) for x in tss])
+            tss_cov = db_session.query(
+                func.coalesce(
+                    func.sum(func.coalesce(ApiTestSpecificationModel.covered, ApiTestSpecificationModel.coverage)), 0
+                )
+            ).filter(ApiTestSpecificationModel.api_id == self.id).scalar()
 
-            tcs_query = db_session.query(ApiTestCaseModel).filter(
-                ApiTestCaseModel.api_id == self.id
-            )
-            tcs = tcs_query.all()
-            tcs_cov = sum([x.as_dict()['coverage'] for x in tcs])
+            tcs_cov = db_session.query(
+                func.coalesce(func.sum(ApiTestCaseModel.coverage), 0)
+            ).filter(ApiTestCaseModel.api_id == self.id).scalar()
 
             _dict['srs_coverage'] = srs_cov
             _dict['tss_coverage'] = tss_cov
@@ -191,8 +192,12 @@ class ApiModel(Base):
         return html
 
 
-@event.listens_for(ApiModel, "after_update")
-def receive_after_update(mapper, connection, target):
+def _permission_fields(target):
+    return {field: getattr(target, field) for field in PERMISSION_FLAGS.keys()}
+
+
+@event.listens_for(ApiModel, "before_update")
+def receive_before_update(mapper, connection, target):
     # Avoid to update the version if the only change is related to last_coverage
     state = inspect(target)
     changes = {}
@@ -208,14 +213,9 @@ def receive_after_update(mapper, connection, target):
             if affected_fields[0] == 'last_coverage':
                 return
 
-    last_query = select(ApiHistoryModel.version).where(ApiHistoryModel.id ==
-                                                       target.id).order_by(ApiHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(ApiHistoryModel).values(
+    version = next_version(connection, target, ApiHistoryModel)
+    if version:
+        write_history(connection, target, ApiHistoryModel, dict(
             id=target.id,
             api=target.api,
             library=target.library,
@@ -236,14 +236,22 @@ def receive_after_update(mapper, connection, target):
             read_denials=target.read_denials,
             write_permissions=target.write_permissions,
             write_permission_requests=target.write_permission_requests,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(ApiModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PERMISSION_FLAGS.keys()):
+        sync_api_user_permissions(connection, target.id, _permission_fields(target))
 
 
 @event.listens_for(ApiModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiHistoryModel).values(
+    sync_api_user_permissions(connection, target.id, _permission_fields(target))
+
+    write_history(connection, target, ApiHistoryModel, dict(
         id=target.id,
         api=target.api,
         library=target.library,
@@ -265,8 +273,7 @@ def receive_after_insert(mapper, connection, target):
         write_permissions=target.write_permissions,
         write_permission_requests=target.write_permission_requests,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(ApiModel, "before_delete")
@@ -278,6 +285,9 @@ def receive_before_delete(mapper, connection, target):
 
 class ApiHistoryModel(Base):
     __tablename__ = "apis_history"
+    __table_args__ = (
+        Index("ix_apis_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -3,17 +3,25 @@ from db.models.api import ApiModel
 from db.models.db_base import Base
 from db.models.document import DocumentModel, DocumentHistoryModel
 from db.models.user import UserModel
-from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer, String
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
+from typing import Optional
 
 
 class ApiDocumentModel(Base):
     __tablename__ = "document_mapping_api"
+    __table_args__ = (
+        Index("ix_document_mapping_api_api_id", "api_id"),
+        Index("ix_document_mapping_api_item", "document_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "document.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped["ApiModel"] = relationship("ApiModel", foreign_keys="ApiDocumentModel.api_id")
@@ -23,6 +31,7 @@ class ApiDocumentModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="ApiDocumentModel.created_by_id")
@@ -31,6 +40,7 @@ class ApiDocumentModel(Base):
                                                   foreign_keys="ApiDocumentModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, document, section, offset, coverage, created_by):
         self.api = api
@@ -58,17 +68,11 @@ class ApiDocumentModel(Base):
                f"- {str(self.document)!r}"
 
     def current_version(self, db_session):
-        last_mapping_query = db_session.query(ApiDocumentHistoryModel).filter(
-                        ApiDocumentHistoryModel.id == self.id).order_by(
-                        ApiDocumentHistoryModel.version.desc()).limit(1)
-        last_mapping = last_mapping_query.all()[0]
-
-        last_item_query = db_session.query(DocumentHistoryModel).filter(
-                     DocumentHistoryModel.id == self.document_id).order_by(
-                     DocumentHistoryModel.version.desc()).limit(1)
-
-        last_item = last_item_query.all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, ApiDocumentHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, DocumentHistoryModel, self.document_id, self.document.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'document': self.document.as_dict(full_data=full_data, db_session=db_session),
@@ -92,29 +96,12 @@ class ApiDocumentModel(Base):
             _dict["updated_at"] = self.updated_at.strftime(Base.dt_format_str)
         return _dict
 
-    def get_waterfall_coverage(self, db_session):
-        from db.models.document_document import DocumentDocumentModel
+    def get_waterfall_coverage(self, db_session=None):
         # Return Api-Document waterfall coverage
-
-        if db_session is None:
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-
-        docs_coverage = 0
-
-        # Documents
-        docs = db_session.query(DocumentDocumentModel).filter(
-            DocumentDocumentModel.document_mapping_api_id == self.id
-        ).all()
-        if len(docs) > 0:
-            docs_coverage = sum([x.get_waterfall_coverage(db_session) for x in docs])
-
-        if len(docs) == 0:
-            waterfall_coverage = self.coverage
-        else:
-            waterfall_coverage = (min(max(0, sum([docs_coverage])), 100.0) * self.coverage) / 100.0
-
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_api, db_session):
         from db.models.document_document import DocumentDocumentModel
@@ -143,18 +130,11 @@ class ApiDocumentModel(Base):
         return new_api_document
 
 
-@event.listens_for(ApiDocumentModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(ApiDocumentHistoryModel.version).where(
-                   ApiDocumentHistoryModel.id == target.id).order_by(
-                   ApiDocumentHistoryModel.version.desc()).limit(1)
-    version = -1
-
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(ApiDocumentHistoryModel).values(
+@event.listens_for(ApiDocumentModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, ApiDocumentHistoryModel)
+    if version:
+        write_history(connection, target, ApiDocumentHistoryModel, dict(
             id=target.id,
             api_id=target.api_id,
             document_id=target.document_id,
@@ -163,14 +143,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(ApiDocumentModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(ApiDocumentModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiDocumentHistoryModel).values(
+    write_history(connection, target, ApiDocumentHistoryModel, dict(
         id=target.id,
         api_id=target.api_id,
         document_id=target.document_id,
@@ -180,8 +164,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(ApiDocumentModel, "before_delete")
@@ -191,8 +176,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(ApiDocumentModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class ApiDocumentHistoryModel(Base):
     __tablename__ = "document_mapping_api_history"
+    __table_args__ = (
+        Index("ix_document_mapping_api_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
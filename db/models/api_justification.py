@@ -3,17 +3,24 @@ from db.models.api import ApiModel
 from db.models.db_base import Base
 from db.models.justification import JustificationModel, JustificationHistoryModel
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event, inspect
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
+from typing import Optional
 
 
 class ApiJustificationModel(Base):
     __tablename__ = "justification_mapping_api"
+    __table_args__ = (
+        Index("ix_justification_mapping_api_api_id", "api_id"),
+        Index("ix_justification_mapping_api_item", "justification_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "justification.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped["ApiModel"] = relationship("ApiModel", foreign_keys="ApiJustificationModel.api_id")
@@ -31,6 +38,7 @@ class ApiJustificationModel(Base):
                                                   foreign_keys="ApiJustificationModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, justification, section, offset, coverage, created_by):
         self.api = api
@@ -58,17 +66,11 @@ class ApiJustificationModel(Base):
                f"- {str(self.justification)!r}"
 
     def current_version(self, db_session):
-        last_mapping_query = db_session.query(ApiJustificationHistoryModel).filter(
-                        ApiJustificationHistoryModel.id == self.id).order_by(
-                        ApiJustificationHistoryModel.version.desc()).limit(1)
-        last_mapping = last_mapping_query.all()[0]
-
-        last_item_query = db_session.query(JustificationHistoryModel).filter(
-                     JustificationHistoryModel.id == self.justification_id).order_by(
-                     JustificationHistoryModel.version.desc()).limit(1)
-
-        last_item = last_item_query.all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, ApiJustificationHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, JustificationHistoryModel, self.justification_id, self.justification.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'justification': self.justification.as_dict(full_data=full_data, db_session=db_session),
@@ -106,27 +108,16 @@ class ApiJustificationModel(Base):
         return new_api_justification
 
 
-@event.listens_for(ApiJustificationModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(ApiJustificationHistoryModel.version,
-                        ApiJustificationHistoryModel.section,
-                        ApiJustificationHistoryModel.offset,
-                        ApiJustificationHistoryModel.coverage).where(
-                   ApiJustificationHistoryModel.id == target.id).order_by(
-                   ApiJustificationHistoryModel.version.desc()).limit(1)
-    version = -1
-    section = None
-    offset = None
-    coverage = 0
-
-    for row in connection.execute(last_query):
-        version = row[0]
-        section = row[1]
-        offset = row[2]
-        coverage = row[3]
-
-    if version > -1 and (section != target.section or offset != target.offset or coverage != target.coverage):
-        insert_query = insert(ApiJustificationHistoryModel).values(
+@event.listens_for(ApiJustificationModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    # A new version is created only if section, offset or coverage changed
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in ["section", "offset", "coverage"]):
+        return
+
+    version = next_version(connection, target, ApiJustificationHistoryModel)
+    if version:
+        write_history(connection, target, ApiJustificationHistoryModel, dict(
             id=target.id,
             api_id=target.api_id,
             justification_id=target.justification_id,
@@ -135,14 +126,13 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(ApiJustificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiJustificationHistoryModel).values(
+    write_history(connection, target, ApiJustificationHistoryModel, dict(
         id=target.id,
         api_id=target.api_id,
         justification_id=target.justification_id,
@@ -152,8 +142,7 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(ApiJustificationModel, "before_delete")
@@ -165,7 +154,10 @@ def receive_before_delete(mapper, connection, target):
 
 class ApiJustificationHistoryModel(Base):
     __tablename__ = "justification_mapping_api_history"
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        Index("ix_justification_mapping_api_history_id_version", "id", "version"),
+        {"sqlite_autoincrement": True},
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -3,17 +3,25 @@ from db.models.api import ApiModel
 from db.models.db_base import Base
 from db.models.user import UserModel
 from db.models.sw_requirement import SwRequirementModel, SwRequirementHistoryModel
-from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer, String
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
+from typing import Optional
 
 
 class ApiSwRequirementModel(Base):
     __tablename__ = "sw_requirement_mapping_api"
+    __table_args__ = (
+        Index("ix_sw_requirement_mapping_api_api_id", "api_id"),
+        Index("ix_sw_requirement_mapping_api_item", "sw_requirement_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "sw_requirement.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped["ApiModel"] = relationship("ApiModel", foreign_keys="ApiSwRequirementModel.api_id")
@@ -23,6 +31,7 @@ class ApiSwRequirementModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="ApiSwRequirementModel.created_by_id")
@@ -31,6 +40,7 @@ class ApiSwRequirementModel(Base):
                                                   foreign_keys="ApiSwRequirementModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, sw_requirement, section, offset, coverage, created_by):
         self.api = api
@@ -97,15 +107,11 @@ class ApiSwRequirementModel(Base):
         return sr_ts_mapping
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(ApiSwRequirementHistoryModel).filter(
-                        ApiSwRequirementHistoryModel.id == self.id).order_by(
-                        ApiSwRequirementHistoryModel.version.desc()).limit(1).all()[0]
-
-        last_item = db_session.query(SwRequirementHistoryModel).filter(
-                     SwRequirementHistoryModel.id == self.sw_requirement_id).order_by(
-                     SwRequirementHistoryModel.version.desc()).limit(1).all()[0]
-
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, ApiSwRequirementHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, SwRequirementHistoryModel, self.sw_requirement_id, self.sw_requirement.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'sw_requirement': self.sw_requirement.as_dict(full_data=full_data, db_session=db_session),
@@ -130,52 +136,12 @@ class ApiSwRequirementModel(Base):
             _dict["updated_at"] = self.updated_at.strftime(Base.dt_format_str)
         return _dict
 
-    def get_waterfall_coverage(self, db_session):
-        from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
-        from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
-        from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+    def get_waterfall_coverage(self, db_session=None):
         # Return Api-SR waterfall coverage
-
-        if db_session is None:
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-
-        srs_coverage = 0
-        tss_coverage = 0
-        tcs_coverage = 0
-
-        # Sw Requirements
-        sr_query = db_session.query(SwRequirementSwRequirementModel).filter(
-            SwRequirementSwRequirementModel.sw_requirement_mapping_api_id == self.id
-        )
-        srs = sr_query.all()
-        if len(srs) > 0:
-            srs_coverage = sum([x.get_waterfall_coverage(db_session) for x in srs])
-
-        # Test Specifications
-        ts_query = db_session.query(SwRequirementTestSpecificationModel).filter(
-            SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id == self.id
-        )
-        tss = ts_query.all()
-        if len(tss) > 0:
-            tss_coverage = sum([x.get_waterfall_coverage(db_session) for x in tss])
-
-        # Test Cases
-        tc_query = db_session.query(SwRequirementTestCaseModel).filter(
-            SwRequirementTestCaseModel.sw_requirement_mapping_api_id == self.id
-        )
-        tcs = tc_query.all()
-        if len(tcs) > 0:
-            tcs_coverage = sum([x.as_dict()['coverage'] for x in tcs])
-
-        if len(tcs) == len(tss) == len(srs) == 0:
-            waterfall_coverage = self.coverage
-        else:
-            waterfall_coverage = (
-                min(max(0, sum([srs_coverage, tss_coverage, tcs_coverage])), 100.0) * self.coverage
-            ) / 100.0
-
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_api, db_session):
         from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
@@ -227,17 +193,11 @@ class ApiSwRequirementModel(Base):
         return new_api_sw_requirement
 
 
-@event.listens_for(ApiSwRequirementModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(ApiSwRequirementHistoryModel.version).where(
-        ApiSwRequirementHistoryModel.id == target.id).order_by(
-        ApiSwRequirementHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(ApiSwRequirementHistoryModel).values(
+@event.listens_for(ApiSwRequirementModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, ApiSwRequirementHistoryModel)
+    if version:
+        write_history(connection, target, ApiSwRequirementHistoryModel, dict(
             id=target.id,
             api_id=target.api_id,
             sw_requirement_id=target.sw_requirement_id,
@@ -246,14 +206,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(ApiSwRequirementModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(ApiSwRequirementModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiSwRequirementHistoryModel).values(
+    write_history(connection, target, ApiSwRequirementHistoryModel, dict(
         id=target.id,
         api_id=target.api_id,
         sw_requirement_id=target.sw_requirement_id,
@@ -263,8 +227,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(ApiSwRequirementModel, "before_delete")
@@ -274,8 +239,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(ApiSwRequirementModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class ApiSwRequirementHistoryModel(Base):
     __tablename__ = 'sw_requirement_mapping_api_history'
+    __table_args__ = (
+        Index("ix_sw_requirement_mapping_api_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -3,17 +3,24 @@ from db.models.api import ApiModel
 from db.models.db_base import Base
 from db.models.test_case import TestCaseModel, TestCaseHistoryModel
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
+from typing import Optional
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 
 
 class ApiTestCaseModel(Base):
     __tablename__ = "test_case_mapping_api"
+    __table_args__ = (
+        Index("ix_test_case_mapping_api_api_id", "api_id"),
+        Index("ix_test_case_mapping_api_item", "test_case_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "test_case.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped["ApiModel"] = relationship("ApiModel", foreign_keys="ApiTestCaseModel.api_id")
@@ -30,6 +37,7 @@ class ApiTestCaseModel(Base):
                                                   foreign_keys="ApiTestCaseModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, test_case, section, offset, coverage, created_by):
         self.api = api
@@ -58,13 +66,11 @@ class ApiTestCaseModel(Base):
                f"{str(self.test_case)!r}"
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(ApiTestCaseHistoryModel).filter(
-                        ApiTestCaseHistoryModel.id == self.id).order_by(
-                        ApiTestCaseHistoryModel.version.desc()).limit(1).all()[0]
-        last_item = db_session.query(TestCaseHistoryModel).filter(
-                     TestCaseHistoryModel.id == self.test_case_id).order_by(
-                     TestCaseHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, ApiTestCaseHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, TestCaseHistoryModel, self.test_case_id, self.test_case.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'test_case': self.test_case.as_dict(full_data=full_data, db_session=db_session),
@@ -102,17 +108,11 @@ class ApiTestCaseModel(Base):
         return new_api_test_case
 
 
-@event.listens_for(ApiTestCaseModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(ApiTestCaseHistoryModel.version).where(
-        ApiTestCaseHistoryModel.id == target.id).order_by(
-        ApiTestCaseHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(ApiTestCaseHistoryModel).values(
+@event.listens_for(ApiTestCaseModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, ApiTestCaseHistoryModel)
+    if version:
+        write_history(connection, target, ApiTestCaseHistoryModel, dict(
             id=target.id,
             api_id=target.api_id,
             test_case_id=target.test_case_id,
@@ -121,14 +121,13 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(ApiTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiTestCaseHistoryModel).values(
+    write_history(connection, target, ApiTestCaseHistoryModel, dict(
         id=target.id,
         api_id=target.api_id,
         test_case_id=target.test_case_id,
@@ -138,8 +137,7 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(ApiTestCaseModel, "before_delete")
@@ -151,6 +149,9 @@ def receive_before_delete(mapper, connection, target):
 
 class ApiTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_api_history'
+    __table_args__ = (
+        Index("ix_test_case_mapping_api_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -3,19 +3,27 @@ from db.models.api import ApiModel
 from db.models.db_base import Base
 from db.models.test_specification import TestSpecificationModel, TestSpecificationHistoryModel
 from db.models.user import UserModel
-from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer, String
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
+from typing import Optional
 
 ats_fkey = "ApiTestSpecificationModel.test_specification_id"
 
 
 class ApiTestSpecificationModel(Base):
     __tablename__ = "test_specification_mapping_api"
+    __table_args__ = (
+        Index("ix_test_specification_mapping_api_api_id", "api_id"),
+        Index("ix_test_specification_mapping_api_item", "test_specification_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "test_specification.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped["ApiModel"] = relationship("ApiModel", foreign_keys="ApiTestSpecificationModel.api_id")
@@ -25,6 +33,7 @@ class ApiTestSpecificationModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="ApiTestSpecificationModel.created_by_id")
@@ -33,6 +42,7 @@ class ApiTestSpecificationModel(Base):
                                                   foreign_keys="ApiTestSpecificationModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, api, test_specification, section, offset, coverage, created_by):
         self.api = api
@@ -81,15 +91,11 @@ class ApiTestSpecificationModel(Base):
         return ts_tc_mapping
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(ApiTestSpecificationHistoryModel).filter(
-                        ApiTestSpecificationHistoryModel.id == self.id).order_by(
-                        ApiTestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
-
-        last_item = db_session.query(TestSpecificationHistoryModel).filter(
-                     TestSpecificationHistoryModel.id == self.test_specification_id).order_by(
-                     TestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
-
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, ApiTestSpecificationHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, TestSpecificationHistoryModel, self.test_specification_id, self.test_specification.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'test_specification': self.test_specification.as_dict(full_data=full_data, db_session=db_session),
@@ -113,26 +119,12 @@ class ApiTestSpecificationModel(Base):
             _dict["updated_at"] = self.updated_at.strftime(Base.dt_format_str)
         return _dict
 
-    def get_waterfall_coverage(self, db_session):
-        if db_session is None:
+    def get_waterfall_coverage(self, db_session=None):
+        # Return Api-TS waterfall coverage
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-
-        from db.models.test_specification_test_case import TestSpecificationTestCaseModel
-        tcs_coverage = 0
-
-        # Test Cases
-        tc_query = db_session.query(TestSpecificationTestCaseModel).filter(
-            TestSpecificationTestCaseModel.test_specification_mapping_api_id == self.id
-        )
-        tcs = tc_query.all()
-        if len(tcs) > 0:
-            tcs_coverage = sum([x.as_dict()['coverage'] for x in tcs])
-        else:
-            tcs_coverage = 100
-
-        waterfall_coverage = (min(max(0, tcs_coverage), 100) * self.coverage) / 100.0
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_api, db_session):
         from db.models.test_specification_test_case import TestSpecificationTestCaseModel
@@ -161,17 +153,11 @@ class ApiTestSpecificationModel(Base):
         return new_api_test_specification
 
 
-@event.listens_for(ApiTestSpecificationModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(ApiTestSpecificationHistoryModel.version).where(
-        ApiTestSpecificationHistoryModel.id == target.id).order_by(
-        ApiTestSpecificationHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(ApiTestSpecificationHistoryModel).values(
+@event.listens_for(ApiTestSpecificationModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, ApiTestSpecificationHistoryModel)
+    if version:
+        write_history(connection, target, ApiTestSpecificationHistoryModel, dict(
             id=target.id,
             api_id=target.api_id,
             test_specification_id=target.test_specification_id,
@@ -180,14 +166,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(ApiTestSpecificationModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(ApiTestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(ApiTestSpecificationHistoryModel).values(
+    write_history(connection, target, ApiTestSpecificationHistoryModel, dict(
         id=target.id,
         api_id=target.api_id,
         test_specification_id=target.test_specification_id,
@@ -197,8 +187,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(ApiTestSpecificationModel, "before_delete")
@@ -208,8 +199,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(ApiTestSpecificationModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class ApiTestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specification_mapping_api_history'
+    __table_args__ = (
+        Index("ix_test_specification_mapping_api_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -0,0 +1,146 @@
+import re
+
+from db.models.db_base import Base
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy import and_, delete, exists, insert, or_, select
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+
+# ApiModel permission field -> flag stored in ApiUserPermissionModel.perms
+PERMISSION_FLAGS = {
+    "read_denials": "d",
+    "write_permissions": "w",
+    "edit_permissions": "e",
+    "manage_permissions": "m",
+}
+READ_DENIAL = PERMISSION_FLAGS["read_denials"]
+WRITE = PERMISSION_FLAGS["write_permissions"]
+EDIT = PERMISSION_FLAGS["edit_permissions"]
+MANAGE = PERMISSION_FLAGS["manage_permissions"]
+
+
+class ApiUserPermissionModel(Base):
+    """Normalized copy of the "[id][id]" permission fields of ApiModel, one row per (api, user).
+
+    The ApiModel fields are still the ones written by the application, rows are
+    kept aligned by the ApiModel listeners. user_id 0 is the marker of a Software
+    Component with restricted read access, as in ApiModel.read_denials.
+    """
+    __tablename__ = "api_user_permissions"
+    __table_args__ = (
+        Index("ix_api_user_permissions_user_id_api_id", "user_id", "api_id"),
+    )
+    extend_existing = True
+    api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer(), primary_key=True)
+    perms: Mapped[str] = mapped_column(String(8), default="")
+
+    def __repr__(self) -> str:
+        return f"ApiUserPermissionModel(api_id={self.api_id!r}, " \
+               f"user_id={self.user_id!r}, " \
+               f"perms={self.perms!r})"
+
+
+def get_permission_rows(api_id, fields):
+    """Return the rows of an api from the values of its permission fields
+
+    :param api_id: ApiModel id
+    :param fields: dict ApiModel permission field -> "[id][id]" string
+    :return: list of dict (api_id, user_id, perms)
+    """
+    perms = {}
+    for field, flag in PERMISSION_FLAGS.items():
+        for user_id in re.findall(r"\[(\d+)\]", fields.get(field) or ""):
+            perms.setdefault(int(user_id), set()).add(flag)
+    return [{"api_id": api_id, "user_id": user_id,
+             "perms": "".join([x for x in PERMISSION_FLAGS.values() if x in flags])}
+            for user_id, flags in perms.items()]
+
+
+def sync_api_user_permissions(connection, api_id, fields):
+    """Replace the rows of an api with the ones described by its permission fields"""
+    table = ApiUserPermissionModel.__table__
+    connection.execute(delete(table).where(table.c.api_id == api_id))
+    rows = get_permission_rows(api_id, fields)
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+def rebuild_api_user_permissions(connection, where=None):
+    """Rebuild the rows of the apis matching `where` (all if None) from the apis table.
+    Used to populate the table and after bulk updates of the permission fields."""
+    from db.models.api import ApiModel
+
+    apis = ApiModel.__table__
+    query = select(apis.c.id, *[apis.c[x] for x in PERMISSION_FLAGS.keys()])
+    if where is not None:
+        query = query.where(where)
+
+    table = ApiUserPermissionModel.__table__
+    api_ids = []
+    rows = []
+    for api in connection.execute(query).mappings().all():
+        api_ids.append(api["id"])
+        rows += get_permission_rows(api["id"], api)
+    if not api_ids:
+        return
+    connection.execute(delete(table).where(table.c.api_id.in_(api_ids)))
+    if rows:
+        connection.execute(insert(table), rows)
+
+
+def backfill_api_user_permissions(connection):
+    """Populate the table at the first startup after its introduction"""
+    from db.models.api import ApiModel
+
+    table = ApiUserPermissionModel.__table__
+    if connection.execute(select(table.c.api_id).limit(1)).first() is None:
+        if connection.execute(select(ApiModel.__table__.c.id).limit(1)).first() is not None:
+            rebuild_api_user_permissions(connection)
+
+
+def get_users_permission_rows(db_session, api_ids, user_id):
+    """Return the rows needed to evaluate the permissions of a user on a list of apis:
+    the ones of the user and the read denials, with a single index lookup.
+
+    :return: list of (api_id, user_id, perms)
+    """
+    table = ApiUserPermissionModel.__table__
+    if not api_ids:
+        return []
+    return db_session.execute(
+        select(table.c.api_id, table.c.user_id, table.c.perms)
+        .where(table.c.api_id.in_(api_ids))
+        .where(or_(table.c.user_id == user_id, table.c.perms.contains(READ_DENIAL)))
+    ).all()
+
+
+def user_api_ids_with_permission(user_id, flag):
+    """Select the ids of the apis where the user has the permission `flag`"""
+    table = ApiUserPermissionModel.__table__
+    return select(table.c.api_id).where(table.c.user_id == user_id).where(table.c.perms.contains(flag))
+
+
+def api_user_ids_with_permission(api_id, flag):
+    """Select the ids of the users having the permission `flag` on the api"""
+    table = ApiUserPermissionModel.__table__
+    return select(table.c.user_id).where(table.c.api_id == api_id).where(table.c.perms.contains(flag))
+
+
+def readable_apis_filter(api_id_column, user_id=None, created_by_id_column=None):
+    """Filter on the apis readable by a user
+
+    :param api_id_column: ApiModel.id or equivalent column
+    :param user_id: id of the user, None for guests and users with GUEST role,
+                    that can read only apis without read denials
+    :param created_by_id_column: ApiModel.created_by_id, creators can always read their apis
+    """
+    table = ApiUserPermissionModel.__table__
+    if user_id is None:
+        return ~exists().where(and_(table.c.api_id == api_id_column, table.c.perms.contains(READ_DENIAL)))
+    denied = exists().where(
+        and_(table.c.api_id == api_id_column, table.c.user_id == user_id, table.c.perms.contains(READ_DENIAL))
+    )
+    if created_by_id_column is None:
+        return ~denied
+    return or_(created_by_id_column == user_id, ~denied)
@@ -1,18 +1,32 @@
+import os
 from datetime import datetime
 from typing import Optional
 
 from db.models.db_base import Base
 from db.models.user import UserModel
 from sqlalchemy import Boolean, DateTime, Integer, String
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy import and_, case, delete, event, func, insert, inspect, or_, select
 from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import Session
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 
+# Read comment badges from the comment_counts table, kept aligned on comment changes,
+# instead of aggregating the comments table
+COMMENT_COUNTER_CACHE = os.environ.get("BASIL_COMMENT_COUNTER_CACHE", "false").lower() in ["1", "true", "yes"]
+
+# Key of Session.info holding the preloaded counters: (parent_table, parent_id) -> dict
+COMMENT_COUNTS_CACHE = "comment_counts"
+
 
 class CommentModel(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_parent_table_parent_id", "parent_table", "parent_id"),
+    )
     extend_existing = True
+    as_dict_relationships = ["created_by", "done_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     parent_table: Mapped[str] = mapped_column(String(100))
     parent_id: Mapped[int] = mapped_column(Integer())
@@ -72,3 +86,130 @@ class CommentModel(Base):
                f"done_at={self.done_at.strftime(Base.dt_short_format_str)!r} if self.done_at else None, " \
                f"parent_table={self.parent_table!r}, " \
                f"parent_id={self.parent_id!r}"
+
+
+class CommentCountModel(Base):
+    """Counter cache of the comments of each parent row, see COMMENT_COUNTER_CACHE"""
+    __tablename__ = "comment_counts"
+    extend_existing = True
+    parent_table: Mapped[str] = mapped_column(String(100), primary_key=True)
+    parent_id: Mapped[int] = mapped_column(Integer(), primary_key=True)
+    comment_count: Mapped[int] = mapped_column(Integer(), default=0)
+    todo_count: Mapped[int] = mapped_column(Integer(), default=0)
+
+    def __repr__(self) -> str:
+        return f"CommentCountModel(parent_table={self.parent_table!r}, " \
+               f"parent_id={self.parent_id!r}, " \
+               f"comment_count={self.comment_count!r}, " \
+               f"todo_count={self.todo_count!r})"
+
+
+def _parents_filter(table, keys):
+    """Filter the rows of `table` by a list of (parent_table, parent_id)"""
+    ids = {}
+    for parent_table, parent_id in keys:
+        ids.setdefault(parent_table, []).append(parent_id)
+    return or_(*[and_(table.c.parent_table == parent_table, table.c.parent_id.in_(parent_ids))
+                 for parent_table, parent_ids in ids.items()])
+
+
+def _counts_select():
+    """Comment and open todo counts grouped by parent row"""
+    comments = CommentModel.__table__
+    open_todo = and_(comments.c.todo.is_(True), comments.c.done.is_(False))
+    return select(
+        comments.c.parent_table,
+        comments.c.parent_id,
+        func.count().label("comment_count"),
+        func.coalesce(func.sum(case((open_todo, 1), else_=0)), 0).label("todo_count"),
+    ).group_by(comments.c.parent_table, comments.c.parent_id)
+
+
+def preload_comment_counts(db_session, instances):
+    """Resolve the comment and todo counts of a list of rows at once.
+
+    A single grouped query, on the comments table or on the comment_counts
+    table if COMMENT_COUNTER_CACHE is enabled, replaces the two COUNT queries
+    that comment_counts() runs for each row.
+    Counts are stored in the session, where comment_counts() looks for them
+    first, and are dropped at the next flush of the session.
+
+    :param db_session: database session
+    :param instances: model instances of any type, comments are matched on their table and id
+    """
+    cache = db_session.info.setdefault(COMMENT_COUNTS_CACHE, {})
+    keys = {(x.__tablename__, x.id) for x in instances} - set(cache.keys())
+    if not keys:
+        return
+
+    if COMMENT_COUNTER_CACHE:
+        table = CommentCountModel.__table__
+        query = select(table.c.parent_table, table.c.parent_id, table.c.comment_count, table.c.todo_count)
+    else:
+        table = CommentModel.__table__
+        query = _counts_select()
+
+    for key in keys:
+        cache[key] = {"comment_count": 0, "todo_count": 0}
+    for parent_table, parent_id, comment_count, todo_count in db_session.execute(
+            query.where(_parents_filter(table, keys))).all():
+        cache[(parent_table, parent_id)] = {"comment_count": comment_count, "todo_count": int(todo_count)}
+
+
+def get_cached_comment_counts(db_session, parent_table, parent_id):
+    """Return the preloaded counts of a parent row, None if they have not been preloaded"""
+    counts = db_session.info.get(COMMENT_COUNTS_CACHE, {}).get((parent_table, parent_id), None)
+    return dict(counts) if counts is not None else None
+
+
+def refresh_comment_counts(connection, parent_table, parent_id):
+    """Align the comment_counts row of a parent with its comments"""
+    table = CommentCountModel.__table__
+    connection.execute(delete(table).where(_parents_filter(table, [(parent_table, parent_id)])))
+    comments = CommentModel.__table__
+    row = connection.execute(
+        _counts_select().where(_parents_filter(comments, [(parent_table, parent_id)]))
+    ).first()
+    if row is not None:
+        connection.execute(insert(table).values(parent_table=parent_table, parent_id=parent_id,
+                                                comment_count=row.comment_count, todo_count=int(row.todo_count)))
+
+
+def rebuild_comment_counts(connection):
+    """Populate the comment_counts table from scratch"""
+    table = CommentCountModel.__table__
+    connection.execute(delete(table))
+    connection.execute(
+        insert(table).from_select(["parent_table", "parent_id", "comment_count", "todo_count"], _counts_select())
+    )
+
+
+@event.listens_for(CommentModel, "after_insert")
+def receive_after_insert(mapper, connection, target):
+    if COMMENT_COUNTER_CACHE:
+        refresh_comment_counts(connection, target.parent_table, target.parent_id)
+
+
+@event.listens_for(CommentModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    if COMMENT_COUNTER_CACHE:
+        state = inspect(target)
+        old_parent_table = state.attrs.parent_table.history.deleted
+        old_parent_id = state.attrs.parent_id.history.deleted
+        if old_parent_table or old_parent_id:
+            refresh_comment_counts(connection,
+                                   old_parent_table[0] if old_parent_table else target.parent_table,
+                                   old_parent_id[0] if old_parent_id else target.parent_id)
+        refresh_comment_counts(connection, target.parent_table, target.parent_id)
+
+
+@event.listens_for(CommentModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    if COMMENT_COUNTER_CACHE:
+        refresh_comment_counts(connection, target.parent_table, target.parent_id)
+
+
+@event.listens_for(Session, "after_flush")
+def receive_after_flush(session, flush_context):
+    # Comments could have been added or changed
+    session.info.pop(COMMENT_COUNTS_CACHE, None)
@@ -1,11 +1,16 @@
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import String
+from sqlalchemy.orm import DeclarativeBase, MANYTOONE, Session, selectinload
+from sqlalchemy import String, event, inspect
+
+USED_WORK_ITEMS_CACHE = "used_work_items"
 
 
 class Base(DeclarativeBase):
     dt_format_str = "%Y-%m-%d %H:%M"
     dt_short_format_str = "%d %b %y %H:%M"
 
+    # Relationships read by as_dict(), as dotted paths, see as_dict_load_options()
+    as_dict_relationships = []
+
     STATUS_NEW = 'NEW'
     STATUS_IN_REVIEW = 'IN_REVIEW'
     STATUS_APPROVED = 'APPROVED'
@@ -45,13 +50,50 @@ class Base(DeclarativeBase):
 
         return constraints
 
+    @classmethod
+    def as_dict_load_options(cls):
+        """
+        Return the loader options of the relationships listed in ``as_dict_relationships``.
+        Queries of rows that are going to be serialized with ``as_dict()`` apply them
+        so that each relationship is loaded for all the rows with a single SELECT ... IN
+        instead of a lazy load per row.
+        """
+        ret = []
+        for path in cls.as_dict_relationships:
+            model = cls
+            option = None
+            for name in path.split("."):
+                attr = getattr(model, name)
+                option = selectinload(attr) if option is None else option.selectinload(attr)
+                model = attr.property.mapper.class_
+            ret.append(option)
+        return ret
+
+    def is_preloaded_as_used(self, db_session):
+        """
+        Return True if the work item is referenced by one of the mapping rows
+        passed to ``preload_used_work_items``, so ``is_used()`` does not need to query.
+        """
+        return (self.__tablename__, self.id) in db_session.info.get(USED_WORK_ITEMS_CACHE, ())
+
     def comment_counts(self, db_session):
         """
         Return comment and todo counts for rows where this instance is the parent
         (``parent_table`` / ``parent_id`` on ``CommentModel``).
+        Counts resolved in bulk by ``db.models.comment.preload_comment_counts``
+        are read from the session.
         """
-        from db.models.comment import CommentModel
+        from db.models import comment
+
+        counts = comment.get_cached_comment_counts(db_session, self.__tablename__, self.id)
+        if counts is not None:
+            return counts
 
+        if comment.COMMENT_COUNTER_CACHE:
+            comment.preload_comment_counts(db_session, [self])
+            return comment.get_cached_comment_counts(db_session, self.__tablename__, self.id)
+
+        CommentModel = comment.CommentModel
         q = db_session.query(CommentModel).filter(
             CommentModel.parent_table == self.__tablename__,
             CommentModel.parent_id == self.id,
@@ -64,3 +106,41 @@ class Base(DeclarativeBase):
                 .count()
             ),
         }
+
+    @staticmethod
+    def last_version(db_session, history_model, id, version=None):
+        """
+        Return the last version of the ``history_model`` row with the selected ``id``.
+        ``version`` is the value of the ``version`` column of the row, the history
+        table is read only for the rows created before the introduction of the column.
+        """
+        if version is not None:
+            return version
+        return (
+            db_session.query(history_model.version)
+            .filter(history_model.id == id)
+            .order_by(history_model.version.desc())
+            .limit(1)
+            .all()[0]
+            .version
+        )
+
+
+def preload_used_work_items(db_session, rows):
+    """Store in the session the work items referenced by mapping rows, that are used by definition"""
+    used = db_session.info.setdefault(USED_WORK_ITEMS_CACHE, set())
+    for row in rows:
+        mapper = inspect(type(row))
+        for rel in mapper.relationships:
+            if rel.direction is not MANYTOONE or not hasattr(rel.mapper.class_, "is_used"):
+                continue
+            for column in rel.local_columns:
+                work_item_id = getattr(row, mapper.get_property_by_column(column).key)
+                if work_item_id:
+                    used.add((rel.mapper.class_.__tablename__, work_item_id))
+
+
+@event.listens_for(Session, "after_flush")
+def receive_after_flush(session, flush_context):
+    # Mappings could have been added or removed
+    session.info.pop(USED_WORK_ITEMS_CACHE, None)
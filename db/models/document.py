@@ -1,9 +1,10 @@
 from datetime import datetime
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -14,6 +15,7 @@ class DocumentModel(Base):
     __tablename__ = 'documents'
     _description = 'Document'
     extend_existing = True
+    as_dict_relationships = ["created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     title: Mapped[Optional[str]] = mapped_column(String(200))
     description: Mapped[Optional[str]] = mapped_column(String())
@@ -32,6 +34,7 @@ class DocumentModel(Base):
     status: Mapped[str] = mapped_column(String(30))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, title, description, document_type, spdx_relation, url, section, offset, valid, created_by):
         self.title = title
@@ -58,13 +61,10 @@ class DocumentModel(Base):
         return tmp
 
     def current_version(self, db_session):
-        last_item = db_session.query(DocumentHistoryModel).filter(
-                     DocumentHistoryModel.id == self.id).order_by(
-                     DocumentHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, DocumentHistoryModel, self.id, self.version)}'
 
     def is_used(self, db_session) -> bool:
-        if db_session is None:
+        if db_session is None or self.is_preloaded_as_used(db_session):
             return True
         from db.models.api_document import ApiDocumentModel
         from db.models.document_document import DocumentDocumentModel
@@ -116,18 +116,11 @@ class DocumentModel(Base):
         return new_document
 
 
-@event.listens_for(DocumentModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(DocumentHistoryModel.version,
-                        DocumentHistoryModel.description).where(
-        DocumentHistoryModel.id == target.id).order_by(
-        DocumentHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(DocumentHistoryModel).values(
+@event.listens_for(DocumentModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, DocumentHistoryModel)
+    if version:
+        write_history(connection, target, DocumentHistoryModel, dict(
             id=target.id,
             title=target.title,
             description=target.description,
@@ -140,14 +133,13 @@ def receive_after_update(mapper, connection, target):
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
             status=target.status,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(DocumentModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(DocumentHistoryModel).values(
+    write_history(connection, target, DocumentHistoryModel, dict(
         id=target.id,
         title=target.title,
         description=target.description,
@@ -161,8 +153,7 @@ def receive_after_insert(mapper, connection, target):
         edited_by_id=target.edited_by_id,
         status=target.status,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(DocumentModel, "before_delete")
@@ -174,6 +165,9 @@ def receive_before_delete(mapper, connection, target):
 
 class DocumentHistoryModel(Base):
     __tablename__ = 'documents_history'
+    __table_args__ = (
+        Index("ix_documents_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -3,9 +3,11 @@ from db.models.api_document import ApiDocumentModel
 from db.models.db_base import Base
 from db.models.document import DocumentModel, DocumentHistoryModel
 from db.models.user import UserModel
-from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer, String
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -14,7 +16,18 @@ from typing import Optional
 
 class DocumentDocumentModel(Base):
     __tablename__ = "document_mapping_document"
+    __table_args__ = (
+        Index("ix_document_mapping_document_parent_api", "document_mapping_api_id"),
+        Index("ix_document_mapping_document_parent_mapping", "document_mapping_document_id"),
+        Index("ix_document_mapping_document_item", "document_id"),
+    )
     extend_existing = True
+    as_dict_relationships = [
+        "created_by",
+        "document.created_by",
+        "document_mapping_api.document",
+        "document_mapping_document.document",
+    ]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     document_mapping_api: Mapped[Optional["ApiDocumentModel"]] = relationship(
         "ApiDocumentModel", foreign_keys="DocumentDocumentModel.document_mapping_api_id")
@@ -34,6 +47,7 @@ class DocumentDocumentModel(Base):
     section: Mapped[str] = mapped_column(String())
     offset: Mapped[int] = mapped_column(Integer())
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="DocumentDocumentModel.created_by_id")
@@ -42,6 +56,7 @@ class DocumentDocumentModel(Base):
                                                   foreign_keys="DocumentDocumentModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, document_mapping_document, document_mapping_api, document,
                  section, offset, coverage, created_by):
@@ -79,13 +94,11 @@ class DocumentDocumentModel(Base):
         return None
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(DocumentDocumentHistoryModel).filter(
-            DocumentDocumentHistoryModel.id == self.id).order_by(
-            DocumentDocumentHistoryModel.version.desc()).limit(1).all()[0]
-        last_item = db_session.query(DocumentHistoryModel).filter(
-            DocumentHistoryModel.id == self.document_id).order_by(
-            DocumentHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, DocumentDocumentHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, DocumentHistoryModel, self.document_id, self.document.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'relation_id': self.id,
@@ -118,31 +131,12 @@ class DocumentDocumentModel(Base):
             _dict["updated_at"] = self.updated_at.strftime(Base.dt_format_str)
         return _dict
 
-    def get_waterfall_coverage(self, db_session, _visited=None):
+    def get_waterfall_coverage(self, db_session=None):
         # Return Document-Document waterfall coverage
-        if db_session is None:
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-        # Cycle protection in case of unexpected document cycles
-        if _visited is None:
-            _visited = set()
-        if self.id in _visited:
-            return 0
-        _visited.add(self.id)
-
-        docs_coverage = 0
-
-        # Documents
-        docs = db_session.query(DocumentDocumentModel).filter(
-            DocumentDocumentModel.document_mapping_document_id == self.id
-        ).all()
-        if len(docs) > 0:
-            docs_coverage = sum([x.get_waterfall_coverage(db_session, _visited) for x in docs])
-            waterfall_coverage = (min(max(0, docs_coverage), 100) * self.coverage) / 100.0
-        else:
-            waterfall_coverage = self.coverage
-
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_document_mapping_document=None, new_document_mapping_api=None, db_session=None):
         new_document_document = DocumentDocumentModel(
@@ -169,18 +163,11 @@ class DocumentDocumentModel(Base):
         return new_document_document
 
 
-@event.listens_for(DocumentDocumentModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(DocumentDocumentHistoryModel.version).where(
-                   DocumentDocumentHistoryModel.id == target.id).order_by(
-                   DocumentDocumentHistoryModel.version.desc()).limit(1)
-    version = -1
-
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(DocumentDocumentHistoryModel).values(
+@event.listens_for(DocumentDocumentModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, DocumentDocumentHistoryModel)
+    if version:
+        write_history(connection, target, DocumentDocumentHistoryModel, dict(
             id=target.id,
             document_mapping_api_id=target.document_mapping_api_id,
             document_mapping_document_id=target.document_mapping_document_id,
@@ -190,14 +177,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(DocumentDocumentModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(DocumentDocumentModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(DocumentDocumentHistoryModel).values(
+    write_history(connection, target, DocumentDocumentHistoryModel, dict(
         id=target.id,
         document_mapping_api_id=target.document_mapping_api_id,
         document_mapping_document_id=target.document_mapping_document_id,
@@ -208,8 +199,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(DocumentDocumentModel, "before_delete")
@@ -219,8 +211,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(DocumentDocumentModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class DocumentDocumentHistoryModel(Base):
     __tablename__ = "document_mapping_document_history"
+    __table_args__ = (
+        Index("ix_document_mapping_document_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
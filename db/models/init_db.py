@@ -1,7 +1,7 @@
 import logging
 import os
 import sys
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(1, os.path.dirname(os.path.dirname(currentdir)))
@@ -14,10 +14,12 @@ from db.models.api_justification import ApiJustificationModel, ApiJustificationH
 from db.models.api_sw_requirement import ApiSwRequirementModel, ApiSwRequirementHistoryModel
 from db.models.api_test_case import ApiTestCaseModel, ApiTestCaseHistoryModel
 from db.models.api_test_specification import ApiTestSpecificationModel, ApiTestSpecificationHistoryModel
-from db.models.comment import CommentModel
+from db.models.api_user_permission import ApiUserPermissionModel, backfill_api_user_permissions
+from db.models.comment import COMMENT_COUNTER_CACHE, CommentModel, rebuild_comment_counts
 from db.models.document import DocumentModel, DocumentHistoryModel
 from db.models.document_document import DocumentDocumentModel, DocumentDocumentHistoryModel
 from db.models.justification import JustificationModel, JustificationHistoryModel
+from db.models.mapping_generation import MappingGenerationModel
 from db.models.note import NoteModel
 from db.models.notification import NotificationModel
 from db.models.ssh_key import SshKeyModel
@@ -35,9 +37,26 @@ from db.models.test_specification_test_case import TestSpecificationTestCaseMode
 from db.models.test_specification_test_case import TestSpecificationTestCaseHistoryModel
 from db.models.test_specification import TestSpecificationModel, TestSpecificationHistoryModel
 from db.models.user import UserModel
+from db.models.versions import backfill_versions
+from db.models.waterfall_coverage import backfill_waterfall_coverage
+from db.models.work_item_usage import WorkItemUsageModel, backfill_work_item_usages
 logger = logging.getLogger(__name__)
 
 
+def get_missing_indexes(connection):
+    """Return the names of the indexes declared by the models that are not in the database.
+    create_all does not add indexes to existing tables, they are added by the migration scripts.
+    """
+    inspector = inspect(connection)
+    ret = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = [x["name"] for x in inspector.get_indexes(table.name)]
+        ret += sorted([x.name for x in table.indexes if x.name not in existing])
+    return ret
+
+
 def initialization(db_name='basil'):
     logger.info(f"Database initialization: {db_name}")
 
@@ -52,6 +71,11 @@ def initialization(db_name='basil'):
     except Exception as e:
         logger.error(f"Unable to run database create_all\n{e}")
 
+    missing_indexes = get_missing_indexes(dbi.session.connection())
+    if missing_indexes:
+        logger.warning(f"Missing database indexes: {', '.join(missing_indexes)}. "
+                       f"Please run the migration scripts in db/models/migration")
+
     admin_pwd = os.getenv('BASIL_ADMIN_PASSWORD', 'admin')
 
     # Prevent multiple workers write same entries
@@ -88,6 +112,22 @@ def initialization(db_name='basil'):
             dummy_user = UserModel("dummy_user", "dummy_user", "dummy_user", "USER")
             dbi.session.add(dummy_user)
 
+    # Waterfall coverage of mappings created before it was materialized
+    backfill_waterfall_coverage(dbi.session.connection())
+
+    # Version of the rows created before it was kept on the live tables
+    backfill_versions(dbi.session.connection())
+
+    # Normalized api permissions of the Software Components created before its introduction
+    backfill_api_user_permissions(dbi.session.connection())
+
+    # Reverse traceability index of the mappings created before its introduction
+    backfill_work_item_usages(dbi.session.connection())
+
+    # Comment counters are not maintained while the cache is disabled
+    if COMMENT_COUNTER_CACHE:
+        rebuild_comment_counts(dbi.session.connection())
+
     dbi.session.commit()
     dbi.close()
 
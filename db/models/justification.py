@@ -1,9 +1,10 @@
 from datetime import datetime
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -14,6 +15,7 @@ class JustificationModel(Base):
     __tablename__ = 'justifications'
     _description = 'Justification'
     extend_existing = True
+    as_dict_relationships = ["created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     description: Mapped[Optional[str]] = mapped_column(String())
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
@@ -25,6 +27,7 @@ class JustificationModel(Base):
     status: Mapped[str] = mapped_column(String(30))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, description, created_by):
         self.description = description
@@ -43,13 +46,10 @@ class JustificationModel(Base):
                f"description={self.description!r})"
 
     def current_version(self, db_session):
-        last_item = db_session.query(JustificationHistoryModel).filter(
-                     JustificationHistoryModel.id == self.id).order_by(
-                     JustificationHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, JustificationHistoryModel, self.id, self.version)}'
 
     def is_used(self, db_session) -> bool:
-        if db_session is None:
+        if db_session is None or self.is_preloaded_as_used(db_session):
             return True
         from db.models.api_justification import ApiJustificationModel
         api_justifications = db_session.query(ApiJustificationModel).filter(
@@ -82,39 +82,30 @@ class JustificationModel(Base):
         return new_justification
 
 
-@event.listens_for(JustificationModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(JustificationHistoryModel.version,
-                        JustificationHistoryModel.description).where(
-        JustificationHistoryModel.id == target.id).order_by(
-        JustificationHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(JustificationHistoryModel).values(
+@event.listens_for(JustificationModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, JustificationHistoryModel)
+    if version:
+        write_history(connection, target, JustificationHistoryModel, dict(
             id=target.id,
             description=target.description,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
             status=target.status,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(JustificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(JustificationHistoryModel).values(
+    write_history(connection, target, JustificationHistoryModel, dict(
         id=target.id,
         description=target.description,
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         status=target.status,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(JustificationModel, "before_delete")
@@ -126,6 +117,9 @@ def receive_before_delete(mapper, connection, target):
 
 class JustificationHistoryModel(Base):
     __tablename__ = 'justifications_history'
+    __table_args__ = (
+        Index("ix_justifications_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
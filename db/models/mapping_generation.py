@@ -0,0 +1,149 @@
+from itertools import chain
+
+from db.models.db_base import Base
+from sqlalchemy import Integer, event, inspect, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Mapped, Session
+from sqlalchemy.orm import mapped_column
+
+# Generation of the rows that can be shown in the mapping views of any Software Component
+GLOBAL_GENERATION = 0
+
+# Session info: counters to increase when the current transaction is committed
+PENDING_GENERATIONS = "pending_mapping_generations"
+
+# Direct mappings, the Software Component is known from the row
+API_MAPPING_TABLES = [
+    "document_mapping_api",
+    "justification_mapping_api",
+    "sw_requirement_mapping_api",
+    "test_case_mapping_api",
+    "test_specification_mapping_api",
+]
+
+# Work items, nested mappings and comments: they can be shown by any Software Component
+SHARED_TABLES = [
+    "comments",
+    "document_mapping_document",
+    "documents",
+    "justifications",
+    "sw_requirement_mapping_sw_requirement",
+    "sw_requirements",
+    "test_case_mapping_sw_requirement",
+    "test_case_mapping_test_specification",
+    "test_cases",
+    "test_specification_mapping_sw_requirement",
+    "test_specifications",
+]
+
+# Tables shown by the mapping views only through some columns, e.g. the name of the user that created a mapping
+SHARED_COLUMNS = {
+    "users": ["username"],
+}
+
+
+class MappingGenerationModel(Base):
+    """Counter of the changes of the data shown by the mapping views of a Software Component.
+
+    The row with api_id GLOBAL_GENERATION counts the changes to work items, nested
+    mappings, comments and user names, that affect the mapping views of any Software Component.
+    Counters are increased by the transaction that changes the data, right before its
+    commit, so all the processes see them together with the data and the counter rows
+    are locked only for the duration of the commit.
+    """
+    __tablename__ = "mapping_generations"
+    extend_existing = True
+    api_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=False)
+    generation: Mapped[int] = mapped_column(Integer(), default=0)
+
+    def __repr__(self) -> str:
+        return f"MappingGenerationModel(api_id={self.api_id!r}, generation={self.generation!r})"
+
+
+def bump_mapping_generations(connection, api_ids):
+    """Increase the counters of the selected Software Components, GLOBAL_GENERATION for all of them.
+    Rows are locked in api_id order to avoid deadlocks between concurrent transactions."""
+    table = MappingGenerationModel.__table__
+    statement = insert(table).on_conflict_do_update(
+        index_elements=[table.c.api_id], set_={"generation": table.c.generation + 1})
+    connection.execute(statement, [{"api_id": x, "generation": 1} for x in sorted(api_ids)])
+
+
+def get_mapping_generations(db_session, api_id):
+    """Return the counters of the Software Component, as a list:
+    database name, counters table oid, Software Component counter, global counter.
+    Database and table identify the counters, that restart from 0 when the table is created again."""
+    row = db_session.execute(text(
+        "SELECT current_database() AS db, 'mapping_generations'::regclass::oid AS oid, "
+        "(SELECT generation FROM mapping_generations WHERE api_id = :api_id) AS api, "
+        "(SELECT generation FROM mapping_generations WHERE api_id = :global_id) AS global_generation"
+    ), {"api_id": api_id, "global_id": GLOBAL_GENERATION}).one()
+    return [row.db, row.oid, row.api or 0, row.global_generation or 0]
+
+
+def has_pending_mapping_changes(db_session):
+    """True if the current transaction changed data shown by the mapping views"""
+    return bool(db_session.info.get(PENDING_GENERATIONS, None))
+
+
+def _add_pending_generations(session, api_ids):
+    session.info.setdefault(PENDING_GENERATIONS, set()).update(api_ids)
+
+
+def _shared_columns_changed(instance, tablename):
+    state = inspect(instance)
+    return state.deleted or any(state.attrs[x].history.has_changes() for x in SHARED_COLUMNS[tablename])
+
+
+def _changed_api_ids(instances):
+    api_ids = set()
+    for instance in instances:
+        tablename = getattr(instance, "__tablename__", None)
+        if tablename in API_MAPPING_TABLES:
+            api_ids.add(instance.api_id)
+        elif tablename in SHARED_TABLES:
+            api_ids.add(GLOBAL_GENERATION)
+        elif tablename in SHARED_COLUMNS and _shared_columns_changed(instance, tablename):
+            api_ids.add(GLOBAL_GENERATION)
+    return api_ids
+
+
+@event.listens_for(Session, "after_flush")
+def receive_after_flush(session, flush_context):
+    dirty = [x for x in session.dirty if session.is_modified(x, include_collections=False)]
+    api_ids = _changed_api_ids(chain(session.new, dirty, session.deleted))
+    if api_ids:
+        _add_pending_generations(session, api_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def receive_before_commit(session):
+    # The changes not flushed yet would be flushed by the commit after this listener
+    session.flush()
+    api_ids = session.info.get(PENDING_GENERATIONS, None)
+    if api_ids:
+        bump_mapping_generations(session.connection(), api_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def receive_after_commit(session):
+    session.info.pop(PENDING_GENERATIONS, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def receive_after_rollback(session):
+    session.info.pop(PENDING_GENERATIONS, None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def receive_do_orm_execute(orm_execute_state):
+    # Bulk updates and deletes don't go through the flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    tablename = mapper.local_table.name
+    if tablename in API_MAPPING_TABLES or tablename in SHARED_TABLES or tablename in SHARED_COLUMNS:
+        # Affected Software Components and updated columns are not known before the execution
+        _add_pending_generations(orm_execute_state.session, [GLOBAL_GENERATION])
@@ -0,0 +1,166 @@
+BEGIN;
+
+-- Materialized waterfall coverage of the mapping rows (see db/models/waterfall_coverage.py)
+-- Values of existing rows are populated by the api at startup (db/models/init_db.py)
+
+ALTER TABLE sw_requirement_mapping_api ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+ALTER TABLE sw_requirement_mapping_sw_requirement ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+ALTER TABLE test_specification_mapping_api ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+ALTER TABLE test_specification_mapping_sw_requirement ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+ALTER TABLE document_mapping_api ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+ALTER TABLE document_mapping_document ADD COLUMN IF NOT EXISTS covered DOUBLE PRECISION;
+
+-- Normalized api permissions (see db/models/api_user_permission.py)
+-- perms flags: d = read denial, w = write, e = edit, m = manage
+
+CREATE TABLE IF NOT EXISTS api_user_permissions (
+    api_id INTEGER NOT NULL REFERENCES apis(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    perms VARCHAR(8) NOT NULL DEFAULT '',
+    PRIMARY KEY (api_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS ix_api_user_permissions_user_id_api_id ON api_user_permissions (user_id, api_id);
+
+INSERT INTO api_user_permissions (api_id, user_id, perms)
+SELECT api_id, user_id, string_agg(flag, '' ORDER BY position(flag IN 'dwem'))
+FROM (
+    SELECT DISTINCT id AS api_id, m[1]::INTEGER AS user_id, 'd' AS flag
+    FROM apis, regexp_matches(COALESCE(read_denials, ''), '\[(\d+)\]', 'g') AS m
+    UNION
+    SELECT DISTINCT id, m[1]::INTEGER, 'w'
+    FROM apis, regexp_matches(COALESCE(write_permissions, ''), '\[(\d+)\]', 'g') AS m
+    UNION
+    SELECT DISTINCT id, m[1]::INTEGER, 'e'
+    FROM apis, regexp_matches(COALESCE(edit_permissions, ''), '\[(\d+)\]', 'g') AS m
+    UNION
+    SELECT DISTINCT id, m[1]::INTEGER, 'm'
+    FROM apis, regexp_matches(COALESCE(manage_permissions, ''), '\[(\d+)\]', 'g') AS m
+) AS flags
+GROUP BY api_id, user_id
+ON CONFLICT (api_id, user_id) DO NOTHING;
+
+-- Last history version kept on the live rows (see db/models/versions.py)
+
+ALTER TABLE apis ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE justifications ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE sw_requirements ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_cases ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_specifications ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE document_mapping_api ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE justification_mapping_api ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE sw_requirement_mapping_api ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_case_mapping_api ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_specification_mapping_api ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE document_mapping_document ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE sw_requirement_mapping_sw_requirement ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_case_mapping_sw_requirement ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_specification_mapping_sw_requirement ADD COLUMN IF NOT EXISTS version INTEGER;
+ALTER TABLE test_case_mapping_test_specification ADD COLUMN IF NOT EXISTS version INTEGER;
+
+UPDATE apis SET version = (SELECT max(h.version) FROM apis_history h WHERE h.id = apis.id) WHERE version IS NULL;
+UPDATE documents SET version = (SELECT max(h.version) FROM documents_history h WHERE h.id = documents.id) WHERE version IS NULL;
+UPDATE justifications SET version = (SELECT max(h.version) FROM justifications_history h WHERE h.id = justifications.id) WHERE version IS NULL;
+UPDATE sw_requirements SET version = (SELECT max(h.version) FROM sw_requirements_history h WHERE h.id = sw_requirements.id) WHERE version IS NULL;
+UPDATE test_cases SET version = (SELECT max(h.version) FROM test_cases_history h WHERE h.id = test_cases.id) WHERE version IS NULL;
+UPDATE test_specifications SET version = (SELECT max(h.version) FROM test_specifications_history h WHERE h.id = test_specifications.id) WHERE version IS NULL;
+UPDATE document_mapping_api SET version = (SELECT max(h.version) FROM document_mapping_api_history h WHERE h.id = document_mapping_api.id) WHERE version IS NULL;
+UPDATE justification_mapping_api SET version = (SELECT max(h.version) FROM justification_mapping_api_history h WHERE h.id = justification_mapping_api.id) WHERE version IS NULL;
+UPDATE sw_requirement_mapping_api SET version = (SELECT max(h.version) FROM sw_requirement_mapping_api_history h WHERE h.id = sw_requirement_mapping_api.id) WHERE version IS NULL;
+UPDATE test_case_mapping_api SET version = (SELECT max(h.version) FROM test_case_mapping_api_history h WHERE h.id = test_case_mapping_api.id) WHERE version IS NULL;
+UPDATE test_specification_mapping_api SET version = (SELECT max(h.version) FROM test_specification_mapping_api_history h WHERE h.id = test_specification_mapping_api.id) WHERE version IS NULL;
+UPDATE document_mapping_document SET version = (SELECT max(h.version) FROM document_mapping_document_history h WHERE h.id = document_mapping_document.id) WHERE version IS NULL;
+UPDATE sw_requirement_mapping_sw_requirement SET version = (SELECT max(h.version) FROM sw_requirement_mapping_sw_requirement_history h WHERE h.id = sw_requirement_mapping_sw_requirement.id) WHERE version IS NULL;
+UPDATE test_case_mapping_sw_requirement SET version = (SELECT max(h.version) FROM test_case_mapping_sw_requirement_history h WHERE h.id = test_case_mapping_sw_requirement.id) WHERE version IS NULL;
+UPDATE test_specification_mapping_sw_requirement SET version = (SELECT max(h.version) FROM test_specification_mapping_sw_requirement_history h WHERE h.id = test_specification_mapping_sw_requirement.id) WHERE version IS NULL;
+UPDATE test_case_mapping_test_specification SET version = (SELECT max(h.version) FROM test_case_mapping_test_specification_history h WHERE h.id = test_case_mapping_test_specification.id) WHERE version IS NULL;
+
+-- Indexes of the hot lookups (declared in the __table_args__ of the models)
+-- Missing ones are reported at startup by db/models/init_db.py
+
+-- Mappings, by parent and by work item
+CREATE INDEX IF NOT EXISTS ix_document_mapping_api_api_id ON document_mapping_api (api_id);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_api_item ON document_mapping_api (document_id);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_document_item ON document_mapping_document (document_id);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_document_parent_api ON document_mapping_document (document_mapping_api_id);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_document_parent_mapping ON document_mapping_document (document_mapping_document_id);
+CREATE INDEX IF NOT EXISTS ix_justification_mapping_api_api_id ON justification_mapping_api (api_id);
+CREATE INDEX IF NOT EXISTS ix_justification_mapping_api_item ON justification_mapping_api (justification_id);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_api_api_id ON sw_requirement_mapping_api (api_id);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_api_item ON sw_requirement_mapping_api (sw_requirement_id);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_sw_requirement_item ON sw_requirement_mapping_sw_requirement (sw_requirement_id);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_sw_requirement_parent_api ON sw_requirement_mapping_sw_requirement (sw_requirement_mapping_api_id);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_sw_requirement_parent_mapping ON sw_requirement_mapping_sw_requirement (sw_requirement_mapping_sw_requirement_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_api_api_id ON test_case_mapping_api (api_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_api_item ON test_case_mapping_api (test_case_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_sw_requirement_item ON test_case_mapping_sw_requirement (test_case_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_sw_requirement_parent_api ON test_case_mapping_sw_requirement (sw_requirement_mapping_api_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_sw_requirement_parent_mapping ON test_case_mapping_sw_requirement (sw_requirement_mapping_sw_requirement_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_test_specification_item ON test_case_mapping_test_specification (test_case_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_test_specification_parent_api ON test_case_mapping_test_specification (test_specification_mapping_api_id);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_test_specification_parent_mapping ON test_case_mapping_test_specification (test_specification_mapping_sw_requirement_id);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_api_api_id ON test_specification_mapping_api (api_id);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_api_item ON test_specification_mapping_api (test_specification_id);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_sw_requirement_item ON test_specification_mapping_sw_requirement (test_specification_id);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_sw_requirement_parent_api ON test_specification_mapping_sw_requirement (sw_requirement_mapping_api_id);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_sw_requirement_parent_mapping ON test_specification_mapping_sw_requirement (sw_requirement_mapping_sw_requirement_id);
+
+-- History, last version of a row
+CREATE INDEX IF NOT EXISTS ix_apis_history_id_version ON apis_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_api_history_id_version ON document_mapping_api_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_document_mapping_document_history_id_version ON document_mapping_document_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_documents_history_id_version ON documents_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_justification_mapping_api_history_id_version ON justification_mapping_api_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_justifications_history_id_version ON justifications_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_api_history_id_version ON sw_requirement_mapping_api_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_sw_requirement_mapping_sw_requirement_history_id_version ON sw_requirement_mapping_sw_requirement_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_sw_requirements_history_id_version ON sw_requirements_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_api_history_id_version ON test_case_mapping_api_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_sw_requirement_history_id_version ON test_case_mapping_sw_requirement_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_case_mapping_test_specification_history_id_version ON test_case_mapping_test_specification_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_cases_history_id_version ON test_cases_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_api_history_id_version ON test_specification_mapping_api_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_specification_mapping_sw_requirement_history_id_version ON test_specification_mapping_sw_requirement_history (id, version);
+CREATE INDEX IF NOT EXISTS ix_test_specifications_history_id_version ON test_specifications_history (id, version);
+
+-- Comments of a mapping and test runs of a mapping
+CREATE INDEX IF NOT EXISTS ix_comments_parent_table_parent_id ON comments (parent_table, parent_id);
+CREATE INDEX IF NOT EXISTS ix_test_runs_api_id_mapping_to_mapping_id_created_at ON test_runs (api_id, mapping_to, mapping_id, created_at);
+
+-- Counter cache of the comments of each parent row, used with BASIL_COMMENT_COUNTER_CACHE=true
+-- Rows are populated by the api at startup (db/models/init_db.py), the primary key is the lookup index
+CREATE TABLE IF NOT EXISTS comment_counts (
+    parent_table VARCHAR(100) NOT NULL,
+    parent_id INTEGER NOT NULL,
+    comment_count INTEGER,
+    todo_count INTEGER,
+    PRIMARY KEY (parent_table, parent_id)
+);
+
+-- Change counters of the data shown by the mapping views, api_id 0 for work items, nested mappings and comments
+CREATE TABLE IF NOT EXISTS mapping_generations (
+    api_id INTEGER NOT NULL PRIMARY KEY,
+    generation INTEGER
+);
+
+-- Reverse traceability index, one row per direct or nested mapping
+CREATE TABLE IF NOT EXISTS work_item_usages (
+    mapping_table VARCHAR(64) NOT NULL,
+    mapping_id INTEGER NOT NULL,
+    api_id INTEGER NOT NULL REFERENCES apis (id) ON DELETE CASCADE,
+    work_item_table VARCHAR(64) NOT NULL,
+    work_item_id INTEGER NOT NULL,
+    path VARCHAR NOT NULL,
+    PRIMARY KEY (mapping_table, mapping_id)
+);
+CREATE INDEX IF NOT EXISTS ix_work_item_usages_work_item_table_work_item_id ON work_item_usages (work_item_table, work_item_id);
+CREATE INDEX IF NOT EXISTS ix_work_item_usages_api_id ON work_item_usages (api_id);
+CREATE INDEX IF NOT EXISTS ix_work_item_usages_path ON work_item_usages (path text_pattern_ops);
+
+-- Test runs of a mapping in any Software Component, read by the impact analysis
+CREATE INDEX IF NOT EXISTS ix_test_runs_mapping_to_mapping_id ON test_runs (mapping_to, mapping_id);
+
+-- Sort key of the Software Components list, used by the keyset pagination
+CREATE INDEX IF NOT EXISTS ix_apis_api_library_version_id ON apis (api, library_version, id);
+
+COMMIT;
@@ -12,6 +12,7 @@ from typing import Optional
 class NotificationModel(Base):
     __tablename__ = "notifications"
     extend_existing = True
+    as_dict_relationships = ["api"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     api_id: Mapped[Optional[int]] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
     api: Mapped[Optional["ApiModel"]] = relationship("ApiModel", foreign_keys="NotificationModel.api_id")
@@ -1,9 +1,10 @@
 from datetime import datetime
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -14,6 +15,7 @@ class SwRequirementModel(Base):
     __tablename__ = 'sw_requirements'
     _description = 'Software Requirement'
     extend_existing = True
+    as_dict_relationships = ["created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String())
     description: Mapped[Optional[str]] = mapped_column(String())
@@ -26,6 +28,7 @@ class SwRequirementModel(Base):
     status: Mapped[str] = mapped_column(String(30))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, title, description, created_by):
         self.title = title
@@ -47,13 +50,10 @@ class SwRequirementModel(Base):
                f"edited_by={self.edited_by.username!r}"
 
     def current_version(self, db_session):
-        last_item = db_session.query(SwRequirementHistoryModel).filter(
-                     SwRequirementHistoryModel.id == self.id).order_by(
-                     SwRequirementHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, SwRequirementHistoryModel, self.id, self.version)}'
 
     def is_used(self, db_session) -> bool:
-        if db_session is None:
+        if db_session is None or self.is_preloaded_as_used(db_session):
             return True
         from db.models.api_sw_requirement import ApiSwRequirementModel
         from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
@@ -93,31 +93,24 @@ class SwRequirementModel(Base):
         return new_sw_requirement
 
 
-@event.listens_for(SwRequirementModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(SwRequirementHistoryModel.version).where(
-        SwRequirementHistoryModel.id == target.id).order_by(
-        SwRequirementHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(SwRequirementHistoryModel).values(
+@event.listens_for(SwRequirementModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, SwRequirementHistoryModel)
+    if version:
+        write_history(connection, target, SwRequirementHistoryModel, dict(
             id=target.id,
             title=target.title,
             description=target.description,
             status=target.status,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(SwRequirementModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(SwRequirementHistoryModel).values(
+    write_history(connection, target, SwRequirementHistoryModel, dict(
         id=target.id,
         title=target.title,
         description=target.description,
@@ -125,8 +118,7 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(SwRequirementModel, "before_delete")
@@ -138,6 +130,9 @@ def receive_before_delete(mapper, connection, target):
 
 class SwRequirementHistoryModel(Base):
     __tablename__ = 'sw_requirements_history'
+    __table_args__ = (
+        Index("ix_sw_requirements_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
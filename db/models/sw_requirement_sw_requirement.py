@@ -3,9 +3,11 @@ from db.models.api_sw_requirement import ApiSwRequirementModel
 from db.models.db_base import Base
 from db.models.user import UserModel
 from db.models.sw_requirement import SwRequirementModel, SwRequirementHistoryModel
-from sqlalchemy import DateTime, Integer
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -14,7 +16,18 @@ from typing import Optional
 
 class SwRequirementSwRequirementModel(Base):
     __tablename__ = "sw_requirement_mapping_sw_requirement"
+    __table_args__ = (
+        Index("ix_sw_requirement_mapping_sw_requirement_parent_api", "sw_requirement_mapping_api_id"),
+        Index("ix_sw_requirement_mapping_sw_requirement_parent_mapping", "sw_requirement_mapping_sw_requirement_id"),
+        Index("ix_sw_requirement_mapping_sw_requirement_item", "sw_requirement_id"),
+    )
     extend_existing = True
+    as_dict_relationships = [
+        "created_by",
+        "sw_requirement.created_by",
+        "sw_requirement_mapping_api.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement",
+    ]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     sw_requirement_mapping_api: Mapped[Optional["ApiSwRequirementModel"]] = relationship(
         "ApiSwRequirementModel",
@@ -42,6 +55,7 @@ class SwRequirementSwRequirementModel(Base):
         "SwRequirementModel",
         foreign_keys="SwRequirementSwRequirementModel.sw_requirement_id")
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="SwRequirementSwRequirementModel.created_by_id")
@@ -50,6 +64,7 @@ class SwRequirementSwRequirementModel(Base):
                                                   foreign_keys="SwRequirementSwRequirementModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self,
                  sw_requirement_mapping_api,
@@ -94,13 +109,13 @@ class SwRequirementSwRequirementModel(Base):
         return None
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(SwRequirementSwRequirementHistoryModel).filter(
-            SwRequirementSwRequirementHistoryModel.id == self.id).order_by(
-            SwRequirementSwRequirementHistoryModel.version.desc()).limit(1).all()[0]
-        last_item = db_session.query(SwRequirementHistoryModel).filter(
-            SwRequirementHistoryModel.id == self.sw_requirement_id).order_by(
-            SwRequirementHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(
+            db_session, SwRequirementSwRequirementHistoryModel, self.id, self.version
+        )
+        last_item_version = self.last_version(
+            db_session, SwRequirementHistoryModel, self.sw_requirement_id, self.sw_requirement.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'relation_id': self.id,
@@ -133,56 +148,12 @@ class SwRequirementSwRequirementModel(Base):
             _dict["updated_at"] = self.updated_at.strftime(Base.dt_format_str)
         return _dict
 
-    def get_waterfall_coverage(self, db_session, _visited=None):
-        from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
-        from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+    def get_waterfall_coverage(self, db_session=None):
         # Return SR-SR waterfall coverage
-
-        if db_session is None:
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-        # cycle protection across SR-SR graph
-        if _visited is None:
-            _visited = set()
-        # If we've already visited this relation in the current path, avoid infinite recursion / double counting
-        if self.id in _visited:
-            return 0
-        _visited.add(self.id)
-
-        srs_coverage = 0
-        tss_coverage = 0
-        tcs_coverage = 0
-
-        # Sw Requirements
-        srs = db_session.query(SwRequirementSwRequirementModel).filter(
-            SwRequirementSwRequirementModel.sw_requirement_mapping_sw_requirement_id == self.id
-        ).all()
-        if len(srs) > 0:
-            srs_coverage = sum([x.get_waterfall_coverage(db_session, _visited) for x in srs])
-
-        # Test Specifications
-        ts_query = db_session.query(SwRequirementTestSpecificationModel).filter(
-            SwRequirementTestSpecificationModel.sw_requirement_mapping_sw_requirement_id == self.id
-        )
-        tss = ts_query.all()
-        if len(tss) > 0:
-            tss_coverage = sum([x.get_waterfall_coverage(db_session) for x in tss])
-
-        # Test Cases
-        tc_query = db_session.query(SwRequirementTestCaseModel).filter(
-            SwRequirementTestCaseModel.sw_requirement_mapping_sw_requirement_id == self.id
-        )
-        tcs = tc_query.all()
-        if len(tcs) > 0:
-            tcs_coverage = sum([x.as_dict()['coverage'] for x in tcs])
-
-        if len(tcs) == len(tss) == len(srs) == 0:
-            waterfall_coverage = self.coverage
-        else:
-            waterfall_coverage = (
-                min(max(0, sum([srs_coverage, tss_coverage, tcs_coverage])), 100.0) * self.coverage
-            ) / 100.0
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_sw_requirement_mapping_api, new_sw_requirement_mapping_sw_requirement, db_session):
         from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
@@ -240,17 +211,11 @@ class SwRequirementSwRequirementModel(Base):
         return new_sw_requirement_sw_requirement
 
 
-@event.listens_for(SwRequirementSwRequirementModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(SwRequirementSwRequirementHistoryModel.version).where(
-        SwRequirementSwRequirementHistoryModel.id == target.id).order_by(
-        SwRequirementSwRequirementHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(SwRequirementSwRequirementHistoryModel).values(
+@event.listens_for(SwRequirementSwRequirementModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, SwRequirementSwRequirementHistoryModel)
+    if version:
+        write_history(connection, target, SwRequirementSwRequirementHistoryModel, dict(
             id=target.id,
             sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
             sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -258,14 +223,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(SwRequirementSwRequirementModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(SwRequirementSwRequirementModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(SwRequirementSwRequirementHistoryModel).values(
+    write_history(connection, target, SwRequirementSwRequirementHistoryModel, dict(
         id=target.id,
         sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
         sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -274,8 +243,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(SwRequirementSwRequirementModel, "before_delete")
@@ -288,8 +258,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(SwRequirementSwRequirementModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class SwRequirementSwRequirementHistoryModel(Base):
     __tablename__ = 'sw_requirement_mapping_sw_requirement_history'
+    __table_args__ = (
+        Index("ix_sw_requirement_mapping_sw_requirement_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -4,19 +4,33 @@ from db.models.db_base import Base
 from db.models.user import UserModel
 from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
 from db.models.test_case import TestCaseModel, TestCaseHistoryModel
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.orm.exc import NoResultFound
 from typing import Optional
 
 
 class SwRequirementTestCaseModel(Base):
     __tablename__ = "test_case_mapping_sw_requirement"
+    __table_args__ = (
+        Index("ix_test_case_mapping_sw_requirement_parent_api", "sw_requirement_mapping_api_id"),
+        Index("ix_test_case_mapping_sw_requirement_parent_mapping", "sw_requirement_mapping_sw_requirement_id"),
+        Index("ix_test_case_mapping_sw_requirement_item", "test_case_id"),
+    )
     extend_existing = True
+    as_dict_relationships = [
+        "created_by",
+        "test_case.created_by",
+        "sw_requirement_mapping_api.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement_mapping_api.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement_mapping_sw_requirement.sw_requirement",
+    ]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     sw_requirement_mapping_api: Mapped[Optional["ApiSwRequirementModel"]] = relationship(
         "ApiSwRequirementModel", foreign_keys="SwRequirementTestCaseModel.sw_requirement_mapping_api_id")
@@ -41,6 +55,7 @@ class SwRequirementTestCaseModel(Base):
                                                   foreign_keys="SwRequirementTestCaseModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self,
                  sw_requirement_mapping_api,
@@ -76,13 +91,11 @@ class SwRequirementTestCaseModel(Base):
         return tmp
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(SwRequirementTestCaseHistoryModel).filter(
-            SwRequirementTestCaseHistoryModel.id == self.id).order_by(
-            SwRequirementTestCaseHistoryModel.version.desc()).limit(1).all()[0]
-        last_item = db_session.query(TestCaseHistoryModel).filter(
-            TestCaseHistoryModel.id == self.test_case_id).order_by(
-            TestCaseHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(db_session, SwRequirementTestCaseHistoryModel, self.id, self.version)
+        last_item_version = self.last_version(
+            db_session, TestCaseHistoryModel, self.test_case_id, self.test_case.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'relation_id': self.id,
@@ -114,12 +127,9 @@ class SwRequirementTestCaseModel(Base):
         return _dict
 
     def test_case_as_dict(self, db_session):
-        try:
-            tc = db_session.query(TestCaseModel).filter(
-                TestCaseModel.id == self.test_case_id).one()
-            return tc.as_dict(db_session=db_session)
-        except NoResultFound:
+        if self.test_case is None:
             return None
+        return self.test_case.as_dict(db_session=db_session)
 
     def get_indirect_test_cases(self, db_session):
         from db.models.test_specification_test_case import TestSpecificationTestCaseModel
@@ -160,17 +170,11 @@ class SwRequirementTestCaseModel(Base):
         return new_sw_requirement_test_case
 
 
-@event.listens_for(SwRequirementTestCaseModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(SwRequirementTestCaseHistoryModel.version).where(
-        SwRequirementTestCaseHistoryModel.id == target.id).order_by(
-        SwRequirementTestCaseHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(SwRequirementTestCaseHistoryModel).values(
+@event.listens_for(SwRequirementTestCaseModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, SwRequirementTestCaseHistoryModel)
+    if version:
+        write_history(connection, target, SwRequirementTestCaseHistoryModel, dict(
             id=target.id,
             sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
             sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -178,14 +182,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(SwRequirementTestCaseModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(SwRequirementTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(SwRequirementTestCaseHistoryModel).values(
+    write_history(connection, target, SwRequirementTestCaseHistoryModel, dict(
         id=target.id,
         sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
         sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -194,8 +202,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(SwRequirementTestCaseModel, "before_delete")
@@ -205,8 +214,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(SwRequirementTestCaseModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class SwRequirementTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_sw_requirement_history'
+    __table_args__ = (
+        Index("ix_test_case_mapping_sw_requirement_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
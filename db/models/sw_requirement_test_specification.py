@@ -4,19 +4,34 @@ from db.models.user import UserModel
 from db.models.test_specification import TestSpecificationModel, TestSpecificationHistoryModel
 from db.models.api_sw_requirement import ApiSwRequirementModel
 from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
-from sqlalchemy import DateTime, Integer
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
+from sqlalchemy import DateTime, Float, Integer
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.orm.exc import NoResultFound
 from typing import Optional
 
 
 class SwRequirementTestSpecificationModel(Base):
     __tablename__ = "test_specification_mapping_sw_requirement"
+    __table_args__ = (
+        Index("ix_test_specification_mapping_sw_requirement_parent_api", "sw_requirement_mapping_api_id"),
+        Index("ix_test_specification_mapping_sw_requirement_parent_mapping",
+              "sw_requirement_mapping_sw_requirement_id"),
+        Index("ix_test_specification_mapping_sw_requirement_item", "test_specification_id"),
+    )
     extend_existing = True
+    as_dict_relationships = [
+        "created_by",
+        "test_specification.created_by",
+        "sw_requirement_mapping_api.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement_mapping_api.sw_requirement",
+        "sw_requirement_mapping_sw_requirement.sw_requirement_mapping_sw_requirement.sw_requirement",
+    ]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     sw_requirement_mapping_api: Mapped[Optional["ApiSwRequirementModel"]] = relationship(
         "ApiSwRequirementModel", foreign_keys="SwRequirementTestSpecificationModel.sw_requirement_mapping_api_id")
@@ -33,6 +48,7 @@ class SwRequirementTestSpecificationModel(Base):
     test_specification: Mapped["TestSpecificationModel"] = relationship(
         "TestSpecificationModel", foreign_keys="SwRequirementTestSpecificationModel.test_specification_id")
     coverage: Mapped[int] = mapped_column(Integer())
+    covered: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     created_by: Mapped["UserModel"] = relationship("UserModel",
                                                    foreign_keys="SwRequirementTestSpecificationModel.created_by_id")
@@ -41,6 +57,7 @@ class SwRequirementTestSpecificationModel(Base):
                                                   foreign_keys="SwRequirementTestSpecificationModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self,
                  sw_requirement_mapping_api,
@@ -76,13 +93,13 @@ class SwRequirementTestSpecificationModel(Base):
         return tmp
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(SwRequirementTestSpecificationHistoryModel).filter(
-            SwRequirementTestSpecificationHistoryModel.id == self.id).order_by(
-            SwRequirementTestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
-        last_item = db_session.query(TestSpecificationHistoryModel).filter(
-            TestSpecificationHistoryModel.id == self.test_specification_id).order_by(
-            TestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(
+            db_session, SwRequirementTestSpecificationHistoryModel, self.id, self.version
+        )
+        last_item_version = self.last_version(
+            db_session, TestSpecificationHistoryModel, self.test_specification_id, self.test_specification.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def as_dict(self, full_data=False, db_session=None):
         _dict = {'relation_id': self.id,
@@ -114,38 +131,16 @@ class SwRequirementTestSpecificationModel(Base):
         return _dict
 
     def test_specification_as_dict(self, db_session):
-        try:
-            ts = db_session.query(TestSpecificationModel).filter(
-                TestSpecificationModel.id == self.test_specification_id).one()
-            return ts.as_dict(db_session=db_session)
-        except NoResultFound:
+        if self.test_specification is None:
             return None
+        return self.test_specification.as_dict(db_session=db_session)
 
-    def get_waterfall_coverage(self, db_session):
-        if db_session is None:
+    def get_waterfall_coverage(self, db_session=None):
+        # Return SR-TS waterfall coverage
+        # materialized by the event listeners, see db/models/waterfall_coverage.py
+        if db_session is None or self.covered is None:
             return self.coverage
-
-        from db.models.test_specification_test_case import TestSpecificationTestCaseModel
-        # Calc children(TestSpecificationTestCase) coverage
-        # filtering with test_specification_mapping_sw_requirement_id
-        # Return self.coverage * Sum(childrend coverage)
-
-        tcs_coverage = 0
-
-        # Test Cases
-        tc_query = db_session.query(TestSpecificationTestCaseModel).filter(
-            TestSpecificationTestCaseModel.test_specification_mapping_sw_requirement_id == self.id
-        )
-        tcs = tc_query.all()
-        if len(tcs) > 0:
-            tcs_coverage = sum([x.as_dict()['coverage'] for x in tcs])
-        else:
-            tcs_coverage = 100
-
-        tcs_coverage = min(max(0, tcs_coverage), 100)
-        waterfall_coverage = (self.coverage * tcs_coverage) / 100
-        waterfall_coverage = min(max(0, waterfall_coverage), 100)
-        return waterfall_coverage
+        return self.covered
 
     def fork(self, new_sw_requirement_mapping_api, new_sw_requirement_mapping_sw_requirement, db_session):
         from db.models.test_specification_test_case import TestSpecificationTestCaseModel
@@ -178,17 +173,11 @@ class SwRequirementTestSpecificationModel(Base):
         return new_sw_requirement_test_specification
 
 
-@event.listens_for(SwRequirementTestSpecificationModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(SwRequirementTestSpecificationHistoryModel.version).where(
-        SwRequirementTestSpecificationHistoryModel.id == target.id).order_by(
-        SwRequirementTestSpecificationHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(SwRequirementTestSpecificationHistoryModel).values(
+@event.listens_for(SwRequirementTestSpecificationModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, SwRequirementTestSpecificationHistoryModel)
+    if version:
+        write_history(connection, target, SwRequirementTestSpecificationHistoryModel, dict(
             id=target.id,
             sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
             sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -196,14 +185,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(SwRequirementTestSpecificationModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(SwRequirementTestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(SwRequirementTestSpecificationHistoryModel).values(
+    write_history(connection, target, SwRequirementTestSpecificationHistoryModel, dict(
         id=target.id,
         sw_requirement_mapping_api_id=target.sw_requirement_mapping_api_id,
         sw_requirement_mapping_sw_requirement_id=target.sw_requirement_mapping_sw_requirement_id,
@@ -212,8 +205,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(SwRequirementTestSpecificationModel, "before_delete")
@@ -226,8 +220,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(SwRequirementTestSpecificationModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class SwRequirementTestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specification_mapping_sw_requirement_history'
+    __table_args__ = (
+        Index("ix_test_specification_mapping_sw_requirement_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -1,18 +1,21 @@
 from datetime import datetime
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
+from typing import Optional
 
 
 class TestCaseModel(Base):
     __tablename__ = "test_cases"
     _description = 'Test Case'
     extend_existing = True
+    as_dict_relationships = ["created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     repository: Mapped[str] = mapped_column(String())
     relative_path: Mapped[str] = mapped_column(String())
@@ -27,6 +30,7 @@ class TestCaseModel(Base):
     status: Mapped[str] = mapped_column(String(30))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, repository, relative_path, title, description, created_by):
         self.repository = repository
@@ -51,13 +55,10 @@ class TestCaseModel(Base):
                f"created_by={self.created_by.username!r}"
 
     def current_version(self, db_session):
-        last_item = db_session.query(TestCaseHistoryModel).filter(
-                     TestCaseHistoryModel.id == self.id).order_by(
-                     TestCaseHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, TestCaseHistoryModel, self.id, self.version)}'
 
     def is_used(self, db_session) -> bool:
-        if db_session is None:
+        if db_session is None or self.is_preloaded_as_used(db_session):
             return True
         from db.models.api_test_case import ApiTestCaseModel
         from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
@@ -102,17 +103,11 @@ class TestCaseModel(Base):
         return new_test_case
 
 
-@event.listens_for(TestCaseModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(TestCaseHistoryModel.version).where(
-        TestCaseHistoryModel.id == target.id).order_by(
-        TestCaseHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(TestCaseHistoryModel).values(
+@event.listens_for(TestCaseModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, TestCaseHistoryModel)
+    if version:
+        write_history(connection, target, TestCaseHistoryModel, dict(
             id=target.id,
             repository=target.repository,
             relative_path=target.relative_path,
@@ -121,14 +116,13 @@ def receive_after_update(mapper, connection, target):
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
             status=target.status,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(TestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(TestCaseHistoryModel).values(
+    write_history(connection, target, TestCaseHistoryModel, dict(
         id=target.id,
         repository=target.repository,
         relative_path=target.relative_path,
@@ -138,8 +132,7 @@ def receive_after_insert(mapper, connection, target):
         edited_by_id=target.edited_by_id,
         status=target.status,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(TestCaseModel, "before_delete")
@@ -151,6 +144,9 @@ def receive_before_delete(mapper, connection, target):
 
 class TestCaseHistoryModel(Base):
     __tablename__ = 'test_cases_history'
+    __table_args__ = (
+        Index("ix_test_cases_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -4,7 +4,7 @@ from db.models.api import ApiModel
 from db.models.test_run_config import TestRunConfigModel
 from db.models.user import UserModel
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -14,8 +14,14 @@ import uuid
 
 class TestRunModel(Base):
     __tablename__ = "test_runs"
+    __table_args__ = (
+        Index("ix_test_runs_api_id_mapping_to_mapping_id_created_at",
+              "api_id", "mapping_to", "mapping_id", "created_at"),
+        Index("ix_test_runs_mapping_to_mapping_id", "mapping_to", "mapping_id"),
+    )
     _description = 'Test Run'
     extend_existing = True
+    as_dict_relationships = ["created_by", "test_run_config.created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     uid: Mapped[str] = mapped_column(String())
     title: Mapped[Optional[str]] = mapped_column(String())
@@ -1,9 +1,10 @@
 from datetime import datetime
 from db.models.db_base import Base
 from db.models.user import UserModel
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer, String
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -14,6 +15,7 @@ class TestSpecificationModel(Base):
     __tablename__ = 'test_specifications'
     _description = 'Test Specification'
     extend_existing = True
+    as_dict_relationships = ["created_by"]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String())
     preconditions: Mapped[Optional[str]] = mapped_column(String(), nullable=True)
@@ -28,6 +30,7 @@ class TestSpecificationModel(Base):
     status: Mapped[str] = mapped_column(String(30))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self, title, preconditions, test_description, expected_behavior, created_by):
         self.title = title
@@ -52,13 +55,10 @@ class TestSpecificationModel(Base):
                f"created_by={self.created_by.username!r}"
 
     def current_version(self, db_session):
-        last_item = db_session.query(TestSpecificationHistoryModel).filter(
-                     TestSpecificationHistoryModel.id == self.id).order_by(
-                     TestSpecificationHistoryModel.version.desc()).limit(1).all()[0]
-        return f'{last_item.version}'
+        return f'{self.last_version(db_session, TestSpecificationHistoryModel, self.id, self.version)}'
 
     def is_used(self, db_session) -> bool:
-        if db_session is None:
+        if db_session is None or self.is_preloaded_as_used(db_session):
             return True
         from db.models.api_test_specification import ApiTestSpecificationModel
         from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
@@ -102,17 +102,11 @@ class TestSpecificationModel(Base):
         return new_test_specification
 
 
-@event.listens_for(TestSpecificationModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(TestSpecificationHistoryModel.version).where(
-        TestSpecificationHistoryModel.id == target.id).order_by(
-        TestSpecificationHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(TestSpecificationHistoryModel).values(
+@event.listens_for(TestSpecificationModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, TestSpecificationHistoryModel)
+    if version:
+        write_history(connection, target, TestSpecificationHistoryModel, dict(
             id=target.id,
             title=target.title,
             preconditions=target.preconditions,
@@ -121,14 +115,13 @@ def receive_after_update(mapper, connection, target):
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
             status=target.status,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
 
 
 @event.listens_for(TestSpecificationModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(TestSpecificationHistoryModel).values(
+    write_history(connection, target, TestSpecificationHistoryModel, dict(
         id=target.id,
         title=target.title,
         preconditions=target.preconditions,
@@ -138,8 +131,7 @@ def receive_after_insert(mapper, connection, target):
         edited_by_id=target.edited_by_id,
         status=target.status,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
 
 
 @event.listens_for(TestSpecificationModel, "before_delete")
@@ -151,6 +143,9 @@ def receive_before_delete(mapper, connection, target):
 
 class TestSpecificationHistoryModel(Base):
     __tablename__ = 'test_specifications_history'
+    __table_args__ = (
+        Index("ix_test_specifications_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
@@ -4,19 +4,34 @@ from db.models.api_test_specification import ApiTestSpecificationModel
 from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
 from db.models.user import UserModel
 from db.models.db_base import Base
+from db.models.waterfall_coverage import update_parent_waterfall_coverage, update_waterfall_coverage
+from db.models.versions import next_version, write_history
 from sqlalchemy import DateTime, Integer
-from sqlalchemy import delete, event, insert, select
-from sqlalchemy import ForeignKey
+from sqlalchemy import delete, event
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.orm.exc import NoResultFound
 from typing import Optional
 
 
 class TestSpecificationTestCaseModel(Base):
     __tablename__ = "test_case_mapping_test_specification"
+    __table_args__ = (
+        Index("ix_test_case_mapping_test_specification_parent_api", "test_specification_mapping_api_id"),
+        Index("ix_test_case_mapping_test_specification_parent_mapping",
+              "test_specification_mapping_sw_requirement_id"),
+        Index("ix_test_case_mapping_test_specification_item", "test_case_id"),
+    )
     extend_existing = True
+    as_dict_relationships = [
+        "created_by",
+        "test_case.created_by",
+        "test_specification_mapping_api.test_specification",
+        "test_specification_mapping_sw_requirement.test_specification",
+        "test_specification_mapping_sw_requirement.sw_requirement_mapping_api",
+        "test_specification_mapping_sw_requirement.sw_requirement_mapping_sw_requirement",
+    ]
     id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     test_specification_mapping_api_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("test_specification_mapping_api.id", ondelete="CASCADE"))
@@ -39,6 +54,7 @@ class TestSpecificationTestCaseModel(Base):
                                                   foreign_keys="TestSpecificationTestCaseModel.edited_by_id")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+    version: Mapped[Optional[int]] = mapped_column(Integer(), nullable=True, default=1)
 
     def __init__(self,
                  test_specification_mapping_api,
@@ -114,23 +130,18 @@ class TestSpecificationTestCaseModel(Base):
         return _dict
 
     def current_version(self, db_session):
-        last_mapping = db_session.query(TestSpecificationTestCaseHistoryModel).filter(
-            TestSpecificationTestCaseHistoryModel.id == self.id).order_by(
-            TestSpecificationTestCaseHistoryModel.version.desc()).limit(1).all()[0]
-
-        last_item = db_session.query(TestCaseHistoryModel).filter(
-            TestCaseHistoryModel.id == self.test_case_id).order_by(
-            TestCaseHistoryModel.version.desc()).limit(1).all()[0]
-
-        return f'{last_item.version}.{last_mapping.version}'
+        last_mapping_version = self.last_version(
+            db_session, TestSpecificationTestCaseHistoryModel, self.id, self.version
+        )
+        last_item_version = self.last_version(
+            db_session, TestCaseHistoryModel, self.test_case_id, self.test_case.version
+        )
+        return f'{last_item_version}.{last_mapping_version}'
 
     def test_case_as_dict(self, db_session):
-        try:
-            tc = db_session.query(TestCaseModel).filter(
-                TestCaseModel.id == self.test_case_id).one()
-            return tc.as_dict(db_session=db_session)
-        except NoResultFound:
+        if self.test_case is None:
             return None
+        return self.test_case.as_dict(db_session=db_session)
 
     def fork(self, new_test_specification_mapping_api, new_test_specification_mapping_sw_requirement, db_session):
         new_test_specification_test_case = TestSpecificationTestCaseModel(
@@ -145,17 +156,11 @@ class TestSpecificationTestCaseModel(Base):
         return new_test_specification_test_case
 
 
-@event.listens_for(TestSpecificationTestCaseModel, "after_update")
-def receive_after_update(mapper, connection, target):
-    last_query = select(TestSpecificationTestCaseHistoryModel.version).where(
-        TestSpecificationTestCaseHistoryModel.id == target.id).order_by(
-        TestSpecificationTestCaseHistoryModel.version.desc()).limit(1)
-    version = -1
-    for row in connection.execute(last_query):
-        version = row[0]
-
-    if version > -1:
-        insert_query = insert(TestSpecificationTestCaseHistoryModel).values(
+@event.listens_for(TestSpecificationTestCaseModel, "before_update")
+def receive_before_update(mapper, connection, target):
+    version = next_version(connection, target, TestSpecificationTestCaseHistoryModel)
+    if version:
+        write_history(connection, target, TestSpecificationTestCaseHistoryModel, dict(
             id=target.id,
             test_specification_mapping_api_id=target.test_specification_mapping_api_id,
             test_specification_mapping_sw_requirement_id=target.test_specification_mapping_sw_requirement_id,
@@ -163,14 +168,18 @@ def receive_after_update(mapper, connection, target):
             coverage=target.coverage,
             created_by_id=target.created_by_id,
             edited_by_id=target.edited_by_id,
-            version=version + 1
-        )
-        connection.execute(insert_query)
+            version=version
+        ))
+
+
+@event.listens_for(TestSpecificationTestCaseModel, "after_update")
+def receive_after_update(mapper, connection, target):
+    update_waterfall_coverage(connection, target)
 
 
 @event.listens_for(TestSpecificationTestCaseModel, "after_insert")
 def receive_after_insert(mapper, connection, target):
-    insert_query = insert(TestSpecificationTestCaseHistoryModel).values(
+    write_history(connection, target, TestSpecificationTestCaseHistoryModel, dict(
         id=target.id,
         test_specification_mapping_api_id=target.test_specification_mapping_api_id,
         test_specification_mapping_sw_requirement_id=target.test_specification_mapping_sw_requirement_id,
@@ -179,8 +188,9 @@ def receive_after_insert(mapper, connection, target):
         created_by_id=target.created_by_id,
         edited_by_id=target.edited_by_id,
         version=1
-    )
-    connection.execute(insert_query)
+    ))
+
+    update_waterfall_coverage(connection, target, inserted=True)
 
 
 @event.listens_for(TestSpecificationTestCaseModel, "before_delete")
@@ -193,8 +203,16 @@ def receive_before_delete(mapper, connection, target):
     connection.execute(del_stmt)
 
 
+@event.listens_for(TestSpecificationTestCaseModel, "after_delete")
+def receive_after_delete(mapper, connection, target):
+    update_parent_waterfall_coverage(connection, target)
+
+
 class TestSpecificationTestCaseHistoryModel(Base):
     __tablename__ = 'test_case_mapping_test_specification_history'
+    __table_args__ = (
+        Index("ix_test_case_mapping_test_specification_history_id_version", "id", "version"),
+    )
     extend_existing = True
     row_id: Mapped[int] = mapped_column(Integer(), primary_key=True, autoincrement=True)
     id: Mapped[int] = mapped_column(Integer())
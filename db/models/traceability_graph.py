@@ -0,0 +1,165 @@
+from db.models.api import ApiModel
+from db.models.api_user_permission import readable_apis_filter
+from db.models.test_run import TestRunModel
+from db.models.waterfall_coverage import WATERFALL_PARENTS
+from db.models.work_item_usage import MAPPING_WORK_ITEMS, WorkItemUsageModel
+from sqlalchemy import and_, column, func, literal, null, select, table, true, union_all
+
+# Traceability graph: the nodes are the Software Components, the work items and
+# the test runs, each mapping row is an edge from the work item (or the Software
+# Component) it is mapped to, to the work item it maps.
+# The graph is walked following the mapping rows, so a work item reached through
+# a mapping only brings the mappings nested under that mapping.
+
+# table -> node type
+NODE_TYPES = {
+    "apis": "api",
+    "documents": "document",
+    "justifications": "justification",
+    "sw_requirements": "sw-requirement",
+    "test_cases": "test-case",
+    "test_runs": "test-run",
+    "test_specifications": "test-specification",
+}
+
+DOWNSTREAM = "downstream"
+UPSTREAM = "upstream"
+DIRECTIONS = [DOWNSTREAM, UPSTREAM]
+
+DEFAULT_DEPTH = 10
+MAX_DEPTH = 50
+
+# Mapping tables of Test Cases, referenced by the test runs
+TEST_RUN_MAPPING_TABLES = ["test_case_mapping_api", "test_case_mapping_sw_requirement",
+                           "test_case_mapping_test_specification"]
+
+
+def _mapping_table(tablename):
+    columns = ["id", MAPPING_WORK_ITEMS[tablename][1]]
+    columns += [fk for fk, _ in WATERFALL_PARENTS[tablename]] if tablename in WATERFALL_PARENTS else ["api_id"]
+    return table(tablename, *[column(x) for x in columns])
+
+
+def _edge(mapping_table, mapping_id, parent_table, parent_id, parent_type, parent_item_id,
+          child_type, child_item_id, api_id):
+    return [
+        literal(mapping_table).label("mapping_table"),
+        mapping_id.label("mapping_id"),
+        parent_table.label("parent_mapping_table"),
+        parent_id.label("parent_mapping_id"),
+        literal(parent_type).label("parent_type"),
+        parent_item_id.label("parent_id"),
+        literal(child_type).label("child_type"),
+        child_item_id.label("child_id"),
+        api_id.label("api_id"),
+    ]
+
+
+def get_edges():
+    """Return the selects of the edges of the graph, one per mapping table and parent link.
+
+    Each edge is a mapping row (mapping_table, mapping_id), linked to its parent
+    mapping row (parent_mapping_table, parent_mapping_id), "apis" and the api id for
+    direct mappings. api_id is only known for direct mappings and test runs.
+    """
+    selects = []
+    for tablename, (work_item_table, work_item_fk) in MAPPING_WORK_ITEMS.items():
+        child = _mapping_table(tablename)
+        child_type = NODE_TYPES[work_item_table]
+        if tablename not in WATERFALL_PARENTS:
+            selects.append(select(*_edge(
+                tablename, child.c.id, literal("apis"), child.c.api_id, "api", child.c.api_id,
+                child_type, child.c[work_item_fk], child.c.api_id,
+            )))
+            continue
+        for fk, parent_table in WATERFALL_PARENTS[tablename]:
+            parent = _mapping_table(parent_table).alias(f"parent_{tablename}_{fk}")
+            parent_work_item_table, parent_work_item_fk = MAPPING_WORK_ITEMS[parent_table]
+            selects.append(
+                select(*_edge(
+                    tablename, child.c.id, literal(parent_table), child.c[fk],
+                    NODE_TYPES[parent_work_item_table], parent.c[parent_work_item_fk],
+                    child_type, child.c[work_item_fk], null(),
+                )).join_from(child, parent, child.c[fk] == parent.c.id)
+            )
+
+    test_runs = TestRunModel.__table__
+    for tablename in TEST_RUN_MAPPING_TABLES:
+        parent = table(tablename, column("id"), column("test_case_id")).alias(f"parent_test_runs_{tablename}")
+        selects.append(
+            select(*_edge(
+                "test_runs", test_runs.c.id, test_runs.c.mapping_to, test_runs.c.mapping_id,
+                "test-case", parent.c.test_case_id, "test-run", test_runs.c.id, test_runs.c.api_id,
+            ))
+            .join_from(test_runs, parent, test_runs.c.mapping_id == parent.c.id)
+            .where(test_runs.c.mapping_to == tablename)
+        )
+    return selects
+
+
+def _filtered_edges(condition):
+    """Union of the edges matching condition(edge columns).
+    The condition is applied to each select so that it is evaluated with the indexes
+    of each table, also when it depends on the columns of an outer query."""
+    return union_all(*[x.where(condition(x.selected_columns)) for x in get_edges()])
+
+
+def get_reachable_edges(db_session, node_type, node_id, direction=DOWNSTREAM, max_depth=DEFAULT_DEPTH,
+                        types=None, user_id=None):
+    """Return the edges reachable from a node, walking the mappings in one direction.
+
+    :param node_type: one of NODE_TYPES values
+    :param direction: DOWNSTREAM to the mapped work items and test runs, UPSTREAM to the
+                      work items and Software Components they are mapped to
+    :param max_depth: number of mapping levels to walk
+    :param types: node types of the edges to return (all if None), the walk goes through
+                  all the types anyway
+    :param user_id: see readable_apis_filter(), edges of Software Components the user
+                    cannot read are not returned
+    :return: list of rows (parent_type, parent_id, child_type, child_id, depth), with the
+             minimum depth of each couple of nodes
+    """
+    if direction == DOWNSTREAM:
+        start = _filtered_edges(lambda x: and_(x.parent_type == node_type, x.parent_id == node_id)).subquery()
+    else:
+        start = _filtered_edges(lambda x: and_(x.child_type == node_type, x.child_id == node_id)).subquery()
+    walk = select(start, literal(1).label("depth")).cte("walk", recursive=True)
+
+    # Each row of the walk is joined to the edges of its mapping row only, the
+    # recursive query can reference the walk just once, hence the lateral subquery
+    if direction == DOWNSTREAM:
+        step = _filtered_edges(lambda x: and_(x.parent_mapping_table == walk.c.mapping_table,
+                                              x.parent_mapping_id == walk.c.mapping_id))
+    else:
+        step = _filtered_edges(lambda x: and_(x.mapping_table == walk.c.parent_mapping_table,
+                                              x.mapping_id == walk.c.parent_mapping_id))
+    step = step.lateral("step")
+    walk = walk.union(
+        select(step, (walk.c.depth + 1).label("depth")).join_from(walk, step, true()).where(walk.c.depth < max_depth)
+    )
+
+    # Software Component of the nested mappings, from the work item usage index
+    usages = WorkItemUsageModel.__table__
+    usage_api_id = (
+        select(usages.c.api_id)
+        .where(usages.c.mapping_table == walk.c.mapping_table)
+        .where(usages.c.mapping_id == walk.c.mapping_id)
+        .scalar_subquery()
+    )
+    edges = select(walk, func.coalesce(walk.c.api_id, usage_api_id).label("edge_api_id")).subquery("reached")
+    if types is not None:
+        reached_type = edges.c.child_type if direction == DOWNSTREAM else edges.c.parent_type
+        edges = select(edges).where(reached_type.in_(types)).subquery("reached_types")
+
+    apis = ApiModel.__table__
+    query = (
+        select(edges.c.parent_type, edges.c.parent_id, edges.c.child_type, edges.c.child_id,
+               func.min(edges.c.depth).label("depth"))
+        .select_from(edges)
+        .outerjoin(apis, apis.c.id == edges.c.edge_api_id)
+        .where(readable_apis_filter(edges.c.edge_api_id, user_id,
+                                    apis.c.created_by_id if user_id is not None else None))
+        .group_by(edges.c.parent_type, edges.c.parent_id, edges.c.child_type, edges.c.child_id)
+        .order_by("depth", edges.c.parent_type, edges.c.parent_id, edges.c.child_type, edges.c.child_id)
+    )
+    return db_session.execute(query).all()
@@ -0,0 +1,187 @@
+from db.models.api import ApiModel
+from db.models.test_run import TestRunModel
+from db.models.traceability_graph import MAX_DEPTH, NODE_TYPES
+from db.models.waterfall_coverage import WATERFALL_PARENTS
+from db.models.work_item_usage import MAPPING_WORK_ITEMS
+from sqlalchemy import Integer, String, and_, case, cast, column, exists, func, literal, null, select, table, true
+from sqlalchemy import union_all
+from sqlalchemy.dialects.postgresql import ARRAY, array
+
+# Traceability matrix: one row per path of mappings, from a section of a Software
+# Component down to the last work item mapped (Sw Requirements chain, Test
+# Specification, Test Case) with the latest test run of the Test Case.
+# Sections justified instead of being covered get a row with the Justification.
+
+# Mapping tables walked by the matrix
+MATRIX_MAPPING_TABLES = [
+    "sw_requirement_mapping_api",
+    "test_specification_mapping_api",
+    "test_case_mapping_api",
+    "justification_mapping_api",
+    "sw_requirement_mapping_sw_requirement",
+    "test_specification_mapping_sw_requirement",
+    "test_case_mapping_sw_requirement",
+    "test_case_mapping_test_specification",
+]
+
+# work item table -> column used as title
+WORK_ITEM_TITLES = {
+    "sw_requirements": "title",
+    "test_specifications": "title",
+    "test_cases": "title",
+    "justifications": "description",
+}
+
+# Columns of the matrix rows, in order
+MATRIX_COLUMNS = [
+    "api_id", "api", "library", "library_version", "section", "offset", "mapping_table", "mapping_id",
+    "sw_requirement_ids", "sw_requirements", "test_specification_id", "test_specification",
+    "test_case_id", "test_case", "justification_id", "justification",
+    "test_run_id", "test_run_status", "test_run_result", "test_run_created_at",
+]
+
+# Work item columns of the matrix, filled by the mappings of each node type
+_SINGLE_WORK_ITEMS = {
+    "test-specification": ("test_specification_id", "test_specification"),
+    "test-case": ("test_case_id", "test_case"),
+    "justification": ("justification_id", "justification"),
+}
+
+_INT_ARRAY = ARRAY(Integer)
+_STRING_ARRAY = ARRAY(String)
+
+
+def _edges(tablename):
+    """Select of the mapping rows of tablename with the work item they map, one per parent link"""
+    work_item_table, work_item_fk = MAPPING_WORK_ITEMS[tablename]
+    title = WORK_ITEM_TITLES[work_item_table]
+    work_items = table(work_item_table, column("id"), column(title))
+    columns = ["id", work_item_fk]
+    columns += [fk for fk, _ in WATERFALL_PARENTS[tablename]] if tablename in WATERFALL_PARENTS \
+        else ["api_id", "section", "offset"]
+    mappings = table(tablename, *[column(x) for x in columns])
+
+    def _select(parent_table, parent_id):
+        return select(
+            literal(tablename).label("mapping_table"),
+            mappings.c.id.label("mapping_id"),
+            literal(parent_table).label("parent_mapping_table"),
+            parent_id.label("parent_mapping_id"),
+            literal(NODE_TYPES[work_item_table]).label("work_item_type"),
+            work_items.c.id.label("work_item_id"),
+            cast(work_items.c[title], String).label("work_item_title"),
+        ).join_from(mappings, work_items, mappings.c[work_item_fk] == work_items.c.id)
+
+    if tablename not in WATERFALL_PARENTS:
+        return [_select("apis", mappings.c.api_id).add_columns(mappings.c.api_id, mappings.c.section,
+                                                               mappings.c.offset)]
+    return [_select(parent_table, mappings.c[fk]).where(mappings.c[fk].isnot(null()))
+            for fk, parent_table in WATERFALL_PARENTS[tablename]]
+
+
+def _work_item_columns(edge, previous=None):
+    """Work item columns of a walk row, the ones of the previous row updated with the edge"""
+    is_sw_requirement = edge.work_item_type == "sw-requirement"
+    if previous is None:
+        ret = [
+            case((is_sw_requirement, array([edge.work_item_id])), else_=cast(array([]), _INT_ARRAY)),
+            case((is_sw_requirement, array([edge.work_item_title])), else_=cast(array([]), _STRING_ARRAY)),
+        ]
+    else:
+        ret = [
+            case((is_sw_requirement, func.array_append(previous.sw_requirement_ids, edge.work_item_id)),
+                 else_=previous.sw_requirement_ids),
+            case((is_sw_requirement, func.array_append(previous.sw_requirements, edge.work_item_title)),
+                 else_=previous.sw_requirements),
+        ]
+    ret = [ret[0].label("sw_requirement_ids"), ret[1].label("sw_requirements")]
+    for node_type, (id_column, title_column) in _SINGLE_WORK_ITEMS.items():
+        is_type = edge.work_item_type == node_type
+        ret += [
+            case((is_type, edge.work_item_id), else_=previous[id_column] if previous is not None
+                 else null()).label(id_column),
+            case((is_type, edge.work_item_title), else_=previous[title_column] if previous is not None
+                 else null()).label(title_column),
+        ]
+    return ret
+
+
+def get_traceability_matrix_query(apis_condition):
+    """Return the select of the traceability matrix of the Software Components matching apis_condition.
+
+    :param apis_condition: SQL condition on ApiModel, e.g. the library and the read permissions
+    :return: select with the MATRIX_COLUMNS, ordered by Software Component and section
+    """
+    direct = [x for x in MATRIX_MAPPING_TABLES if x not in WATERFALL_PARENTS]
+    nested = [x for x in MATRIX_MAPPING_TABLES if x in WATERFALL_PARENTS]
+
+    apis = ApiModel.__table__
+    roots = union_all(*[y for x in direct for y in _edges(x)]).subquery("roots")
+    walk = select(
+        roots.c.api_id, roots.c.section, roots.c.offset,
+        roots.c.mapping_table, roots.c.mapping_id, roots.c.parent_mapping_table, roots.c.parent_mapping_id,
+        array([roots.c.mapping_id]).label("path"),
+        *_work_item_columns(roots.c),
+    ).where(roots.c.api_id.in_(select(apis.c.id).where(apis_condition))).cte("walk", recursive=True)
+
+    # The nested mappings of the rows reached at the previous level, the walk can
+    # be referenced just once by the recursive query
+    step = union_all(*[y for x in nested for y in _edges(x)]).subquery("step")
+    walk = walk.union_all(
+        select(
+            walk.c.api_id, walk.c.section, walk.c.offset,
+            step.c.mapping_table, step.c.mapping_id, step.c.parent_mapping_table, step.c.parent_mapping_id,
+            func.array_append(walk.c.path, step.c.mapping_id),
+            *_work_item_columns(step.c, walk.c),
+        )
+        .join_from(walk, step, and_(step.c.parent_mapping_table == walk.c.mapping_table,
+                                    step.c.parent_mapping_id == walk.c.mapping_id))
+        .where(func.cardinality(walk.c.path) < MAX_DEPTH)
+    )
+
+    # Only the last mapping of each path is a row of the matrix
+    children = walk.alias("children")
+    leaves = walk.alias("leaves")
+    has_children = exists().where(children.c.parent_mapping_table == leaves.c.mapping_table) \
+        .where(children.c.parent_mapping_id == leaves.c.mapping_id)
+
+    test_runs = TestRunModel.__table__
+    latest_test_run = (
+        select(test_runs.c.id, test_runs.c.status, test_runs.c.result, test_runs.c.created_at)
+        .where(test_runs.c.api_id == leaves.c.api_id)
+        .where(test_runs.c.mapping_to == leaves.c.mapping_table)
+        .where(test_runs.c.mapping_id == leaves.c.mapping_id)
+        .order_by(test_runs.c.created_at.desc(), test_runs.c.id.desc())
+        .limit(1)
+        .lateral("latest_test_run")
+    )
+
+    return (
+        select(
+            apis.c.id.label("api_id"), apis.c.api, apis.c.library, apis.c.library_version,
+            leaves.c.section, leaves.c.offset, leaves.c.mapping_table, leaves.c.mapping_id,
+            leaves.c.sw_requirement_ids, leaves.c.sw_requirements,
+            leaves.c.test_specification_id, leaves.c.test_specification,
+            leaves.c.test_case_id, leaves.c.test_case,
+            leaves.c.justification_id, leaves.c.justification,
+            latest_test_run.c.id.label("test_run_id"),
+            latest_test_run.c.status.label("test_run_status"),
+            latest_test_run.c.result.label("test_run_result"),
+            latest_test_run.c.created_at.label("test_run_created_at"),
+        )
+        .select_from(leaves)
+        .join(apis, apis.c.id == leaves.c.api_id)
+        .outerjoin(latest_test_run, true())
+        .where(~has_children)
+        .order_by(apis.c.library, apis.c.api, apis.c.library_version, apis.c.id, leaves.c.offset,
+                  leaves.c.path, leaves.c.mapping_table)
+    )
+
+
+def get_traceability_matrix(db_session, apis_condition, yield_per=1000):
+    """Yield the rows of the traceability matrix as dicts, see get_traceability_matrix_query().
+    Rows are fetched from a server side cursor, yield_per at a time."""
+    result = db_session.execute(get_traceability_matrix_query(apis_condition),
+                                execution_options={"yield_per": yield_per})
+    for row in result.mappings():
+        yield dict(row)
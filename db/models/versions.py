@@ -0,0 +1,116 @@
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session, object_session
+
+# Key of Session.info holding the history rows to be written at the end of the flush:
+# history model -> list of rows
+HISTORY_BUFFER = "pending_history"
+
+
+def _version_sources():
+    """Return a dict model class -> list of (history model, id attribute) used by its current_version()"""
+    from db.models.api import ApiModel, ApiHistoryModel
+    from db.models.api_document import ApiDocumentModel, ApiDocumentHistoryModel
+    from db.models.api_justification import ApiJustificationModel, ApiJustificationHistoryModel
+    from db.models.api_sw_requirement import ApiSwRequirementModel, ApiSwRequirementHistoryModel
+    from db.models.api_test_case import ApiTestCaseModel, ApiTestCaseHistoryModel
+    from db.models.api_test_specification import ApiTestSpecificationModel, ApiTestSpecificationHistoryModel
+    from db.models.document import DocumentModel, DocumentHistoryModel
+    from db.models.document_document import DocumentDocumentModel, DocumentDocumentHistoryModel
+    from db.models.justification import JustificationModel, JustificationHistoryModel
+    from db.models.sw_requirement import SwRequirementModel, SwRequirementHistoryModel
+    from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+    from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementHistoryModel
+    from db.models.sw_requirement_test_case import SwRequirementTestCaseModel, SwRequirementTestCaseHistoryModel
+    from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+    from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationHistoryModel
+    from db.models.test_case import TestCaseModel, TestCaseHistoryModel
+    from db.models.test_specification import TestSpecificationModel, TestSpecificationHistoryModel
+    from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+    from db.models.test_specification_test_case import TestSpecificationTestCaseHistoryModel
+
+    return {
+        ApiModel: [(ApiHistoryModel, "id")],
+        DocumentModel: [(DocumentHistoryModel, "id")],
+        JustificationModel: [(JustificationHistoryModel, "id")],
+        SwRequirementModel: [(SwRequirementHistoryModel, "id")],
+        TestCaseModel: [(TestCaseHistoryModel, "id")],
+        TestSpecificationModel: [(TestSpecificationHistoryModel, "id")],
+        ApiDocumentModel: [(ApiDocumentHistoryModel, "id"), (DocumentHistoryModel, "document_id")],
+        ApiJustificationModel: [(ApiJustificationHistoryModel, "id"), (JustificationHistoryModel, "justification_id")],
+        ApiSwRequirementModel: [(ApiSwRequirementHistoryModel, "id"),
+                                (SwRequirementHistoryModel, "sw_requirement_id")],
+        ApiTestCaseModel: [(ApiTestCaseHistoryModel, "id"), (TestCaseHistoryModel, "test_case_id")],
+        ApiTestSpecificationModel: [(ApiTestSpecificationHistoryModel, "id"),
+                                    (TestSpecificationHistoryModel, "test_specification_id")],
+        DocumentDocumentModel: [(DocumentDocumentHistoryModel, "id"), (DocumentHistoryModel, "document_id")],
+        SwRequirementSwRequirementModel: [(SwRequirementSwRequirementHistoryModel, "id"),
+                                          (SwRequirementHistoryModel, "sw_requirement_id")],
+        SwRequirementTestCaseModel: [(SwRequirementTestCaseHistoryModel, "id"),
+                                     (TestCaseHistoryModel, "test_case_id")],
+        SwRequirementTestSpecificationModel: [(SwRequirementTestSpecificationHistoryModel, "id"),
+                                              (TestSpecificationHistoryModel, "test_specification_id")],
+        TestSpecificationTestCaseModel: [(TestSpecificationTestCaseHistoryModel, "id"),
+                                         (TestCaseHistoryModel, "test_case_id")],
+    }
+
+
+def next_version(connection, target, history_model):
+    """Increment the version of a row that is going to be updated, to be called by before_update listeners.
+
+    The last version is kept in the `version` column of the row itself, so that
+    a new history row does not require to look up the history table.
+    Rows created before the introduction of the column fall back to the history table.
+    Return the new version, None if the row has no history.
+    """
+    version = target.version
+    if version is None:
+        version = connection.execute(
+            select(func.max(history_model.version)).where(history_model.id == target.id)
+        ).scalar()
+        if version is None:
+            return None
+    target.version = version + 1
+    return target.version
+
+
+def write_history(connection, target, history_model, values):
+    """Add a history row of `target`.
+
+    Rows are collected in the session and written at the end of the flush with a
+    single executemany per history table, so bulk edits do not issue one INSERT
+    per updated object.
+    """
+    session = object_session(target)
+    if session is None:
+        connection.execute(insert(history_model).values(**values))
+        return
+    session.info.setdefault(HISTORY_BUFFER, {}).setdefault(history_model, []).append(values)
+
+
+def backfill_versions(connection):
+    """Populate the version of the rows created before the introduction of the `version` column"""
+    for model, sources in _version_sources().items():
+        history_model = [x for x, attr in sources if attr == "id"][0]
+        table = model.__table__
+        last_version = (
+            select(func.max(history_model.version))
+            .where(history_model.id == table.c.id)
+            .scalar_subquery()
+        )
+        connection.execute(update(table).where(table.c.version.is_(None)).values(
+            version=last_version, updated_at=table.c.updated_at))
+
+
+@event.listens_for(Session, "after_flush")
+def receive_after_flush(session, flush_context):
+    pending = session.info.pop(HISTORY_BUFFER, None)
+    if pending:
+        connection = session.connection()
+        for history_model, rows in pending.items():
+            connection.execute(insert(history_model), rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def receive_after_soft_rollback(session, previous_transaction):
+    # History rows of a failed flush
+    session.info.pop(HISTORY_BUFFER, None)
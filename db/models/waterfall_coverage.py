@@ -0,0 +1,209 @@
+from sqlalchemy import func, inspect, select, update
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+# Waterfall coverage of a mapping row:
+#  - its own coverage if nothing is mapped to it
+#  - its own coverage weighted by the sum of the children coverage otherwise
+# The value is materialized in the `covered` column of the mapping tables listed
+# in WATERFALL_CHILDREN and kept current by the model event listeners, that
+# recompute the changed row and propagate the new value up to its ancestors.
+
+# mapping table -> list of (child table, child foreign key, child has a `covered` column)
+WATERFALL_CHILDREN = {
+    "sw_requirement_mapping_api": [
+        ("sw_requirement_mapping_sw_requirement", "sw_requirement_mapping_api_id", True),
+        ("test_specification_mapping_sw_requirement", "sw_requirement_mapping_api_id", True),
+        ("test_case_mapping_sw_requirement", "sw_requirement_mapping_api_id", False),
+    ],
+    "sw_requirement_mapping_sw_requirement": [
+        ("sw_requirement_mapping_sw_requirement", "sw_requirement_mapping_sw_requirement_id", True),
+        ("test_specification_mapping_sw_requirement", "sw_requirement_mapping_sw_requirement_id", True),
+        ("test_case_mapping_sw_requirement", "sw_requirement_mapping_sw_requirement_id", False),
+    ],
+    "test_specification_mapping_api": [
+        ("test_case_mapping_test_specification", "test_specification_mapping_api_id", False),
+    ],
+    "test_specification_mapping_sw_requirement": [
+        ("test_case_mapping_test_specification", "test_specification_mapping_sw_requirement_id", False),
+    ],
+    "document_mapping_api": [
+        ("document_mapping_document", "document_mapping_api_id", True),
+    ],
+    "document_mapping_document": [
+        ("document_mapping_document", "document_mapping_document_id", True),
+    ],
+}
+
+# mapping table -> list of (foreign key, parent table)
+WATERFALL_PARENTS = {
+    "sw_requirement_mapping_sw_requirement": [
+        ("sw_requirement_mapping_api_id", "sw_requirement_mapping_api"),
+        ("sw_requirement_mapping_sw_requirement_id", "sw_requirement_mapping_sw_requirement"),
+    ],
+    "test_specification_mapping_sw_requirement": [
+        ("sw_requirement_mapping_api_id", "sw_requirement_mapping_api"),
+        ("sw_requirement_mapping_sw_requirement_id", "sw_requirement_mapping_sw_requirement"),
+    ],
+    "test_case_mapping_sw_requirement": [
+        ("sw_requirement_mapping_api_id", "sw_requirement_mapping_api"),
+        ("sw_requirement_mapping_sw_requirement_id", "sw_requirement_mapping_sw_requirement"),
+    ],
+    "test_case_mapping_test_specification": [
+        ("test_specification_mapping_api_id", "test_specification_mapping_api"),
+        ("test_specification_mapping_sw_requirement_id", "test_specification_mapping_sw_requirement"),
+    ],
+    "document_mapping_document": [
+        ("document_mapping_api_id", "document_mapping_api"),
+        ("document_mapping_document_id", "document_mapping_document"),
+    ],
+}
+
+
+def _models():
+    """Return a dict tablename -> model class of the mapping tables involved in the waterfall"""
+    from db.models.api_document import ApiDocumentModel
+    from db.models.api_sw_requirement import ApiSwRequirementModel
+    from db.models.api_test_specification import ApiTestSpecificationModel
+    from db.models.document_document import DocumentDocumentModel
+    from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+    from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+    from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+    from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+
+    models = [ApiDocumentModel, ApiSwRequirementModel, ApiTestSpecificationModel, DocumentDocumentModel,
+              SwRequirementSwRequirementModel, SwRequirementTestCaseModel, SwRequirementTestSpecificationModel,
+              TestSpecificationTestCaseModel]
+    return {x.__tablename__: x for x in models}
+
+
+def waterfall_coverage(coverage, children_coverage=None):
+    """Return the waterfall coverage of a mapping
+
+    :param coverage: coverage of the mapping
+    :param children_coverage: sum of the coverage of the work items mapped to it, None if there are not
+    """
+    if children_coverage is None:
+        covered = coverage
+    else:
+        covered = (min(max(0, children_coverage), 100.0) * coverage) / 100.0
+    return min(max(0, covered), 100)
+
+
+def compute_waterfall_coverage(connection, tablename, row_id):
+    """Compute the waterfall coverage of a mapping row from the values stored in its children"""
+    models = _models()
+    table = models[tablename].__table__
+
+    coverage = connection.execute(select(table.c.coverage).where(table.c.id == row_id)).scalar()
+    if coverage is None:
+        return None
+
+    children_count = 0
+    children_coverage = 0
+    for child_tablename, foreign_key, child_waterfall in WATERFALL_CHILDREN[tablename]:
+        child = models[child_tablename].__table__
+        value = func.coalesce(child.c.covered, child.c.coverage) if child_waterfall else child.c.coverage
+        count, total = connection.execute(
+            select(func.count(), func.coalesce(func.sum(value), 0)).where(child.c[foreign_key] == row_id)
+        ).one()
+        children_count += count
+        children_coverage += float(total)
+
+    return waterfall_coverage(coverage, children_coverage if children_count else None)
+
+
+def _get_parent(connection, tablename, row_id):
+    models = _models()
+    table = models[tablename].__table__
+    foreign_keys = WATERFALL_PARENTS.get(tablename, [])
+    if not foreign_keys:
+        return None, None
+    row = connection.execute(
+        select(*[table.c[fk] for fk, _ in foreign_keys]).where(table.c.id == row_id)
+    ).first()
+    if row is None:
+        return None, None
+    for (fk, parent_tablename), parent_id in zip(foreign_keys, row):
+        if parent_id:
+            return parent_tablename, parent_id
+    return None, None
+
+
+def _get_target_parent(target, history=False):
+    """Return the parent (tablename, id) of a mapping instance.
+    With history=True, return the parent the mapping was linked to before the current flush"""
+    for fk, parent_tablename in WATERFALL_PARENTS.get(target.__tablename__, []):
+        if history:
+            deleted = inspect(target).attrs[fk].history.deleted
+            parent_id = deleted[0] if deleted else None
+        else:
+            parent_id = getattr(target, fk)
+        if parent_id:
+            return parent_tablename, parent_id
+    return None, None
+
+
+def refresh_waterfall_coverage(connection, tablename, row_id, session=None):
+    """Recompute the waterfall coverage of a mapping row and of all its ancestors.
+    Mapping instances already loaded in the session are kept aligned with the database.
+    Return the waterfall coverage of the selected row."""
+    models = _models()
+    ret = None
+    visited = set()
+    while tablename and row_id and (tablename, row_id) not in visited:
+        visited.add((tablename, row_id))
+        if tablename in WATERFALL_CHILDREN:
+            covered = compute_waterfall_coverage(connection, tablename, row_id)
+            if covered is None:
+                break
+            if len(visited) == 1:
+                ret = covered
+            table = models[tablename].__table__
+            # Keep updated_at, the waterfall coverage is not a user change
+            connection.execute(
+                update(table).where(table.c.id == row_id).values(covered=covered, updated_at=table.c.updated_at)
+            )
+            if session is not None:
+                instance = session.identity_map.get(identity_key(models[tablename], row_id))
+                if instance is not None:
+                    set_committed_value(instance, "covered", covered)
+        tablename, row_id = _get_parent(connection, tablename, row_id)
+    return ret
+
+
+def update_waterfall_coverage(connection, target, inserted=False):
+    """To be called by after_insert/after_update listeners of the mapping models"""
+    session = object_session(target)
+    if not inserted:
+        state = inspect(target)
+        foreign_keys = [fk for fk, _ in WATERFALL_PARENTS.get(target.__tablename__, [])]
+        if not any(state.attrs[x].history.has_changes() for x in ["coverage"] + foreign_keys):
+            return
+        # The mapping has been moved, update the previous ancestors
+        old_parent_tablename, old_parent_id = _get_target_parent(target, history=True)
+        if old_parent_id:
+            refresh_waterfall_coverage(connection, old_parent_tablename, old_parent_id, session)
+    covered = refresh_waterfall_coverage(connection, target.__tablename__, target.id, session)
+    if covered is not None:
+        set_committed_value(target, "covered", covered)
+
+
+def update_parent_waterfall_coverage(connection, target):
+    """To be called by after_delete listeners of the mapping models"""
+    parent_tablename, parent_id = _get_target_parent(target)
+    if parent_id:
+        refresh_waterfall_coverage(connection, parent_tablename, parent_id, object_session(target))
+
+
+def backfill_waterfall_coverage(connection):
+    """Populate the waterfall coverage of mapping rows created before its introduction.
+    Each refresh propagates up to the ancestors, so parents are aligned once all their
+    descendants have been processed, whatever the order."""
+    models = _models()
+    for tablename in WATERFALL_CHILDREN.keys():
+        table = models[tablename].__table__
+        row_ids = connection.execute(select(table.c.id).where(table.c.covered.is_(None))).scalars().all()
+        for row_id in row_ids:
+            refresh_waterfall_coverage(connection, tablename, row_id)
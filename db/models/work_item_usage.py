@@ -0,0 +1,337 @@
+from db.models.api_document import ApiDocumentModel
+from db.models.api_justification import ApiJustificationModel
+from db.models.api_sw_requirement import ApiSwRequirementModel
+from db.models.api_test_case import ApiTestCaseModel
+from db.models.api_test_specification import ApiTestSpecificationModel
+from db.models.db_base import Base
+from db.models.document_document import DocumentDocumentModel
+from db.models.sw_requirement_sw_requirement import SwRequirementSwRequirementModel
+from db.models.sw_requirement_test_case import SwRequirementTestCaseModel
+from db.models.sw_requirement_test_specification import SwRequirementTestSpecificationModel
+from db.models.test_specification_test_case import TestSpecificationTestCaseModel
+from db.models.waterfall_coverage import WATERFALL_CHILDREN, WATERFALL_PARENTS
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy import and_, column, delete, event, exists, inspect, insert, or_, select, table, update
+from sqlalchemy.orm import Mapped, Session
+from sqlalchemy.orm import mapped_column
+
+# mapping table -> work item table, work item foreign key
+MAPPING_WORK_ITEMS = {
+    "sw_requirement_mapping_api": ("sw_requirements", "sw_requirement_id"),
+    "test_specification_mapping_api": ("test_specifications", "test_specification_id"),
+    "test_case_mapping_api": ("test_cases", "test_case_id"),
+    "justification_mapping_api": ("justifications", "justification_id"),
+    "document_mapping_api": ("documents", "document_id"),
+    "sw_requirement_mapping_sw_requirement": ("sw_requirements", "sw_requirement_id"),
+    "test_specification_mapping_sw_requirement": ("test_specifications", "test_specification_id"),
+    "test_case_mapping_sw_requirement": ("test_cases", "test_case_id"),
+    "test_case_mapping_test_specification": ("test_cases", "test_case_id"),
+    "document_mapping_document": ("documents", "document_id"),
+}
+
+PATH_SEPARATOR = "/"
+
+
+class WorkItemUsageModel(Base):
+    """Reverse traceability index: one row per mapping, direct or nested, with the
+    Software Component and the work item it maps.
+
+    path lists the mappings from the direct one to the row itself, as
+    "table:id/table:id", so the rows nested under a mapping share its path as prefix.
+    Rows are kept aligned by the mapping model listeners, see rebuild_work_item_usages()
+    to populate the table from the mapping tables.
+    """
+    __tablename__ = "work_item_usages"
+    __table_args__ = (
+        Index("ix_work_item_usages_work_item_table_work_item_id", "work_item_table", "work_item_id"),
+        Index("ix_work_item_usages_api_id", "api_id"),
+        Index("ix_work_item_usages_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+    )
+    extend_existing = True
+    mapping_table: Mapped[str] = mapped_column(String(64), primary_key=True)
+    mapping_id: Mapped[int] = mapped_column(Integer(), primary_key=True)
+    api_id: Mapped[int] = mapped_column(ForeignKey("apis.id", ondelete="CASCADE"))
+    work_item_table: Mapped[str] = mapped_column(String(64))
+    work_item_id: Mapped[int] = mapped_column(Integer())
+    path: Mapped[str] = mapped_column(String())
+
+    def __repr__(self) -> str:
+        return f"WorkItemUsageModel(mapping_table={self.mapping_table!r}, " \
+               f"mapping_id={self.mapping_id!r}, " \
+               f"api_id={self.api_id!r}, " \
+               f"work_item_table={self.work_item_table!r}, " \
+               f"work_item_id={self.work_item_id!r}, " \
+               f"path={self.path!r})"
+
+
+def _mapping_table(tablename):
+    """Lightweight table with the columns used by the index"""
+    work_item_fk = MAPPING_WORK_ITEMS[tablename][1]
+    parent_fks = [fk for fk, _ in WATERFALL_PARENTS.get(tablename, [])]
+    columns = ["id", work_item_fk] + (parent_fks if parent_fks else ["api_id"])
+    return table(tablename, *[column(x) for x in columns])
+
+
+def _node(tablename, mapping_id):
+    return f"{tablename}:{mapping_id}"
+
+
+def _row(tablename, mapping_id, api_id, work_item_id, path):
+    return {
+        "mapping_table": tablename,
+        "mapping_id": mapping_id,
+        "api_id": api_id,
+        "work_item_table": MAPPING_WORK_ITEMS[tablename][0],
+        "work_item_id": work_item_id,
+        "path": path,
+    }
+
+
+def _nested_row(tablename, row, nodes):
+    """Index row of a nested mapping, None if its parent is not in nodes"""
+    parent = None
+    for fk, parent_table in WATERFALL_PARENTS[tablename]:
+        if row[fk]:
+            parent = nodes.get((parent_table, row[fk]))
+            break
+    if parent is None:
+        return None
+    api_id, parent_path = parent
+    path = f"{parent_path}{PATH_SEPARATOR}{_node(tablename, row['id'])}"
+    nodes[(tablename, row["id"])] = (api_id, path)
+    return _row(tablename, row["id"], api_id, row[MAPPING_WORK_ITEMS[tablename][1]], path)
+
+
+def get_work_item_usage_rows(connection, api_ids=None):
+    """Return the index rows of the mappings of the apis in api_ids (all if None), read from the mapping tables"""
+    if api_ids is not None:
+        return _get_api_work_item_usage_rows(connection, api_ids)
+
+    # (table, id) -> (api_id, path)
+    nodes = {}
+    ret = []
+    pending = []
+    for tablename, (_, work_item_fk) in MAPPING_WORK_ITEMS.items():
+        mapping_table = _mapping_table(tablename)
+        for row in connection.execute(select(mapping_table)).mappings().all():
+            if tablename in WATERFALL_PARENTS:
+                pending.append((tablename, row))
+                continue
+            path = _node(tablename, row["id"])
+            nodes[(tablename, row["id"])] = (row["api_id"], path)
+            ret.append(_row(tablename, row["id"], row["api_id"], row[work_item_fk], path))
+
+    # Nested mappings are resolved level by level, orphans are skipped
+    while pending:
+        unresolved = []
+        for tablename, row in pending:
+            usage = _nested_row(tablename, row, nodes)
+            if usage is None:
+                unresolved.append((tablename, row))
+            else:
+                ret.append(usage)
+        if len(unresolved) == len(pending):
+            break
+        pending = unresolved
+    return ret
+
+
+def _get_api_work_item_usage_rows(connection, api_ids):
+    """Read the direct mappings of the apis, then the mappings nested under the ones read at the previous level"""
+    nodes = {}
+    ret = []
+    # table -> ids of the mappings read at the previous level
+    level = {}
+    for tablename, (_, work_item_fk) in MAPPING_WORK_ITEMS.items():
+        if tablename in WATERFALL_PARENTS:
+            continue
+        mapping_table = _mapping_table(tablename)
+        rows = connection.execute(
+            select(mapping_table).where(mapping_table.c.api_id.in_(list(api_ids)))
+        ).mappings().all()
+        for row in rows:
+            path = _node(tablename, row["id"])
+            nodes[(tablename, row["id"])] = (row["api_id"], path)
+            ret.append(_row(tablename, row["id"], row["api_id"], row[work_item_fk], path))
+        level[tablename] = [x["id"] for x in rows]
+
+    while any(level.values()):
+        next_level = {}
+        for tablename, parents in WATERFALL_PARENTS.items():
+            mapping_table = _mapping_table(tablename)
+            conditions = [mapping_table.c[fk].in_(level[parent_table])
+                          for fk, parent_table in parents if level.get(parent_table)]
+            if not conditions:
+                continue
+            for row in connection.execute(select(mapping_table).where(or_(*conditions))).mappings().all():
+                if (tablename, row["id"]) in nodes:
+                    continue
+                usage = _nested_row(tablename, row, nodes)
+                if usage is not None:
+                    ret.append(usage)
+                    next_level.setdefault(tablename, []).append(row["id"])
+        level = next_level
+    return ret
+
+
+def rebuild_work_item_usages(connection, api_ids=None):
+    """Rebuild the rows of the apis in api_ids (all if None) from the mapping tables"""
+    usages = WorkItemUsageModel.__table__
+    rows = get_work_item_usage_rows(connection, api_ids)
+    if api_ids is None:
+        connection.execute(delete(usages))
+    else:
+        connection.execute(delete(usages).where(usages.c.api_id.in_(list(api_ids))))
+    if rows:
+        connection.execute(insert(usages), rows)
+
+
+def backfill_work_item_usages(connection):
+    """Populate the table at the first startup after its introduction"""
+    usages = WorkItemUsageModel.__table__
+    if connection.execute(select(usages.c.mapping_id).limit(1)).first() is None:
+        rebuild_work_item_usages(connection)
+
+
+def prune_work_item_usages(connection, tablenames=None):
+    """Delete the rows of the mappings that do not exist anymore, in the selected tables (all if None).
+    Used after bulk deletes, that don't go through the model listeners."""
+    usages = WorkItemUsageModel.__table__
+    for tablename in tablenames if tablenames is not None else MAPPING_WORK_ITEMS.keys():
+        mapping_table = table(tablename, column("id"))
+        connection.execute(
+            delete(usages).where(
+                and_(
+                    usages.c.mapping_table == tablename,
+                    ~exists().where(mapping_table.c.id == usages.c.mapping_id),
+                )
+            )
+        )
+
+
+def get_work_item_usages(db_session, work_item_table, work_item_id):
+    """Return the rows of the mappings of a work item, ordered by api and path"""
+    usages = WorkItemUsageModel.__table__
+    return db_session.execute(
+        select(usages)
+        .where(usages.c.work_item_table == work_item_table)
+        .where(usages.c.work_item_id == work_item_id)
+        .order_by(usages.c.api_id, usages.c.path)
+    ).mappings().all()
+
+
+def _nested_tables(tablename):
+    """The table and the tables that can be nested under it, at any depth"""
+    ret = {tablename}
+    pending = [tablename]
+    while pending:
+        for child_table, _, _ in WATERFALL_CHILDREN.get(pending.pop(), []):
+            if child_table not in ret:
+                ret.add(child_table)
+                pending.append(child_table)
+    return ret
+
+
+def _key_columns(tablename):
+    return [MAPPING_WORK_ITEMS[tablename][1]] + (
+        [fk for fk, _ in WATERFALL_PARENTS[tablename]] if tablename in WATERFALL_PARENTS else ["api_id"]
+    )
+
+
+def receive_after_insert(mapper, connection, target):
+    tablename = target.__tablename__
+    usages = WorkItemUsageModel.__table__
+    work_item_id = getattr(target, MAPPING_WORK_ITEMS[tablename][1])
+
+    if tablename not in WATERFALL_PARENTS:
+        row = _row(tablename, target.id, target.api_id, work_item_id, _node(tablename, target.id))
+    else:
+        parents = [(parent_table, getattr(target, fk)) for fk, parent_table in WATERFALL_PARENTS[tablename]]
+        parent_table, parent_id = next((x for x in parents if x[1]), (None, None))
+        parent = connection.execute(
+            select(usages.c.api_id, usages.c.path)
+            .where(usages.c.mapping_table == parent_table)
+            .where(usages.c.mapping_id == parent_id)
+        ).first()
+        if parent is None:
+            # Parent not indexed, rebuild_work_item_usages() will add the row
+            return
+        path = f"{parent.path}{PATH_SEPARATOR}{_node(tablename, target.id)}"
+        row = _row(tablename, target.id, parent.api_id, work_item_id, path)
+    connection.execute(insert(usages), [row])
+
+
+def receive_after_update(mapper, connection, target):
+    tablename = target.__tablename__
+    state = inspect(target)
+    changed = [x for x in _key_columns(tablename) if state.attrs[x].history.has_changes()]
+    if not changed:
+        return
+    usages = WorkItemUsageModel.__table__
+    work_item_fk = MAPPING_WORK_ITEMS[tablename][1]
+    if changed == [work_item_fk]:
+        # Same position, e.g. forked work item: the nested rows keep their paths
+        connection.execute(
+            update(usages)
+            .where(usages.c.mapping_table == tablename)
+            .where(usages.c.mapping_id == target.id)
+            .values(work_item_id=getattr(target, work_item_fk))
+        )
+        return
+
+    # The mapping moved: rebuild the Software Components it was and it is part of
+    api_ids = set(connection.execute(
+        select(usages.c.api_id)
+        .where(usages.c.mapping_table == tablename)
+        .where(usages.c.mapping_id == target.id)
+    ).scalars().all())
+    if tablename in WATERFALL_PARENTS:
+        for fk, parent_table in WATERFALL_PARENTS[tablename]:
+            if getattr(target, fk):
+                api_ids.update(connection.execute(
+                    select(usages.c.api_id)
+                    .where(usages.c.mapping_table == parent_table)
+                    .where(usages.c.mapping_id == getattr(target, fk))
+                ).scalars().all())
+                break
+    else:
+        api_ids.add(target.api_id)
+    receive_after_delete(mapper, connection, target)
+    rebuild_work_item_usages(connection, api_ids)
+
+
+def receive_after_delete(mapper, connection, target):
+    # Nested mappings are deleted by the database cascades, without events
+    usages = WorkItemUsageModel.__table__
+    path = connection.execute(
+        select(usages.c.path)
+        .where(usages.c.mapping_table == target.__tablename__)
+        .where(usages.c.mapping_id == target.id)
+    ).scalar()
+    if path is None:
+        return
+    connection.execute(
+        delete(usages).where(or_(usages.c.path == path,
+                                 usages.c.path.startswith(f"{path}{PATH_SEPARATOR}", autoescape=True)))
+    )
+
+
+for model in [ApiDocumentModel, ApiJustificationModel, ApiSwRequirementModel, ApiTestCaseModel,
+              ApiTestSpecificationModel, DocumentDocumentModel, SwRequirementSwRequirementModel,
+              SwRequirementTestCaseModel, SwRequirementTestSpecificationModel, TestSpecificationTestCaseModel]:
+    event.listen(model, "after_insert", receive_after_insert)
+    event.listen(model, "after_update", receive_after_update)
+    event.listen(model, "after_delete", receive_after_delete)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def receive_do_orm_execute(orm_execute_state):
+    # Bulk deletes don't go through the model listeners
+    if not orm_execute_state.is_delete:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.local_table.name not in MAPPING_WORK_ITEMS:
+        return
+    result = orm_execute_state.invoke_statement()
+    prune_work_item_usages(orm_execute_state.session.connection(), _nested_tables(mapper.local_table.name))
+    return result
@@ -0,0 +1,142 @@
+"""Benchmark of the indexes added by db/models/migration/postgres_1_8_12.sql
+
+Create a scratch database, populate the tables read by the mapping views,
+then run EXPLAIN ANALYZE of the hot lookups without and with the indexes
+declared in the models.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/benchmark_db_indexes.py --apis 200 --mappings 50
+
+The database user needs the privileges to create a database and to disable
+foreign keys checks (session_replication_role) while populating it.
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from db import db_orm  # noqa: E402
+from db.models.db_base import Base  # noqa: E402
+import db.models.init_db  # noqa: E402 F401
+
+POPULATE = [
+    # One Software Component every `mappings` Sw Requirement mappings
+    """INSERT INTO sw_requirement_mapping_api (api_id, sw_requirement_id, section, "offset", coverage,
+           created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g / :mappings + 1, g + 1, 'section', 0, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings - 1) AS g""",
+    # Nested Sw Requirements, 4 children per mapping
+    """INSERT INTO sw_requirement_mapping_sw_requirement (sw_requirement_mapping_sw_requirement_id, sw_requirement_id,
+           coverage, created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g / 4 + 1, g + 1, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings * 4 - 1) AS g""",
+    # Test Cases of Test Specifications, 4 per mapping
+    """INSERT INTO test_case_mapping_test_specification (test_specification_mapping_api_id, test_case_id,
+           coverage, created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g / 4 + 1, g + 1, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings * 4 - 1) AS g""",
+    # 5 versions per Sw Requirement
+    """INSERT INTO sw_requirements_history (id, title, status, created_by_id, edited_by_id, version, created_at)
+       SELECT g / 5 + 1, 'title', 'NEW', 1, 1, g % 5 + 1, now()
+       FROM generate_series(0, :apis * :mappings * 5 - 1) AS g""",
+    # 2 comments per mapping
+    """INSERT INTO comments (parent_table, parent_id, comment, todo, done, created_by_id, created_at, updated_at)
+       SELECT 'sw_requirement_mapping_api', g / 2 + 1, 'comment', false, false, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings * 2 - 1) AS g""",
+    # 3 test runs per mapping
+    """INSERT INTO test_runs (uid, status, api_id, mapping_to, mapping_id, test_run_config_id, created_by_id,
+           created_at, updated_at)
+       SELECT md5(g::text), 'done', g / (3 * :mappings) + 1, 'test_case_mapping_api', g / 3 + 1, 1, 1,
+              now() - g * interval '1 minute', now()
+       FROM generate_series(0, :apis * :mappings * 3 - 1) AS g""",
+]
+
+QUERIES = {
+    "Sw Requirements of a Software Component":
+        "SELECT * FROM sw_requirement_mapping_api WHERE api_id = :api_id",
+    "Nested Sw Requirements of a mapping":
+        "SELECT * FROM sw_requirement_mapping_sw_requirement WHERE sw_requirement_mapping_sw_requirement_id = :id",
+    "Test Cases of a Test Specification mapping":
+        "SELECT * FROM test_case_mapping_test_specification WHERE test_specification_mapping_api_id = :id",
+    "Last version of a Sw Requirement":
+        "SELECT version FROM sw_requirements_history WHERE id = :id ORDER BY version DESC LIMIT 1",
+    "Comments of a mapping":
+        "SELECT * FROM comments WHERE parent_table = 'sw_requirement_mapping_api' AND parent_id = :id",
+    "Last test run of a mapping":
+        "SELECT * FROM test_runs WHERE api_id = :api_id AND mapping_to = 'test_case_mapping_api' "
+        "AND mapping_id = :id ORDER BY created_at DESC LIMIT 1",
+}
+
+
+def explain(connection, query, params, repeat):
+    """Return the best execution time in ms of `repeat` runs"""
+    ret = None
+    for i in range(repeat):
+        plan = connection.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"), params).scalar()
+        duration = plan[0]["Execution Time"]
+        ret = duration if ret is None else min(ret, duration)
+    return ret
+
+
+def run(connection, params, repeat):
+    return {name: explain(connection, query, params, repeat) for name, query in QUERIES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the BASIL database indexes")
+    parser.add_argument("--db-name", default="basil_benchmark", help="Scratch database, dropped at the end")
+    parser.add_argument("--apis", type=int, default=200, help="Number of Software Components")
+    parser.add_argument("--mappings", type=int, default=50, help="Sw Requirements per Software Component")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each query")
+    args = parser.parse_args()
+
+    admin_engine = create_engine(f"{db_orm.DbInterface.DB_URL}/postgres", isolation_level="AUTOCOMMIT")
+    with admin_engine.connect() as connection:
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{args.db_name}"'))
+        connection.execute(text(f'CREATE DATABASE "{args.db_name}"'))
+
+    engine = create_engine(f"{db_orm.DbInterface.DB_URL}/{args.db_name}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        indexes = [x for table in Base.metadata.sorted_tables for x in table.indexes]
+
+        sizes = {"apis": args.apis, "mappings": args.mappings}
+        with engine.begin() as connection:
+            for index in indexes:
+                index.drop(bind=connection)
+            connection.execute(text("SET session_replication_role = replica"))
+            for statement in POPULATE:
+                connection.execute(text(statement), sizes)
+        with engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+
+        # Lookups in the middle of the tables
+        params = {"api_id": args.apis // 2, "id": args.apis * args.mappings // 2}
+        with engine.connect() as connection:
+            before = run(connection, params, args.repeat)
+
+        with engine.begin() as connection:
+            for index in indexes:
+                index.create(bind=connection)
+            connection.execute(text("ANALYZE"))
+        with engine.connect() as connection:
+            after = run(connection, params, args.repeat)
+    finally:
+        engine.dispose()
+        with admin_engine.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{args.db_name}"'))
+        admin_engine.dispose()
+
+    print(f"{args.apis} Software Components, {args.mappings} Sw Requirements each, best of {args.repeat} runs\n")
+    print(f"| {'Query':<45} | {'Before (ms)':>11} | {'After (ms)':>10} |")
+    print(f"|{'-' * 47}|{'-' * 13}|{'-' * 12}|")
+    for name in QUERIES.keys():
+        print(f"| {name:<45} | {before[name]:>11.3f} | {after[name]:>10.3f} |")
+
+
+if __name__ == "__main__":
+    main()
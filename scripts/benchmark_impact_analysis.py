@@ -0,0 +1,118 @@
+"""Benchmark of the impact analysis query (get_reachable_edges)
+
+Create a scratch database, populate the mapping tables with the given number of
+rows, then time the downstream walk from a Sw Requirement and the upstream walk
+from a Test Case.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/benchmark_impact_analysis.py --apis 100 --mappings 100
+
+The database user needs the privileges to create a database and to disable
+foreign keys checks (session_replication_role) while populating it.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from db import db_orm  # noqa: E402
+from db.models.db_base import Base  # noqa: E402
+import db.models.init_db  # noqa: E402 F401
+from db.models.traceability_graph import DOWNSTREAM, UPSTREAM, get_reachable_edges  # noqa: E402
+from db.models.work_item_usage import rebuild_work_item_usages  # noqa: E402
+
+POPULATE = [
+    # Every Sw Requirement is mapped to `sharing` Software Components
+    """INSERT INTO sw_requirement_mapping_api (api_id, sw_requirement_id, section, "offset", coverage,
+           created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g / :mappings + 1, g % (:apis * :mappings / :sharing) + 1, 'section', 0, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings - 1) AS g""",
+    # Nested Sw Requirements, 4 children per mapping
+    """INSERT INTO sw_requirement_mapping_sw_requirement (sw_requirement_mapping_api_id, sw_requirement_id,
+           coverage, created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g / 4 + 1, :apis * :mappings + g + 1, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings * 4 - 1) AS g""",
+    # Test Cases of the nested Sw Requirements, one per mapping
+    """INSERT INTO test_case_mapping_sw_requirement (sw_requirement_mapping_sw_requirement_id, test_case_id,
+           coverage, created_by_id, edited_by_id, created_at, updated_at)
+       SELECT g + 1, g % 1000 + 1, 100, 1, 1, now(), now()
+       FROM generate_series(0, :apis * :mappings * 4 - 1) AS g""",
+    # One test run per Test Case mapping
+    """INSERT INTO test_runs (uid, status, api_id, mapping_to, mapping_id, test_run_config_id, created_by_id,
+           created_at, updated_at)
+       SELECT md5(g::text), 'done', g / (4 * :mappings) + 1, 'test_case_mapping_sw_requirement', g + 1, 1, 1,
+              now(), now()
+       FROM generate_series(0, :apis * :mappings * 4 - 1) AS g""",
+]
+
+
+def measure(session, repeat, *args, **kwargs):
+    """Return the best time in ms of `repeat` runs and the number of edges"""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        edges = get_reachable_edges(session, *args, **kwargs)
+        duration = (time.perf_counter() - start) * 1000
+        best = duration if best is None else min(best, duration)
+    return best, len(edges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the BASIL impact analysis query")
+    parser.add_argument("--db-name", default="basil_benchmark", help="Scratch database, dropped at the end")
+    parser.add_argument("--apis", type=int, default=100, help="Number of Software Components")
+    parser.add_argument("--mappings", type=int, default=100, help="Sw Requirements per Software Component")
+    parser.add_argument("--sharing", type=int, default=4, help="Software Components sharing a Sw Requirement")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each query")
+    args = parser.parse_args()
+
+    admin_engine = create_engine(f"{db_orm.DbInterface.DB_URL}/postgres", isolation_level="AUTOCOMMIT")
+    with admin_engine.connect() as connection:
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{args.db_name}"'))
+        connection.execute(text(f'CREATE DATABASE "{args.db_name}"'))
+
+    engine = create_engine(f"{db_orm.DbInterface.DB_URL}/{args.db_name}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        sizes = {"apis": args.apis, "mappings": args.mappings, "sharing": args.sharing}
+        with engine.begin() as connection:
+            connection.execute(text("SET session_replication_role = replica"))
+            for statement in POPULATE:
+                connection.execute(text(statement), sizes)
+            rebuild_work_item_usages(connection)
+            rows = connection.execute(text(
+                "SELECT (SELECT count(*) FROM sw_requirement_mapping_api) "
+                "+ (SELECT count(*) FROM sw_requirement_mapping_sw_requirement) "
+                "+ (SELECT count(*) FROM test_case_mapping_sw_requirement)"
+            )).scalar()
+        with engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+
+        with Session(engine) as session:
+            results = {
+                "Downstream of a Sw Requirement": measure(session, args.repeat, "sw-requirement", 1, DOWNSTREAM),
+                "Upstream of a Test Case": measure(session, args.repeat, "test-case", 1, UPSTREAM),
+                "Software Components of a Test Case": measure(session, args.repeat, "test-case", 1, UPSTREAM,
+                                                              types=["api"]),
+            }
+    finally:
+        engine.dispose()
+        with admin_engine.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{args.db_name}"'))
+        admin_engine.dispose()
+
+    print(f"{rows} mapping rows, best of {args.repeat} runs\n")
+    print(f"| {'Query':<36} | {'Time (ms)':>9} | {'Edges':>6} |")
+    print(f"|{'-' * 38}|{'-' * 11}|{'-' * 8}|")
+    for name, (duration, edges) in results.items():
+        print(f"| {name:<36} | {duration:>9.1f} | {edges:>6} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark of the compiled rules of the traceability scanner
+
+Generates the sources of a large repository in memory, with a requirement block every
+few lines, and extracts the fields of a Software Requirement rule from each file:
+
+- per field: each field scans the file content on its own, as before the rule plans
+- compiled:  the fields share the lines of the file and the predicates of the rule,
+             evaluated in a single pass
+
+The script checks that both return the same values, then compares the times.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/benchmark_scanner_rules.py --files 300 --lines 3000
+
+The api module initializes the database at import, BASIL_TESTING=1 selects the test one.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "api"))
+
+from repos_scanner import ArtifactsScanner, logger  # noqa: E402
+
+RULE_CONFIG = {
+    "name": "Requirements",
+    "title": {
+        "start": {"line_starting_with": "// REQ", "strip": True},
+        "end": {"line_equal": "// END", "first_only": True},
+        "transform": [{"how": "replace", "what": "// REQ ", "with": ""}],
+    },
+    "description": {
+        "start": {"line_starting_with": "// REQ", "strip": True, "extend": {"direction": "down", "count": 1}},
+        "end": {"line_equal": "// END", "first_only": True},
+    },
+    "coverage": {
+        "start": {"line_contains": "coverage:", "strip": True},
+        "end": {"line_ending_with": "%", "first_only": True},
+    },
+    "test": {
+        "start": {"line_regex": r"^\s*// TEST-\d+", "closest": {"direction": "up", "line_starting_with": "// REQ"}},
+        "end": {"line_equal": "// END", "first_only": True},
+    },
+}
+
+FIELDS = [("title", "str"), ("description", "str"), ("coverage", "str"), ("test", "str")]
+
+
+def get_file_content(rnd, n_lines):
+    """Source file with a requirement block every 5 to 30 lines"""
+    lines = []
+    while len(lines) < n_lines:
+        lines += [f"    int value_{len(lines)} = {rnd.randint(0, 1000)};" for i in range(rnd.randint(5, 30))]
+        n = len(lines)
+        lines += [f"// REQ SR-{n}", f"  description of SR-{n}", f"  coverage: {rnd.randint(0, 100)}%"]
+        if rnd.random() < 0.3:
+            lines.append(f"  // TEST-{n}")
+        lines.append("// END")
+    return "\n".join(lines)
+
+
+def per_field(scanner, file_content):
+    ret = []
+    for field_name, field_type in FIELDS:
+        field_config = RULE_CONFIG[field_name]
+        values = scanner.search__extract_sections(_config=field_config, text=file_content, elements=[])
+        if field_config.get("transform", None) is not None:
+            values = [scanner._apply_transforms(x, field_config.get("transform"), field_type) for x in values]
+        ret.append(values)
+    return ret
+
+
+def compiled(scanner, file_content):
+    return [scanner._get_field_value(_config=RULE_CONFIG, field_name=field_name, field_type=field_type,
+                                     text=file_content, _magic_variables={})
+            for field_name, field_type in FIELDS]
+
+
+def measure(func, files, repeat):
+    """Return the result of the last run and the best time in ms"""
+    best = None
+    for i in range(repeat):
+        scanner = ArtifactsScanner(user_id="benchmark", testing=True)
+        start = time.perf_counter()
+        ret = [func(scanner, x) for x in files]
+        duration = (time.perf_counter() - start) * 1000
+        best = duration if best is None else min(best, duration)
+    return ret, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the compiled rules of the traceability scanner")
+    parser.add_argument("--files", type=int, default=300, help="Files of the repository")
+    parser.add_argument("--lines", type=int, default=3000, help="Lines of each file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each implementation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dump-plan", action="store_true", help="Print the compiled plan of the rule")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    rnd = random.Random(args.seed)
+    files = [get_file_content(rnd, args.lines) for i in range(args.files)]
+    if args.dump_plan:
+        print(json.dumps(ArtifactsScanner(user_id="benchmark", testing=True)._get_rule_plan(RULE_CONFIG).describe(),
+                         indent=4))
+
+    previous, previous_time = measure(per_field, files, args.repeat)
+    current, current_time = measure(compiled, files, args.repeat)
+    if previous != current:
+        sys.exit("Different output")
+    n_requirements = sum(len(x[0]) for x in current)
+    print(f"{args.files} files of {args.lines} lines, {n_requirements} requirements, best of {args.repeat} runs\n")
+    print(f"| {'Per field (ms)':>14} | {'Compiled (ms)':>13} |")
+    print(f"|{'-' * 16}|{'-' * 15}|")
+    print(f"| {previous_time:>14.1f} | {current_time:>13.1f} |")
+
+
+if __name__ == "__main__":
+    main()
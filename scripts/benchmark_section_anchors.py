@@ -0,0 +1,95 @@
+"""Benchmark of reanchor_sections() against the previous lookup
+
+The previous implementation searched each section from the start of the new
+Reference Document (`section in spec` and `spec.index(section)`), anchoring
+duplicated sections to their first occurrence.
+The script builds a Reference Document with some duplicated paragraphs, inserts
+text in a few places and compares the times and the number of sections
+anchored to the expected offset.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/benchmark_section_anchors.py --size 1000000 --sections 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "api"))
+
+from section_anchors import reanchor_sections  # noqa: E402
+
+
+def legacy_reanchor_sections(sections, new_text):
+    ret = {}
+    for key, section, offset in sections:
+        ret[key] = new_text.index(section) if section in new_text else None
+    return ret
+
+
+def build(size, n_sections, seed):
+    rnd = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        if paragraphs and rnd.random() < 0.05:
+            # Duplicated paragraph
+            paragraph = rnd.choice(paragraphs)
+        else:
+            words = [f"{rnd.getrandbits(24):06x}" for _ in range(rnd.randint(5, 30))]
+            paragraph = " ".join(words) + ".\n"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+
+    starts = []
+    offset = 0
+    for paragraph in paragraphs:
+        starts.append(offset)
+        offset += len(paragraph)
+    old_text = "".join(paragraphs)
+
+    indexes = sorted(rnd.sample(range(len(paragraphs)), min(n_sections, len(paragraphs))))
+    sections = [(i, paragraphs[i], starts[i]) for i in indexes]
+
+    # Text inserted before some paragraphs
+    inserts = set(rnd.sample(range(len(paragraphs)), 10))
+    new_paragraphs = []
+    expected = {}
+    offset = 0
+    for i, paragraph in enumerate(paragraphs):
+        if i in inserts:
+            new_paragraphs.append("Inserted paragraph.\n")
+            offset += len(new_paragraphs[-1])
+        expected[i] = offset
+        new_paragraphs.append(paragraph)
+        offset += len(paragraph)
+    new_text = "".join(new_paragraphs)
+    return old_text, new_text, sections, {i: expected[i] for i, _, _ in sections}
+
+
+def run(name, func, expected):
+    start = time.perf_counter()
+    ret = func()
+    duration = time.perf_counter() - start
+    correct = len([x for x in expected if ret[x] == expected[x]])
+    print(f"{name:<28} {duration * 1000:10.1f} ms  {correct}/{len(expected)} anchored as expected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000000, help="characters of the Reference Document")
+    parser.add_argument("--sections", type=int, default=5000, help="number of mapped sections")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    old_text, new_text, sections, expected = build(args.size, args.sections, args.seed)
+    print(f"{len(new_text)} characters, {len(sections)} sections")
+    run("legacy", lambda: legacy_reanchor_sections(sections, new_text), expected)
+    run("reanchor (new text only)", lambda: reanchor_sections(sections, new_text), expected)
+    run("reanchor (with old text)", lambda: reanchor_sections(sections, new_text, old_text), expected)
+
+
+if __name__ == "__main__":
+    main()
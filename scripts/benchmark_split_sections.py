@@ -0,0 +1,273 @@
+"""Benchmark of get_split_sections() against the previous implementation
+
+The previous implementation split the sections mapping by mapping, detecting
+overlaps with sets of offsets. It is kept here as reference: the script checks
+that both the implementations return the same json, then compares the times.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/benchmark_split_sections.py --size 200000 --mappings 300
+
+The api module initializes the database at import, BASIL_TESTING=1 selects the test one.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "api"))
+
+from api import _D, _Ds, _J, _Js, _SR, _SRs, _TC, _TCs, _TS, _TSs, get_split_sections  # noqa: E402
+
+
+def legacy_split_section(_to_splits, _that_split, _work_item_type):
+    sections = []
+    _current_work_item = _that_split
+
+    if _work_item_type == _SR:
+        if "indirect_sw_requirement" in _that_split.keys():
+            _current_work_item["parent_mapping_type"] = "sw_requirement_mapping_sw_requirement"
+        else:
+            _current_work_item["parent_mapping_type"] = "sw_requirement_mapping_api"
+
+    for _to_split in _to_splits:
+        _to_split_range = range(_to_split["offset"], _to_split["offset"] + len(_to_split["section"]))
+        that_split_range = range(_that_split["offset"], _that_split["offset"] + len(_that_split["section"]))
+        overlap = len(list(set(_to_split_range) & set(that_split_range))) > 0
+        if not overlap:
+            tmp_section = {
+                "section": _to_split["section"],
+                "offset": _to_split["offset"],
+                "coverage": _to_split["coverage"],
+                "covered": _to_split["covered"],
+                "gap": _to_split["gap"],
+                "delete": 0,
+                _Js: [],
+                _TCs: [],
+                _TSs: [],
+                _SRs: [],
+                _Ds: [],
+            }
+
+            for j in range(len(_to_split[_SRs])):
+                tmp_section[_SRs].append(_to_split[_SRs][j].copy())
+            for j in range(len(_to_split[_TCs])):
+                tmp_section[_TCs].append(_to_split[_TCs][j].copy())
+            for j in range(len(_to_split[_TSs])):
+                tmp_section[_TSs].append(_to_split[_TSs][j].copy())
+            for j in range(len(_to_split[_Js])):
+                tmp_section[_Js].append(_to_split[_Js][j].copy())
+            for j in range(len(_to_split[_Ds])):
+                tmp_section[_Ds].append(_to_split[_Ds][j].copy())
+
+            sections.append(tmp_section)
+
+        else:
+            idx = [
+                _to_split["offset"],
+                _to_split["offset"] + len(_to_split["section"]),
+                _that_split["offset"],
+                _that_split["offset"] + len(_that_split["section"]),
+            ]
+            idx_set = set(idx)
+            idx = sorted(list(idx_set))
+            for i in range(1, len(idx)):
+                # Compute boundaries relative to the section being split to avoid negative or zero-length slices
+                base_offset = _to_split["offset"]
+                section_start = base_offset
+                section_end = base_offset + len(_to_split["section"])
+                segment_start = max(idx[i - 1], section_start)
+                segment_end = min(idx[i], section_end)
+                if segment_end <= segment_start:
+                    continue
+                tmp_section = {
+                    "section": _to_split["section"][segment_start - base_offset: segment_end - base_offset],
+                    "offset": segment_start,
+                    "coverage": _to_split["coverage"],
+                    "covered": _to_split["covered"],
+                    "gap": _to_split["gap"],
+                    "delete": 0,
+                    _Js: [],
+                    _TCs: [],
+                    _TSs: [],
+                    _SRs: [],
+                    _Ds: [],
+                }
+
+                for j in range(len(_to_split[_SRs])):
+                    tmp_section[_SRs].append(_to_split[_SRs][j].copy())
+                for j in range(len(_to_split[_TCs])):
+                    tmp_section[_TCs].append(_to_split[_TCs][j].copy())
+                for j in range(len(_to_split[_TSs])):
+                    tmp_section[_TSs].append(_to_split[_TSs][j].copy())
+                for j in range(len(_to_split[_Js])):
+                    tmp_section[_Js].append(_to_split[_Js][j].copy())
+                for j in range(len(_to_split[_Ds])):
+                    tmp_section[_Ds].append(_to_split[_Ds][j].copy())
+
+                sections.append(tmp_section)
+
+    for iSection in range(len(sections)):
+        section_range = range(
+            sections[iSection]["offset"], sections[iSection]["offset"] + len(sections[iSection]["section"])
+        )
+        that_split_range = range(_that_split["offset"], _that_split["offset"] + len(_that_split["section"]))
+        overlap = len(list(set(section_range) & set(that_split_range))) > 0
+        if overlap:
+            sections[iSection][f"{_work_item_type}s"].append(_current_work_item)
+
+    return sections
+
+
+def legacy_get_split_sections(_specification, _mapping, _work_item_types):
+    """
+    _mapping: list of x_y (e.g. ApiSwRequirement) with nested mapping
+              each row has its own specification section information
+    _work_item_types: list of work items type for direct mapping that I
+              what to display in the current view
+    return: list of sections with related mapping
+    """
+    mapped_sections = [
+        {
+            "section": _specification,
+            "offset": 0,
+            "coverage": 0,
+            "covered": 0,
+            "gap": 100,
+            "delete": 0,
+            _TCs: [],
+            _TSs: [],
+            _SRs: [],
+            _Js: [],
+            _Ds: [],
+        }
+    ]
+
+    for iWIT in range(len(_work_item_types)):
+        _items_key = f"{_work_item_types[iWIT]}s"
+        for iMapping in range(len(_mapping[_items_key])):
+            if not _mapping[_items_key][iMapping]["match"]:
+                continue
+            mapped_sections = sorted(mapped_sections, key=lambda k: k["offset"])
+
+            # get overlapping sections
+            overlapping_section_indexes = []
+            for j in range(len(mapped_sections)):
+                section_range = range(
+                    mapped_sections[j]["offset"], mapped_sections[j]["offset"] + len(mapped_sections[j]["section"])
+                )
+                that_split_range = range(
+                    _mapping[_items_key][iMapping]["offset"],
+                    _mapping[_items_key][iMapping]["offset"] + len(_mapping[_items_key][iMapping]["section"]),
+                )
+                overlap = len(list(set(section_range) & set(that_split_range))) > 0
+                if overlap:
+                    overlapping_section_indexes.append(j)
+
+            if len(overlapping_section_indexes) > 0:
+                for k in overlapping_section_indexes:
+                    mapped_sections[k]["delete"] = 1
+
+                mapped_sections += legacy_split_section(
+                    [x for x in mapped_sections if x["delete"] == 1],
+                    _mapping[_items_key][iMapping],
+                    _work_item_types[iWIT],
+                )
+                mapped_sections = [x for x in mapped_sections if x["delete"] == 0]
+
+    for iS in range(len(mapped_sections)):
+        if mapped_sections[iS]["section"].strip() == "":
+            if (
+                sum(
+                    [
+                        len(mapped_sections[iS][_SRs]),
+                        len(mapped_sections[iS][_TSs]),
+                        len(mapped_sections[iS][_TCs]),
+                        len(mapped_sections[iS][_Js]),
+                        len(mapped_sections[iS][_Ds]),
+                    ]
+                )
+                == 0
+            ):
+                mapped_sections[iS]["delete"] = True
+
+        coverage_total = 0
+        for j in range(len(mapped_sections[iS][_SRs])):
+            coverage_total += mapped_sections[iS][_SRs][j]["covered"]
+        for j in range(len(mapped_sections[iS][_TCs])):
+            coverage_total += mapped_sections[iS][_TCs][j]["covered"]
+        for j in range(len(mapped_sections[iS][_TSs])):
+            coverage_total += mapped_sections[iS][_TSs][j]["covered"]
+        for j in range(len(mapped_sections[iS][_Js])):
+            coverage_total += mapped_sections[iS][_Js][j]["covered"]
+        for j in range(len(mapped_sections[iS][_Ds])):
+            coverage_total += mapped_sections[iS][_Ds][j]["covered"]
+        mapped_sections[iS]["covered"] = min(max(coverage_total, 0), 100)
+
+    # Remove Section with section: \n and no work items
+    mapped_sections = [x for x in mapped_sections if not x["delete"]]
+    return sorted(mapped_sections, key=lambda k: k["offset"])
+
+
+def get_mapping(specification, n_mappings, max_length, seed):
+    """Random mappings of each work item type, some of them not matching the specification"""
+    rnd = random.Random(seed)
+    mapping = {}
+    for items_key in [_SRs, _TSs, _TCs, _Js, _Ds]:
+        mapping[items_key] = []
+        for i in range(n_mappings):
+            offset = rnd.randrange(len(specification))
+            section = specification[offset: offset + rnd.randint(1, max_length)]
+            mapping[items_key].append({
+                "relation_id": i,
+                "section": section,
+                "offset": offset,
+                "covered": rnd.choice([0, 12.5, 33.3, 50, 100]),
+                "match": rnd.random() > 0.05,
+            })
+    return mapping
+
+
+def measure(func, specification, mapping, work_item_types, repeat):
+    """Return the result of the last run and the best time in ms"""
+    best = None
+    for i in range(repeat):
+        tmp = copy.deepcopy(mapping)
+        start = time.perf_counter()
+        ret = func(specification, tmp, work_item_types)
+        duration = (time.perf_counter() - start) * 1000
+        best = duration if best is None else min(best, duration)
+    return ret, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of get_split_sections")
+    parser.add_argument("--size", type=int, default=200000, help="Reference document size in characters")
+    parser.add_argument("--mappings", type=int, default=300, help="Mappings per work item type")
+    parser.add_argument("--max-length", type=int, default=2000, help="Max length of a mapped section")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each implementation")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    specification = "".join(rnd.choice("abcdefghij \n") for i in range(args.size))
+    mapping = get_mapping(specification, args.mappings, args.max_length, args.seed)
+
+    print(f"{args.size} characters, {args.mappings} mappings per work item type, best of {args.repeat} runs\n")
+    print(f"| {'Work item types':<45} | {'Sections':>8} | {'Previous (ms)':>13} | {'Current (ms)':>12} |")
+    print(f"|{'-' * 47}|{'-' * 10}|{'-' * 15}|{'-' * 14}|")
+    for work_item_types in [[_SR, _J, _D], [_TS, _J, _D], [_TC, _J, _D], [_J], [_D]]:
+        legacy, legacy_time = measure(legacy_get_split_sections, specification, mapping, work_item_types,
+                                      args.repeat)
+        current, current_time = measure(get_split_sections, specification, mapping, work_item_types, args.repeat)
+        if json.dumps(legacy) != json.dumps(current):
+            sys.exit(f"Different output for {work_item_types}")
+        print(f"| {', '.join(work_item_types):<45} | {len(current):>8} | {legacy_time:>13.1f} | "
+              f"{current_time:>12.1f} |")
+
+
+if __name__ == "__main__":
+    main()
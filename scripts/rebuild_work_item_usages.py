@@ -0,0 +1,41 @@
+"""Rebuild the reverse traceability index (work_item_usages table)
+
+The index is kept aligned by the mapping model listeners and populated at the
+first startup after its introduction. Rebuild it if the mapping tables were
+changed outside of the api, e.g. after restoring a backup or editing the
+database with sql statements.
+
+To be executed from BASIL root folder:
+
+    python3 scripts/rebuild_work_item_usages.py --db basil
+    python3 scripts/rebuild_work_item_usages.py --db basil --api-id 1 --api-id 2
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from db import db_orm  # noqa: E402
+from db.models.work_item_usage import WorkItemUsageModel, rebuild_work_item_usages  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="basil", help="database name")
+    parser.add_argument("--api-id", type=int, action="append", dest="api_ids",
+                        help="rebuild the rows of this Software Component only, can be repeated")
+    args = parser.parse_args()
+
+    dbi = db_orm.DbInterface(args.db)
+    try:
+        rebuild_work_item_usages(dbi.session.connection(), args.api_ids)
+        dbi.session.commit()
+        count = dbi.session.query(WorkItemUsageModel).count()
+        print(f"{count} mappings indexed")
+    finally:
+        dbi.close()
+
+
+if __name__ == "__main__":
+    main()